@@ -211,6 +211,8 @@ GROUP BY team_id, date;
 CREATE TABLE IF NOT EXISTS clicks (
     id String,
     link_id String,
+    team_id String DEFAULT '',
+    visitor_id String DEFAULT ip,
     short_code String,
     timestamp DateTime64(3),
     ip String,
@@ -0,0 +1,27 @@
+# Staged ingestion pipeline shared by the click consumers
+from .core import PIPELINES, Message, Pipeline, StageMetrics, json_decode, pipeline_metrics
+from .fields import CLICK_COLUMNS, normalize_click, parse_timestamp, snake_case, to_click_row
+from .sinks import ClickHouseSink, MemorySink, Sink
+from .sources import KafkaSource, MemorySource, RabbitMQSource, RedisStreamSource, Source
+
+__all__ = [
+    "PIPELINES",
+    "Message",
+    "Pipeline",
+    "StageMetrics",
+    "json_decode",
+    "pipeline_metrics",
+    "Source",
+    "MemorySource",
+    "KafkaSource",
+    "RabbitMQSource",
+    "RedisStreamSource",
+    "Sink",
+    "MemorySink",
+    "ClickHouseSink",
+    "CLICK_COLUMNS",
+    "normalize_click",
+    "parse_timestamp",
+    "snake_case",
+    "to_click_row",
+]
@@ -0,0 +1,73 @@
+"""
+Benchmark a pipeline end to end with the in-memory source and sink.
+
+    python -m lnk_pipeline.bench --events 200000 --batch-size 1000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime
+from uuid import uuid4
+
+from .core import Pipeline
+from .fields import normalize_click
+from .sinks import MemorySink
+from .sources import MemorySource
+
+
+def sample_clicks(count: int):
+    now = datetime.utcnow().isoformat() + "Z"
+    return [
+        json.dumps({
+            "id": str(uuid4()),
+            "linkId": f"link-{i % 100}",
+            "shortCode": f"c{i % 100}",
+            "teamId": "team-1",
+            "timestamp": now,
+            "ip": "203.0.113.7",
+            "userAgent": "Mozilla/5.0",
+            "country": "US",
+            "device": "mobile" if i % 3 else "desktop",
+        }).encode()
+        for i in range(count)
+    ]
+
+
+async def run(events: int, batch_size: int, queue_size: int) -> None:
+    source = MemorySource(sample_clicks(events))
+    sink = MemorySink(keep=False)
+    pipeline = Pipeline(
+        "bench",
+        source,
+        sink,
+        enrich=[normalize_click],
+        filters=[lambda click: click.get("link_id")],
+        batch_size=batch_size,
+        flush_interval=0.1,
+        queue_size=queue_size,
+    )
+
+    started = time.perf_counter()
+    await pipeline.run()
+    elapsed = time.perf_counter() - started
+
+    print(f"{sink.count} events in {sink.batches} batches, {elapsed:.2f}s "
+          f"({sink.count / elapsed:,.0f} events/s), {source.acked} acked")
+    for stage, metrics in pipeline.metrics().items():
+        print(f"  {stage:<7} in={metrics['events_in']:<8} out={metrics['events_out']:<8} "
+              f"avg={metrics['avg_latency_ms']:.3f}ms util={metrics['utilization']:.0%}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--queue-size", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(run(args.events, args.batch_size, args.queue_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+"""Staged ingestion pipeline: source -> decode -> enrich -> filter -> batch -> sink."""
+
+import asyncio
+import inspect
+import json
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+Event = Dict[str, Any]
+Decoder = Callable[[Any], Iterable[Event]]
+Step = Callable[[Event], Union[Optional[Event], Awaitable[Optional[Event]]]]
+Predicate = Callable[[Event], bool]
+
+# Pipelines started in this process, by name, for metrics endpoints
+PIPELINES: Dict[str, "Pipeline"] = {}
+
+_STOP = object()
+
+
+class Message:
+    """One message from a source and the decoded events still waiting to be written."""
+
+    __slots__ = ("body", "token", "pending")
+
+    def __init__(self, body: Any, token: Any = None):
+        self.body = body
+        self.token = token  # Source-specific handle used to acknowledge it
+        self.pending: Optional[int] = None  # Set once decoded
+
+
+class Record:
+    __slots__ = ("event", "message")
+
+    def __init__(self, event: Event, message: Message):
+        self.event = event
+        self.message = message
+
+
+class StageMetrics:
+    """Throughput and latency counters for one pipeline stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.events_in = 0
+        self.events_out = 0
+        self.errors = 0
+        self.calls = 0
+        self.busy_seconds = 0.0
+        self.max_latency_ms = 0.0
+        self.queue_depth: Callable[[], int] = lambda: 0
+        self._started = time.monotonic()
+
+    def record(self, events_in: int, events_out: int, seconds: float) -> None:
+        self.events_in += events_in
+        self.events_out += events_out
+        self.calls += 1
+        self.busy_seconds += seconds
+        self.max_latency_ms = max(self.max_latency_ms, seconds * 1000)
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = max(time.monotonic() - self._started, 1e-9)
+        return {
+            "events_in": self.events_in,
+            "events_out": self.events_out,
+            "errors": self.errors,
+            "events_per_second": self.events_out / elapsed,
+            "avg_latency_ms": self.busy_seconds * 1000 / self.calls if self.calls else 0,
+            "max_latency_ms": self.max_latency_ms,
+            "utilization": self.busy_seconds / elapsed,
+            "queue_depth": self.queue_depth(),
+        }
+
+
+def pipeline_metrics() -> Dict[str, Dict[str, Any]]:
+    """Per-stage metrics of every pipeline running in this process."""
+    return {name: pipeline.metrics() for name, pipeline in PIPELINES.items()}
+
+
+def json_decode(body: Any) -> List[Event]:
+    """Decode a JSON object (or list of objects) from bytes, str or an already-parsed value."""
+    if isinstance(body, (bytes, bytearray, str)):
+        body = json.loads(body)
+    if isinstance(body, list):
+        return body
+    return [body]
+
+
+class Pipeline:
+    """
+    Run events from a source through decode, enrich, filter, batch and sink stages.
+
+    Each stage is its own task, joined to the next by a bounded queue, so a
+    slow sink applies backpressure all the way to the source instead of
+    buffering without limit. Enrich steps return the (possibly modified)
+    event or None to drop it; filters return False to drop. Both may be sync
+    or async.
+
+    Messages are acknowledged to the source in the order they arrived, once
+    every event decoded from them was written or dropped. A batch the sink
+    still rejects after ``sink_retries`` attempts is logged, counted in the
+    sink's ``errors`` and then retried at the longest backoff until the sink
+    recovers; backpressure pauses the source meanwhile. It is never
+    acknowledged unwritten: stopping the pipeline leaves it, and everything
+    read after it, for the source to redeliver.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        source,
+        sink,
+        decode: Decoder = json_decode,
+        enrich: Optional[List[Step]] = None,
+        filters: Optional[List[Predicate]] = None,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        queue_size: int = 1000,
+        sink_retries: int = 3,
+        retry_backoff: float = 0.5,
+    ):
+        self.name = name
+        self.source = source
+        self.sink = sink
+        self.decode = decode
+        self.enrich = enrich or []
+        self.filters = filters or []
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.sink_retries = sink_retries
+        self.retry_backoff = retry_backoff
+
+        self.stages: Dict[str, StageMetrics] = {
+            name: StageMetrics(name)
+            for name in ("source", "decode", "enrich", "filter", "batch", "sink")
+        }
+        self._inflight: Deque[Message] = deque()
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = asyncio.Event()
+
+    async def run(self) -> None:
+        """Run until the source is exhausted or ``stop`` is called."""
+        await self.source.start()
+        PIPELINES[self.name] = self
+        logger.info(f"Pipeline {self.name} started")
+
+        queues = [asyncio.Queue(self.queue_size) for _ in range(5)]
+        to_decode, to_enrich, to_filter, to_batch, to_sink = queues
+        # Each stage reports the backlog waiting in its input queue
+        for metrics, queue in zip(list(self.stages.values())[1:], queues):
+            metrics.queue_depth = queue.qsize
+
+        self._tasks = [
+            asyncio.create_task(self._read(to_decode)),
+            asyncio.create_task(self._decode(to_decode, to_enrich)),
+            asyncio.create_task(
+                self._transform("enrich", self._apply_enrich, to_enrich, to_filter)
+            ),
+            asyncio.create_task(
+                self._transform("filter", self._apply_filters, to_filter, to_batch)
+            ),
+            asyncio.create_task(self._batch(to_batch, to_sink)),
+            asyncio.create_task(self._write(to_sink)),
+        ]
+        try:
+            await asyncio.gather(*self._tasks)
+        finally:
+            for task in self._tasks:
+                task.cancel()
+            await self.source.stop()
+            await self.sink.close()
+            PIPELINES.pop(self.name, None)
+            logger.info(f"Pipeline {self.name} stopped")
+
+    async def stop(self, timeout: float = 30) -> None:
+        """Stop reading, then let in-flight events drain through the sink."""
+        self._stopping.set()
+        self.source.close()
+        if self._tasks:
+            done, pending = await asyncio.wait(self._tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {name: stage.snapshot() for name, stage in self.stages.items()}
+
+    # ========== Stages ==========
+
+    async def _read(self, out: asyncio.Queue) -> None:
+        metrics = self.stages["source"]
+        try:
+            async for message in self.source.messages():
+                metrics.record(1, 1, 0)
+                self._inflight.append(message)
+                await out.put(message)
+                if self._stopping.is_set():
+                    break
+        except Exception as e:
+            metrics.errors += 1
+            logger.error(f"Pipeline {self.name} source failed: {e}")
+        finally:
+            await out.put(_STOP)
+
+    async def _decode(self, inbox: asyncio.Queue, out: asyncio.Queue) -> None:
+        metrics = self.stages["decode"]
+        while (message := await inbox.get()) is not _STOP:
+            started = time.perf_counter()
+            try:
+                events = list(self.decode(message.body))
+            except Exception as e:
+                metrics.errors += 1
+                logger.warning(f"Pipeline {self.name} could not decode message: {e}")
+                events = []
+            metrics.record(1, len(events), time.perf_counter() - started)
+
+            message.pending = len(events)
+            if not events:
+                await self._ack_ready()
+                continue
+            # Records travel between stages in per-message chunks
+            await out.put([Record(event, message) for event in events])
+        await out.put(_STOP)
+
+    async def _transform(
+        self,
+        stage: str,
+        apply: Callable[[Event], Awaitable[Optional[Event]]],
+        inbox: asyncio.Queue,
+        out: asyncio.Queue,
+    ) -> None:
+        metrics = self.stages[stage]
+        while (records := await inbox.get()) is not _STOP:
+            started = time.perf_counter()
+            kept, dropped = [], []
+            for record in records:
+                try:
+                    event = await apply(record.event)
+                except Exception as e:
+                    metrics.errors += 1
+                    logger.warning(f"Pipeline {self.name} {stage} failed: {e}")
+                    event = None
+                if event is None:
+                    dropped.append(record)
+                else:
+                    record.event = event
+                    kept.append(record)
+            metrics.record(len(records), len(kept), time.perf_counter() - started)
+
+            if dropped:
+                await self._done(dropped)
+            if kept:
+                await out.put(kept)
+        await out.put(_STOP)
+
+    async def _apply_enrich(self, event: Event) -> Optional[Event]:
+        for step in self.enrich:
+            event = step(event)
+            if inspect.isawaitable(event):
+                event = await event
+            if event is None:
+                return None
+        return event
+
+    async def _apply_filters(self, event: Event) -> Optional[Event]:
+        for keep in self.filters:
+            result = keep(event)
+            if inspect.isawaitable(result):
+                result = await result
+            if not result:
+                return None
+        return event
+
+    async def _batch(self, inbox: asyncio.Queue, out: asyncio.Queue) -> None:
+        metrics = self.stages["batch"]
+        batch: List[Record] = []
+        deadline = time.monotonic() + self.flush_interval
+
+        while True:
+            if inbox.empty():
+                try:
+                    records = await asyncio.wait_for(
+                        inbox.get(),
+                        timeout=max(deadline - time.monotonic(), 0),
+                    )
+                except asyncio.TimeoutError:
+                    records = None
+            else:
+                records = inbox.get_nowait()
+
+            if records is _STOP:
+                break
+            if records:
+                batch.extend(records)
+            while len(batch) >= self.batch_size:
+                metrics.record(self.batch_size, self.batch_size, 0)
+                await out.put(batch[:self.batch_size])
+                batch = batch[self.batch_size:]
+            if time.monotonic() >= deadline:
+                if batch:
+                    metrics.record(len(batch), len(batch), 0)
+                    await out.put(batch)
+                    batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+        if batch:
+            metrics.record(len(batch), len(batch), 0)
+            await out.put(batch)
+        await out.put(_STOP)
+
+    async def _write(self, inbox: asyncio.Queue) -> None:
+        metrics = self.stages["sink"]
+        held = False
+        while (batch := await inbox.get()) is not _STOP:
+            if held:
+                # Read after a batch left unwritten, so never acknowledged either
+                continue
+            events = [record.event for record in batch]
+            started = time.perf_counter()
+            attempt = 0
+            while True:
+                try:
+                    await self.sink.write(events)
+                    metrics.record(len(events), len(events), time.perf_counter() - started)
+                    break
+                except Exception as e:
+                    attempt += 1
+                    if attempt > self.sink_retries:
+                        if attempt == self.sink_retries + 1:
+                            metrics.errors += 1
+                            logger.error(
+                                f"Pipeline {self.name} could not write {len(events)} events "
+                                f"after {attempt} attempts, holding them until the sink "
+                                f"recovers: {e}"
+                            )
+                        if self._stopping.is_set():
+                            # Left unacknowledged, so the source redelivers them
+                            metrics.record(len(events), 0, time.perf_counter() - started)
+                            held = True
+                            break
+                    backoff = self.retry_backoff * (2 ** min(attempt, self.sink_retries))
+                    await asyncio.sleep(random.uniform(0, backoff))
+            if not held:
+                await self._done(batch)
+
+    # ========== Acknowledgement ==========
+
+    async def _done(self, records: List[Record]) -> None:
+        for record in records:
+            record.message.pending -= 1
+        await self._ack_ready()
+
+    async def _ack_ready(self) -> None:
+        """Acknowledge the leading run of fully processed messages, in arrival order."""
+        ready = []
+        while self._inflight and self._inflight[0].pending == 0:
+            ready.append(self._inflight.popleft())
+        if ready:
+            try:
+                await self.source.ack(ready)
+            except Exception as e:
+                logger.error(f"Pipeline {self.name} failed to acknowledge messages: {e}")
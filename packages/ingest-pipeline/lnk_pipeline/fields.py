@@ -0,0 +1,73 @@
+"""Field mapping shared by click ingestion pipelines."""
+
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict
+
+# Columns of the ClickHouse ``clicks`` table written by the click consumers
+CLICK_COLUMNS = [
+    "id", "link_id", "team_id", "visitor_id", "short_code", "timestamp", "ip",
+    "user_agent", "referer", "country", "region", "city", "device", "browser", "os",
+]
+
+_CAMEL_BOUNDARY = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+
+
+@lru_cache(maxsize=1024)
+def snake_case(key: str) -> str:
+    """``linkId`` -> ``link_id``; snake_case keys are returned unchanged."""
+    return _CAMEL_BOUNDARY.sub("_", key).lower()
+
+
+def parse_timestamp(value: Any) -> datetime:
+    """Parse an ISO-8601 timestamp (``Z`` suffix allowed); falls back to now."""
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            pass
+    if isinstance(value, (int, float)):
+        # Epoch seconds or milliseconds
+        return datetime.utcfromtimestamp(value / 1000 if value > 1e11 else value)
+    return datetime.utcnow()
+
+
+def normalize_click(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Map a click event to snake_case fields with a parsed ``timestamp``.
+
+    Producers send either ``linkId``/``shortCode`` or ``link_id``/``short_code``;
+    downstream stages only see the snake_case form.
+    """
+    click = {snake_case(key): value for key, value in event.items()}
+    click["timestamp"] = parse_timestamp(click.get("timestamp"))
+    return click
+
+
+def to_click_row(click: Dict[str, Any], unknown_country: str = "") -> tuple:
+    """
+    Build a ``clicks`` row, in CLICK_COLUMNS order, from a normalized click.
+
+    Producers send no visitor ID, so the visitor is identified by IP unless
+    one is given. Missing text fields are written as empty strings.
+    """
+    return (
+        click.get("id") or "",
+        click.get("link_id") or "",
+        click.get("team_id") or "",
+        click.get("visitor_id") or click.get("ip") or "",
+        click.get("short_code") or "",
+        click["timestamp"],
+        click.get("ip") or "",
+        click.get("user_agent") or "",
+        click.get("referer") or "",
+        click.get("country") or unknown_country,
+        click.get("region") or "",
+        click.get("city") or "",
+        click.get("device") or "",
+        click.get("browser") or "",
+        click.get("os") or "",
+    )
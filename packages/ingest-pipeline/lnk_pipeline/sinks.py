@@ -0,0 +1,67 @@
+"""Pipeline sinks: ClickHouse and an in-memory sink."""
+
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+class Sink:
+    """Base class for pipeline sinks. ``write`` raises to have the batch retried."""
+
+    async def write(self, events: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class MemorySink(Sink):
+    """Collect written events in memory, or only count them with ``keep=False``."""
+
+    def __init__(self, keep: bool = True):
+        self.keep = keep
+        self.events: List[Dict[str, Any]] = []
+        self.count = 0
+        self.batches = 0
+
+    async def write(self, events: List[Dict[str, Any]]) -> None:
+        self.count += len(events)
+        self.batches += 1
+        if self.keep:
+            self.events.extend(events)
+
+
+class ClickHouseSink(Sink):
+    """
+    Insert batches into a ClickHouse table.
+
+    ``columns`` are read from each event (missing ones as None) unless a
+    ``to_row`` function builds the row tuple. The insert runs in a worker
+    thread so the event loop keeps feeding the other stages.
+    """
+
+    def __init__(
+        self,
+        client,
+        table: str,
+        columns: Sequence[str],
+        to_row: Optional[Callable[[Dict[str, Any]], tuple]] = None,
+    ):
+        self.client = client
+        self.table = table
+        self.columns = list(columns)
+        self.to_row = to_row or (lambda event: tuple(event.get(c) for c in self.columns))
+        self._query = f"INSERT INTO {table} ({', '.join(self.columns)}) VALUES"
+
+    async def write(self, events: List[Dict[str, Any]]) -> None:
+        rows = [self.to_row(event) for event in events]
+        await asyncio.to_thread(self.client.execute, self._query, rows)
+        logger.debug(f"Inserted {len(rows)} rows into {self.table}")
+
+    async def close(self) -> None:
+        try:
+            self.client.disconnect()
+        except Exception as e:
+            logger.warning(f"Error disconnecting ClickHouse client: {e}")
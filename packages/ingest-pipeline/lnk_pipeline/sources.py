@@ -0,0 +1,266 @@
+"""Pipeline sources: Kafka, RabbitMQ, Redis Streams and an in-memory source."""
+
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Iterable, List, Optional, Tuple
+
+from .core import Message
+
+logger = logging.getLogger(__name__)
+
+
+class Source:
+    """
+    Base class for pipeline sources.
+
+    ``messages`` yields until the source is exhausted or ``close`` is called;
+    ``ack`` receives fully processed messages in the order they were yielded.
+    """
+
+    name = "source"
+
+    def __init__(self):
+        self._closing = asyncio.Event()
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    def close(self) -> None:
+        """Stop yielding messages; already yielded ones can still be acknowledged."""
+        self._closing.set()
+
+    def messages(self) -> AsyncIterator[Message]:
+        raise NotImplementedError
+
+    async def ack(self, messages: List[Message]) -> None:
+        pass
+
+
+class MemorySource(Source):
+    """Yield a fixed list of payloads, e.g. for benchmarks and tests."""
+
+    name = "memory"
+
+    def __init__(self, items: Iterable[Any], repeat: int = 1):
+        super().__init__()
+        self.items = list(items)
+        self.repeat = repeat
+        self.acked = 0
+
+    async def messages(self) -> AsyncIterator[Message]:
+        for _ in range(self.repeat):
+            for i, item in enumerate(self.items):
+                if self._closing.is_set():
+                    return
+                yield Message(item)
+                # Let the other stages run, as a network source would
+                if i % 256 == 0:
+                    await asyncio.sleep(0)
+
+    async def ack(self, messages: List[Message]) -> None:
+        self.acked += len(messages)
+
+
+class KafkaSource(Source):
+    """Consume a Kafka topic, committing offsets only after messages are processed."""
+
+    name = "kafka"
+
+    def __init__(
+        self,
+        topic: str,
+        bootstrap_servers: str,
+        group_id: str,
+        auto_offset_reset: str = "latest",
+        max_records: int = 500,
+    ):
+        super().__init__()
+        self.topic = topic
+        self.bootstrap_servers = bootstrap_servers
+        self.group_id = group_id
+        self.auto_offset_reset = auto_offset_reset
+        self.max_records = max_records
+        self.consumer = None
+
+    async def start(self) -> None:
+        from aiokafka import AIOKafkaConsumer
+
+        self.consumer = AIOKafkaConsumer(
+            self.topic,
+            bootstrap_servers=self.bootstrap_servers,
+            group_id=self.group_id,
+            enable_auto_commit=False,
+            auto_offset_reset=self.auto_offset_reset,
+        )
+        await self.consumer.start()
+        logger.info(f"Kafka source consuming {self.topic}")
+
+    async def stop(self) -> None:
+        if self.consumer:
+            await self.consumer.stop()
+            self.consumer = None
+
+    async def messages(self) -> AsyncIterator[Message]:
+        while not self._closing.is_set():
+            batches = await self.consumer.getmany(timeout_ms=500, max_records=self.max_records)
+            for partition, records in batches.items():
+                for record in records:
+                    yield Message(record.value, (partition, record.offset))
+
+    async def ack(self, messages: List[Message]) -> None:
+        # Messages arrive in order, so the last offset per partition is the highest
+        offsets = {}
+        for message in messages:
+            partition, offset = message.token
+            offsets[partition] = offset + 1
+        if self.consumer and offsets:
+            await self.consumer.commit(offsets)
+
+
+class RabbitMQSource(Source):
+    """Consume a durable RabbitMQ queue bound to topic exchanges; acks after processing."""
+
+    name = "rabbitmq"
+
+    def __init__(
+        self,
+        url: str,
+        queue: str,
+        bindings: Iterable[Tuple[str, str]] = (),
+        prefetch_count: int = 1000,
+    ):
+        super().__init__()
+        self.url = url
+        self.queue_name = queue
+        self.bindings = list(bindings)  # (exchange, routing key)
+        self.prefetch_count = prefetch_count
+        self.connection = None
+        self.channel = None
+        self._buffer: Optional[asyncio.Queue] = None
+        self._consumer_tag = None
+        self._queue = None
+
+    async def start(self) -> None:
+        import aio_pika
+
+        self.connection = await aio_pika.connect_robust(self.url, timeout=10)
+        self.channel = await self.connection.channel()
+        await self.channel.set_qos(prefetch_count=self.prefetch_count)
+
+        self._queue = await self.channel.declare_queue(self.queue_name, durable=True)
+        for exchange_name, routing_key in self.bindings:
+            exchange = await self.channel.declare_exchange(
+                exchange_name,
+                aio_pika.ExchangeType.TOPIC,
+                durable=True,
+            )
+            await self._queue.bind(exchange, routing_key)
+
+        # Unacked deliveries are bounded by the prefetch count
+        self._buffer = asyncio.Queue()
+        self._consumer_tag = await self._queue.consume(self._buffer.put)
+        logger.info(f"RabbitMQ source consuming {self.queue_name}")
+
+    def close(self) -> None:
+        super().close()
+        if self._buffer is not None:
+            self._buffer.put_nowait(None)
+
+    async def stop(self) -> None:
+        if self._queue is not None and self._consumer_tag:
+            try:
+                await self._queue.cancel(self._consumer_tag)
+            except Exception as e:
+                logger.warning(f"Failed to cancel RabbitMQ consumer: {e}")
+        if self.channel:
+            await self.channel.close()
+        if self.connection:
+            await self.connection.close()
+
+    async def messages(self) -> AsyncIterator[Message]:
+        while not self._closing.is_set():
+            delivery = await self._buffer.get()
+            if delivery is None:
+                return
+            yield Message(delivery.body, delivery)
+
+    async def ack(self, messages: List[Message]) -> None:
+        for message in messages:
+            await message.token.ack()
+
+
+class RedisStreamSource(Source):
+    """
+    Consume a Redis Stream through a consumer group.
+
+    Entries left pending by a previous run of the same consumer are read
+    first, then new ones; each is XACKed once processed. The payload is the
+    ``data`` field if present, otherwise the whole field map.
+    """
+
+    name = "redis_stream"
+
+    def __init__(
+        self,
+        url: str,
+        stream: str,
+        group: str,
+        consumer: str,
+        count: int = 500,
+        block_ms: int = 1000,
+    ):
+        super().__init__()
+        self.url = url
+        self.stream = stream
+        self.group = group
+        self.consumer = consumer
+        self.count = count
+        self.block_ms = block_ms
+        self.redis = None
+
+    async def start(self) -> None:
+        import redis.asyncio as redis
+        from redis.exceptions import ResponseError
+
+        self.redis = redis.from_url(self.url)
+        try:
+            await self.redis.xgroup_create(self.stream, self.group, id="$", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        logger.info(f"Redis Stream source consuming {self.stream} as {self.group}/{self.consumer}")
+
+    async def stop(self) -> None:
+        if self.redis:
+            await self.redis.close()
+            self.redis = None
+
+    async def messages(self) -> AsyncIterator[Message]:
+        last_id = "0"  # Our own pending entries first
+        while not self._closing.is_set():
+            response = await self.redis.xreadgroup(
+                self.group,
+                self.consumer,
+                {self.stream: last_id},
+                count=self.count,
+                block=None if last_id == "0" else self.block_ms,
+            )
+            entries = response[0][1] if response else []
+            if last_id == "0" and not entries:
+                last_id = ">"
+                continue
+            for entry_id, fields in entries:
+                if last_id != ">":
+                    last_id = entry_id
+                if b"data" in fields:
+                    body = fields[b"data"]
+                else:
+                    body = {key.decode(): value.decode() for key, value in fields.items()}
+                yield Message(body, entry_id)
+
+    async def ack(self, messages: List[Message]) -> None:
+        if self.redis and messages:
+            await self.redis.xack(self.stream, self.group, *(m.token for m in messages))
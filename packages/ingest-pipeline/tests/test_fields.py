@@ -0,0 +1,33 @@
+"""Click field mapping."""
+
+from datetime import datetime
+
+from lnk_pipeline import CLICK_COLUMNS, normalize_click, to_click_row
+
+
+def test_click_row_carries_team_and_visitor():
+    click = normalize_click({
+        "linkId": "link-1",
+        "teamId": "team-1",
+        "ip": "203.0.113.7",
+        "timestamp": "2024-05-01T12:00:00Z",
+        "country": None,
+    })
+
+    row = dict(zip(CLICK_COLUMNS, to_click_row(click)))
+
+    assert row["link_id"] == "link-1"
+    assert row["team_id"] == "team-1"
+    assert row["visitor_id"] == "203.0.113.7"
+    assert row["timestamp"].replace(tzinfo=None) == datetime(2024, 5, 1, 12)
+    assert row["country"] == ""
+    assert row["referer"] == ""
+
+
+def test_click_row_prefers_a_sent_visitor_id_and_country_default():
+    click = normalize_click({"visitorId": "v-1", "ip": "203.0.113.7", "timestamp": 0})
+
+    row = dict(zip(CLICK_COLUMNS, to_click_row(click, unknown_country="Unknown")))
+
+    assert row["visitor_id"] == "v-1"
+    assert row["country"] == "Unknown"
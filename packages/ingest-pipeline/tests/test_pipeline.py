@@ -0,0 +1,127 @@
+"""Pipeline acknowledgement order with the in-memory source and sink."""
+
+import asyncio
+from typing import List
+
+from lnk_pipeline import MemorySink, MemorySource, Message, Pipeline
+
+
+class RecordingSource(MemorySource):
+    """Remembers the ID of every acknowledged message, in acknowledgement order."""
+
+    def __init__(self, items):
+        super().__init__(items)
+        self.acked_ids: List[int] = []
+
+    async def ack(self, messages: List[Message]) -> None:
+        await super().ack(messages)
+        self.acked_ids.extend(message.body["id"] for message in messages)
+
+
+class GatedSink(MemorySink):
+    """Holds every write until ``gate`` is set; fails the first ``failures`` writes."""
+
+    def __init__(self, failures: float = 0):
+        super().__init__()
+        self.gate = asyncio.Event()
+        self.failures = failures
+
+    async def write(self, events):
+        await self.gate.wait()
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("sink unavailable")
+        await super().write(events)
+
+
+def make_pipeline(source, sink, **kwargs) -> Pipeline:
+    return Pipeline(
+        "test",
+        source,
+        sink,
+        filters=[lambda event: event.get("keep", True)],
+        batch_size=10,
+        flush_interval=0.01,
+        retry_backoff=0,
+        **kwargs,
+    )
+
+
+def test_messages_are_acked_in_arrival_order():
+    async def scenario():
+        # Message 1 is dropped by the filter right away, message 0 waits on the sink
+        source = RecordingSource([
+            {"id": 0},
+            {"id": 1, "keep": False},
+            {"id": 2},
+        ])
+        sink = GatedSink()
+        task = asyncio.create_task(make_pipeline(source, sink).run())
+
+        await asyncio.sleep(0.1)
+        acked_while_blocked = list(source.acked_ids)
+        sink.gate.set()
+        await task
+        return source, sink, acked_while_blocked
+
+    source, sink, acked_while_blocked = asyncio.run(scenario())
+
+    assert acked_while_blocked == []
+    assert source.acked_ids == [0, 1, 2]
+    assert [event["id"] for event in sink.events] == [0, 2]
+
+
+def test_undecodable_messages_are_acked_in_order():
+    def decode(body):
+        if body.get("bad"):
+            raise ValueError("bad payload")
+        return [body]
+
+    async def scenario():
+        source = RecordingSource([{"id": 0}, {"id": 1, "bad": True}, {"id": 2}])
+        sink = GatedSink()
+        sink.gate.set()
+        await make_pipeline(source, sink, decode=decode).run()
+        return source, sink
+
+    source, sink = asyncio.run(scenario())
+
+    assert source.acked_ids == [0, 1, 2]
+    assert [event["id"] for event in sink.events] == [0, 2]
+
+
+def test_batch_is_held_until_the_sink_recovers():
+    async def scenario():
+        source = RecordingSource([{"id": i} for i in range(3)])
+        sink = GatedSink(failures=3)
+        sink.gate.set()
+        pipeline = make_pipeline(source, sink, sink_retries=1)
+        await pipeline.run()
+        return source, sink, pipeline
+
+    source, sink, pipeline = asyncio.run(scenario())
+
+    assert source.acked_ids == [0, 1, 2]
+    assert [event["id"] for event in sink.events] == [0, 1, 2]
+    assert pipeline.stages["sink"].errors == 1
+
+
+def test_batch_is_not_acked_after_retries_run_out():
+    async def scenario():
+        source = RecordingSource([{"id": 0}, {"id": 1}, {"id": 2, "keep": False}])
+        sink = GatedSink(failures=float("inf"))
+        sink.gate.set()
+        pipeline = make_pipeline(source, sink, sink_retries=1)
+        task = asyncio.create_task(pipeline.run())
+
+        while not pipeline.stages["sink"].errors:
+            await asyncio.sleep(0.01)
+        await pipeline.stop(timeout=5)
+        await task
+        return source, sink, pipeline
+
+    source, sink, pipeline = asyncio.run(scenario())
+
+    assert source.acked_ids == []
+    assert sink.events == []
+    assert pipeline.stages["sink"].errors == 1
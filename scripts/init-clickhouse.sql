@@ -43,6 +43,8 @@ GROUP BY user_id, link_id, date;
 CREATE TABLE IF NOT EXISTS lnk_analytics.clicks (
     id String,
     link_id String,
+    team_id String DEFAULT '',
+    visitor_id String DEFAULT ip,
     short_code String,
     timestamp DateTime64(3),
     ip String,
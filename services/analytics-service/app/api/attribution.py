@@ -4,7 +4,7 @@
 import logging
 from datetime import datetime, timedelta
 from typing import Optional
-from fastapi import APIRouter, Query, HTTPException, Request
+from fastapi import APIRouter, Header, HTTPException, Query, Request
 
 from app.services.attribution_service import attribution_service, AttributionModel
 
@@ -85,7 +85,8 @@ async def get_channel_attribution(
         default="last_touch",
         description="归因模型: first_touch, last_touch, linear, time_decay, position"
     ),
-    team_id: Optional[str] = Query(default=None, description="团队 ID"),
+    x_team_id: str = Header(..., alias="X-Team-ID"),
+    link_id: Optional[str] = Query(default=None, description="链接 ID"),
 ):
     """
     渠道归因分析
@@ -108,7 +109,8 @@ async def get_channel_attribution(
 
     try:
         result = attribution_service.get_channel_attribution(
-            team_id=team_id,
+            team_id=x_team_id,
+            link_id=link_id,
             start_date=start_date,
             end_date=end_date,
             model=attribution_model
@@ -126,7 +128,8 @@ async def get_campaign_attribution(
         default="last_touch",
         description="归因模型"
     ),
-    team_id: Optional[str] = Query(default=None, description="团队 ID"),
+    x_team_id: str = Header(..., alias="X-Team-ID"),
+    link_id: Optional[str] = Query(default=None, description="链接 ID"),
 ):
     """
     营销活动归因分析
@@ -146,7 +149,8 @@ async def get_campaign_attribution(
 
     try:
         result = attribution_service.get_campaign_attribution(
-            team_id=team_id,
+            team_id=x_team_id,
+            link_id=link_id,
             start_date=start_date,
             end_date=end_date,
             model=attribution_model
@@ -160,7 +164,8 @@ async def get_campaign_attribution(
 @router.get("/touchpoints")
 async def get_touchpoint_analysis(
     request: Request,
-    team_id: Optional[str] = Query(default=None, description="团队 ID"),
+    x_team_id: str = Header(..., alias="X-Team-ID"),
+    link_id: Optional[str] = Query(default=None, description="链接 ID"),
 ):
     """
     触点路径分析
@@ -175,7 +180,8 @@ async def get_touchpoint_analysis(
 
     try:
         result = attribution_service.get_touchpoint_analysis(
-            team_id=team_id,
+            team_id=x_team_id,
+            link_id=link_id,
             start_date=start_date,
             end_date=end_date
         )
@@ -188,7 +194,8 @@ async def get_touchpoint_analysis(
 @router.get("/assisted")
 async def get_assisted_conversions(
     request: Request,
-    team_id: Optional[str] = Query(default=None, description="团队 ID"),
+    x_team_id: str = Header(..., alias="X-Team-ID"),
+    link_id: Optional[str] = Query(default=None, description="链接 ID"),
 ):
     """
     辅助转化分析
@@ -210,7 +217,8 @@ async def get_assisted_conversions(
 
     try:
         result = attribution_service.get_assisted_conversions(
-            team_id=team_id,
+            team_id=x_team_id,
+            link_id=link_id,
             start_date=start_date,
             end_date=end_date
         )
@@ -227,7 +235,8 @@ async def get_multi_touch_attribution(
         default="linear",
         description="归因模型"
     ),
-    team_id: Optional[str] = Query(default=None, description="团队 ID"),
+    x_team_id: str = Header(..., alias="X-Team-ID"),
+    link_id: Optional[str] = Query(default=None, description="链接 ID"),
 ):
     """
     多触点归因分析
@@ -254,7 +263,8 @@ async def get_multi_touch_attribution(
 
     try:
         result = attribution_service.get_multi_touch_attribution(
-            team_id=team_id,
+            team_id=x_team_id,
+            link_id=link_id,
             start_date=start_date,
             end_date=end_date,
             model=attribution_model
@@ -268,7 +278,8 @@ async def get_multi_touch_attribution(
 @router.get("/compare")
 async def compare_attribution_models(
     request: Request,
-    team_id: Optional[str] = Query(default=None, description="团队 ID"),
+    x_team_id: str = Header(..., alias="X-Team-ID"),
+    link_id: Optional[str] = Query(default=None, description="链接 ID"),
 ):
     """
     对比不同归因模型的结果
@@ -283,7 +294,8 @@ async def compare_attribution_models(
 
     try:
         result = attribution_service.compare_attribution_models(
-            team_id=team_id,
+            team_id=x_team_id,
+            link_id=link_id,
             start_date=start_date,
             end_date=end_date
         )
@@ -296,7 +308,8 @@ async def compare_attribution_models(
 @router.get("/summary")
 async def get_attribution_summary(
     request: Request,
-    team_id: Optional[str] = Query(default=None, description="团队 ID"),
+    x_team_id: str = Header(..., alias="X-Team-ID"),
+    link_id: Optional[str] = Query(default=None, description="链接 ID"),
 ):
     """
     归因分析概览
@@ -312,20 +325,23 @@ async def get_attribution_summary(
     try:
         # 获取各项数据
         channel = attribution_service.get_channel_attribution(
-            team_id=team_id,
+            team_id=x_team_id,
+            link_id=link_id,
             start_date=start_date,
             end_date=end_date,
             model=AttributionModel.LINEAR
         )
 
         touchpoints = attribution_service.get_touchpoint_analysis(
-            team_id=team_id,
+            team_id=x_team_id,
+            link_id=link_id,
             start_date=start_date,
             end_date=end_date
         )
 
         assisted = attribution_service.get_assisted_conversions(
-            team_id=team_id,
+            team_id=x_team_id,
+            link_id=link_id,
             start_date=start_date,
             end_date=end_date
         )
@@ -4,7 +4,7 @@
 import logging
 from datetime import datetime, timedelta
 from typing import Optional
-from fastapi import APIRouter, Query, HTTPException, Request
+from fastapi import APIRouter, Header, HTTPException, Query, Request
 
 from app.services.retention_service import retention_service
 
@@ -47,7 +47,8 @@ async def get_cohort_analysis(
     request: Request,
     cohort_size: str = Query(default="week", description="群组粒度: day, week, month"),
     retention_periods: int = Query(default=8, le=24, description="分析周期数"),
-    team_id: Optional[str] = Query(default=None, description="团队 ID"),
+    x_team_id: str = Header(..., alias="X-Team-ID"),
+    link_id: Optional[str] = Query(default=None, description="链接 ID"),
 ):
     """
     群组留存分析
@@ -83,7 +84,8 @@ async def get_cohort_analysis(
 
     try:
         result = retention_service.get_cohort_analysis(
-            team_id=team_id,
+            team_id=x_team_id,
+            link_id=link_id,
             start_date=start_date,
             end_date=end_date,
             cohort_size=cohort_size,
@@ -99,7 +101,8 @@ async def get_cohort_analysis(
 async def get_retention_rate(
     request: Request,
     period_days: int = Query(default=7, le=30, description="每个周期的天数"),
-    team_id: Optional[str] = Query(default=None, description="团队 ID"),
+    x_team_id: str = Header(..., alias="X-Team-ID"),
+    link_id: Optional[str] = Query(default=None, description="链接 ID"),
 ):
     """
     留存率分析
@@ -114,7 +117,8 @@ async def get_retention_rate(
 
     try:
         result = retention_service.get_user_retention_rate(
-            team_id=team_id,
+            team_id=x_team_id,
+            link_id=link_id,
             start_date=start_date,
             end_date=end_date,
             period_days=period_days
@@ -128,7 +132,8 @@ async def get_retention_rate(
 @router.get("/visitors")
 async def get_new_vs_returning_visitors(
     request: Request,
-    team_id: Optional[str] = Query(default=None, description="团队 ID"),
+    x_team_id: str = Header(..., alias="X-Team-ID"),
+    link_id: Optional[str] = Query(default=None, description="链接 ID"),
 ):
     """
     新访客 vs 回访访客分析
@@ -143,7 +148,8 @@ async def get_new_vs_returning_visitors(
 
     try:
         result = retention_service.get_returning_vs_new_visitors(
-            team_id=team_id,
+            team_id=x_team_id,
+            link_id=link_id,
             start_date=start_date,
             end_date=end_date
         )
@@ -156,7 +162,8 @@ async def get_new_vs_returning_visitors(
 @router.get("/frequency")
 async def get_visitor_frequency(
     request: Request,
-    team_id: Optional[str] = Query(default=None, description="团队 ID"),
+    x_team_id: str = Header(..., alias="X-Team-ID"),
+    link_id: Optional[str] = Query(default=None, description="链接 ID"),
 ):
     """
     访问频率分析
@@ -171,7 +178,8 @@ async def get_visitor_frequency(
 
     try:
         result = retention_service.get_visitor_frequency(
-            team_id=team_id,
+            team_id=x_team_id,
+            link_id=link_id,
             start_date=start_date,
             end_date=end_date
         )
@@ -184,7 +192,8 @@ async def get_visitor_frequency(
 @router.get("/recency")
 async def get_recency_analysis(
     request: Request,
-    team_id: Optional[str] = Query(default=None, description="团队 ID"),
+    x_team_id: str = Header(..., alias="X-Team-ID"),
+    link_id: Optional[str] = Query(default=None, description="链接 ID"),
 ):
     """
     最近活跃度分析 (Recency)
@@ -196,7 +205,8 @@ async def get_recency_analysis(
 
     try:
         result = retention_service.get_recency_analysis(
-            team_id=team_id,
+            team_id=x_team_id,
+            link_id=link_id,
             end_date=end_date
         )
         return result
@@ -209,7 +219,8 @@ async def get_recency_analysis(
 async def get_churn_analysis(
     request: Request,
     churn_days: int = Query(default=30, le=90, description="流失判定天数"),
-    team_id: Optional[str] = Query(default=None, description="团队 ID"),
+    x_team_id: str = Header(..., alias="X-Team-ID"),
+    link_id: Optional[str] = Query(default=None, description="链接 ID"),
 ):
     """
     用户流失分析
@@ -224,7 +235,8 @@ async def get_churn_analysis(
 
     try:
         result = retention_service.get_churn_analysis(
-            team_id=team_id,
+            team_id=x_team_id,
+            link_id=link_id,
             start_date=start_date,
             end_date=end_date,
             churn_days=churn_days
@@ -238,7 +250,8 @@ async def get_churn_analysis(
 @router.get("/lifecycle")
 async def get_lifecycle_stages(
     request: Request,
-    team_id: Optional[str] = Query(default=None, description="团队 ID"),
+    x_team_id: str = Header(..., alias="X-Team-ID"),
+    link_id: Optional[str] = Query(default=None, description="链接 ID"),
 ):
     """
     用户生命周期阶段分析
@@ -258,7 +271,8 @@ async def get_lifecycle_stages(
 
     try:
         result = retention_service.get_lifecycle_stages(
-            team_id=team_id,
+            team_id=x_team_id,
+            link_id=link_id,
             end_date=end_date
         )
         return result
@@ -270,7 +284,8 @@ async def get_lifecycle_stages(
 @router.get("/summary")
 async def get_retention_summary(
     request: Request,
-    team_id: Optional[str] = Query(default=None, description="团队 ID"),
+    x_team_id: str = Header(..., alias="X-Team-ID"),
+    link_id: Optional[str] = Query(default=None, description="链接 ID"),
 ):
     """
     留存分析概览
@@ -286,24 +301,28 @@ async def get_retention_summary(
     try:
         # 获取各项数据
         visitors = retention_service.get_returning_vs_new_visitors(
-            team_id=team_id,
+            team_id=x_team_id,
+            link_id=link_id,
             start_date=start_date,
             end_date=end_date
         )
 
         frequency = retention_service.get_visitor_frequency(
-            team_id=team_id,
+            team_id=x_team_id,
+            link_id=link_id,
             start_date=start_date,
             end_date=end_date
         )
 
         lifecycle = retention_service.get_lifecycle_stages(
-            team_id=team_id,
+            team_id=x_team_id,
+            link_id=link_id,
             end_date=end_date
         )
 
         retention_rate = retention_service.get_user_retention_rate(
-            team_id=team_id,
+            team_id=x_team_id,
+            link_id=link_id,
             start_date=start_date,
             end_date=end_date,
             period_days=7
@@ -0,0 +1,163 @@
+"""
+Cohort Export Encoders
+Encode row iterators as CSV, NDJSON, JSON or Parquet chunks for streaming
+"""
+
+import csv
+import io
+import json
+from datetime import date, datetime
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# Large exports are written here by background jobs (cleaned up after 24h)
+EXPORTS_DIR = "/tmp/lnk_exports"
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+EXPORT_FORMATS = tuple(MEDIA_TYPES)
+
+
+def encode_rows(
+    columns: List[str],
+    rows: Iterable[tuple],
+    format: str,
+    batch_rows: int = 10000,
+    types: Optional[Dict[str, str]] = None,
+) -> Iterator[bytes]:
+    """
+    Encode rows as a stream of byte chunks, ``batch_rows`` rows at a time,
+    so memory stays bounded however many rows there are.
+
+    ``types`` maps column names to Parquet column types ("string", "int64",
+    "float64", "date" or "timestamp"); columns without one are strings.
+    """
+    if format not in MEDIA_TYPES:
+        raise ValueError(f"Unsupported format: {format}")
+
+    batches = _batches(rows, batch_rows)
+    if format == "csv":
+        return _encode_csv(columns, batches)
+    if format == "ndjson":
+        return _encode_ndjson(columns, batches)
+    if format == "json":
+        return _encode_json(columns, batches)
+
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ValueError("Parquet export requires pyarrow")
+    return _encode_parquet(columns, batches, types or {})
+
+
+def _batches(rows: Iterable[tuple], size: int) -> Iterator[List[tuple]]:
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def _json_default(value: Any) -> str:
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def _encode_csv(columns: List[str], batches: Iterator[List[tuple]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _encode_ndjson(columns: List[str], batches: Iterator[List[tuple]]) -> Iterator[bytes]:
+    for batch in batches:
+        yield "".join(
+            json.dumps(dict(zip(columns, row)), default=_json_default, ensure_ascii=False) + "\n"
+            for row in batch
+        ).encode("utf-8")
+
+
+def _encode_json(columns: List[str], batches: Iterator[List[tuple]]) -> Iterator[bytes]:
+    separator = "["
+    for batch in batches:
+        chunk = []
+        for row in batch:
+            chunk.append(separator)
+            chunk.append(
+                json.dumps(dict(zip(columns, row)), default=_json_default, ensure_ascii=False)
+            )
+            separator = ","
+        yield "".join(chunk).encode("utf-8")
+    yield b"[]" if separator == "[" else b"]"
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands out what was written since the last drain."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        # Parquet records offsets from this, so it must keep counting across drains
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _encode_parquet(
+    columns: List[str],
+    batches: Iterator[List[tuple]],
+    types: Dict[str, str],
+) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrow_types = {
+        "string": pa.string(),
+        "int64": pa.int64(),
+        "float64": pa.float64(),
+        "date": pa.date32(),
+        "timestamp": pa.timestamp("s"),
+    }
+    # Declared up front: inferring from the first batch would type a column
+    # that starts out all-null as null, and later batches would not fit
+    schema = pa.schema([
+        (column, arrow_types[types.get(column, "string")]) for column in columns
+    ])
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for batch in batches:
+        # One row group per batch
+        table = pa.Table.from_pydict(
+            {column: [row[i] for row in batch] for i, column in enumerate(columns)},
+            schema=schema,
+        )
+        writer.write_table(table)
+        yield sink.drain()
+
+    writer.close()
+    yield sink.drain()
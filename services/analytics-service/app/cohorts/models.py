@@ -151,7 +151,7 @@ class RetentionData(BaseModel):
     """Retention matrix data"""
     # Matrix where rows are cohorts, columns are periods
     # Value at [i][j] is retention rate for cohort i at period j
-    matrix: List[List[float]]
+    matrix: List[List[Optional[float]]]
 
     # Row labels (cohort periods)
     row_labels: List[str]
@@ -216,6 +216,9 @@ class CohortComparison(BaseModel):
     # Insights
     insights: List[str] = []
 
+    # Every compared segment value
+    segments: List["CohortSegment"] = []
+
 
 class CohortSegment(BaseModel):
     """Segment within a cohort for detailed analysis"""
@@ -256,6 +259,25 @@ class CohortExportRequest(BaseModel):
     date_range_end: Optional[datetime] = None
 
 
+class CohortExportJob(BaseModel):
+    """Background export of a dataset too large to stream in the request"""
+    id: str
+    cohort_id: str
+    team_id: str
+    dataset: str  # "matrix", "members"
+    format: str  # "csv", "ndjson", "json", "parquet"
+    start_date: datetime
+    end_date: datetime
+
+    status: str = "pending"  # "pending", "running", "completed", "failed"
+    size_bytes: int = 0
+    file_path: Optional[str] = None
+    error: Optional[str] = None
+
+    created_at: datetime
+    completed_at: Optional[datetime] = None
+
+
 class PresetCohort(BaseModel):
     """Preset cohort template"""
     id: str
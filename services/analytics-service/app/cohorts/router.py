@@ -2,25 +2,31 @@
 Cohort Analysis API Router
 """
 
+import os
 from datetime import datetime, timedelta
-from typing import Optional, List
-from fastapi import APIRouter, HTTPException, Query, Header
+from typing import List, Optional
+
+from fastapi import APIRouter, BackgroundTasks, Header, HTTPException, Query, Response
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
 
+from app.core.config import settings
+
+from .export import EXPORT_FORMATS, MEDIA_TYPES
 from .models import (
     Cohort,
-    CohortCreate,
-    CohortUpdate,
     CohortAnalysis,
-    CohortMetric,
     CohortComparison,
-    CohortSegment,
+    CohortCreate,
+    CohortExportJob,
     CohortInsight,
+    CohortMetric,
+    CohortSegment,
+    CohortUpdate,
     PresetCohort,
 )
 from .service import cohort_service
 
-
 router = APIRouter()
 
 
@@ -55,9 +61,33 @@ class InsightsResponse(BaseModel):
     insights: List[CohortInsight]
 
 
-class ExportResponse(BaseModel):
+class ExportJobResponse(BaseModel):
+    job_id: str
+    status: str
+    dataset: str
     format: str
-    data: dict
+    size_bytes: int = 0
+    error: Optional[str] = None
+    download_url: Optional[str] = None
+    created_at: datetime
+    completed_at: Optional[datetime] = None
+
+
+def _job_response(job: CohortExportJob) -> ExportJobResponse:
+    download_url = None
+    if job.status == "completed":
+        download_url = f"/api/v1/cohorts/exports/{job.id}/download"
+    return ExportJobResponse(
+        job_id=job.id,
+        status=job.status,
+        dataset=job.dataset,
+        format=job.format,
+        size_bytes=job.size_bytes,
+        error=job.error,
+        download_url=download_url,
+        created_at=job.created_at,
+        completed_at=job.completed_at,
+    )
 
 
 # ========== Cohort CRUD Endpoints ==========
@@ -214,21 +244,25 @@ async def compare_cohort_segments(
 ):
     """比较队列中不同分群的表现
 
-    例如：比较不同国家、设备、来源的用户留存差异
+    例如：比较不同国家、设备、来源的用户留存差异。
+    第一个分群值与第二个比较，只给一个时与整个队列比较
     """
     if not end_date:
         end_date = datetime.utcnow()
     if not start_date:
         start_date = end_date - timedelta(days=90)
 
-    comparison = cohort_service.compare_cohorts(
-        cohort_id,
-        x_team_id,
-        data.segment_field,
-        data.segment_values,
-        start_date,
-        end_date,
-    )
+    try:
+        comparison = cohort_service.compare_cohorts(
+            cohort_id,
+            x_team_id,
+            data.segment_field,
+            data.segment_values,
+            start_date,
+            end_date,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not comparison:
         raise HTTPException(status_code=404, detail="Cohort not found")
     return comparison
@@ -285,27 +319,95 @@ async def get_cohort_insights(
 @router.get("/{cohort_id}/export")
 async def export_cohort_data(
     cohort_id: str,
+    response: Response,
+    background_tasks: BackgroundTasks,
     x_team_id: str = Header(..., alias="X-Team-ID"),
-    format: str = Query("csv", description="导出格式: csv, json"),
+    format: str = Query("csv", description="导出格式: csv, ndjson, json, parquet"),
+    dataset: str = Query(
+        "matrix", description="导出内容: matrix (留存矩阵), members (队列成员明细)"
+    ),
     start_date: Optional[datetime] = Query(None),
     end_date: Optional[datetime] = Query(None),
 ):
     """导出队列数据
 
-    支持 CSV 和 JSON 格式
+    边计算边流式返回。成员明细较大时转为后台任务，
+    返回 202 和任务状态，完成后从下载链接获取文件
     """
     if not end_date:
         end_date = datetime.utcnow()
     if not start_date:
         start_date = end_date - timedelta(days=90)
 
-    data = cohort_service.export_cohort_data(
-        cohort_id, x_team_id, format, start_date, end_date
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
+    if dataset not in ("matrix", "members"):
+        raise HTTPException(status_code=400, detail=f"Unsupported dataset: {dataset}")
+
+    cohort = cohort_service.get_cohort(cohort_id, x_team_id)
+    if not cohort:
+        raise HTTPException(status_code=404, detail="Cohort not found")
+
+    try:
+        estimated_rows = cohort_service.estimate_export_rows(cohort, dataset, start_date, end_date)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Cohort members unavailable: {e}")
+
+    if estimated_rows > settings.COHORT_EXPORT_STREAM_MAX_ROWS:
+        job = cohort_service.create_export_job(
+            cohort_id, x_team_id, dataset, format, start_date, end_date
+        )
+        background_tasks.add_task(cohort_service.run_export_job, job.id)
+        response.status_code = 202
+        return _job_response(job)
+
+    try:
+        chunks = cohort_service.export_cohort_data(
+            cohort_id, x_team_id, format, start_date, end_date, dataset
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return StreamingResponse(
+        chunks,
+        media_type=MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f"attachment; filename=cohort_{cohort_id}_{dataset}.{format}"
+        },
     )
-    if "error" in data:
-        raise HTTPException(status_code=400, detail=data["error"])
 
-    return ExportResponse(format=format, data=data)
+
+@router.get("/exports/{job_id}", response_model=ExportJobResponse)
+async def get_export_job(
+    job_id: str,
+    x_team_id: str = Header(..., alias="X-Team-ID"),
+):
+    """获取后台导出任务状态"""
+    job = cohort_service.get_export_job(job_id, x_team_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return _job_response(job)
+
+
+@router.get("/exports/{job_id}/download")
+async def download_export(
+    job_id: str,
+    x_team_id: str = Header(..., alias="X-Team-ID"),
+):
+    """下载后台导出文件"""
+    job = cohort_service.get_export_job(job_id, x_team_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    if job.status != "completed":
+        raise HTTPException(status_code=400, detail="Export not ready for download")
+    if not os.path.exists(job.file_path):
+        raise HTTPException(status_code=404, detail="Export file expired")
+
+    return FileResponse(
+        job.file_path,
+        media_type=MEDIA_TYPES[job.format],
+        filename=f"cohort_{job.cohort_id}_{job.dataset}.{job.format}",
+    )
 
 
 # ========== Quick Analysis Endpoints ==========
@@ -3,30 +3,73 @@ Cohort Analysis Service
 Provides cohort CRUD and retention analysis with ClickHouse queries
 """
 
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
-from uuid import uuid4
+import logging
+import os
 import random
+import re
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from uuid import uuid4
 
 from app.core.clickhouse import get_clickhouse_client
+from app.core.config import settings
+
+from .export import EXPORTS_DIR, encode_rows
 from .models import (
     Cohort,
-    CohortType,
-    CohortGranularity,
-    CohortMetric,
+    CohortAnalysis,
+    CohortComparison,
     CohortCondition,
     CohortCreate,
-    CohortUpdate,
-    CohortAnalysis,
-    CohortRow,
+    CohortExportJob,
+    CohortGranularity,
+    CohortInsight,
+    CohortMetric,
     CohortPeriod,
-    RetentionData,
-    CohortComparison,
+    CohortRow,
     CohortSegment,
-    CohortInsight,
+    CohortType,
+    CohortUpdate,
     PresetCohort,
+    RetentionData,
 )
 
+logger = logging.getLogger(__name__)
+
+
+# Bucket start expression and dateDiff unit per granularity
+COHORT_BUCKETS = {
+    CohortGranularity.DAILY: ("toDate({})", "day"),
+    CohortGranularity.WEEKLY: ("toMonday({})", "week"),
+    CohortGranularity.MONTHLY: ("toStartOfMonth({})", "month"),
+}
+
+# Breakdown dimensions kept in visitor_daily_bitmaps
+SEGMENT_DIMS = ("country", "device", "source")
+
+# (value, users, events) per dimension when ClickHouse is unavailable
+MOCK_BREAKDOWNS = {
+    "country": [("CN", 3000, 15000), ("US", 1500, 7500), ("JP", 800, 4000)],
+    "device": [("mobile", 4000, 20000), ("desktop", 2000, 10000), ("tablet", 500, 2500)],
+    "source": [("Direct", 3000, 15000), ("WeChat", 2000, 10000), ("Google", 1200, 6000)],
+}
+
+
+def _bucket_start(day: date, granularity: CohortGranularity) -> date:
+    if granularity == CohortGranularity.WEEKLY:
+        return day - timedelta(days=day.weekday())
+    if granularity == CohortGranularity.MONTHLY:
+        return day.replace(day=1)
+    return day
+
+
+def _next_bucket(bucket: date, granularity: CohortGranularity) -> date:
+    if granularity == CohortGranularity.WEEKLY:
+        return bucket + timedelta(weeks=1)
+    if granularity == CohortGranularity.MONTHLY:
+        return (bucket.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return bucket + timedelta(days=1)
+
 
 class CohortService:
     """Service for cohort analysis operations."""
@@ -35,6 +78,7 @@ class CohortService:
         self.client = get_clickhouse_client()
         # In-memory storage (production should use PostgreSQL)
         self.cohorts: Dict[str, Cohort] = {}
+        self.export_jobs: Dict[str, CohortExportJob] = {}
 
     # ========== Cohort CRUD ==========
 
@@ -123,6 +167,29 @@ class CohortService:
             cohort, start_date, end_date, metric
         )
 
+        # Get breakdown data if requested
+        breakdowns = self._get_cohort_breakdowns(
+            team_id, start_date, end_date,
+            [breakdown_by] if breakdown_by else SEGMENT_DIMS,
+        )
+
+        return self._build_analysis(
+            cohort, cohort.name, cohort_rows, start_date, end_date, metric, breakdowns
+        )
+
+    def _build_analysis(
+        self,
+        cohort: Cohort,
+        name: str,
+        cohort_rows: List[CohortRow],
+        start_date: datetime,
+        end_date: datetime,
+        metric: CohortMetric = CohortMetric.RETENTION,
+        breakdowns: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+    ) -> CohortAnalysis:
+        """Summarize cohort rows into a full analysis."""
+        breakdowns = breakdowns or {}
+
         # Build retention matrix
         retention_matrix = self._build_retention_matrix(cohort_rows, cohort.granularity)
 
@@ -136,21 +203,9 @@ class CohortService:
         # Determine retention trend
         trend, trend_pct = self._calculate_retention_trend(cohort_rows)
 
-        # Get breakdown data if requested
-        by_country = None
-        by_device = None
-        by_source = None
-
-        if breakdown_by == "country" or breakdown_by is None:
-            by_country = self._get_cohort_by_country(team_id, start_date, end_date)
-        if breakdown_by == "device" or breakdown_by is None:
-            by_device = self._get_cohort_by_device(team_id, start_date, end_date)
-        if breakdown_by == "source" or breakdown_by is None:
-            by_source = self._get_cohort_by_source(team_id, start_date, end_date)
-
         return CohortAnalysis(
-            cohort_id=cohort_id,
-            cohort_name=cohort.name,
+            cohort_id=cohort.id,
+            cohort_name=name,
             start_date=start_date,
             end_date=end_date,
             granularity=cohort.granularity,
@@ -163,9 +218,9 @@ class CohortService:
             average_retention_period12=avg_p12,
             retention_trend=trend,
             trend_percentage=trend_pct,
-            by_country=by_country,
-            by_device=by_device,
-            by_source=by_source,
+            by_country=breakdowns.get("country"),
+            by_device=breakdowns.get("device"),
+            by_source=breakdowns.get("source"),
         )
 
     def _calculate_cohort_rows(
@@ -176,179 +231,195 @@ class CohortService:
         metric: CohortMetric,
     ) -> List[CohortRow]:
         """Calculate cohort rows based on granularity."""
-        rows = []
+        try:
+            cells = self._query_cohort_matrix(cohort, start_date, end_date)
+        except Exception as e:
+            logger.warning(
+                f"Cohort clicks unavailable for cohort {cohort.id}, serving mock retention: {e}"
+            )
+            cells = self._mock_cohort_matrix(cohort, start_date, end_date)
+        return self._rows_from_cells(cohort, cells, start_date, end_date)
 
-        # Determine period length
+    def _rows_from_cells(
+        self,
+        cohort: Cohort,
+        cells: Dict[tuple, tuple],
+        start_date: datetime,
+        end_date: datetime,
+    ) -> List[CohortRow]:
+        """One row per cohort bucket in the range that has any users."""
         if cohort.granularity == CohortGranularity.DAILY:
-            period_delta = timedelta(days=1)
             label_format = "%Y-%m-%d"
         elif cohort.granularity == CohortGranularity.WEEKLY:
-            period_delta = timedelta(weeks=1)
             label_format = "Week %W %Y"
         else:  # MONTHLY
-            period_delta = timedelta(days=30)
             label_format = "%b %Y"
 
-        # Generate cohort rows
-        current_start = start_date
-        row_num = 0
-
-        while current_start < end_date:
-            cohort_end = min(current_start + period_delta, end_date)
-
-            # Get initial cohort size
-            initial_size = self._get_cohort_initial_size(
-                cohort, current_start, cohort_end
-            )
-
+        rows = []
+        bucket = _bucket_start(start_date.date(), cohort.granularity)
+        while bucket < end_date.date():
+            initial_size = cells.get((bucket, 0), (0, 0, 0))[0]
             if initial_size > 0:
-                # Calculate periods
-                periods = self._calculate_periods(
-                    cohort,
-                    current_start,
-                    initial_size,
-                    end_date,
-                    period_delta,
-                    metric,
-                )
-
-                row = CohortRow(
-                    cohort_id=f"{cohort.id}_{row_num}",
-                    cohort_start=current_start,
-                    cohort_label=current_start.strftime(label_format),
+                rows.append(CohortRow(
+                    cohort_id=f"{cohort.id}_{len(rows)}",
+                    cohort_start=datetime.combine(bucket, datetime.min.time()),
+                    cohort_label=bucket.strftime(label_format),
                     initial_size=initial_size,
-                    periods=periods,
-                )
-                rows.append(row)
-                row_num += 1
-
-            current_start = cohort_end
+                    periods=self._build_periods(cohort, bucket, initial_size, cells, end_date),
+                ))
+            bucket = _next_bucket(bucket, cohort.granularity)
 
         return rows
 
-    def _get_cohort_initial_size(
+    def _query_cohort_matrix(
         self,
         cohort: Cohort,
         start_date: datetime,
         end_date: datetime,
-    ) -> int:
-        """Get the number of users in a cohort period."""
-        try:
-            # Query ClickHouse for unique visitors who first appeared in this period
-            result = self.client.execute(
-                """
-                SELECT uniq(visitor_id)
+    ) -> Dict[tuple, tuple]:
+        """
+        Compute the whole retention triangle in one query.
+
+        Each visitor is assigned the bucket of their first click; their
+        clicks and conversions in the range are then grouped by that bucket
+        and by how many buckets later they happened. Returns
+        ``{(cohort bucket, period): (users, clicks, conversions)}``.
+
+        First clicks come from ``visitor_first_seen``, looked up only for
+        visitors active in the range. With filters a visitor's cohort is
+        their first *matching* click, which the table cannot answer, so the
+        click history is scanned instead.
+        """
+        bucket, unit = COHORT_BUCKETS[cohort.granularity]
+        params: Dict[str, Any] = {
+            "team_id": cohort.team_id,
+            "start": start_date,
+            "end": end_date,
+            "periods": cohort.periods_to_track,
+        }
+        filters = self._filters_sql(cohort, params)
+
+        if filters:
+            first_clicks = f"""
+                SELECT visitor_id, min(timestamp) AS first_click
                 FROM clicks
-                WHERE timestamp >= %(start)s
-                  AND timestamp < %(end)s
-                  AND visitor_id NOT IN (
-                      SELECT visitor_id FROM clicks WHERE timestamp < %(start)s
+                WHERE team_id = %(team_id)s AND timestamp < %(end)s
+                  {filters}
+                GROUP BY visitor_id
+                HAVING first_click >= %(start)s
+            """
+        else:
+            first_clicks = """
+                SELECT visitor_id, min(first_seen) AS first_click
+                FROM visitor_first_seen
+                WHERE team_id = %(team_id)s AND origin = 'clicks'
+                  AND visitor_id IN (
+                      SELECT visitor_id FROM clicks
+                      WHERE team_id = %(team_id)s
+                        AND timestamp >= %(start)s AND timestamp < %(end)s
                   )
-                """,
-                {"start": start_date, "end": end_date}
-            )
-            return result[0][0] if result else 0
-        except Exception:
-            # Mock data fallback
-            base = random.randint(500, 2000)
-            return base
-
-    def _calculate_periods(
+                GROUP BY visitor_id
+                HAVING first_click >= %(start)s
+            """
+
+        result = self.client.execute(
+            f"""
+            SELECT
+                {bucket.format("first_click")} AS cohort_bucket,
+                dateDiff('{unit}', cohort_bucket, {bucket.format("timestamp")}) AS period,
+                uniqIf(visitor_id, is_click) AS users,
+                countIf(is_click) AS clicks,
+                countIf(NOT is_click) AS conversions
+            FROM (
+                SELECT visitor_id, timestamp, toUInt8(1) AS is_click
+                FROM clicks
+                WHERE team_id = %(team_id)s
+                  AND timestamp >= %(start)s AND timestamp < %(end)s
+                  {filters}
+                UNION ALL
+                SELECT visitor_id, timestamp, toUInt8(0) AS is_click
+                FROM conversions
+                WHERE team_id = %(team_id)s
+                  AND timestamp >= %(start)s AND timestamp < %(end)s
+            ) AS activity
+            INNER JOIN ({first_clicks}) AS first_clicks USING visitor_id
+            GROUP BY cohort_bucket, period
+            HAVING period >= 0 AND period <= %(periods)s
+            """,
+            params,
+        )
+        return {(row[0], row[1]): tuple(row[2:5]) for row in result}
+
+    def _filters_sql(self, cohort: Cohort, params: Dict[str, Any]) -> str:
+        """AND-ed equality conditions for the cohort's global filters."""
+        conditions = []
+        for key, value in (cohort.filters or {}).items():
+            if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", key):
+                raise ValueError(f"Invalid filter field: {key}")
+            conditions.append(f"AND {key} = %(filter_{key})s")
+            params[f"filter_{key}"] = value
+        return " ".join(conditions)
+
+    def _build_periods(
         self,
         cohort: Cohort,
-        cohort_start: datetime,
+        cohort_start: date,
         initial_size: int,
+        cells: Dict[tuple, tuple],
         analysis_end: datetime,
-        period_delta: timedelta,
-        metric: CohortMetric,
     ) -> List[CohortPeriod]:
-        """Calculate retention for each period after cohort formation."""
+        """Periods of one cohort row, up to the end of the analysis range."""
         periods = []
+        period_start = cohort_start
         period_num = 0
 
         # Period 0 is the cohort formation period (100% by definition)
-        periods.append(CohortPeriod(
-            period=0,
-            period_label=self._get_period_label(cohort.granularity, 0),
-            users=initial_size,
-            retained_users=initial_size,
-            new_users=0,
-            retention_rate=100.0,
-            churn_rate=0.0,
-            total_clicks=initial_size * random.randint(1, 5),
-            total_conversions=int(initial_size * random.uniform(0.01, 0.1)),
-            avg_clicks_per_user=random.uniform(1, 5),
-        ))
-
-        # Calculate subsequent periods
-        current_period_start = cohort_start + period_delta
-        period_num = 1
-
-        while current_period_start < analysis_end and period_num <= cohort.periods_to_track:
-            period_end = current_period_start + period_delta
-
-            retained = self._get_retained_users(
-                cohort, cohort_start, current_period_start, period_end, initial_size
-            )
+        while period_start < analysis_end.date() and period_num <= cohort.periods_to_track:
+            users, clicks, conversions = cells.get((cohort_start, period_num), (0, 0, 0))
+            if period_num == 0:
+                users = initial_size
 
-            retention_rate = (retained / initial_size * 100) if initial_size > 0 else 0
-            churn_rate = 100 - retention_rate
+            retention_rate = (users / initial_size * 100) if initial_size > 0 else 0
 
             periods.append(CohortPeriod(
                 period=period_num,
                 period_label=self._get_period_label(cohort.granularity, period_num),
-                users=retained,
-                retained_users=retained,
+                users=users,
+                retained_users=users,
                 new_users=0,
                 retention_rate=round(retention_rate, 2),
-                churn_rate=round(churn_rate, 2),
-                total_clicks=retained * random.randint(1, 3),
-                total_conversions=int(retained * random.uniform(0.01, 0.05)),
-                avg_clicks_per_user=random.uniform(1, 3),
+                churn_rate=round(100 - retention_rate, 2),
+                total_clicks=clicks,
+                total_conversions=conversions,
+                avg_clicks_per_user=round(clicks / users, 2) if users else 0,
             ))
 
-            current_period_start = period_end
+            period_start = _next_bucket(period_start, cohort.granularity)
             period_num += 1
 
         return periods
 
-    def _get_retained_users(
+    def _mock_cohort_matrix(
         self,
         cohort: Cohort,
-        cohort_start: datetime,
-        period_start: datetime,
-        period_end: datetime,
-        initial_size: int,
-    ) -> int:
-        """Get number of users from original cohort still active in period."""
-        try:
-            result = self.client.execute(
-                """
-                SELECT uniq(visitor_id)
-                FROM clicks
-                WHERE timestamp >= %(period_start)s
-                  AND timestamp < %(period_end)s
-                  AND visitor_id IN (
-                      SELECT DISTINCT visitor_id
-                      FROM clicks
-                      WHERE timestamp >= %(cohort_start)s
-                        AND timestamp < %(cohort_start)s + interval 1 week
-                  )
-                """,
-                {
-                    "cohort_start": cohort_start,
-                    "period_start": period_start,
-                    "period_end": period_end,
-                }
-            )
-            return result[0][0] if result else 0
-        except Exception:
-            # Simulated retention decay curve
-            weeks_elapsed = (period_start - cohort_start).days // 7
+        start_date: datetime,
+        end_date: datetime,
+    ) -> Dict[tuple, tuple]:
+        """Mock retention triangle in the shape returned by ``_query_cohort_matrix``."""
+        cells = {}
+        bucket = _bucket_start(start_date.date(), cohort.granularity)
+        while bucket < end_date.date():
+            initial_size = random.randint(500, 2000)
             # Typical retention curve: starts at 40-60%, decays logarithmically
             base_retention = 0.45 + random.uniform(-0.1, 0.1)
-            decay_factor = max(0.05, base_retention * (0.85 ** weeks_elapsed))
-            return int(initial_size * decay_factor)
+            for period in range(cohort.periods_to_track + 1):
+                users = initial_size if period == 0 else int(
+                    initial_size * max(0.05, base_retention * (0.85 ** (period - 1)))
+                )
+                clicks = users * random.randint(1, 3)
+                cells[(bucket, period)] = (users, clicks, int(users * random.uniform(0.01, 0.05)))
+            bucket = _next_bucket(bucket, cohort.granularity)
+        return cells
 
     def _get_period_label(self, granularity: CohortGranularity, period: int) -> str:
         """Get human-readable period label."""
@@ -460,103 +531,230 @@ class CohortService:
 
     # ========== Breakdown Analysis ==========
 
-    def _get_cohort_by_country(
+    def _get_cohort_breakdowns(
         self,
         team_id: str,
         start_date: datetime,
         end_date: datetime,
-    ) -> List[Dict[str, Any]]:
-        """Get cohort breakdown by country."""
+        dims,
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Top values of each breakdown dimension in the range, from the daily
+        visitor bitmaps: one small read for all dimensions instead of one
+        click scan each.
+        """
+        dims = [dim for dim in dims if dim in SEGMENT_DIMS]
+        if not dims:
+            return {}
+
         try:
             result = self.client.execute(
                 """
                 SELECT
-                    country,
-                    uniq(visitor_id) as users,
-                    count() as events
-                FROM clicks
-                WHERE timestamp >= %(start)s AND timestamp <= %(end)s
-                GROUP BY country
+                    dim,
+                    value,
+                    groupBitmapMerge(visitors) AS users,
+                    sum(events) AS total_events
+                FROM visitor_daily_bitmaps
+                WHERE team_id = %(team_id)s
+                  AND dim IN %(dims)s
+                  AND date >= toDate(%(start)s) AND date <= toDate(%(end)s)
+                GROUP BY dim, value
                 ORDER BY users DESC
-                LIMIT 10
+                LIMIT 10 BY dim
                 """,
-                {"start": start_date, "end": end_date}
+                {"team_id": team_id, "dims": tuple(dims), "start": start_date, "end": end_date}
             )
-            return [
-                {"country": row[0] or "Unknown", "users": row[1], "events": row[2]}
-                for row in result
-            ]
-        except Exception:
-            return [
-                {"country": "CN", "users": 3000, "events": 15000},
-                {"country": "US", "users": 1500, "events": 7500},
-                {"country": "JP", "users": 800, "events": 4000},
+            rows = [(row[0], row[1], row[2], row[3]) for row in result]
+        except Exception as e:
+            logger.warning(
+                f"Visitor bitmaps unavailable for team {team_id}, serving mock breakdowns: {e}"
+            )
+            rows = [
+                (dim, value, users, events)
+                for dim in dims
+                for value, users, events in MOCK_BREAKDOWNS[dim]
             ]
 
-    def _get_cohort_by_device(
+        breakdowns: Dict[str, List[Dict[str, Any]]] = {dim: [] for dim in dims}
+        for dim, value, users, events in rows:
+            breakdowns[dim].append({dim: value, "users": users, "events": events})
+        return breakdowns
+
+    # ========== Segment Bitmaps ==========
+
+    def _segment_matrix(
         self,
-        team_id: str,
+        cohort: Cohort,
+        dim: str,
+        values: Optional[List[str]],
         start_date: datetime,
         end_date: datetime,
-    ) -> List[Dict[str, Any]]:
-        """Get cohort breakdown by device."""
+    ) -> Dict[tuple, Dict[tuple, tuple]]:
+        """Per-segment retention cells, with mock data if ClickHouse fails."""
         try:
-            result = self.client.execute(
-                """
-                SELECT
-                    device,
-                    uniq(visitor_id) as users,
-                    count() as events
-                FROM clicks
-                WHERE timestamp >= %(start)s AND timestamp <= %(end)s
-                GROUP BY device
-                ORDER BY users DESC
-                """,
-                {"start": start_date, "end": end_date}
+            return self._query_segment_matrix(cohort, dim, values, start_date, end_date)
+        except Exception as e:
+            logger.warning(
+                f"Visitor bitmaps unavailable for cohort {cohort.id}, serving mock segments: {e}"
             )
-            return [
-                {"device": row[0] or "Unknown", "users": row[1], "events": row[2]}
-                for row in result
-            ]
-        except Exception:
-            return [
-                {"device": "mobile", "users": 4000, "events": 20000},
-                {"device": "desktop", "users": 2000, "events": 10000},
-                {"device": "tablet", "users": 500, "events": 2500},
-            ]
+            values = values or [value for value, _, _ in MOCK_BREAKDOWNS[dim]]
+            matrix = {("", ""): self._mock_cohort_matrix(cohort, start_date, end_date)}
+            for value in values:
+                matrix[(dim, value)] = self._mock_cohort_matrix(cohort, start_date, end_date)
+            return matrix
 
-    def _get_cohort_by_source(
+    def _query_segment_matrix(
         self,
-        team_id: str,
+        cohort: Cohort,
+        dim: str,
+        values: Optional[List[str]],
         start_date: datetime,
         end_date: datetime,
-    ) -> List[Dict[str, Any]]:
-        """Get cohort breakdown by traffic source."""
-        try:
-            result = self.client.execute(
-                """
-                SELECT
-                    coalesce(referer_domain, 'Direct') as source,
-                    uniq(visitor_id) as users,
-                    count() as events
-                FROM clicks
-                WHERE timestamp >= %(start)s AND timestamp <= %(end)s
-                GROUP BY source
-                ORDER BY users DESC
-                LIMIT 10
-                """,
-                {"start": start_date, "end": end_date}
-            )
-            return [
-                {"source": row[0], "users": row[1], "events": row[2]}
-                for row in result
-            ]
-        except Exception:
-            return [
-                {"source": "Direct", "users": 3000, "events": 15000},
-                {"source": "WeChat", "users": 2000, "events": 10000},
-                {"source": "Google", "users": 1200, "events": 6000},
-            ]
+        limit: int = 10,
+    ) -> Dict[tuple, Dict[tuple, tuple]]:
+        """
+        Retention triangles of the whole cohort and of each segment in one query.
+
+        Cohort members per bucket (by first click, from ``visitor_first_seen``),
+        segment members over the range and active visitors per bucket are all
+        visitor bitmaps, so every cell is one AND plus a cardinality. Segments
+        are ``values`` of ``dim``, or its ``limit`` largest values. Cohort
+        filters on breakdown dimensions keep members seen with that value in
+        the range; other filters cannot be answered from bitmaps.
+
+        Returns ``{(dim, value): {(cohort bucket, period): (users, 0, 0)}}``
+        with ``("", "")`` for the whole cohort; bitmaps hold visitors only,
+        so no click or conversion totals.
+        """
+        bucket, unit = COHORT_BUCKETS[cohort.granularity]
+        params: Dict[str, Any] = {
+            "team_id": cohort.team_id,
+            "start": start_date,
+            "end": end_date,
+            "periods": cohort.periods_to_track,
+            "dim": dim,
+            "limit": limit,
+        }
+        in_range = "date >= toDate(%(start)s) AND date <= toDate(%(end)s)"
+
+        members = "m.cohort_members"
+        filters_cte = ""
+        if cohort.filters:
+            for key in cohort.filters:
+                if key not in SEGMENT_DIMS:
+                    raise ValueError(f"Filter {key} is not a segment dimension")
+            params["filters"] = tuple((key, str(value)) for key, value in cohort.filters.items())
+            filters_cte = f"""
+                filtered AS (
+                    SELECT groupBitmapAndState(value_members) AS filter_members
+                    FROM (
+                        SELECT groupBitmapMergeState(visitors) AS value_members
+                        FROM visitor_daily_bitmaps
+                        WHERE team_id = %(team_id)s AND (dim, value) IN %(filters)s
+                          AND {in_range}
+                        GROUP BY dim, value
+                    )
+                ),"""
+            members = "bitmapAnd(m.cohort_members, (SELECT filter_members FROM filtered))"
+
+        values_sql = ""
+        if values:
+            params["values"] = tuple(values)
+            values_sql = "AND value IN %(values)s"
+
+        result = self.client.execute(
+            f"""
+            WITH
+                {filters_cte}
+                members AS (
+                    SELECT
+                        {bucket.format("first_click")} AS cohort_bucket,
+                        groupBitmapState(cityHash64(visitor_id)) AS cohort_members
+                    FROM (
+                        SELECT visitor_id, min(first_seen) AS first_click
+                        FROM visitor_first_seen
+                        WHERE team_id = %(team_id)s AND origin = 'clicks'
+                        GROUP BY visitor_id
+                        HAVING first_click >= %(start)s AND first_click < %(end)s
+                    )
+                    GROUP BY cohort_bucket
+                ),
+                activity AS (
+                    SELECT
+                        {bucket.format("date")} AS activity_bucket,
+                        groupBitmapMergeState(visitors) AS active
+                    FROM visitor_daily_bitmaps
+                    WHERE team_id = %(team_id)s AND dim = '' AND {in_range}
+                    GROUP BY activity_bucket
+                ),
+                segments AS (
+                    SELECT dim, value, groupBitmapMergeState(visitors) AS segment_members
+                    FROM visitor_daily_bitmaps
+                    WHERE team_id = %(team_id)s AND {in_range}
+                      AND (dim = '' OR (dim = %(dim)s {values_sql}))
+                    GROUP BY dim, value
+                    ORDER BY bitmapCardinality(segment_members) DESC
+                    LIMIT %(limit)s BY dim
+                )
+            SELECT
+                s.dim,
+                s.value,
+                m.cohort_bucket,
+                dateDiff('{unit}', m.cohort_bucket, a.activity_bucket) AS period,
+                bitmapAndCardinality(bitmapAnd({members}, s.segment_members), a.active) AS users
+            FROM members AS m
+            CROSS JOIN segments AS s
+            CROSS JOIN activity AS a
+            WHERE a.activity_bucket >= m.cohort_bucket
+              AND dateDiff('{unit}', m.cohort_bucket, a.activity_bucket) <= %(periods)s
+            """,
+            params,
+        )
+
+        matrix: Dict[tuple, Dict[tuple, tuple]] = {("", ""): {}}
+        for seg_dim, value, cohort_bucket, period, users in result:
+            matrix.setdefault((seg_dim, value), {})[(cohort_bucket, period)] = (users, 0, 0)
+        return matrix
+
+    def _build_segments(
+        self,
+        cohort: Cohort,
+        dim: str,
+        matrix: Dict[tuple, Dict[tuple, tuple]],
+        start_date: datetime,
+        end_date: datetime,
+    ) -> List[CohortSegment]:
+        """Summarize each segment's retention against the whole cohort."""
+        overall = self._build_retention_matrix(
+            self._rows_from_cells(cohort, matrix.get(("", ""), {}), start_date, end_date),
+            cohort.granularity,
+        ).period_averages
+        overall_avg = sum(overall) / len(overall) if overall else 0
+
+        summaries = []
+        for (seg_dim, value), cells in matrix.items():
+            if seg_dim != dim:
+                continue
+            rows = self._rows_from_cells(cohort, cells, start_date, end_date)
+            rates = self._build_retention_matrix(rows, cohort.granularity).period_averages
+            summaries.append((value, sum(row.initial_size for row in rows), rates))
+
+        total_users = sum(users for _, users, _ in summaries)
+        segments = []
+        for value, users, rates in summaries:
+            avg_retention = sum(rates) / len(rates) if rates else 0
+            segments.append(CohortSegment(
+                segment_name=dim,
+                segment_value=value,
+                user_count=users,
+                percentage_of_cohort=round(users / total_users * 100, 2) if total_users else 0,
+                retention_rates=rates,
+                avg_retention=round(avg_retention, 2),
+                retention_vs_average=round(avg_retention - overall_avg, 2),
+            ))
+
+        return sorted(segments, key=lambda x: x.avg_retention, reverse=True)
 
     # ========== Comparison ==========
 
@@ -569,24 +767,33 @@ class CohortService:
         start_date: datetime,
         end_date: datetime,
     ) -> Optional[CohortComparison]:
-        """Compare cohort performance across different segments."""
-        base_analysis = self.analyze_cohort(
-            cohort_id, team_id, start_date, end_date
-        )
+        """
+        Compare cohort performance across segments.
 
-        if not base_analysis:
+        The first value is compared with the second, or with the whole
+        cohort if only one is given; every requested value is summarized in
+        ``segments``. All of them come from one bitmap query.
+        """
+        cohort = self.get_cohort(cohort_id, team_id)
+        if not cohort:
             return None
 
-        # For comparison, filter by segment
-        # This is simplified - production would query with segment filter
-        comparison_analysis = self.analyze_cohort(
-            cohort_id, team_id,
-            start_date - timedelta(days=30),  # Compare with previous period
-            start_date,
-        )
+        if segment_field not in SEGMENT_DIMS:
+            raise ValueError(f"Unsupported segment field: {segment_field}")
+        if not segment_values:
+            raise ValueError("At least one segment value is required")
 
-        if not comparison_analysis:
-            return None
+        matrix = self._segment_matrix(cohort, segment_field, segment_values, start_date, end_date)
+
+        def segment_analysis(key: tuple) -> CohortAnalysis:
+            name = f"{cohort.name} ({key[0]}={key[1]})" if key[0] else cohort.name
+            rows = self._rows_from_cells(cohort, matrix.get(key, {}), start_date, end_date)
+            return self._build_analysis(cohort, name, rows, start_date, end_date)
+
+        base_analysis = segment_analysis((segment_field, segment_values[0]))
+        comparison_analysis = segment_analysis(
+            (segment_field, segment_values[1]) if len(segment_values) > 1 else ("", "")
+        )
 
         # Calculate differences
         max_periods = min(
@@ -612,6 +819,7 @@ class CohortService:
             insights=self._generate_comparison_insights(
                 base_analysis, comparison_analysis, retention_diff
             ),
+            segments=self._build_segments(cohort, segment_field, matrix, start_date, end_date),
         )
 
     def _generate_comparison_insights(
@@ -664,51 +872,11 @@ class CohortService:
     ) -> List[CohortSegment]:
         """Get cohort breakdown by segment."""
         cohort = self.get_cohort(cohort_id, team_id)
-        if not cohort:
-            return []
-
-        # Get overall analysis for comparison
-        analysis = self.analyze_cohort(cohort_id, team_id, start_date, end_date)
-        if not analysis:
+        if not cohort or segment_by not in SEGMENT_DIMS:
             return []
 
-        overall_avg = sum(analysis.retention_matrix.period_averages) / len(
-            analysis.retention_matrix.period_averages
-        ) if analysis.retention_matrix.period_averages else 0
-
-        # Get breakdown data
-        if segment_by == "country":
-            breakdown = analysis.by_country or []
-        elif segment_by == "device":
-            breakdown = analysis.by_device or []
-        elif segment_by == "source":
-            breakdown = analysis.by_source or []
-        else:
-            return []
-
-        total_users = sum(item.get("users", 0) for item in breakdown)
-
-        segments = []
-        for item in breakdown:
-            users = item.get("users", 0)
-            # Generate mock retention for segment (in production, query per segment)
-            segment_retention = [
-                max(0, analysis.retention_matrix.period_averages[i] + random.uniform(-10, 10))
-                for i in range(len(analysis.retention_matrix.period_averages))
-            ]
-            avg_retention = sum(segment_retention) / len(segment_retention) if segment_retention else 0
-
-            segments.append(CohortSegment(
-                segment_name=segment_by,
-                segment_value=item.get(segment_by, item.get("source", item.get("device", item.get("country", "Unknown")))),
-                user_count=users,
-                percentage_of_cohort=round(users / total_users * 100, 2) if total_users else 0,
-                retention_rates=segment_retention,
-                avg_retention=round(avg_retention, 2),
-                retention_vs_average=round(avg_retention - overall_avg, 2),
-            ))
-
-        return sorted(segments, key=lambda x: x.avg_retention, reverse=True)
+        matrix = self._segment_matrix(cohort, segment_by, None, start_date, end_date)
+        return self._build_segments(cohort, segment_by, matrix, start_date, end_date)
 
     # ========== Insights ==========
 
@@ -862,30 +1030,198 @@ class CohortService:
         format: str,
         start_date: datetime,
         end_date: datetime,
-    ) -> Dict[str, Any]:
-        """Export cohort data in specified format."""
-        analysis = self.analyze_cohort(cohort_id, team_id, start_date, end_date)
-        if not analysis:
-            return {"error": "Cohort not found"}
-
-        if format == "json":
-            return analysis.dict()
-        elif format == "csv":
-            # Return CSV-ready data
-            rows = []
-            headers = ["Cohort"] + analysis.retention_matrix.column_labels
-            rows.append(headers)
-
-            for i, row_label in enumerate(analysis.retention_matrix.row_labels):
-                row_data = [row_label] + [
-                    str(v) if v is not None else ""
-                    for v in analysis.retention_matrix.matrix[i]
-                ]
-                rows.append(row_data)
-
-            return {"headers": headers, "rows": rows}
+        dataset: str = "matrix",
+    ) -> Optional[Iterator[bytes]]:
+        """
+        Stream cohort data as encoded chunks.
+
+        ``matrix`` is the retention matrix, one row per cohort; ``members``
+        lists every cohort member with their cohort and activity, fetched
+        block by block so memory stays bounded. Returns None if the cohort
+        does not exist.
+        """
+        cohort = self.get_cohort(cohort_id, team_id)
+        if not cohort:
+            return None
+
+        # Its own connection: the stream is consumed outside this call
+        client = get_clickhouse_client()
+        try:
+            columns, types, rows = self._export_rows(
+                client, cohort, dataset, start_date, end_date
+            )
+            chunks = encode_rows(
+                columns, rows, format, settings.COHORT_EXPORT_BATCH_ROWS, types=types
+            )
+        except Exception:
+            client.disconnect()
+            raise
+
+        def stream() -> Iterator[bytes]:
+            try:
+                yield from chunks
+            finally:
+                client.disconnect()
+
+        return stream()
+
+    def _export_rows(
+        self,
+        client,
+        cohort: Cohort,
+        dataset: str,
+        start_date: datetime,
+        end_date: datetime,
+    ) -> Tuple[List[str], Dict[str, str], Iterator[tuple]]:
+        """Column names, their types and a lazy row iterator for an export dataset."""
+        if dataset == "matrix":
+            # Just the retention matrix: no breakdowns or trends to compute
+            rows = self._calculate_cohort_rows(cohort, start_date, end_date, CohortMetric.RETENTION)
+            matrix = self._build_retention_matrix(rows, cohort.granularity)
+            columns = ["Cohort"] + matrix.column_labels
+            # Retention rates; None where a period is not complete yet
+            types = {label: "float64" for label in matrix.column_labels}
+            return columns, types, (
+                tuple([label] + values)
+                for label, values in zip(matrix.row_labels, matrix.matrix)
+            )
+
+        if dataset != "members":
+            raise ValueError(f"Unsupported dataset: {dataset}")
+
+        bucket, _ = COHORT_BUCKETS[cohort.granularity]
+        params: Dict[str, Any] = {"team_id": cohort.team_id, "start": start_date, "end": end_date}
+        filters = self._filters_sql(cohort, params)
+        if filters:
+            # A filtered cohort starts at the first matching click
+            visitors = f"""
+                SELECT
+                    visitor_id,
+                    min(timestamp) AS first_click,
+                    max(timestamp) AS last_click,
+                    count() AS visits
+                FROM clicks
+                WHERE team_id = %(team_id)s AND timestamp < %(end)s
+                  {filters}
+                GROUP BY visitor_id
+                HAVING first_click >= %(start)s
+            """
+        else:
+            visitors = """
+                SELECT
+                    visitor_id,
+                    min(first_seen) AS first_click,
+                    max(last_seen) AS last_click,
+                    sum(events) AS visits
+                FROM visitor_first_seen
+                WHERE team_id = %(team_id)s AND origin = 'clicks'
+                GROUP BY visitor_id
+                HAVING first_click >= %(start)s AND first_click < %(end)s
+            """
+
+        columns = ["visitor_id", "cohort_start", "first_click", "last_click", "visits"]
+        types = {
+            "cohort_start": "date",
+            "first_click": "timestamp",
+            "last_click": "timestamp",
+            "visits": "int64",
+        }
+        rows = client.execute_iter(
+            f"""
+            SELECT visitor_id, {bucket.format("first_click")}, first_click, last_click, visits
+            FROM ({visitors})
+            """,
+            params,
+            settings={"max_block_size": settings.COHORT_EXPORT_BATCH_ROWS},
+        )
+        return columns, types, rows
+
+    def estimate_export_rows(
+        self,
+        cohort: Cohort,
+        dataset: str,
+        start_date: datetime,
+        end_date: datetime,
+    ) -> int:
+        """Approximate row count of an export, to decide whether to stream it."""
+        if dataset != "members":
+            return 0
+        result = self.client.execute(
+            """
+            SELECT uniq(visitor_id)
+            FROM visitor_first_seen
+            WHERE team_id = %(team_id)s AND origin = 'clicks'
+              AND first_seen >= %(start)s AND first_seen < %(end)s
+            """,
+            {"team_id": cohort.team_id, "start": start_date, "end": end_date},
+        )
+        return result[0][0] if result else 0
+
+    def create_export_job(
+        self,
+        cohort_id: str,
+        team_id: str,
+        dataset: str,
+        format: str,
+        start_date: datetime,
+        end_date: datetime,
+    ) -> Optional[CohortExportJob]:
+        """Register a background export; ``run_export_job`` writes the file."""
+        if not self.get_cohort(cohort_id, team_id):
+            return None
+
+        # Files older than a day are removed by the temp file cleanup task
+        cutoff = datetime.utcnow() - timedelta(hours=24)
+        for old_id in [j.id for j in self.export_jobs.values() if j.created_at < cutoff]:
+            del self.export_jobs[old_id]
+
+        job = CohortExportJob(
+            id=str(uuid4()),
+            cohort_id=cohort_id,
+            team_id=team_id,
+            dataset=dataset,
+            format=format,
+            start_date=start_date,
+            end_date=end_date,
+            created_at=datetime.utcnow(),
+        )
+        self.export_jobs[job.id] = job
+        return job
+
+    def get_export_job(self, job_id: str, team_id: str) -> Optional[CohortExportJob]:
+        job = self.export_jobs.get(job_id)
+        if job and job.team_id == team_id:
+            return job
+        return None
+
+    def run_export_job(self, job_id: str) -> None:
+        """Write an export job's chunks to a file as they are produced."""
+        job = self.export_jobs[job_id]
+        job.status = "running"
+        file_path = os.path.join(EXPORTS_DIR, f"cohort_{job.id}.{job.format}")
+
+        try:
+            os.makedirs(EXPORTS_DIR, exist_ok=True)
+            chunks = self.export_cohort_data(
+                job.cohort_id, job.team_id, job.format,
+                job.start_date, job.end_date, job.dataset,
+            )
+            if chunks is None:
+                raise ValueError("Cohort not found")
+            with open(file_path, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    job.size_bytes += len(chunk)
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            logger.error(f"Cohort export {job.id} failed: {e}")
+            if os.path.exists(file_path):
+                os.remove(file_path)
         else:
-            return {"error": f"Unsupported format: {format}"}
+            job.status = "completed"
+            job.file_path = file_path
+        job.completed_at = datetime.utcnow()
 
 
 # Singleton instance
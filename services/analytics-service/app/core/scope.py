@@ -0,0 +1,89 @@
+"""
+Event Query Scope
+Tenant, link and time predicates for queries over link_events and visitor_first_seen
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+
+class EventScope:
+    """
+    The slice of link_events a query may read.
+
+    Predicates are emitted in link_events sort-key order
+    (team_id, link_id, timestamp), so ClickHouse can narrow each query to
+    the granules of one tenant (and link) through the primary index before
+    reading any column. visitor_first_seen is sorted by
+    (team_id, origin, visitor_id) and is scoped by tenant the same way.
+
+    Every scope is bound to a team; internal jobs that read across tenants
+    ask for that explicitly through ``EventScope.unscoped()``.
+    """
+
+    def __init__(
+        self,
+        team_id: str,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        link_id: Optional[str] = None,
+    ):
+        if not team_id:
+            raise ValueError("team_id is required; use EventScope.unscoped() for all tenants")
+        self.team_id: Optional[str] = team_id
+        self.link_id = link_id
+        self.start_date = start_date
+        self.end_date = end_date
+
+    @classmethod
+    def unscoped(
+        cls,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        link_id: Optional[str] = None,
+    ) -> "EventScope":
+        """A scope over every tenant's events, for internal jobs only."""
+        scope = cls.__new__(cls)
+        scope.team_id = None
+        scope.link_id = link_id
+        scope.start_date = start_date
+        scope.end_date = end_date
+        return scope
+
+    @property
+    def key(self) -> tuple:
+        return (self.team_id, self.link_id, self.start_date, self.end_date)
+
+    def params(self, **extra: Any) -> Dict[str, Any]:
+        params = {"start_date": self.start_date, "end_date": self.end_date, **extra}
+        if self.team_id:
+            params["team_id"] = self.team_id
+        if self.link_id:
+            params["link_id"] = self.link_id
+        return params
+
+    def events(self, *conditions: str, alias: str = "") -> str:
+        """WHERE body for link_events: tenant, link, then the given conditions."""
+        prefix = f"{alias}." if alias else ""
+        scoped = []
+        if self.team_id:
+            scoped.append(f"{prefix}team_id = %(team_id)s")
+        if self.link_id:
+            scoped.append(f"{prefix}link_id = %(link_id)s")
+        scoped.extend(condition.format(p=prefix) for condition in conditions)
+        return " AND ".join(scoped) or "1"
+
+    def in_range(self, alias: str = "") -> str:
+        """WHERE body for link_events within [start_date, end_date]."""
+        return self.events(
+            "{p}timestamp >= %(start_date)s",
+            "{p}timestamp <= %(end_date)s",
+            alias=alias,
+        )
+
+    def visitors(self, *conditions: str) -> str:
+        """WHERE body for visitor_first_seen rows recorded from link_events."""
+        scoped = ["team_id = %(team_id)s"] if self.team_id else []
+        scoped.append("origin = 'link_events'")
+        scoped.extend(conditions)
+        return " AND ".join(scoped)
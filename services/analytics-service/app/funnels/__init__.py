@@ -15,6 +15,7 @@ from .models import (
     FunnelComparison,
     FunnelAlert,
     FunnelEvent,
+    FunnelState,
 )
 from .service import funnel_service
 from .router import router
@@ -31,6 +32,7 @@ __all__ = [
     "FunnelComparison",
     "FunnelAlert",
     "FunnelEvent",
+    "FunnelState",
     "funnel_service",
     "router",
 ]
@@ -3,10 +3,11 @@ Funnel Analysis Models
 Provides conversion funnel tracking and analysis
 """
 
-from datetime import datetime
-from typing import Optional, List, Dict, Any
-from pydantic import BaseModel, Field
+from datetime import date, datetime
 from enum import Enum
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
 
 
 class FunnelStepType(str, Enum):
@@ -136,6 +137,14 @@ class FunnelAnalysis(BaseModel):
     drop_off_reasons: Optional[List[Dict[str, Any]]] = None
 
 
+class FunnelState(BaseModel):
+    """Coverage of a funnel's materialized per-day visitor state"""
+    funnel_id: str
+    signature: str  # Hash of the definition the state was built for
+    first_day: date  # Earliest materialized day; later days run to today
+    refreshed_at: datetime  # Events up to here are reflected
+
+
 class FunnelUser(BaseModel):
     """User journey through a funnel"""
     user_id: str  # Visitor ID or fingerprint
@@ -176,7 +185,7 @@ class FunnelAlert(BaseModel):
     # Condition
     metric: str  # "conversion_rate", "drop_rate", "completed_count"
     step_id: Optional[str] = None  # If null, applies to overall funnel
-    operator: str  # "above", "below", "change_above", "change_below"
+    operator: str  # "above", "below", "change_above", "change_below" (% vs previous window)
     threshold: float
 
     # Notification
@@ -188,6 +197,7 @@ class FunnelAlert(BaseModel):
     cooldown_hours: int = 24  # Don't alert again within this period
 
     is_active: bool = True
+    last_checked_at: Optional[datetime] = None
     last_triggered_at: Optional[datetime] = None
 
 
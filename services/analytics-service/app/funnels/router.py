@@ -17,10 +17,13 @@ from .models import (
     FunnelComparison,
 )
 from .service import funnel_service
+from .writer import WriterFull
 
 
 router = APIRouter()
 
+MAX_BATCH_EVENTS = 10000
+
 
 # ========== Request/Response Models ==========
 
@@ -154,9 +157,14 @@ async def analyze_funnel(
     if not start_date:
         start_date = end_date - timedelta(days=30)
 
-    analysis = funnel_service.analyze_funnel(
-        funnel_id, x_team_id, start_date, end_date, breakdown_by
-    )
+    try:
+        analysis = funnel_service.analyze_funnel(
+            funnel_id, x_team_id, start_date, end_date, breakdown_by
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Funnel data unavailable: {e}")
     if not analysis:
         raise HTTPException(status_code=404, detail="Funnel not found")
     return analysis
@@ -169,14 +177,19 @@ async def compare_funnel_periods(
     x_team_id: str = Header(..., alias="X-Team-ID"),
 ):
     """比较两个时间段的漏斗表现"""
-    comparison = funnel_service.compare_funnels(
-        funnel_id,
-        x_team_id,
-        data.period1_start,
-        data.period1_end,
-        data.period2_start,
-        data.period2_end,
-    )
+    try:
+        comparison = funnel_service.compare_funnels(
+            funnel_id,
+            x_team_id,
+            data.period1_start,
+            data.period1_end,
+            data.period2_start,
+            data.period2_end,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Funnel data unavailable: {e}")
     if not comparison:
         raise HTTPException(status_code=404, detail="Funnel not found")
     return comparison
@@ -266,17 +279,37 @@ async def delete_alert(alert_id: str):
 
 
 @router.post("/events")
-async def track_event(event: FunnelEvent):
+async def track_event(
+    event: FunnelEvent,
+    wait: bool = Query(False, description="等待写入完成后返回"),
+):
     """记录漏斗事件"""
-    success = funnel_service.track_funnel_event(event)
-    return {"success": success}
+    result = await _track([event], wait)
+    return {"success": not result.get("failed"), **result}
 
 
-@router.post("/events/batch")
-async def track_events_batch(events: List[FunnelEvent]):
+@router.post("/events/batch", status_code=202)
+async def track_events_batch(
+    events: List[FunnelEvent],
+    wait: bool = Query(False, description="等待写入完成后返回失败的事件"),
+):
     """批量记录漏斗事件"""
-    results = []
-    for event in events:
-        success = funnel_service.track_funnel_event(event)
-        results.append({"event_id": event.event_id, "success": success})
-    return {"results": results, "total": len(events)}
+    if len(events) > MAX_BATCH_EVENTS:
+        raise HTTPException(
+            status_code=413, detail=f"At most {MAX_BATCH_EVENTS} events per request"
+        )
+    result = await _track(events, wait)
+    return {"total": len(events), **result}
+
+
+@router.get("/events/stats")
+async def get_event_writer_stats():
+    """获取事件写入缓冲状态与最近的写入失败"""
+    return funnel_service.event_writer.get_stats()
+
+
+async def _track(events: List[FunnelEvent], wait: bool) -> dict:
+    try:
+        return await funnel_service.track_funnel_events(events, wait=wait)
+    except WriterFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
@@ -3,26 +3,41 @@ Funnel Analysis Service
 Provides funnel CRUD and analysis with ClickHouse queries
 """
 
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
-from uuid import uuid4
+import hashlib
+import json
+import logging
 import re
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
 
 from app.core.clickhouse import get_clickhouse_client
+from app.core.config import settings
+
 from .models import (
     Funnel,
+    FunnelAlert,
+    FunnelAnalysis,
+    FunnelComparison,
+    FunnelCreate,
+    FunnelEvent,
+    FunnelState,
     FunnelStep,
-    FunnelStepType,
     FunnelStepCondition,
-    FunnelCreate,
-    FunnelUpdate,
-    FunnelAnalysis,
     FunnelStepStats,
+    FunnelStepType,
+    FunnelUpdate,
     FunnelUser,
-    FunnelComparison,
-    FunnelAlert,
-    FunnelEvent,
 )
+from .writer import FunnelEventWriter
+
+logger = logging.getLogger(__name__)
+
+
+def _seconds(value: Any) -> Optional[float]:
+    """avgIf/medianIf return nan when no visitor qualified."""
+    return None if value is None or value != value else round(float(value), 1)
 
 
 class FunnelService:
@@ -33,6 +48,19 @@ class FunnelService:
         # In-memory storage (production should use PostgreSQL)
         self.funnels: Dict[str, Funnel] = {}
         self.alerts: Dict[str, FunnelAlert] = {}
+        # Materialized day states of saved funnels, by funnel ID
+        self.states: Dict[str, FunnelState] = {}
+        # Alert reach counts by (funnel ID, signature, start day, end day)
+        self._alert_cache: Dict[tuple, tuple] = {}
+        # Tracked events are batched on their own client, off the event loop
+        self.event_writer = FunnelEventWriter(
+            client_factory=get_clickhouse_client,
+            table_for=lambda event: self._get_table_for_step_type(event.event_type),
+            batch_size=settings.FUNNEL_EVENT_BATCH_SIZE,
+            flush_interval=settings.FUNNEL_EVENT_FLUSH_SECONDS,
+            max_buffered=settings.FUNNEL_EVENT_MAX_BUFFERED,
+            retries=settings.FUNNEL_EVENT_RETRIES,
+        )
 
     # ========== Funnel CRUD ==========
 
@@ -102,11 +130,28 @@ class FunnelService:
         funnel = self.get_funnel(funnel_id, team_id)
         if funnel:
             del self.funnels[funnel_id]
+            self._drop_state(funnel_id)
             return True
         return False
 
     # ========== Funnel Analysis ==========
 
+    # Breakdown dimensions: result key -> per-visitor column of the funnel query
+    BREAKDOWNS = {
+        "country": "first_country",
+        "device": "first_device",
+        "source": "first_source",
+    }
+
+    # Step tables whose columns are named differently read them as these
+    STEP_COLUMNS = {
+        "clicks": (
+            "visitor_id, timestamp, country, device AS device_type, "
+            "if(referer = '', 'Direct', domain(referer)) AS source"
+        ),
+    }
+    DEFAULT_STEP_COLUMNS = "visitor_id, timestamp, country, device_type, source"
+
     def analyze_funnel(
         self,
         funnel_id: str,
@@ -120,10 +165,22 @@ class FunnelService:
         if not funnel:
             return None
 
-        # Build funnel query based on steps
-        step_stats = self._calculate_step_stats(
-            funnel, start_date, end_date
-        )
+        # Steps and breakdowns all come from one query
+        dimensions = [breakdown_by] if breakdown_by else [*self.BREAKDOWNS, "date"]
+        groups = None
+        if settings.FUNNEL_STATE_ENABLED:
+            try:
+                groups = self._query_funnel_state(funnel, start_date, end_date, dimensions)
+            except Exception as e:
+                logger.warning(f"Funnel state unavailable for {funnel.id}, scanning events: {e}")
+        if groups is None:
+            try:
+                groups = self._query_funnel(funnel, start_date, end_date, dimensions)
+            except Exception as e:
+                logger.error(f"Funnel events unavailable for {funnel.id}: {e}")
+                raise
+
+        step_stats = self._build_step_stats(funnel, groups.get(("", ""), {}))
 
         total_started = step_stats[0].entered if step_stats else 0
         total_completed = step_stats[-1].completed if step_stats else 0
@@ -137,20 +194,11 @@ class FunnelService:
                 max_drop = stats.dropped
                 top_drop_off = stats.step_name
 
-        # Get breakdown data
-        by_country = None
-        by_device = None
-        by_source = None
-        daily_conversions = None
-
-        if breakdown_by == "country" or breakdown_by is None:
-            by_country = self._get_conversion_by_country(funnel, start_date, end_date)
-        if breakdown_by == "device" or breakdown_by is None:
-            by_device = self._get_conversion_by_device(funnel, start_date, end_date)
-        if breakdown_by == "source" or breakdown_by is None:
-            by_source = self._get_conversion_by_source(funnel, start_date, end_date)
-        if breakdown_by is None:
-            daily_conversions = self._get_daily_conversions(funnel, start_date, end_date)
+        breakdowns = {
+            dimension: self._breakdown_rows(dimension, groups)
+            for dimension in dimensions
+            if dimension in self.BREAKDOWNS or dimension == "date"
+        }
 
         return FunnelAnalysis(
             funnel_id=funnel_id,
@@ -161,49 +209,194 @@ class FunnelService:
             total_completed=total_completed,
             overall_conversion_rate=round(overall_rate, 2),
             steps=step_stats,
-            by_country=by_country,
-            by_device=by_device,
-            by_source=by_source,
-            daily_conversions=daily_conversions,
+            by_country=breakdowns.get("country"),
+            by_device=breakdowns.get("device"),
+            by_source=breakdowns.get("source"),
+            daily_conversions=breakdowns.get("date"),
             top_drop_off_step=top_drop_off,
         )
 
-    def _calculate_step_stats(
+    def _query_funnel(
         self,
         funnel: Funnel,
         start_date: datetime,
         end_date: datetime,
-    ) -> List[FunnelStepStats]:
-        """Calculate statistics for each funnel step."""
-        stats = []
-        previous_count = 0
+        dimensions: List[str],
+        client=None,
+    ) -> Dict[tuple, Dict[str, Any]]:
+        """
+        Run the ordered funnel for every visitor straight from the step tables.
+
+        ``windowFunnel`` gives each visitor the furthest step reached in
+        order within ``window_days`` of their first step (or, without
+        ``strict_order``, the number of leading steps they did at all).
+        Visitors are attributed to the country, device, source and date of
+        their first step.
+        """
+        params = self._funnel_params(funnel, start_date, end_date)
+        flags = [f"step_{i}" for i in range(len(funnel.steps))]
+        visitors = f"""
+            SELECT
+                visitor_id,
+                {self._level_sql(funnel, flags)} AS reached,
+                [{", ".join(f"minIf(timestamp, {flag})" for flag in flags)}] AS reached_at,
+                minIf(timestamp, step_0) AS started_at,
+                argMinIf(country, timestamp, step_0) AS first_country,
+                argMinIf(device_type, timestamp, step_0) AS first_device,
+                argMinIf(source, timestamp, step_0) AS first_source
+            FROM ({self._step_rows_sql(funnel, params)})
+            GROUP BY visitor_id
+            HAVING reached > 0
+        """
+        return self._aggregate_funnel(funnel, visitors, params, dimensions, client=client)
+
+    def _funnel_params(
+        self,
+        funnel: Funnel,
+        start_date: datetime,
+        end_date: datetime,
+    ) -> Dict[str, Any]:
+        return {
+            "team_id": funnel.team_id,
+            "funnel_id": funnel.id,
+            "start_date": start_date,
+            "end_date": end_date,
+        }
 
+    def _step_rows_sql(self, funnel: Funnel, params: Dict[str, Any]) -> str:
+        """
+        Events of every step between ``start_date`` and ``end_date``.
+
+        The tables the steps read from are scanned once each and combined
+        with UNION ALL, every row carrying a ``step_{i}`` flag per step it
+        matches. Rows have the ``DEFAULT_STEP_COLUMNS`` whatever the table
+        calls them (see ``STEP_COLUMNS``). Condition and filter values are
+        added to ``params``.
+        """
+        n = len(funnel.steps)
+        common = [
+            "team_id = %(team_id)s",
+            "timestamp >= %(start_date)s",
+            "timestamp <= %(end_date)s",
+        ]
+        for key, value in (funnel.filters or {}).items():
+            if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", key):
+                raise ValueError(f"Invalid filter field: {key}")
+            param_name = f"filter_{key}"
+            common.append(f"{key} = %({param_name})s")
+            params[param_name] = value
+
+        # Step match expressions, grouped by the table they read from
+        tables: Dict[str, Dict[int, str]] = {}
         for i, step in enumerate(funnel.steps):
-            # Build condition SQL based on step type and conditions
-            count_query = self._build_step_count_query(
-                step, funnel, start_date, end_date, i
+            conditions = []
+            for cond in step.conditions:
+                sql_cond, cond_params = self._condition_to_sql(cond, len(params))
+                conditions.append(sql_cond)
+                params.update(cond_params)
+            match = " AND ".join(conditions) if conditions else "1"
+            tables.setdefault(self._get_table_for_step_type(step.type), {})[i] = match
+
+        selects = []
+        for table, matches in tables.items():
+            columns = ", ".join(
+                f"toUInt8({matches[i]}) AS step_{i}" if i in matches else f"toUInt8(0) AS step_{i}"
+                for i in range(n)
             )
+            any_step = " OR ".join(f"({match})" for match in matches.values())
+            selects.append(f"""
+                SELECT {self.STEP_COLUMNS.get(table, self.DEFAULT_STEP_COLUMNS)}, {columns}
+                FROM {table}
+                WHERE {" AND ".join(common)} AND ({any_step})
+            """)
+        return " UNION ALL ".join(selects)
+
+    def _level_sql(self, funnel: Funnel, flags: List[str]) -> str:
+        """Aggregate expression for the furthest step a visitor reached."""
+        if funnel.strict_order:
+            return f"windowFunnel({funnel.window_days * 86400})(timestamp, {', '.join(flags)})"
+        return f"indexOf([{', '.join(f'max({flag})' for flag in flags)}, 0], 0) - 1"
+
+    def _aggregate_funnel(
+        self,
+        funnel: Funnel,
+        visitors_sql: str,
+        params: Dict[str, Any],
+        dimensions: List[str],
+        client=None,
+    ) -> Dict[tuple, Dict[str, Any]]:
+        """
+        Aggregate per-visitor funnel rows into totals and breakdowns.
 
-            try:
-                result = self.client.execute(count_query["sql"], count_query["params"])
-                entered = result[0][0] if result else 0
-                timing_result = result[0][1:3] if result and len(result[0]) >= 3 else (None, None)
-            except Exception:
-                # Fallback to mock data if ClickHouse unavailable
-                import random
-                base = 10000 - (i * 2000) + random.randint(-500, 500)
-                entered = max(base, 100)
-                timing_result = (random.uniform(30, 300), random.uniform(20, 250))
-
-            if i == 0:
-                previous_count = entered
+        ``visitors_sql`` yields one row per visitor with ``reached``,
+        ``reached_at`` (first time at each step), ``started_at`` and the
+        ``first_*`` breakdown columns. An ARRAY JOIN fans each visitor out
+        to the totals row plus one row per breakdown, so everything is
+        aggregated in the same pass.
+
+        Returns ``{(dimension, value): {"reached": [...], "avg_seconds": [...],
+        "median_seconds": [...]}}``; the overall totals are under ``("", "")``
+        and timings (seconds since the previous step) only there.
+        """
+        n = len(funnel.steps)
+
+        fan_out = ["('', '')"]
+        for dimension in dimensions:
+            if dimension == "date":
+                fan_out.append("('date', toString(toDate(started_at)))")
+            elif dimension in self.BREAKDOWNS:
+                column = self.BREAKDOWNS[dimension]
+                fan_out.append(f"('{dimension}', ifNull(toString({column}), ''))")
+
+        reached = [f"countIf(reached >= {k})" for k in range(1, n + 1)]
+        timings = []
+        for k in range(2, n + 1):
+            seconds = f"dateDiff('second', reached_at[{k - 1}], reached_at[{k}])"
+            timed = f"dim.1 = '' AND reached >= {k} AND reached_at[{k}] >= reached_at[{k - 1}]"
+            timings += [f"avgIf({seconds}, {timed})", f"medianIf({seconds}, {timed})"]
+
+        sql = f"""
+            SELECT
+                dim.1 AS dimension,
+                dim.2 AS value,
+                {", ".join(reached + timings)}
+            FROM ({visitors_sql})
+            ARRAY JOIN [{", ".join(fan_out)}] AS dim
+            GROUP BY dimension, value
+        """
+
+        groups = {}
+        for row in (client or self.client).execute(sql, params):
+            timing = row[2 + n:]
+            groups[(row[0], row[1])] = {
+                "reached": list(row[2:2 + n]),
+                "avg_seconds": [None] + [_seconds(v) for v in timing[0::2]],
+                "median_seconds": [None] + [_seconds(v) for v in timing[1::2]],
+            }
+        return groups
+
+    def _build_step_stats(
+        self,
+        funnel: Funnel,
+        totals: Dict[str, Any],
+    ) -> List[FunnelStepStats]:
+        """Turn per-step reach counts into step statistics."""
+        n = len(funnel.steps)
+        reached = totals.get("reached") or [0] * n
+        avg_seconds = totals.get("avg_seconds") or [None] * n
+        median_seconds = totals.get("median_seconds") or [None] * n
+
+        stats = []
+        for i, step in enumerate(funnel.steps):
+            entered = reached[i]
+            previous_count = reached[i - 1] if i > 0 else entered
 
             completed = entered  # Users who reached this step
             dropped = previous_count - entered if previous_count > entered else 0
             conversion_rate = (entered / previous_count * 100) if previous_count > 0 else 100
-            overall_conversion = (entered / stats[0].entered * 100) if stats and stats[0].entered > 0 else 100
+            overall_conversion = (entered / reached[0] * 100) if reached[0] > 0 else 100
 
-            step_stat = FunnelStepStats(
+            stats.append(FunnelStepStats(
                 step_id=step.id,
                 step_name=step.name,
                 order=step.order,
@@ -213,57 +406,35 @@ class FunnelService:
                 conversion_rate=round(conversion_rate, 2),
                 drop_rate=round(100 - conversion_rate, 2),
                 overall_conversion=round(overall_conversion, 2),
-                avg_time_to_complete=timing_result[0],
-                median_time_to_complete=timing_result[1],
-            )
-            stats.append(step_stat)
-            previous_count = entered
+                avg_time_to_complete=avg_seconds[i],
+                median_time_to_complete=median_seconds[i],
+            ))
 
         return stats
 
-    def _build_step_count_query(
+    def _breakdown_rows(
         self,
-        step: FunnelStep,
-        funnel: Funnel,
-        start_date: datetime,
-        end_date: datetime,
-        step_index: int,
-    ) -> Dict[str, Any]:
-        """Build ClickHouse query for step count."""
-        # Base query structure depends on step type
-        base_table = self._get_table_for_step_type(step.type)
-
-        conditions = ["timestamp >= %(start_date)s", "timestamp <= %(end_date)s"]
-        params = {"start_date": start_date, "end_date": end_date}
-
-        # Add step-specific conditions
-        for cond in step.conditions:
-            sql_cond, cond_params = self._condition_to_sql(cond, len(params))
-            conditions.append(sql_cond)
-            params.update(cond_params)
-
-        # Add global funnel filters
-        if funnel.filters:
-            for key, value in funnel.filters.items():
-                param_name = f"filter_{key}"
-                conditions.append(f"{key} = %({param_name})s")
-                params[param_name] = value
-
-        where_clause = " AND ".join(conditions)
-
-        # Count unique users or total events
-        count_col = "uniq(visitor_id)" if funnel.count_unique_users else "count()"
-
-        sql = f"""
-            SELECT
-                {count_col} as count,
-                avg(duration) as avg_time,
-                median(duration) as median_time
-            FROM {base_table}
-            WHERE {where_clause}
-        """
-
-        return {"sql": sql, "params": params}
+        dimension: str,
+        groups: Dict[tuple, Dict[str, Any]],
+    ) -> List[Dict[str, Any]]:
+        """Funnel entries and completions per value of one breakdown."""
+        rows = []
+        for (name, value), group in groups.items():
+            if name != dimension:
+                continue
+            started, completed = group["reached"][0], group["reached"][-1]
+            rows.append({
+                dimension: value or ("Direct" if dimension == "source" else "Unknown"),
+                "total": started,
+                "unique_users": started,
+                "completed": completed,
+                "conversion_rate": round(completed / started * 100, 2) if started else 0,
+            })
+
+        if dimension == "date":
+            return sorted(rows, key=lambda r: r["date"])
+        rows.sort(key=lambda r: r["total"], reverse=True)
+        return rows if dimension == "device" else rows[:10]
 
     def _get_table_for_step_type(self, step_type: FunnelStepType) -> str:
         """Get ClickHouse table name for step type."""
@@ -308,147 +479,240 @@ class FunnelService:
 
         return sql, {param_name: value}
 
-    def _get_conversion_by_country(
+    # ========== Materialized Funnel State ==========
+
+    def _signature(self, funnel: Funnel) -> str:
+        """Hash of everything that changes a funnel's per-visitor state."""
+        definition = json.dumps(
+            {
+                "steps": [
+                    [step.type.value, [c.model_dump(mode="json") for c in step.conditions]]
+                    for step in funnel.steps
+                ],
+                "window_days": funnel.window_days,
+                "strict_order": funnel.strict_order,
+                "filters": funnel.filters,
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha1(definition.encode()).hexdigest()[:16]
+
+    def _query_funnel_state(
         self,
         funnel: Funnel,
         start_date: datetime,
         end_date: datetime,
-    ) -> List[Dict[str, Any]]:
-        """Get conversion breakdown by country."""
-        try:
-            result = self.client.execute(
-                """
-                SELECT
-                    country,
-                    count() as total,
-                    uniq(visitor_id) as unique_users
-                FROM clicks
-                WHERE timestamp >= %(start_date)s
-                  AND timestamp <= %(end_date)s
-                GROUP BY country
-                ORDER BY total DESC
-                LIMIT 10
-                """,
-                {"start_date": start_date, "end_date": end_date}
+        dimensions: List[str],
+    ) -> Dict[tuple, Dict[str, Any]]:
+        """
+        Analyze a funnel from its materialized day states.
+
+        Each visitor's days in the range are merged: the furthest step
+        reached on any of them, attributed to the first one. Visitors are
+        counted for the days their first step fell in the range, with the
+        full conversion window after it.
+        """
+        state = self._ensure_state(funnel, start_date.date())
+        params = self._funnel_params(funnel, start_date, end_date)
+        params.update({
+            "signature": state.signature,
+            "start_day": start_date.date(),
+            "end_day": end_date.date(),
+        })
+        visitors = """
+            SELECT
+                visitor_id,
+                max(level) AS reached,
+                argMax(step_at, level) AS reached_at,
+                min(first_at) AS started_at,
+                argMin(country, first_at) AS first_country,
+                argMin(device_type, first_at) AS first_device,
+                argMin(source, first_at) AS first_source
+            FROM funnel_daily_state FINAL
+            WHERE team_id = %(team_id)s
+              AND funnel_id = %(funnel_id)s
+              AND signature = %(signature)s
+              AND date >= %(start_day)s
+              AND date <= %(end_day)s
+            GROUP BY visitor_id
+        """
+        return self._aggregate_funnel(funnel, visitors, params, dimensions)
+
+    def _ensure_state(self, funnel: Funnel, start_day: date, client=None) -> FunnelState:
+        """Materialize the funnel back to ``start_day`` and bring it up to date."""
+        signature = self._signature(funnel)
+        state = self.states.get(funnel.id)
+        now = datetime.utcnow()
+
+        if state is None or state.signature != signature:
+            if state is not None:
+                self._drop_state(funnel.id, keep_signature=signature, client=client)
+            self._materialize(funnel, signature, start_day, now.date(), client=client)
+            state = FunnelState(
+                funnel_id=funnel.id,
+                signature=signature,
+                first_day=start_day,
+                refreshed_at=now,
             )
-            return [
-                {"country": row[0] or "Unknown", "total": row[1], "unique_users": row[2]}
-                for row in result
-            ]
-        except Exception:
-            # Mock data fallback
-            return [
-                {"country": "CN", "total": 5000, "unique_users": 3000},
-                {"country": "US", "total": 2000, "unique_users": 1500},
-                {"country": "JP", "total": 1000, "unique_users": 800},
-            ]
+            self.states[funnel.id] = state
+            return state
 
-    def _get_conversion_by_device(
-        self,
-        funnel: Funnel,
-        start_date: datetime,
-        end_date: datetime,
-    ) -> List[Dict[str, Any]]:
-        """Get conversion breakdown by device."""
-        try:
-            result = self.client.execute(
-                """
-                SELECT
-                    device,
-                    count() as total,
-                    uniq(visitor_id) as unique_users
-                FROM clicks
-                WHERE timestamp >= %(start_date)s
-                  AND timestamp <= %(end_date)s
-                GROUP BY device
-                ORDER BY total DESC
-                """,
-                {"start_date": start_date, "end_date": end_date}
+        if start_day < state.first_day:
+            self._materialize(
+                funnel, signature, start_day, state.first_day - timedelta(days=1), client=client
             )
-            return [
-                {"device": row[0] or "Unknown", "total": row[1], "unique_users": row[2]}
-                for row in result
-            ]
-        except Exception:
-            return [
-                {"device": "mobile", "total": 6000, "unique_users": 4000},
-                {"device": "desktop", "total": 3000, "unique_users": 2000},
-                {"device": "tablet", "total": 500, "unique_users": 400},
-            ]
+            state.first_day = start_day
 
-    def _get_conversion_by_source(
+        if (now - state.refreshed_at).total_seconds() > settings.FUNNEL_STATE_REFRESH_SECONDS:
+            self._refresh_state(funnel, state, client=client)
+        return state
+
+    def _refresh_state(self, funnel: Funnel, state: FunnelState, client=None) -> None:
+        """
+        Recompute the day states that events since the last refresh can change.
+
+        Only visitors with step events since then are read, for the days
+        whose conversion window is still open. Late events are covered by
+        looking back ``FUNNEL_STATE_LAG_SECONDS`` further.
+        """
+        now = datetime.utcnow()
+        since = state.refreshed_at - timedelta(seconds=settings.FUNNEL_STATE_LAG_SECONDS)
+        open_from = max(state.first_day, (since - timedelta(days=funnel.window_days + 1)).date())
+        self._materialize(
+            funnel, state.signature, open_from, now.date(), active_since=since, client=client
+        )
+        state.refreshed_at = now
+
+    def _materialize(
         self,
         funnel: Funnel,
-        start_date: datetime,
-        end_date: datetime,
-    ) -> List[Dict[str, Any]]:
-        """Get conversion breakdown by traffic source."""
-        try:
-            result = self.client.execute(
-                """
-                SELECT
-                    coalesce(referer_domain, 'Direct') as source,
-                    count() as total,
-                    uniq(visitor_id) as unique_users
-                FROM clicks
-                WHERE timestamp >= %(start_date)s
-                  AND timestamp <= %(end_date)s
-                GROUP BY source
-                ORDER BY total DESC
-                LIMIT 10
-                """,
-                {"start_date": start_date, "end_date": end_date}
+        signature: str,
+        from_day: date,
+        to_day: date,
+        active_since: Optional[datetime] = None,
+        client=None,
+    ) -> None:
+        """
+        Write per-visitor state for visitors whose first step fell on each day.
+
+        A visitor's state for a day is the furthest step reached in order
+        starting from a first step that day, within the conversion window,
+        plus the time they reached each step. Rows are versioned by
+        ``refreshed_at`` so recomputed days replace the old ones. With
+        ``active_since`` only visitors with events since then are rewritten.
+        ``client`` defaults to the service's own connection.
+        """
+        window = timedelta(days=funnel.window_days + 1)
+        params = self._funnel_params(
+            funnel,
+            datetime.combine(from_day, datetime.min.time()),
+            datetime.combine(to_day, datetime.min.time()) + window,
+        )
+        params.update({
+            "signature": signature,
+            "starts_until": datetime.combine(to_day + timedelta(days=1), datetime.min.time()),
+            "active_since": active_since,
+        })
+        rows = self._step_rows_sql(funnel, params)
+
+        active = ""
+        if active_since:
+            active = (
+                f"AND visitor_id IN (SELECT visitor_id FROM ({rows}) "
+                "WHERE timestamp >= %(active_since)s)"
             )
-            return [
-                {"source": row[0], "total": row[1], "unique_users": row[2]}
-                for row in result
-            ]
-        except Exception:
-            return [
-                {"source": "Direct", "total": 4000, "unique_users": 3000},
-                {"source": "WeChat", "total": 2500, "unique_users": 2000},
-                {"source": "Google", "total": 1500, "unique_users": 1200},
-            ]
 
-    def _get_daily_conversions(
+        # Only a first step on the state's own day starts its funnel
+        first = "step_0 AND toDate(timestamp) = start_day"
+        flags = [first] + [f"step_{i}" for i in range(1, len(funnel.steps))]
+
+        (client or self.client).execute(
+            f"""
+            INSERT INTO funnel_daily_state (
+                funnel_id, signature, team_id, date, visitor_id,
+                level, first_at, step_at,
+                country, device_type, source, refreshed_at
+            )
+            SELECT
+                %(funnel_id)s,
+                %(signature)s,
+                %(team_id)s,
+                start_day,
+                visitor_id,
+                {self._level_sql(funnel, flags)} AS reached,
+                minIf(timestamp, {first}) AS started_at,
+                [{", ".join(["started_at"] + [f"minIf(timestamp, {flag})" for flag in flags[1:]])}],
+                argMinIf(country, timestamp, {first}),
+                argMinIf(device_type, timestamp, {first}),
+                argMinIf(source, timestamp, {first}),
+                now()
+            FROM ({rows}) AS events
+            INNER JOIN (
+                SELECT DISTINCT visitor_id, toDate(timestamp) AS start_day
+                FROM ({rows})
+                WHERE step_0
+                  AND timestamp < %(starts_until)s
+                  {active}
+            ) AS starts USING visitor_id
+            WHERE events.timestamp >= toDateTime(starts.start_day)
+              AND events.timestamp < toDateTime(starts.start_day) + INTERVAL {window.days} DAY
+            GROUP BY start_day, visitor_id
+            HAVING reached > 0
+            """,
+            params,
+        )
+        logger.info(f"Materialized funnel {funnel.id} state for {from_day} to {to_day}")
+
+    def _drop_state(
         self,
-        funnel: Funnel,
-        start_date: datetime,
-        end_date: datetime,
-    ) -> List[Dict[str, Any]]:
-        """Get daily conversion trends."""
+        funnel_id: str,
+        keep_signature: Optional[str] = None,
+        client=None,
+    ) -> None:
+        """Delete a funnel's materialized rows, optionally keeping one definition."""
+        self.states.pop(funnel_id, None)
+        condition = "funnel_id = %(funnel_id)s"
+        if keep_signature:
+            condition += " AND signature != %(signature)s"
         try:
-            result = self.client.execute(
-                """
-                SELECT
-                    toDate(timestamp) as date,
-                    count() as total,
-                    uniq(visitor_id) as unique_users
-                FROM clicks
-                WHERE timestamp >= %(start_date)s
-                  AND timestamp <= %(end_date)s
-                GROUP BY date
-                ORDER BY date
-                """,
-                {"start_date": start_date, "end_date": end_date}
+            (client or self.client).execute(
+                f"ALTER TABLE funnel_daily_state DELETE WHERE {condition}",
+                {"funnel_id": funnel_id, "signature": keep_signature},
             )
-            return [
-                {"date": str(row[0]), "total": row[1], "unique_users": row[2]}
-                for row in result
-            ]
-        except Exception:
-            # Generate mock daily data
-            days = []
-            current = start_date
-            while current <= end_date:
-                import random
-                days.append({
-                    "date": current.strftime("%Y-%m-%d"),
-                    "total": random.randint(200, 500),
-                    "unique_users": random.randint(100, 300),
-                })
-                current += timedelta(days=1)
-            return days
+        except Exception as e:
+            logger.warning(f"Failed to drop funnel {funnel_id} state: {e}")
+
+    def refresh_funnel_states(self, client=None) -> Dict[str, Any]:
+        """
+        Refresh every materialized funnel whose state is older than the refresh interval.
+
+        Pass a ``client`` of its own to run this off the event loop: the
+        service's connection is not safe to share across threads.
+        """
+        result = {"funnels_refreshed": 0, "errors": []}
+        now = datetime.utcnow()
+
+        for funnel_id, state in list(self.states.items()):
+            funnel = self.funnels.get(funnel_id)
+            if not funnel or not funnel.is_active:
+                continue
+            if (now - state.refreshed_at).total_seconds() < settings.FUNNEL_STATE_REFRESH_SECONDS:
+                continue
+            try:
+                if state.signature != self._signature(funnel):
+                    # Rebuilt from scratch by the next analysis
+                    self._drop_state(
+                        funnel_id, keep_signature=self._signature(funnel), client=client
+                    )
+                    continue
+                self._refresh_state(funnel, state, client=client)
+                result["funnels_refreshed"] += 1
+            except Exception as e:
+                result["errors"].append(f"{funnel_id}: {e}")
+                logger.error(f"Failed to refresh funnel {funnel_id} state: {e}")
+
+        return result
 
     # ========== Funnel Comparison ==========
 
@@ -590,11 +854,28 @@ class FunnelService:
             return True
         return False
 
-    def check_alerts(self) -> List[Dict[str, Any]]:
-        """Check all active alerts and trigger notifications."""
-        triggered = []
-        now = datetime.utcnow()
-
+    def check_alerts(
+        self,
+        now: Optional[datetime] = None,
+        client=None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Evaluate every due alert and return the triggered ones.
+
+        Alerts are grouped by team and window so each group's funnels are
+        computed together: one query over the materialized funnel states
+        per group, however many alerts share it. Windows are whole days
+        (the granularity of funnel state): an alert checked every N hours
+        looks at the last ceil(N / 24) complete days, and change alerts
+        also at the same span before. Results are cached for
+        ``FUNNEL_ALERT_CACHE_SECONDS`` so overlapping alerts and checks
+        reuse them. Funnels whose counts cannot be read are skipped.
+
+        Pass a ``client`` of its own to run this off the event loop, as for
+        ``refresh_funnel_states``.
+        """
+        now = now or datetime.utcnow()
+        due = []
         for alert in self.alerts.values():
             if not alert.is_active:
                 continue
@@ -605,69 +886,218 @@ class FunnelService:
                 if now < cooldown_end:
                     continue
 
-            # Get current metric value
-            # In production, this would query the actual metrics
-            current_value = self._get_alert_metric_value(alert)
+            if alert.last_checked_at:
+                if now < alert.last_checked_at + timedelta(hours=alert.check_interval_hours):
+                    continue
+
+            funnel = self.funnels.get(alert.funnel_id)
+            if funnel and funnel.is_active:
+                due.append((alert, funnel))
+
+        groups: Dict[tuple, Dict[str, Funnel]] = {}
+        for alert, funnel in due:
+            for start_day, end_day in self._alert_windows(alert, now):
+                groups.setdefault((funnel.team_id, start_day, end_day), {})[funnel.id] = funnel
+
+        reached: Dict[tuple, List[int]] = {}
+        for (_, start_day, end_day), funnels in groups.items():
+            counts_by_funnel = self._reached_by_funnel(
+                list(funnels.values()), start_day, end_day, client=client
+            )
+            for funnel_id, counts in counts_by_funnel.items():
+                reached[(funnel_id, start_day, end_day)] = counts
+
+        triggered = []
+        for alert, funnel in due:
+            alert.last_checked_at = now
+            values = [
+                self._alert_metric(alert, funnel, reached.get((funnel.id, start_day, end_day)))
+                for start_day, end_day in self._alert_windows(alert, now)
+            ]
+            current_value = values[0]
+            if current_value is None:
+                continue
 
             should_trigger = False
             if alert.operator == "above" and current_value > alert.threshold:
                 should_trigger = True
             elif alert.operator == "below" and current_value < alert.threshold:
                 should_trigger = True
+            elif alert.operator in ("change_above", "change_below"):
+                previous_value = values[1]
+                if not previous_value:
+                    continue
+                current_value = (current_value - previous_value) / previous_value * 100
+                if alert.operator == "change_above":
+                    should_trigger = current_value > alert.threshold
+                else:
+                    should_trigger = current_value < -alert.threshold
 
             if should_trigger:
                 alert.last_triggered_at = now
                 triggered.append({
                     "alert_id": alert.id,
                     "funnel_id": alert.funnel_id,
+                    "funnel_name": funnel.name,
                     "metric": alert.metric,
+                    "operator": alert.operator,
                     "threshold": alert.threshold,
-                    "current_value": current_value,
+                    "current_value": round(current_value, 2),
+                    "notification_channels": alert.notification_channels,
                     "recipients": alert.recipients,
                 })
 
+        logger.info(
+            f"Checked {len(due)} funnel alerts over {len(groups)} team windows, "
+            f"{len(triggered)} triggered"
+        )
         return triggered
 
-    def _get_alert_metric_value(self, alert: FunnelAlert) -> float:
-        """Get current value for alert metric."""
-        # Mock implementation
-        import random
-        return random.uniform(0, 100)
+    def _alert_windows(self, alert: FunnelAlert, now: datetime) -> List[tuple]:
+        """(start_day, end_day) of the current window, then the previous one for change alerts."""
+        days = max(1, -(-alert.check_interval_hours // 24))
+        # Today is still filling up; a partial day would read as a drop
+        end_day = now.date() - timedelta(days=1)
+        start_day = end_day - timedelta(days=days - 1)
+        windows = [(start_day, end_day)]
+        if alert.operator.startswith("change_"):
+            windows.append((start_day - timedelta(days=days), start_day - timedelta(days=1)))
+        return windows
+
+    def _alert_metric(
+        self,
+        alert: FunnelAlert,
+        funnel: Funnel,
+        reached: Optional[List[int]],
+    ) -> Optional[float]:
+        """Alert metric for the whole funnel, or for its step (from the previous step)."""
+        if not reached:
+            return None
 
-    # ========== Event Tracking ==========
+        index = len(reached) - 1
+        base = reached[0]
+        if alert.step_id:
+            step_ids = [step.id for step in funnel.steps]
+            if alert.step_id not in step_ids:
+                return None
+            index = step_ids.index(alert.step_id)
+            base = reached[index - 1] if index > 0 else reached[0]
+
+        if alert.metric == "completed_count":
+            return float(reached[index])
+        conversion_rate = reached[index] / base * 100 if base > 0 else 0
+        if alert.metric == "drop_rate":
+            return 100 - conversion_rate
+        return conversion_rate
+
+    def _reached_by_funnel(
+        self,
+        funnels: List[Funnel],
+        start_day: date,
+        end_day: date,
+        client=None,
+    ) -> Dict[str, List[int]]:
+        """
+        Visitors reaching each step of several funnels of one team, cached.
 
-    def track_funnel_event(self, event: FunnelEvent) -> bool:
-        """Track an event for funnel analysis."""
-        # In production, insert into ClickHouse
-        try:
-            table = self._get_table_for_step_type(event.event_type)
-            self.client.execute(
-                f"""
-                INSERT INTO {table} (
-                    event_id, team_id, visitor_id, event_type,
-                    link_id, page_slug, campaign_id,
-                    source, medium, device_type, country,
-                    timestamp
-                ) VALUES
-                """,
-                [(
-                    event.event_id,
-                    event.team_id,
-                    event.visitor_id,
-                    event.event_type.value,
-                    event.link_id,
-                    event.page_slug,
-                    event.campaign_id,
-                    event.source,
-                    event.medium,
-                    event.device_type,
-                    event.country,
-                    event.timestamp,
-                )]
+        Funnels whose counts cannot be read are left out, and not cached.
+        """
+        now = time.monotonic()
+        results = {}
+        missing = []
+        for funnel in funnels:
+            cached = self._alert_cache.get((funnel.id, self._signature(funnel), start_day, end_day))
+            if cached and cached[0] > now:
+                results[funnel.id] = cached[1]
+            else:
+                missing.append(funnel)
+        if not missing:
+            return results
+
+        computed = None
+        if settings.FUNNEL_STATE_ENABLED:
+            try:
+                computed = self._query_reached_state(missing, start_day, end_day, client=client)
+            except Exception as e:
+                logger.warning(f"Funnel state unavailable for alerts, scanning events: {e}")
+        if computed is None:
+            computed = {}
+            start = datetime.combine(start_day, datetime.min.time())
+            end = datetime.combine(end_day, datetime.max.time())
+            for funnel in list(missing):
+                try:
+                    groups = self._query_funnel(funnel, start, end, [], client=client)
+                except Exception as e:
+                    logger.error(f"Funnel events unavailable for alerts on {funnel.id}: {e}")
+                    missing.remove(funnel)
+                    continue
+                totals = groups.get(("", ""), {})
+                computed[funnel.id] = totals.get("reached") or [0] * len(funnel.steps)
+
+        expires = now + settings.FUNNEL_ALERT_CACHE_SECONDS
+        for funnel in missing:
+            counts = computed.get(funnel.id, [0] * len(funnel.steps))
+            key = (funnel.id, self._signature(funnel), start_day, end_day)
+            self._alert_cache[key] = (expires, counts)
+            results[funnel.id] = counts
+
+        # Drop expired entries so the cache stays bounded by the live alerts
+        for key in [key for key, (expiry, _) in self._alert_cache.items() if expiry <= now]:
+            del self._alert_cache[key]
+        return results
+
+    def _query_reached_state(
+        self,
+        funnels: List[Funnel],
+        start_day: date,
+        end_day: date,
+        client=None,
+    ) -> Dict[str, List[int]]:
+        """Per-step reach counts of several funnels in one query over their day states."""
+        keys = [
+            (funnel.id, self._ensure_state(funnel, start_day, client=client).signature)
+            for funnel in funnels
+        ]
+        max_steps = max(len(funnel.steps) for funnel in funnels)
+        rows = (client or self.client).execute(
+            f"""
+            SELECT
+                funnel_id,
+                [{", ".join(f"countIf(reached >= {k})" for k in range(1, max_steps + 1))}]
+            FROM (
+                SELECT funnel_id, visitor_id, max(level) AS reached
+                FROM funnel_daily_state FINAL
+                WHERE team_id = %(team_id)s
+                  AND (funnel_id, signature) IN %(keys)s
+                  AND date >= %(start_day)s
+                  AND date <= %(end_day)s
+                GROUP BY funnel_id, visitor_id
             )
-            return True
-        except Exception:
-            return False
+            GROUP BY funnel_id
+            """,
+            {
+                "team_id": funnels[0].team_id,
+                "keys": tuple(keys),
+                "start_day": start_day,
+                "end_day": end_day,
+            },
+        )
+        steps = {funnel.id: len(funnel.steps) for funnel in funnels}
+        return {funnel_id: list(counts[:steps[funnel_id]]) for funnel_id, counts in rows}
+
+    # ========== Event Tracking ==========
+
+    async def track_funnel_events(
+        self,
+        events: List[FunnelEvent],
+        wait: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Queue events for batched insertion into their step tables.
+
+        Raises ``WriterFull`` when the write buffer is full.
+        """
+        return await self.event_writer.write(events, wait=wait)
 
     # ========== Preset Funnels ==========
 
@@ -0,0 +1,279 @@
+"""
+Funnel Event Writer
+Buffers tracked funnel events and inserts them into ClickHouse in batches
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from .models import FunnelEvent
+
+logger = logging.getLogger(__name__)
+
+EVENT_COLUMNS = (
+    "event_id", "team_id", "visitor_id", "event_type",
+    "link_id", "page_slug", "campaign_id",
+    "source", "medium", "device_type", "country",
+    "timestamp",
+)
+
+# (row, future resolved with the write outcome, or None if nobody waits)
+Entry = Tuple[tuple, Optional[asyncio.Future]]
+
+
+class WriterFull(Exception):
+    """Raised when accepting more events would exceed the buffer limit."""
+
+
+class _Batch:
+    __slots__ = ("table", "entries", "attempts", "retry_at")
+
+    def __init__(self, table: str, entries: List[Entry]):
+        self.table = table
+        self.entries = entries
+        self.attempts = 0
+        self.retry_at = 0.0
+
+
+class FunnelEventWriter:
+    """
+    Buffer funnel events per target table and insert them in columnar batches.
+
+    A table is flushed once it holds ``batch_size`` events or its oldest
+    event has waited ``flush_interval`` seconds, so MergeTree tables get a
+    few large parts instead of one per event. A failed insert is retried
+    with backoff up to ``retries`` times; events that still fail are
+    reported to callers waiting on them, counted, and kept in
+    ``recent_failures`` rather than dropped silently. When ``max_buffered``
+    events are pending, new ones are refused with ``WriterFull``.
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[], Any],
+        table_for: Callable[[FunnelEvent], str],
+        batch_size: int = 1000,
+        flush_interval: float = 1.0,
+        max_buffered: int = 100000,
+        retries: int = 3,
+        retry_backoff: float = 1.0,
+    ):
+        self.client_factory = client_factory
+        self.table_for = table_for
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+
+        self._client = None
+        self._buffers: Dict[str, List[Entry]] = {}
+        self._oldest: Dict[str, float] = {}
+        self._retrying: Deque[_Batch] = deque()
+        self._buffered = 0
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+        self.stats = {
+            "accepted": 0,
+            "written": 0,
+            "failed": 0,
+            "rejected": 0,
+            "batches": 0,
+            "retries": 0,
+            "last_error": None,
+        }
+        self.recent_failures: Deque[Dict[str, Any]] = deque(maxlen=100)
+
+    async def write(
+        self,
+        events: List[FunnelEvent],
+        wait: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Queue events for insertion.
+
+        With ``wait`` the call returns once every event was written or
+        finally failed, listing the failed event IDs.
+        """
+        if self._closing:
+            raise WriterFull("Writer is shutting down")
+        if self._buffered + len(events) > self.max_buffered:
+            self.stats["rejected"] += len(events)
+            raise WriterFull(f"{self._buffered} events already buffered")
+
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+        futures = []
+        for event in events:
+            future = loop.create_future() if wait else None
+            table = self.table_for(event)
+            buffer = self._buffers.setdefault(table, [])
+            if not buffer:
+                self._oldest[table] = now
+            buffer.append((self._to_row(event), future))
+            if future:
+                futures.append((event.event_id, future))
+            if len(buffer) >= self.batch_size:
+                self._wake.set()
+
+        self._buffered += len(events)
+        self.stats["accepted"] += len(events)
+
+        result: Dict[str, Any] = {"accepted": len(events)}
+        if wait:
+            outcomes = await asyncio.gather(*(future for _, future in futures))
+            failed = [event_id for (event_id, _), ok in zip(futures, outcomes) if not ok]
+            result.update({"written": len(events) - len(failed), "failed": failed})
+        return result
+
+    async def close(self, timeout: float = 30) -> None:
+        """Flush everything still buffered, then stop."""
+        self._closing = True
+        if self._task:
+            self._wake.set()
+            try:
+                await asyncio.wait_for(self._task, timeout=timeout)
+            except asyncio.TimeoutError:
+                self._task.cancel()
+                logger.error(f"Funnel event writer closed with {self._buffered} events unwritten")
+            self._task = None
+        if self._client:
+            try:
+                self._client.disconnect()
+            except Exception as e:
+                logger.warning(f"Error disconnecting ClickHouse client: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "buffered": self._buffered,
+            "buffered_by_table": {table: len(b) for table, b in self._buffers.items() if b},
+            "retrying_batches": len(self._retrying),
+            "recent_failures": list(self.recent_failures),
+        }
+
+    # ========== Flushing ==========
+
+    def _ensure_started(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self._next_due())
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+            await self._flush(force=self._closing)
+            if self._closing and not self._buffered:
+                return
+
+    def _next_due(self) -> float:
+        """Seconds until the oldest buffered event or next retry is due."""
+        now = time.monotonic()
+        due = [
+            started + self.flush_interval
+            for table, started in self._oldest.items()
+            if self._buffers.get(table)
+        ]
+        due += [batch.retry_at for batch in self._retrying]
+        return max(min(due, default=now + self.flush_interval) - now, 0.01)
+
+    async def _flush(self, force: bool = False) -> None:
+        now = time.monotonic()
+
+        for _ in range(len(self._retrying)):
+            batch = self._retrying.popleft()
+            if force or batch.retry_at <= now:
+                await self._insert(batch)
+            else:
+                self._retrying.append(batch)
+
+        for table, buffer in list(self._buffers.items()):
+            if not buffer:
+                continue
+            waited = now - self._oldest[table]
+            if not force and len(buffer) < self.batch_size and waited < self.flush_interval:
+                continue
+            while buffer:
+                entries = buffer[:self.batch_size]
+                del buffer[:self.batch_size]
+                await self._insert(_Batch(table, entries))
+            self._oldest.pop(table, None)
+
+    async def _insert(self, batch: _Batch) -> None:
+        # Columnar insert: one list per column instead of one tuple per row
+        columns = [list(column) for column in zip(*(row for row, _ in batch.entries))]
+        try:
+            if self._client is None:
+                self._client = self.client_factory()
+            await asyncio.to_thread(
+                self._client.execute,
+                f"INSERT INTO {batch.table} ({', '.join(EVENT_COLUMNS)}) VALUES",
+                columns,
+                columnar=True,
+            )
+        except Exception as e:
+            batch.attempts += 1
+            self.stats["last_error"] = str(e)
+            if batch.attempts <= self.retries and not self._closing:
+                self.stats["retries"] += 1
+                batch.retry_at = time.monotonic() + self.retry_backoff * (2 ** (batch.attempts - 1))
+                self._retrying.append(batch)
+                logger.warning(
+                    f"Insert of {len(batch.entries)} events into {batch.table} failed "
+                    f"(attempt {batch.attempts}), retrying: {e}"
+                )
+                return
+            self._finish(batch, ok=False, error=str(e))
+            return
+
+        self._finish(batch, ok=True)
+
+    def _finish(self, batch: _Batch, ok: bool, error: Optional[str] = None) -> None:
+        count = len(batch.entries)
+        self._buffered -= count
+        if ok:
+            self.stats["written"] += count
+            self.stats["batches"] += 1
+        else:
+            self.stats["failed"] += count
+            event_ids = [row[0] for row, _ in batch.entries]
+            self.recent_failures.append({
+                "table": batch.table,
+                "count": count,
+                "event_ids": event_ids[:100],
+                "error": error,
+                "failed_at": datetime.utcnow().isoformat(),
+            })
+            logger.error(f"Failed to write {count} funnel events to {batch.table}: {error}")
+
+        for _, future in batch.entries:
+            if future and not future.done():
+                future.set_result(ok)
+
+    @staticmethod
+    def _to_row(event: FunnelEvent) -> tuple:
+        return (
+            event.event_id,
+            event.team_id,
+            event.visitor_id,
+            event.event_type.value,
+            event.link_id,
+            event.page_slug,
+            event.campaign_id,
+            event.source,
+            event.medium,
+            event.device_type,
+            event.country,
+            event.timestamp,
+        )
@@ -3,9 +3,10 @@ import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from lnk_pipeline import pipeline_metrics
 
 from app.api import analytics, reports, export, schedules, tasks, retention, attribution
-from app.funnels import router as funnels
+from app.funnels import router as funnels, funnel_service
 from app.cohorts import router as cohorts
 from app.performance import router as performance
 from app.insights import router as insights
@@ -75,6 +76,8 @@ async def lifespan(app: FastAPI):
     logger.info("Task scheduler stopped")
     await scheduler_runner.stop()
     logger.info("Scheduler runner stopped")
+    await funnel_service.event_writer.close()
+    logger.info("Funnel event writer flushed")
 
 
 app = FastAPI(
@@ -107,6 +110,12 @@ app.include_router(performance, prefix="/api/v1/performance", tags=["performance
 app.include_router(insights, prefix="/api/v1/insights", tags=["insights"])
 
 
+@app.get("/metrics/pipelines")
+async def get_pipeline_metrics():
+    """Per-stage throughput and latency of the ingestion pipelines."""
+    return pipeline_metrics()
+
+
 @app.get("/health")
 async def health_check():
     return {
@@ -6,6 +6,7 @@ from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Any
 from enum import Enum
 from app.core.clickhouse import get_clickhouse_client
+from app.core.scope import EventScope
 
 
 class AttributionModel(str, Enum):
@@ -31,11 +32,12 @@ class AttributionService:
 
     def get_channel_attribution(
         self,
-        team_id: Optional[str],
+        team_id: str,
         start_date: datetime,
         end_date: datetime,
         model: AttributionModel = AttributionModel.LAST_TOUCH,
-        conversion_window_days: int = 30
+        conversion_window_days: int = 30,
+        link_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         渠道归因分析
@@ -48,34 +50,10 @@ class AttributionService:
         - time_decay: 越接近转化的接触点权重越高
         - position: 首末各40%，中间平分20%
         """
-        # 获取按访客分组的触点序列
-        touchpoints_query = """
-        SELECT
-            visitor_ip,
-            groupArray(tuple(
-                timestamp,
-                referrer,
-                CASE
-                    WHEN referrer = '' OR referrer IS NULL THEN 'direct'
-                    WHEN referrer LIKE '%google%' OR referrer LIKE '%bing%' OR referrer LIKE '%yahoo%' OR referrer LIKE '%baidu%' THEN 'organic_search'
-                    WHEN referrer LIKE '%facebook%' OR referrer LIKE '%twitter%' OR referrer LIKE '%linkedin%' OR referrer LIKE '%instagram%' THEN 'social'
-                    WHEN referrer LIKE '%email%' OR referrer LIKE '%mail%' OR referrer LIKE '%newsletter%' THEN 'email'
-                    WHEN utm_source != '' THEN concat('campaign_', utm_source)
-                    ELSE 'referral'
-                END as channel
-            )) as touchpoints,
-            count() as total_clicks
-        FROM link_events
-        WHERE timestamp >= %(start_date)s
-          AND timestamp <= %(end_date)s
-        GROUP BY visitor_ip
-        HAVING total_clicks >= 1
-        ORDER BY total_clicks DESC
-        LIMIT 10000
-        """
+        scope = EventScope(team_id, start_date, end_date, link_id)
 
         # 简化版：直接按渠道统计
-        channel_query = """
+        channel_query = f"""
         SELECT
             CASE
                 WHEN referrer = '' OR referrer IS NULL THEN 'direct'
@@ -87,15 +65,14 @@ class AttributionService:
             count() as clicks,
             uniq(visitor_ip) as unique_visitors
         FROM link_events
-        WHERE timestamp >= %(start_date)s
-          AND timestamp <= %(end_date)s
+        WHERE {scope.in_range()}
         GROUP BY channel
         ORDER BY clicks DESC
         """
 
         result = self.client.execute(
             channel_query,
-            {"start_date": start_date, "end_date": end_date}
+            scope.params()
         )
 
         total_clicks = sum(row[1] for row in result)
@@ -133,16 +110,19 @@ class AttributionService:
 
     def get_campaign_attribution(
         self,
-        team_id: Optional[str],
+        team_id: str,
         start_date: datetime,
         end_date: datetime,
-        model: AttributionModel = AttributionModel.LAST_TOUCH
+        model: AttributionModel = AttributionModel.LAST_TOUCH,
+        link_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         营销活动归因分析
         分析各营销活动的转化贡献
         """
-        query = """
+        scope = EventScope(team_id, start_date, end_date, link_id)
+
+        query = f"""
         SELECT
             utm_campaign,
             utm_source,
@@ -152,8 +132,7 @@ class AttributionService:
             min(timestamp) as first_click,
             max(timestamp) as last_click
         FROM link_events
-        WHERE timestamp >= %(start_date)s
-          AND timestamp <= %(end_date)s
+        WHERE {scope.in_range()}
           AND (utm_campaign != '' OR utm_source != '' OR utm_medium != '')
         GROUP BY utm_campaign, utm_source, utm_medium
         ORDER BY clicks DESC
@@ -162,7 +141,7 @@ class AttributionService:
 
         result = self.client.execute(
             query,
-            {"start_date": start_date, "end_date": end_date}
+            scope.params()
         )
 
         total_clicks = sum(row[3] for row in result)
@@ -203,16 +182,19 @@ class AttributionService:
 
     def get_touchpoint_analysis(
         self,
-        team_id: Optional[str],
+        team_id: str,
         start_date: datetime,
-        end_date: datetime
+        end_date: datetime,
+        link_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         触点路径分析
         分析用户的典型转化路径
         """
+        scope = EventScope(team_id, start_date, end_date, link_id)
+
         # 获取用户的触点序列
-        path_query = """
+        path_query = f"""
         SELECT
             visitor_ip,
             groupArray(
@@ -224,8 +206,7 @@ class AttributionService:
                 END
             ) as path
         FROM link_events
-        WHERE timestamp >= %(start_date)s
-          AND timestamp <= %(end_date)s
+        WHERE {scope.in_range()}
         GROUP BY visitor_ip
         HAVING length(path) >= 2
         ORDER BY length(path) DESC
@@ -234,7 +215,7 @@ class AttributionService:
 
         result = self.client.execute(
             path_query,
-            {"start_date": start_date, "end_date": end_date}
+            scope.params()
         )
 
         # 分析常见路径
@@ -251,7 +232,7 @@ class AttributionService:
         top_paths = sorted(path_counts.items(), key=lambda x: x[1], reverse=True)[:20]
 
         # 触点位置分析
-        position_query = """
+        position_query = f"""
         WITH ranked_events AS (
             SELECT
                 visitor_ip,
@@ -264,8 +245,7 @@ class AttributionService:
                 row_number() OVER (PARTITION BY visitor_ip ORDER BY timestamp) as position,
                 count() OVER (PARTITION BY visitor_ip) as total_touches
             FROM link_events
-            WHERE timestamp >= %(start_date)s
-              AND timestamp <= %(end_date)s
+            WHERE {scope.in_range()}
         )
         SELECT
             channel,
@@ -280,7 +260,7 @@ class AttributionService:
 
         position_result = self.client.execute(
             position_query,
-            {"start_date": start_date, "end_date": end_date}
+            scope.params()
         )
 
         position_analysis = []
@@ -296,20 +276,19 @@ class AttributionService:
             })
 
         # 平均路径长度
-        avg_path_query = """
+        avg_path_query = f"""
         SELECT avg(touch_count) as avg_path_length
         FROM (
             SELECT visitor_ip, count() as touch_count
             FROM link_events
-            WHERE timestamp >= %(start_date)s
-              AND timestamp <= %(end_date)s
+            WHERE {scope.in_range()}
             GROUP BY visitor_ip
         )
         """
 
         avg_result = self.client.execute(
             avg_path_query,
-            {"start_date": start_date, "end_date": end_date}
+            scope.params()
         )
 
         return {
@@ -324,21 +303,23 @@ class AttributionService:
 
     def get_assisted_conversions(
         self,
-        team_id: Optional[str],
+        team_id: str,
         start_date: datetime,
-        end_date: datetime
+        end_date: datetime,
+        link_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         辅助转化分析
         分析各渠道作为辅助触点的贡献
         """
+        scope = EventScope(team_id, start_date, end_date, link_id)
+
         # 分析多触点用户中各渠道的角色
-        query = """
+        query = f"""
         WITH multi_touch_visitors AS (
             SELECT visitor_ip
             FROM link_events
-            WHERE timestamp >= %(start_date)s
-              AND timestamp <= %(end_date)s
+            WHERE {scope.in_range()}
             GROUP BY visitor_ip
             HAVING count() >= 2
         ),
@@ -355,8 +336,7 @@ class AttributionService:
                 count() OVER (PARTITION BY e.visitor_ip) as total
             FROM link_events e
             INNER JOIN multi_touch_visitors mv ON e.visitor_ip = mv.visitor_ip
-            WHERE e.timestamp >= %(start_date)s
-              AND e.timestamp <= %(end_date)s
+            WHERE {scope.in_range(alias="e")}
         )
         SELECT
             channel,
@@ -371,7 +351,7 @@ class AttributionService:
 
         result = self.client.execute(
             query,
-            {"start_date": start_date, "end_date": end_date}
+            scope.params()
         )
 
         channels = []
@@ -402,17 +382,20 @@ class AttributionService:
 
     def get_multi_touch_attribution(
         self,
-        team_id: Optional[str],
+        team_id: str,
         start_date: datetime,
         end_date: datetime,
-        model: AttributionModel = AttributionModel.LINEAR
+        model: AttributionModel = AttributionModel.LINEAR,
+        link_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         多触点归因分析
         使用指定模型计算每个渠道的归因贡献值
         """
+        scope = EventScope(team_id, start_date, end_date, link_id)
+
         # 获取多触点访客的完整路径
-        query = """
+        query = f"""
         SELECT
             visitor_ip,
             groupArray(tuple(
@@ -426,15 +409,14 @@ class AttributionService:
                 END
             )) as touchpoints
         FROM link_events
-        WHERE timestamp >= %(start_date)s
-          AND timestamp <= %(end_date)s
+        WHERE {scope.in_range()}
         GROUP BY visitor_ip
         HAVING length(touchpoints) >= 1
         """
 
         result = self.client.execute(
             query,
-            {"start_date": start_date, "end_date": end_date}
+            scope.params()
         )
 
         # 按模型计算归因
@@ -473,9 +455,10 @@ class AttributionService:
 
     def compare_attribution_models(
         self,
-        team_id: Optional[str],
+        team_id: str,
         start_date: datetime,
-        end_date: datetime
+        end_date: datetime,
+        link_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         对比不同归因模型的结果
@@ -493,7 +476,8 @@ class AttributionService:
                 team_id=team_id,
                 start_date=start_date,
                 end_date=end_date,
-                model=model
+                model=model,
+                link_id=link_id
             )
             comparison[model.value] = result["attribution"]
 
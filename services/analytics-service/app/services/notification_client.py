@@ -107,6 +107,45 @@ class NotificationClient:
 
         return sent_count
 
+    async def send_funnel_alert_email(
+        self,
+        recipients: List[str],
+        alert: dict,
+    ) -> int:
+        """
+        发送漏斗告警邮件
+
+        Args:
+            recipients: 收件人列表
+            alert: FunnelService.check_alerts 返回的告警
+
+        Returns:
+            成功发送的邮件数量
+        """
+        sent_count = 0
+
+        for recipient in recipients:
+            try:
+                success = await self._send_email(
+                    to=recipient,
+                    subject=f"漏斗告警 - {alert['funnel_name']}",
+                    template="funnel-alert",
+                    data={
+                        "funnel_name": alert["funnel_name"],
+                        "metric": alert["metric"],
+                        "operator": alert["operator"],
+                        "threshold": alert["threshold"],
+                        "current_value": alert["current_value"],
+                        "triggered_at": self._get_current_time_str(),
+                    },
+                )
+                if success:
+                    sent_count += 1
+            except Exception as e:
+                logger.error(f"Failed to send funnel alert email to {recipient}: {e}")
+
+        return sent_count
+
     async def _send_email(
         self,
         to: str,
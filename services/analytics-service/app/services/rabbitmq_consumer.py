@@ -1,10 +1,10 @@
 import json
-import asyncio
 import logging
-from datetime import datetime
-from typing import Optional, Callable, Dict, Any
+import uuid
+from typing import Optional, Dict, Any, List
 import aio_pika
 from aio_pika import IncomingMessage
+from lnk_pipeline import ClickHouseSink, Pipeline, RabbitMQSource, normalize_click
 
 from app.core.config import settings
 from app.core.clickhouse import get_clickhouse_client
@@ -26,18 +26,74 @@ LINK_UPDATED_KEY = "link.updated"
 LINK_DELETED_KEY = "link.deleted"
 
 
+LINK_EVENT_COLUMNS = [
+    "event_id", "event_type", "link_id", "team_id", "user_id", "timestamp",
+    "visitor_ip", "country", "city", "device_type", "os", "browser",
+    "referrer", "utm_source", "utm_medium", "utm_campaign",
+]
+
+
+def decode_click_message(body: bytes) -> List[Dict[str, Any]]:
+    """Unwrap ``click.recorded`` (one click) and ``click.batch`` (many) envelopes."""
+    message = json.loads(body)
+    event_type = message.get("type", "")
+    data = message.get("data", {})
+
+    if event_type == CLICK_RECORDED_KEY:
+        return [data]
+    if event_type == CLICK_BATCH_KEY:
+        return data.get("clicks", [])
+    return []
+
+
+def to_link_event_row(click: Dict[str, Any]) -> tuple:
+    return (
+        click.get("id") or str(uuid.uuid4()),
+        "click",  # Enum value
+        click.get("link_id", ""),
+        click.get("team_id", ""),  # Team isolation
+        "",  # user_id: not available from redirect-service
+        click["timestamp"],
+        click.get("ip", ""),
+        click.get("country") or "Unknown",
+        click.get("city", ""),
+        click.get("device", ""),
+        click.get("os", ""),
+        click.get("browser", ""),
+        click.get("referer", ""),
+        click.get("utm_source", ""),
+        click.get("utm_medium", ""),
+        click.get("utm_campaign", ""),
+    )
+
+
 class RabbitMQConsumer:
     def __init__(self):
         self.connection: Optional[aio_pika.Connection] = None
         self.channel: Optional[aio_pika.Channel] = None
         self.clickhouse = get_clickhouse_client()
-        self.batch = []
-        self.batch_size = 100
-        self.flush_interval = 5  # seconds
+        self.pipeline = Pipeline(
+            "analytics-rabbitmq-clicks",
+            RabbitMQSource(
+                settings.RABBITMQ_URL,
+                ANALYTICS_CLICK_EVENTS_QUEUE,
+                bindings=[
+                    (CLICK_EVENTS_EXCHANGE, CLICK_RECORDED_KEY),
+                    (CLICK_EVENTS_EXCHANGE, CLICK_BATCH_KEY),
+                ],
+            ),
+            ClickHouseSink(self.clickhouse, "link_events", LINK_EVENT_COLUMNS, to_link_event_row),
+            decode=decode_click_message,
+            enrich=[normalize_click],
+            batch_size=settings.PIPELINE_BATCH_SIZE,
+            flush_interval=settings.PIPELINE_FLUSH_INTERVAL_SECONDS,
+            queue_size=settings.PIPELINE_QUEUE_SIZE,
+            sink_retries=settings.PIPELINE_SINK_RETRIES,
+        )
         self._running = False
 
     async def connect(self) -> bool:
-        """Connect to RabbitMQ"""
+        """Connect to RabbitMQ for link events (click events go through the pipeline)"""
         try:
             self.connection = await aio_pika.connect_robust(
                 settings.RABBITMQ_URL,
@@ -46,26 +102,12 @@ class RabbitMQConsumer:
             self.channel = await self.connection.channel()
             await self.channel.set_qos(prefetch_count=100)
 
-            # Declare exchanges
-            click_exchange = await self.channel.declare_exchange(
-                CLICK_EVENTS_EXCHANGE,
-                aio_pika.ExchangeType.TOPIC,
-                durable=True,
-            )
             link_exchange = await self.channel.declare_exchange(
                 LINK_EVENTS_EXCHANGE,
                 aio_pika.ExchangeType.TOPIC,
                 durable=True,
             )
 
-            # Declare and bind click events queue
-            click_queue = await self.channel.declare_queue(
-                ANALYTICS_CLICK_EVENTS_QUEUE,
-                durable=True,
-            )
-            await click_queue.bind(click_exchange, CLICK_RECORDED_KEY)
-            await click_queue.bind(click_exchange, CLICK_BATCH_KEY)
-
             # Declare and bind link events queue
             link_queue = await self.channel.declare_queue(
                 ANALYTICS_LINK_EVENTS_QUEUE,
@@ -90,16 +132,6 @@ class RabbitMQConsumer:
 
         self._running = True
 
-        # Start periodic flush task
-        asyncio.create_task(self._periodic_flush())
-
-        # Start consuming click events
-        click_queue = await self.channel.declare_queue(
-            ANALYTICS_CLICK_EVENTS_QUEUE,
-            durable=True,
-        )
-        await click_queue.consume(self._on_click_event)
-
         # Start consuming link events
         link_queue = await self.channel.declare_queue(
             ANALYTICS_LINK_EVENTS_QUEUE,
@@ -109,13 +141,18 @@ class RabbitMQConsumer:
 
         logger.info("RabbitMQ consumer started consuming messages")
 
+        # Click events: runs until stopped
+        try:
+            await self.pipeline.run()
+        except Exception as e:
+            logger.error(f"Click event pipeline failed: {e}")
+
     async def stop(self):
         """Stop the consumer"""
         self._running = False
 
-        # Flush remaining batch
-        if self.batch:
-            await self._flush_batch()
+        # Drain in-flight click events
+        await self.pipeline.stop()
 
         if self.channel:
             await self.channel.close()
@@ -124,23 +161,6 @@ class RabbitMQConsumer:
 
         logger.info("RabbitMQ consumer stopped")
 
-    async def _on_click_event(self, message: IncomingMessage):
-        """Handle click event messages"""
-        async with message.process():
-            try:
-                body = json.loads(message.body.decode())
-                event_type = body.get("type", "")
-
-                if event_type == "click.recorded":
-                    await self._process_click(body.get("data", {}))
-                elif event_type == "click.batch":
-                    clicks = body.get("data", {}).get("clicks", [])
-                    for click in clicks:
-                        await self._process_click(click)
-
-            except Exception as e:
-                logger.error(f"Failed to process click event: {e}")
-
     async def _on_link_event(self, message: IncomingMessage):
         """Handle link event messages"""
         async with message.process():
@@ -161,74 +181,6 @@ class RabbitMQConsumer:
             except Exception as e:
                 logger.error(f"Failed to process link event: {e}")
 
-    async def _process_click(self, click_data: Dict[str, Any]):
-        """Add click to batch for processing"""
-        self.batch.append(click_data)
-
-        if len(self.batch) >= self.batch_size:
-            await self._flush_batch()
-
-    async def _periodic_flush(self):
-        """Periodically flush the batch"""
-        while self._running:
-            await asyncio.sleep(self.flush_interval)
-            if self.batch:
-                await self._flush_batch()
-
-    async def _flush_batch(self):
-        """Flush batch to ClickHouse"""
-        if not self.batch:
-            return
-
-        batch_to_insert = self.batch.copy()
-        self.batch = []
-
-        try:
-            data = []
-            for event in batch_to_insert:
-                timestamp = event.get("timestamp")
-                if isinstance(timestamp, str):
-                    try:
-                        timestamp = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
-                    except ValueError:
-                        timestamp = datetime.utcnow()
-
-                import uuid
-                data.append({
-                    "event_id": event.get("id", str(uuid.uuid4())),
-                    "event_type": "click",  # Enum value
-                    "link_id": event.get("linkId", ""),
-                    "team_id": event.get("teamId", ""),  # Team isolation
-                    "user_id": "",  # Not available from redirect-service
-                    "timestamp": timestamp,
-                    "visitor_ip": event.get("ip", ""),
-                    "country": event.get("country", "Unknown"),
-                    "city": event.get("city", ""),
-                    "device_type": event.get("device", ""),
-                    "os": event.get("os", ""),
-                    "browser": event.get("browser", ""),
-                    "referrer": event.get("referer", ""),
-                    "utm_source": event.get("utmSource", ""),
-                    "utm_medium": event.get("utmMedium", ""),
-                    "utm_campaign": event.get("utmCampaign", ""),
-                })
-
-            self.clickhouse.execute(
-                """
-                INSERT INTO link_events (event_id, event_type, link_id, team_id, user_id, timestamp,
-                                         visitor_ip, country, city, device_type, os, browser,
-                                         referrer, utm_source, utm_medium, utm_campaign)
-                VALUES
-                """,
-                data,
-            )
-            logger.info(f"Flushed {len(batch_to_insert)} click events to ClickHouse")
-
-        except Exception as e:
-            logger.error(f"Failed to flush batch to ClickHouse: {e}")
-            # Re-add failed items back to batch
-            self.batch = batch_to_insert + self.batch
-
     async def _handle_link_created(self, data: Dict[str, Any]):
         """Handle link created event - update link metadata cache"""
         link_id = data.get("linkId")
@@ -2,83 +2,281 @@
 用户留存分析服务
 提供群组分析、留存率计算、用户行为分析等功能
 """
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Any
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
 from app.core.clickhouse import get_clickhouse_client
+from app.core.config import settings
+from app.core.scope import EventScope
+
+# 流失分析最多观察 end_date 之后的天数（与 API 的 churn_days 上限一致）
+RETURN_WINDOW_DAYS = 90
+
+FREQUENCY_BUCKETS = ["1 visit", "2-3 visits", "4-10 visits", "11-25 visits", "26+ visits"]
+RECENCY_BUCKETS = [
+    "Today/Yesterday", "Last 7 days", "Last 14 days", "Last 30 days",
+    "Last 60 days", "Last 90 days", "Over 90 days",
+]
+LIFECYCLE_STAGES = ["New", "Active", "Engaged", "At Risk", "Dormant", "Churned"]
+
+
+def _start_of_week(day: date) -> date:
+    # 与 ClickHouse toStartOfWeek 默认模式一致：周日为一周开始
+    return day - timedelta(days=(day.weekday() + 1) % 7)
+
+
+# 群组粒度 -> 与原 toStartOfDay / toStartOfWeek / toStartOfMonth 相同的取值
+COHORT_BUCKETS: Dict[str, Callable[[date], Any]] = {
+    "day": lambda day: datetime.combine(day, datetime.min.time()),
+    "week": _start_of_week,
+    "month": lambda day: day.replace(day=1),
+}
 
 
 class RetentionService:
     """用户留存分析服务"""
 
     def __init__(self):
-        pass
+        # (种类, team_id, ...) -> (过期时间, 数据)
+        self._snapshots: Dict[tuple, Tuple[float, Any]] = {}
 
     @property
     def client(self):
         """Get a fresh ClickHouse client for each request"""
         return get_clickhouse_client()
 
-    def get_cohort_analysis(
+    # ========== 留存快照 ==========
+
+    def get_snapshot(
         self,
-        team_id: Optional[str],
+        team_id: str,
         start_date: datetime,
         end_date: datetime,
-        cohort_size: str = "week",  # day, week, month
-        retention_periods: int = 8
-    ) -> Dict[str, Any]:
+        link_id: Optional[str] = None
+    ) -> List[tuple]:
         """
-        群组留存分析
-        按首次访问时间将用户分组，分析各群组的回访留存情况
+        时间段内访客的汇总快照，一次扫描 link_events 得到
+
+        每个访客汇总为：段内首次访问日、活跃日期、访问次数档位、
+        是否老访客（首次访问早于 start_date）、end_date 之后第几天回访
+        （0 表示 RETURN_WINDOW_DAYS 内未回访）。行为相同的访客合并为一行，
+        返回 (first_day, active_days, is_returning, frequency, return_days,
+        visitors, visits)。群组、留存率、新老访客、频率、流失均由此推导，
+        按 (team, link, 时间段) 缓存 RETENTION_SNAPSHOT_CACHE_SECONDS 秒。
+        时间取整到分钟，使同一页面的并发请求命中同一份快照。
+        """
+        scope = EventScope(
+            team_id,
+            start_date.replace(second=0, microsecond=0),
+            end_date.replace(second=0, microsecond=0),
+            link_id,
+        )
+        return self._cached(("visitors", *scope.key), lambda: self._query_snapshot(scope))
+
+    def _query_snapshot(self, scope: EventScope) -> List[tuple]:
+        # 段内汇总与 end_date 之后的回访取自同一次 link_events 扫描。
+        # visitor_first_seen 只查段内出现过的访客，JOIN 右表因此不含团队的全部访客；
+        # 查不到首次访问的访客（如物化视图尚未写入）按新访客计
+        in_range = scope.in_range()
+        scanned = scope.events(
+            "timestamp >= %(start_date)s",
+            f"timestamp <= %(end_date)s + INTERVAL {RETURN_WINDOW_DAYS} DAY",
+        )
+        query = f"""
+        SELECT
+            v.first_day,
+            v.active_days,
+            fv.visitor_id != '' AND fv.first_visit < %(start_date)s as is_returning,
+            multiIf(
+                v.visits = 1, '1 visit',
+                v.visits <= 3, '2-3 visits',
+                v.visits <= 10, '4-10 visits',
+                v.visits <= 25, '11-25 visits',
+                '26+ visits'
+            ) as frequency,
+            v.return_days,
+            count() as visitors,
+            sum(v.visits) as total_visits
+        FROM (
+            SELECT
+                visitor_ip,
+                minIf(toDate(timestamp), timestamp <= %(end_date)s) as first_day,
+                arraySort(groupUniqArrayIf(toDate(timestamp), timestamp <= %(end_date)s))
+                    as active_days,
+                countIf(timestamp <= %(end_date)s) as visits,
+                if(
+                    visits = count(),
+                    0,
+                    toUInt16(ceil(dateDiff(
+                        'second', %(end_date)s, minIf(timestamp, timestamp > %(end_date)s)
+                    ) / 86400))
+                ) as return_days
+            FROM link_events
+            WHERE {scanned}
+            GROUP BY visitor_ip
+            HAVING visits > 0
+        ) v
+        LEFT JOIN (
+            SELECT visitor_id, min(first_seen) as first_visit
+            FROM visitor_first_seen
+            WHERE {scope.visitors(
+                f"visitor_id IN (SELECT visitor_ip FROM link_events WHERE {in_range})"
+            )}
+            GROUP BY visitor_id
+        ) fv ON v.visitor_ip = fv.visitor_id
+        GROUP BY v.first_day, v.active_days, is_returning, frequency, v.return_days
         """
-        # 根据 cohort_size 确定时间粒度
-        granularity_map = {
-            "day": "toStartOfDay",
-            "week": "toStartOfWeek",
-            "month": "toStartOfMonth"
-        }
-        granularity_fn = granularity_map.get(cohort_size, "toStartOfWeek")
 
-        # 获取用户首次访问时间（群组）
-        cohort_query = f"""
-        WITH first_visits AS (
+        return self.client.execute(query, scope.params())
+
+    def get_population(
+        self,
+        team_id: str,
+        end_date: datetime,
+        link_id: Optional[str] = None
+    ) -> List[tuple]:
+        """
+        截至 end_date 的全部访客按 (生命周期阶段, 最近访问档位) 汇总，
+        返回 (lifecycle_stage, recency_bucket, users, visits)，
+        供生命周期与最近活跃度分析共用
+        """
+        scope = EventScope(
+            team_id, end_date=end_date.replace(second=0, microsecond=0), link_id=link_id
+        )
+        return self._cached(("population", *scope.key), lambda: self._query_population(scope))
+
+    def _query_population(self, scope: EventScope) -> List[tuple]:
+        # 首次/最近访问和访问次数取自 visitor_first_seen（截至当前）。
+        # end_date 早于今天时，扣除其后的访问，并在 end_date 前 90 天内
+        # 重新取最近访问（二者同一次扫描）；更早的都归为 Churned，无需精确时间。
+        # 生命周期与最近活跃度面向截至 end_date 的全部访客，而非时间段内的访客，
+        # 所以不能由快照推导
+        # visitor_first_seen 不区分链接，单链接只能直接汇总该链接的事件
+        if scope.link_id:
+            user_activity = f"""
             SELECT
                 visitor_ip,
-                {granularity_fn}(min(timestamp)) as cohort_date
+                toDateTime(min(timestamp)) as first_visit,
+                toDateTime(max(timestamp)) as last_visit,
+                count() as total_visits
             FROM link_events
-            WHERE timestamp >= %(start_date)s
-              AND timestamp <= %(end_date)s
+            WHERE {scope.events("timestamp <= %(end_date)s")}
             GROUP BY visitor_ip
-        ),
-        return_visits AS (
+            """
+        elif scope.end_date.date() < datetime.now().date():
+            user_activity = f"""
             SELECT
-                e.visitor_ip,
-                fv.cohort_date,
-                {granularity_fn}(e.timestamp) as visit_date
-            FROM link_events e
-            INNER JOIN first_visits fv ON e.visitor_ip = fv.visitor_ip
-            WHERE e.timestamp >= %(start_date)s
-              AND e.timestamp <= %(end_date)s
-        )
+                s.visitor_id as visitor_ip,
+                s.seen_first as first_visit,
+                if(s.seen_last <= %(end_date)s, s.seen_last, a.recent_visit) as last_visit,
+                s.seen_events - a.later_visits as total_visits
+            FROM (
+                SELECT
+                    visitor_id,
+                    min(first_seen) as seen_first,
+                    max(last_seen) as seen_last,
+                    sum(events) as seen_events
+                FROM visitor_first_seen
+                WHERE {scope.visitors()}
+                GROUP BY visitor_id
+                HAVING seen_first <= %(end_date)s
+            ) s
+            LEFT JOIN (
+                SELECT
+                    visitor_ip,
+                    countIf(timestamp > %(end_date)s) as later_visits,
+                    toDateTime(maxIf(timestamp, timestamp <= %(end_date)s)) as recent_visit
+                FROM link_events
+                WHERE {scope.events("timestamp > %(end_date)s - INTERVAL 90 DAY")}
+                GROUP BY visitor_ip
+            ) a ON s.visitor_id = a.visitor_ip
+            """
+        else:
+            user_activity = f"""
+            SELECT
+                visitor_id as visitor_ip,
+                min(first_seen) as first_visit,
+                max(last_seen) as last_visit,
+                sum(events) as total_visits
+            FROM visitor_first_seen
+            WHERE {scope.visitors()}
+            GROUP BY visitor_id
+            """
+
+        query = f"""
+        WITH user_activity AS ({user_activity})
         SELECT
-            cohort_date,
-            visit_date,
-            uniq(visitor_ip) as users
-        FROM return_visits
-        GROUP BY cohort_date, visit_date
-        ORDER BY cohort_date, visit_date
+            CASE
+                WHEN dateDiff('day', first_visit, %(end_date)s) <= 7 THEN 'New'
+                WHEN dateDiff('day', last_visit, %(end_date)s) <= 7 THEN 'Active'
+                WHEN dateDiff('day', last_visit, %(end_date)s) <= 30 THEN 'Engaged'
+                WHEN dateDiff('day', last_visit, %(end_date)s) <= 60 THEN 'At Risk'
+                WHEN dateDiff('day', last_visit, %(end_date)s) <= 90 THEN 'Dormant'
+                ELSE 'Churned'
+            END as lifecycle_stage,
+            CASE
+                WHEN dateDiff('day', last_visit, %(end_date)s) <= 1 THEN 'Today/Yesterday'
+                WHEN dateDiff('day', last_visit, %(end_date)s) <= 7 THEN 'Last 7 days'
+                WHEN dateDiff('day', last_visit, %(end_date)s) <= 14 THEN 'Last 14 days'
+                WHEN dateDiff('day', last_visit, %(end_date)s) <= 30 THEN 'Last 30 days'
+                WHEN dateDiff('day', last_visit, %(end_date)s) <= 60 THEN 'Last 60 days'
+                WHEN dateDiff('day', last_visit, %(end_date)s) <= 90 THEN 'Last 90 days'
+                ELSE 'Over 90 days'
+            END as recency_bucket,
+            count() as users,
+            sum(total_visits) as visits
+        FROM user_activity
+        GROUP BY lifecycle_stage, recency_bucket
         """
 
-        result = self.client.execute(
-            cohort_query,
-            {"start_date": start_date, "end_date": end_date}
-        )
+        return self.client.execute(query, scope.params())
+
+    def _cached(self, key: tuple, load: Callable[[], Any]) -> Any:
+        now = time.monotonic()
+        entry = self._snapshots.get(key)
+        if entry and entry[0] > now:
+            return entry[1]
+
+        data = load()
+        # 顺带清理过期快照，缓存大小受限于活跃的 (team, 时间段)
+        for old in [k for k, (expiry, _) in self._snapshots.items() if expiry <= now]:
+            del self._snapshots[old]
+        self._snapshots[key] = (now + settings.RETENTION_SNAPSHOT_CACHE_SECONDS, data)
+        return data
+
+    # ========== 留存分析 ==========
+
+    def get_cohort_analysis(
+        self,
+        team_id: str,
+        start_date: datetime,
+        end_date: datetime,
+        cohort_size: str = "week",  # day, week, month
+        retention_periods: int = 8,
+        link_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        群组留存分析
+        按首次访问时间将用户分组，分析各群组的回访留存情况
+        """
+        # 根据 cohort_size 确定时间粒度
+        bucket = COHORT_BUCKETS.get(cohort_size, COHORT_BUCKETS["week"])
+
+        # 按 (群组, 访问周期) 统计用户数，每个用户在同一周期只计一次
+        users_by_cell: Dict[tuple, int] = defaultdict(int)
+        snapshot = self.get_snapshot(team_id, start_date, end_date, link_id)
+        for first_day, active_days, _, _, _, visitors, _ in snapshot:
+            cohort_date = bucket(first_day)
+            for visit_date in {bucket(day) for day in active_days}:
+                users_by_cell[(cohort_date, visit_date)] += visitors
 
         # 处理结果，构建群组留存矩阵
         cohorts: Dict[str, Dict] = {}
-        for row in result:
-            cohort_date = str(row[0])
-            visit_date = str(row[1])
-            users = row[2]
+        for (cohort_key, visit_key), users in sorted(users_by_cell.items()):
+            cohort_date = str(cohort_key)
+            visit_date = str(visit_key)
 
             if cohort_date not in cohorts:
                 cohorts[cohort_date] = {"cohort_date": cohort_date, "periods": {}}
@@ -130,49 +328,25 @@ class RetentionService:
 
     def get_user_retention_rate(
         self,
-        team_id: Optional[str],
+        team_id: str,
         start_date: datetime,
         end_date: datetime,
-        period_days: int = 7
+        period_days: int = 7,
+        link_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         计算指定时间段的用户留存率
         返回各周期的留存率
         """
-        # 计算各周期的留存用户数
-        retention_query = """
-        WITH first_visit AS (
-            SELECT
-                visitor_ip,
-                min(timestamp) as first_time
-            FROM link_events
-            WHERE timestamp >= %(start_date)s
-              AND timestamp <= %(end_date)s
-            GROUP BY visitor_ip
-        )
-        SELECT
-            floor(dateDiff('day', fv.first_time, e.timestamp) / %(period_days)s) as period,
-            uniq(e.visitor_ip) as users
-        FROM link_events e
-        INNER JOIN first_visit fv ON e.visitor_ip = fv.visitor_ip
-        WHERE e.timestamp >= %(start_date)s
-          AND e.timestamp <= %(end_date)s
-        GROUP BY period
-        HAVING period >= 0 AND period <= 12
-        ORDER BY period
-        """
-
-        result = self.client.execute(
-            retention_query,
-            {
-                "start_date": start_date,
-                "end_date": end_date,
-                "period_days": period_days
-            }
-        )
+        # 计算各周期的留存用户数：周期 = 距首次访问天数 // period_days
+        periods_data: Dict[int, int] = defaultdict(int)
+        snapshot = self.get_snapshot(team_id, start_date, end_date, link_id)
+        for first_day, active_days, _, _, _, visitors, _ in snapshot:
+            for period in {(day - first_day).days // period_days for day in active_days}:
+                if period <= 12:
+                    periods_data[period] += visitors
 
         # 构建留存数据
-        periods_data = {int(row[0]): row[1] for row in result}
         initial_users = periods_data.get(0, 0)
 
         retention_data = []
@@ -198,79 +372,33 @@ class RetentionService:
 
     def get_returning_vs_new_visitors(
         self,
-        team_id: Optional[str],
+        team_id: str,
         start_date: datetime,
-        end_date: datetime
+        end_date: datetime,
+        link_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         分析新访客 vs 回访访客
         """
-        # 查询：在时间段内访问的用户，区分新老用户
-        query = """
-        WITH period_visitors AS (
-            SELECT visitor_ip, min(timestamp) as first_visit_in_period
-            FROM link_events
-            WHERE timestamp >= %(start_date)s
-              AND timestamp <= %(end_date)s
-            GROUP BY visitor_ip
-        ),
-        historical_visitors AS (
-            SELECT DISTINCT visitor_ip
-            FROM link_events
-            WHERE timestamp < %(start_date)s
-        )
-        SELECT
-            CASE
-                WHEN hv.visitor_ip IS NOT NULL THEN 'returning'
-                ELSE 'new'
-            END as visitor_type,
-            count() as count
-        FROM period_visitors pv
-        LEFT JOIN historical_visitors hv ON pv.visitor_ip = hv.visitor_ip
-        GROUP BY visitor_type
-        """
-
-        result = self.client.execute(
-            query,
-            {"start_date": start_date, "end_date": end_date}
-        )
-
         visitors = {"new": 0, "returning": 0}
-        for row in result:
-            visitors[row[0]] = row[1]
+        daily: Dict[date, Dict[str, int]] = defaultdict(lambda: {"new": 0, "returning": 0})
+        snapshot = self.get_snapshot(team_id, start_date, end_date, link_id)
+        for _, active_days, is_returning, _, _, count, _ in snapshot:
+            visitor_type = "returning" if is_returning else "new"
+            visitors[visitor_type] += count
+            # 获取按天的新老访客分布
+            for day in active_days:
+                daily[day][visitor_type] += count
 
         total = visitors["new"] + visitors["returning"]
 
-        # 获取按天的新老访客分布
-        daily_query = """
-        WITH historical_visitors AS (
-            SELECT DISTINCT visitor_ip
-            FROM link_events
-            WHERE timestamp < %(start_date)s
-        )
-        SELECT
-            toDate(timestamp) as date,
-            uniqIf(visitor_ip, visitor_ip NOT IN (SELECT visitor_ip FROM historical_visitors)) as new_visitors,
-            uniqIf(visitor_ip, visitor_ip IN (SELECT visitor_ip FROM historical_visitors)) as returning_visitors
-        FROM link_events
-        WHERE timestamp >= %(start_date)s
-          AND timestamp <= %(end_date)s
-        GROUP BY date
-        ORDER BY date
-        """
-
-        daily_result = self.client.execute(
-            daily_query,
-            {"start_date": start_date, "end_date": end_date}
-        )
-
         daily_data = [
             {
-                "date": str(row[0]),
-                "new": row[1],
-                "returning": row[2]
+                "date": str(day),
+                "new": counts["new"],
+                "returning": counts["returning"]
             }
-            for row in daily_result
+            for day, counts in sorted(daily.items())
         ]
 
         return {
@@ -286,131 +414,61 @@ class RetentionService:
 
     def get_visitor_frequency(
         self,
-        team_id: Optional[str],
+        team_id: str,
         start_date: datetime,
-        end_date: datetime
+        end_date: datetime,
+        link_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         访问频率分析
         分析用户的访问次数分布
         """
-        query = """
-        SELECT
-            visit_count_bucket,
-            count() as user_count
-        FROM (
-            SELECT
-                visitor_ip,
-                CASE
-                    WHEN count() = 1 THEN '1 visit'
-                    WHEN count() BETWEEN 2 AND 3 THEN '2-3 visits'
-                    WHEN count() BETWEEN 4 AND 10 THEN '4-10 visits'
-                    WHEN count() BETWEEN 11 AND 25 THEN '11-25 visits'
-                    ELSE '26+ visits'
-                END as visit_count_bucket
-            FROM link_events
-            WHERE timestamp >= %(start_date)s
-              AND timestamp <= %(end_date)s
-            GROUP BY visitor_ip
-        )
-        GROUP BY visit_count_bucket
-        ORDER BY
-            CASE visit_count_bucket
-                WHEN '1 visit' THEN 1
-                WHEN '2-3 visits' THEN 2
-                WHEN '4-10 visits' THEN 3
-                WHEN '11-25 visits' THEN 4
-                ELSE 5
-            END
-        """
-
-        result = self.client.execute(
-            query,
-            {"start_date": start_date, "end_date": end_date}
-        )
-
-        frequency_data = []
-        total_users = 0
-        for row in result:
-            frequency_data.append({"bucket": row[0], "users": row[1]})
-            total_users += row[1]
+        users_by_bucket: Dict[str, int] = defaultdict(int)
+        total_visits = 0
+        snapshot = self.get_snapshot(team_id, start_date, end_date, link_id)
+        for _, _, _, frequency, _, visitors, visits in snapshot:
+            users_by_bucket[frequency] += visitors
+            total_visits += visits
+
+        frequency_data = [
+            {"bucket": bucket, "users": users_by_bucket[bucket]}
+            for bucket in FREQUENCY_BUCKETS
+            if users_by_bucket[bucket]
+        ]
+        total_users = sum(item["users"] for item in frequency_data)
 
         # 计算百分比
         for item in frequency_data:
             item["percentage"] = round(item["users"] / total_users * 100, 2) if total_users > 0 else 0
 
-        # 计算平均访问次数
-        avg_query = """
-        SELECT avg(visit_count) as avg_visits
-        FROM (
-            SELECT visitor_ip, count() as visit_count
-            FROM link_events
-            WHERE timestamp >= %(start_date)s
-              AND timestamp <= %(end_date)s
-            GROUP BY visitor_ip
-        )
-        """
-
-        avg_result = self.client.execute(
-            avg_query,
-            {"start_date": start_date, "end_date": end_date}
-        )
-
         return {
             "frequency_distribution": frequency_data,
             "total_unique_visitors": total_users,
-            "average_visits_per_user": round(avg_result[0][0], 2) if avg_result else 0
+            "average_visits_per_user": (
+                round(total_visits / total_users, 2) if total_users > 0 else 0
+            ),
         }
 
     def get_recency_analysis(
         self,
-        team_id: Optional[str],
-        end_date: datetime
+        team_id: str,
+        end_date: datetime,
+        link_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         最近活跃度分析 (Recency)
         分析用户最后一次访问距今的时间分布
         """
-        query = """
-        SELECT
-            recency_bucket,
-            count() as user_count
-        FROM (
-            SELECT
-                visitor_ip,
-                CASE
-                    WHEN dateDiff('day', max(timestamp), %(end_date)s) <= 1 THEN 'Today/Yesterday'
-                    WHEN dateDiff('day', max(timestamp), %(end_date)s) <= 7 THEN 'Last 7 days'
-                    WHEN dateDiff('day', max(timestamp), %(end_date)s) <= 14 THEN 'Last 14 days'
-                    WHEN dateDiff('day', max(timestamp), %(end_date)s) <= 30 THEN 'Last 30 days'
-                    WHEN dateDiff('day', max(timestamp), %(end_date)s) <= 60 THEN 'Last 60 days'
-                    WHEN dateDiff('day', max(timestamp), %(end_date)s) <= 90 THEN 'Last 90 days'
-                    ELSE 'Over 90 days'
-                END as recency_bucket
-            FROM link_events
-            WHERE timestamp <= %(end_date)s
-            GROUP BY visitor_ip
-        )
-        GROUP BY recency_bucket
-        ORDER BY
-            CASE recency_bucket
-                WHEN 'Today/Yesterday' THEN 1
-                WHEN 'Last 7 days' THEN 2
-                WHEN 'Last 14 days' THEN 3
-                WHEN 'Last 30 days' THEN 4
-                WHEN 'Last 60 days' THEN 5
-                WHEN 'Last 90 days' THEN 6
-                ELSE 7
-            END
-        """
-
-        result = self.client.execute(query, {"end_date": end_date})
-
-        recency_data = []
-        total_users = 0
-        for row in result:
-            recency_data.append({"bucket": row[0], "users": row[1]})
-            total_users += row[1]
+        users_by_bucket: Dict[str, int] = defaultdict(int)
+        for _, recency_bucket, users, _ in self.get_population(team_id, end_date, link_id):
+            users_by_bucket[recency_bucket] += users
+
+        recency_data = [
+            {"bucket": bucket, "users": users_by_bucket[bucket]}
+            for bucket in RECENCY_BUCKETS
+            if users_by_bucket[bucket]
+        ]
+        total_users = sum(item["users"] for item in recency_data)
 
         for item in recency_data:
             item["percentage"] = round(item["users"] / total_users * 100, 2) if total_users > 0 else 0
@@ -430,97 +488,37 @@ class RetentionService:
 
     def get_churn_analysis(
         self,
-        team_id: Optional[str],
+        team_id: str,
         start_date: datetime,
         end_date: datetime,
-        churn_days: int = 30
+        churn_days: int = 30,
+        link_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         用户流失分析
         分析在指定时间段内活跃但之后未再访问的用户
         """
-        # 在分析期间活跃的用户
-        active_query = """
-        SELECT uniq(visitor_ip) as active_users
-        FROM link_events
-        WHERE timestamp >= %(start_date)s
-          AND timestamp <= %(end_date)s
-        """
-
-        active_result = self.client.execute(
-            active_query,
-            {"start_date": start_date, "end_date": end_date}
-        )
-        active_users = active_result[0][0] if active_result else 0
-
-        # 在分析期间后一段时间内回访的用户
-        churn_end = end_date + timedelta(days=churn_days)
-        retained_query = """
-        WITH period_visitors AS (
-            SELECT DISTINCT visitor_ip
-            FROM link_events
-            WHERE timestamp >= %(start_date)s
-              AND timestamp <= %(end_date)s
-        )
-        SELECT uniq(e.visitor_ip) as retained
-        FROM link_events e
-        INNER JOIN period_visitors pv ON e.visitor_ip = pv.visitor_ip
-        WHERE e.timestamp > %(end_date)s
-          AND e.timestamp <= %(churn_end)s
-        """
-
-        retained_result = self.client.execute(
-            retained_query,
-            {"start_date": start_date, "end_date": end_date, "churn_end": churn_end}
-        )
-        retained_users = retained_result[0][0] if retained_result else 0
+        churn_days = min(churn_days, RETURN_WINDOW_DAYS)
+
+        # 在分析期间活跃的用户，及其中在之后 churn_days 天内回访的用户
+        active_users = 0
+        retained_users = 0
+        weekly: Dict[date, int] = defaultdict(int)
+        snapshot = self.get_snapshot(team_id, start_date, end_date, link_id)
+        for _, active_days, _, _, return_days, visitors, _ in snapshot:
+            active_users += visitors
+            if 0 < return_days <= churn_days:
+                retained_users += visitors
+            # 按周计算活跃用户趋势
+            for week in {_start_of_week(day) for day in active_days}:
+                weekly[week] += visitors
 
         churned_users = active_users - retained_users
         churn_rate = (churned_users / active_users * 100) if active_users > 0 else 0
 
-        # 按周计算流失趋势
-        weekly_query = """
-        WITH weekly_active AS (
-            SELECT
-                toStartOfWeek(timestamp) as week,
-                visitor_ip
-            FROM link_events
-            WHERE timestamp >= %(start_date)s
-              AND timestamp <= %(end_date)s
-            GROUP BY week, visitor_ip
-        )
-        SELECT
-            week,
-            uniq(visitor_ip) as active,
-            uniqIf(visitor_ip, visitor_ip NOT IN (
-                SELECT visitor_ip FROM weekly_active wa2
-                WHERE wa2.week > weekly_active.week
-            )) as churned
-        FROM weekly_active
-        GROUP BY week
-        ORDER BY week
-        """
-
-        # 简化版周级别查询
-        weekly_simple = """
-        SELECT
-            toStartOfWeek(timestamp) as week,
-            uniq(visitor_ip) as active_users
-        FROM link_events
-        WHERE timestamp >= %(start_date)s
-          AND timestamp <= %(end_date)s
-        GROUP BY week
-        ORDER BY week
-        """
-
-        weekly_result = self.client.execute(
-            weekly_simple,
-            {"start_date": start_date, "end_date": end_date}
-        )
-
         weekly_data = [
-            {"week": str(row[0]), "active_users": row[1]}
-            for row in weekly_result
+            {"week": str(week), "active_users": users}
+            for week, users in sorted(weekly.items())
         ]
 
         return {
@@ -539,59 +537,32 @@ class RetentionService:
 
     def get_lifecycle_stages(
         self,
-        team_id: Optional[str],
-        end_date: datetime
+        team_id: str,
+        end_date: datetime,
+        link_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         用户生命周期阶段分析
         将用户分为：新用户、活跃用户、沉默用户、流失用户、回流用户
         """
-        query = """
-        WITH user_activity AS (
-            SELECT
-                visitor_ip,
-                min(timestamp) as first_visit,
-                max(timestamp) as last_visit,
-                count() as total_visits
-            FROM link_events
-            WHERE timestamp <= %(end_date)s
-            GROUP BY visitor_ip
-        )
-        SELECT
-            CASE
-                WHEN dateDiff('day', first_visit, %(end_date)s) <= 7 THEN 'New'
-                WHEN dateDiff('day', last_visit, %(end_date)s) <= 7 THEN 'Active'
-                WHEN dateDiff('day', last_visit, %(end_date)s) <= 30 THEN 'Engaged'
-                WHEN dateDiff('day', last_visit, %(end_date)s) <= 60 THEN 'At Risk'
-                WHEN dateDiff('day', last_visit, %(end_date)s) <= 90 THEN 'Dormant'
-                ELSE 'Churned'
-            END as lifecycle_stage,
-            count() as user_count,
-            avg(total_visits) as avg_visits
-        FROM user_activity
-        GROUP BY lifecycle_stage
-        ORDER BY
-            CASE lifecycle_stage
-                WHEN 'New' THEN 1
-                WHEN 'Active' THEN 2
-                WHEN 'Engaged' THEN 3
-                WHEN 'At Risk' THEN 4
-                WHEN 'Dormant' THEN 5
-                ELSE 6
-            END
-        """
-
-        result = self.client.execute(query, {"end_date": end_date})
+        users_by_stage: Dict[str, int] = defaultdict(int)
+        visits_by_stage: Dict[str, int] = defaultdict(int)
+        for lifecycle_stage, _, users, visits in self.get_population(team_id, end_date, link_id):
+            users_by_stage[lifecycle_stage] += users
+            visits_by_stage[lifecycle_stage] += visits
 
         stages = []
         total_users = 0
-        for row in result:
+        for stage in LIFECYCLE_STAGES:
+            users = users_by_stage[stage]
+            if not users:
+                continue
             stages.append({
-                "stage": row[0],
-                "users": row[1],
-                "avg_visits": round(row[2], 2)
+                "stage": stage,
+                "users": users,
+                "avg_visits": round(visits_by_stage[stage] / users, 2)
             })
-            total_users += row[1]
+            total_users += users
 
         for item in stages:
             item["percentage"] = round(item["users"] / total_users * 100, 2) if total_users > 0 else 0
@@ -414,6 +414,8 @@ def register_all_tasks():
         compute_trending_links,
         compute_link_insights,
         update_leaderboards,
+        refresh_funnel_states,
+        check_funnel_alerts,
     )
     from app.tasks.security_tasks import (
         batch_security_scan,
@@ -511,6 +513,22 @@ def register_all_tasks():
         description="Update click leaderboards",
     )
 
+    task_scheduler.register_task(
+        name="refresh_funnel_states",
+        func=refresh_funnel_states,
+        frequency=TaskFrequency.MINUTELY,
+        description="Refresh materialized funnel states with recent events",
+        timeout_seconds=600,
+    )
+
+    task_scheduler.register_task(
+        name="check_funnel_alerts",
+        func=check_funnel_alerts,
+        frequency=TaskFrequency.HOURLY,
+        run_at_minute=20,
+        description="Evaluate funnel alerts grouped by team and window",
+    )
+
     # Security Tasks
     task_scheduler.register_task(
         name="batch_security_scan",
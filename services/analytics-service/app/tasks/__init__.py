@@ -22,6 +22,8 @@ from app.tasks.aggregation_tasks import (
     compute_trending_links,
     compute_link_insights,
     update_leaderboards,
+    refresh_funnel_states,
+    check_funnel_alerts,
 )
 
 from app.tasks.security_tasks import (
@@ -51,6 +53,8 @@ __all__ = [
     "compute_trending_links",
     "compute_link_insights",
     "update_leaderboards",
+    "refresh_funnel_states",
+    "check_funnel_alerts",
     # Security
     "batch_security_scan",
     "scan_new_links",
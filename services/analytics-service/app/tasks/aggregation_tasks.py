@@ -2,9 +2,10 @@
 Data aggregation tasks for pre-computing analytics data
 """
 
+import asyncio
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, Any, List
+from typing import Any, Dict
 
 from app.core.clickhouse import get_clickhouse_client
 
@@ -337,3 +338,57 @@ async def update_leaderboards() -> Dict[str, Any]:
         logger.error(f"Leaderboard update failed: {e}")
 
     return result
+
+
+async def refresh_funnel_states() -> Dict[str, Any]:
+    """
+    Bring materialized funnel states up to date with recent events.
+    Only funnels that have been analyzed (and so materialized) are refreshed.
+    """
+    from app.funnels.service import funnel_service
+
+    # The INSERT ... SELECTs can run for minutes, so they go to a worker
+    # thread on a connection of their own
+    client = get_clickhouse_client()
+    try:
+        result = await asyncio.to_thread(funnel_service.refresh_funnel_states, client)
+    finally:
+        client.disconnect()
+    logger.info(f"Refreshed {result['funnels_refreshed']} funnel states")
+    return result
+
+
+async def check_funnel_alerts() -> Dict[str, Any]:
+    """
+    Evaluate due funnel alerts and notify their recipients.
+    """
+    from app.funnels.service import funnel_service
+    from app.services.notification_client import notification_client
+
+    result = {
+        "triggered": 0,
+        "emails_sent": 0,
+        "errors": [],
+    }
+
+    try:
+        # Alerts may materialize funnel states; like the refresh, that runs
+        # in a worker thread on a connection of its own
+        client = get_clickhouse_client()
+        try:
+            triggered = await asyncio.to_thread(funnel_service.check_alerts, None, client)
+        finally:
+            client.disconnect()
+        result["triggered"] = len(triggered)
+
+        for alert in triggered:
+            if "email" in alert["notification_channels"]:
+                result["emails_sent"] += await notification_client.send_funnel_alert_email(
+                    alert["recipients"], alert
+                )
+
+    except Exception as e:
+        result["errors"].append(str(e))
+        logger.error(f"Funnel alert check failed: {e}")
+
+    return result
@@ -35,6 +35,12 @@ ALTER TABLE clicks ADD INDEX idx_country country TYPE bloom_filter GRANULARITY 4
 ALTER TABLE clicks ADD INDEX idx_device device TYPE bloom_filter GRANULARITY 4;
 ALTER TABLE clicks ADD INDEX idx_browser browser TYPE bloom_filter GRANULARITY 4;
 
+-- Team and visitor of each click, read by the cohort service. The click
+-- consumers write both (the visitor is the IP unless the producer sends one);
+-- the defaults cover clicks written before they did
+ALTER TABLE clicks ADD COLUMN IF NOT EXISTS team_id String DEFAULT '';
+ALTER TABLE clicks ADD COLUMN IF NOT EXISTS visitor_id String DEFAULT ip;
+
 -- Daily aggregated stats (materialized view)
 CREATE MATERIALIZED VIEW IF NOT EXISTS clicks_daily_mv
 ENGINE = SummingMergeTree()
@@ -120,3 +126,234 @@ SELECT
 FROM clicks
 WHERE referer != ''
 GROUP BY link_id, date, referer;
+
+-- Materialized funnel state: per saved funnel, day and visitor, the furthest
+-- step reached from a first step that day (written by the funnel service)
+CREATE TABLE IF NOT EXISTS funnel_daily_state
+(
+    funnel_id String,
+    signature String,
+    team_id String,
+    date Date,
+    visitor_id String,
+    level UInt8,
+    first_at DateTime,
+    step_at Array(DateTime),
+    country String DEFAULT '',
+    device_type String DEFAULT '',
+    source String DEFAULT '',
+    refreshed_at DateTime
+)
+ENGINE = ReplacingMergeTree(refreshed_at)
+PARTITION BY toYYYYMM(date)
+ORDER BY (team_id, funnel_id, signature, date, visitor_id)
+TTL date + INTERVAL 365 DAY;
+
+-- Conversion steps tracked through the funnel API (columns of the funnel
+-- event writer), also counted per period by the cohort retention matrix
+CREATE TABLE IF NOT EXISTS conversions
+(
+    event_id String,
+    team_id String,
+    visitor_id String,
+    event_type String,
+    link_id Nullable(String),
+    page_slug Nullable(String),
+    campaign_id Nullable(String),
+    source Nullable(String),
+    medium Nullable(String),
+    device_type Nullable(String),
+    country Nullable(String),
+    timestamp DateTime
+)
+ENGINE = MergeTree()
+PARTITION BY toYYYYMM(timestamp)
+ORDER BY (team_id, visitor_id, timestamp)
+TTL timestamp + INTERVAL 365 DAY;
+
+-- Team-scoped link events read by the retention, attribution and analytics
+-- services (same schema as link_events in docker/clickhouse/init.sql)
+CREATE TABLE IF NOT EXISTS link_events (
+    event_id String,
+    event_type Enum8('link_click' = 1, 'qr_scan' = 2, 'page_view' = 3),
+    link_id String,
+    team_id String,
+    user_id String,
+    timestamp DateTime64(3),
+
+    -- 访客信息
+    visitor_ip String,
+    visitor_fingerprint String,
+    is_bot UInt8 DEFAULT 0,
+    is_unique UInt8 DEFAULT 1,
+
+    -- 地理位置
+    country LowCardinality(String) DEFAULT '',
+    country_name String DEFAULT '',
+    region String DEFAULT '',
+    city String DEFAULT '',
+    latitude Float32 DEFAULT 0,
+    longitude Float32 DEFAULT 0,
+    timezone String DEFAULT '',
+
+    -- 设备信息
+    device_type LowCardinality(String) DEFAULT '',
+    os LowCardinality(String) DEFAULT '',
+    os_version String DEFAULT '',
+    browser LowCardinality(String) DEFAULT '',
+    browser_version String DEFAULT '',
+    device_brand String DEFAULT '',
+    device_model String DEFAULT '',
+
+    -- 来源信息
+    referrer String DEFAULT '',
+    referrer_domain String DEFAULT '',
+    referrer_source LowCardinality(String) DEFAULT '',
+    referrer_medium LowCardinality(String) DEFAULT '',
+
+    -- UTM 参数
+    utm_source String DEFAULT '',
+    utm_medium String DEFAULT '',
+    utm_campaign String DEFAULT '',
+    utm_content String DEFAULT '',
+    utm_term String DEFAULT '',
+
+    -- 其他
+    user_agent String DEFAULT '',
+    language LowCardinality(String) DEFAULT '',
+
+    -- 目标 URL (跳转后)
+    target_url String DEFAULT ''
+) ENGINE = MergeTree()
+PARTITION BY toYYYYMM(timestamp)
+ORDER BY (team_id, link_id, timestamp, event_id)
+TTL toDateTime(timestamp) + INTERVAL 2 YEAR
+SETTINGS index_granularity = 8192;
+
+-- Databases created by scripts/init-clickhouse.sql have link_events without a team
+ALTER TABLE link_events ADD COLUMN IF NOT EXISTS team_id String DEFAULT '';
+
+-- First/last seen per team and visitor, maintained on ingest by the views
+-- below so "is this visitor new?" is a key lookup instead of a history scan.
+-- origin tells the identity spaces apart: clicks.visitor_id vs link_events.visitor_ip
+CREATE TABLE IF NOT EXISTS visitor_first_seen
+(
+    team_id String,
+    origin LowCardinality(String),
+    visitor_id String,
+    first_seen SimpleAggregateFunction(min, DateTime),
+    last_seen SimpleAggregateFunction(max, DateTime),
+    events SimpleAggregateFunction(sum, UInt64)
+)
+ENGINE = AggregatingMergeTree()
+ORDER BY (team_id, origin, visitor_id);
+
+-- The views below only see new inserts, so first backfill the rows already
+-- written. Each origin is backfilled only while it has no rows yet, so running
+-- this script again (once the views exist) does not double the events counts
+INSERT INTO visitor_first_seen
+SELECT
+    team_id,
+    'clicks' as origin,
+    visitor_id,
+    min(toDateTime(timestamp)),
+    max(toDateTime(timestamp)),
+    count()
+FROM clicks
+WHERE (SELECT count() FROM visitor_first_seen WHERE origin = 'clicks') = 0
+GROUP BY team_id, visitor_id;
+
+INSERT INTO visitor_first_seen
+SELECT
+    team_id,
+    'link_events' as origin,
+    visitor_ip,
+    min(toDateTime(timestamp)),
+    max(toDateTime(timestamp)),
+    count()
+FROM link_events
+WHERE (SELECT count() FROM visitor_first_seen WHERE origin = 'link_events') = 0
+GROUP BY team_id, visitor_ip;
+
+-- Fed from the team and visitor columns added to clicks
+CREATE MATERIALIZED VIEW IF NOT EXISTS visitor_first_seen_clicks_mv
+TO visitor_first_seen
+AS
+SELECT
+    team_id,
+    'clicks' as origin,
+    visitor_id,
+    min(toDateTime(timestamp)) as first_seen,
+    max(toDateTime(timestamp)) as last_seen,
+    count() as events
+FROM clicks
+GROUP BY team_id, visitor_id;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS visitor_first_seen_link_events_mv
+TO visitor_first_seen
+AS
+SELECT
+    team_id,
+    'link_events' as origin,
+    visitor_ip as visitor_id,
+    min(toDateTime(timestamp)) as first_seen,
+    max(toDateTime(timestamp)) as last_seen,
+    count() as events
+FROM link_events
+GROUP BY team_id, visitor_ip;
+
+-- Daily visitor bitmaps per team, overall ('') and per breakdown value, so
+-- cohort segments and comparisons are bitmap AND/cardinality operations
+-- instead of one click scan per segment
+CREATE TABLE IF NOT EXISTS visitor_daily_bitmaps
+(
+    team_id String,
+    date Date,
+    dim LowCardinality(String),
+    value String,
+    visitors AggregateFunction(groupBitmap, UInt64),
+    events SimpleAggregateFunction(sum, UInt64)
+)
+ENGINE = AggregatingMergeTree()
+PARTITION BY toYYYYMM(date)
+ORDER BY (team_id, dim, value, date)
+TTL date + INTERVAL 365 DAY;
+
+-- Backfill clicks written before the view existed, once (see visitor_first_seen)
+INSERT INTO visitor_daily_bitmaps
+SELECT
+    team_id,
+    toDate(timestamp) as date,
+    breakdown.1 as dim,
+    breakdown.2 as value,
+    groupBitmapState(cityHash64(visitor_id)) as visitors,
+    count() as events
+FROM clicks
+ARRAY JOIN [
+    ('', ''),
+    ('country', if(country = '', 'Unknown', country)),
+    ('device', if(device = '', 'Unknown', device)),
+    ('source', if(referer = '', 'Direct', domain(referer)))
+] as breakdown
+WHERE (SELECT count() FROM visitor_daily_bitmaps) = 0
+GROUP BY team_id, date, dim, value;
+
+-- clicks has no referer_domain; the source is the referer's host
+CREATE MATERIALIZED VIEW IF NOT EXISTS visitor_daily_bitmaps_mv
+TO visitor_daily_bitmaps
+AS
+SELECT
+    team_id,
+    toDate(timestamp) as date,
+    breakdown.1 as dim,
+    breakdown.2 as value,
+    groupBitmapState(cityHash64(visitor_id)) as visitors,
+    count() as events
+FROM clicks
+ARRAY JOIN [
+    ('', ''),
+    ('country', if(country = '', 'Unknown', country)),
+    ('device', if(device = '', 'Unknown', device)),
+    ('source', if(referer = '', 'Direct', domain(referer)))
+] as breakdown
+GROUP BY team_id, date, dim, value;
@@ -0,0 +1,87 @@
+"""Cohort export encoders: every format streams in batches and round-trips."""
+
+import csv
+import io
+import json
+from datetime import date
+
+import pytest
+
+from app.cohorts.export import encode_rows
+
+COLUMNS = ["cohort_date", "period", "users"]
+ROWS = [
+    (date(2026, 1, 5), 0, 100),
+    (date(2026, 1, 5), 1, 40),
+    (date(2026, 1, 12), 0, 80),
+]
+
+
+def test_csv_has_a_header_and_one_chunk_per_batch():
+    chunks = list(encode_rows(COLUMNS, ROWS, "csv", batch_rows=2))
+
+    assert len(chunks) == 2
+    lines = list(csv.reader(io.StringIO(b"".join(chunks).decode())))
+    assert lines[0] == COLUMNS
+    assert lines[1:] == [
+        ["2026-01-05", "0", "100"],
+        ["2026-01-05", "1", "40"],
+        ["2026-01-12", "0", "80"],
+    ]
+
+
+def test_csv_without_rows_is_just_the_header():
+    assert b"".join(encode_rows(COLUMNS, [], "csv")).decode().splitlines() == [
+        ",".join(COLUMNS)
+    ]
+
+
+def test_ndjson_writes_one_object_per_line():
+    content = b"".join(encode_rows(COLUMNS, ROWS, "ndjson", batch_rows=2)).decode()
+
+    rows = [json.loads(line) for line in content.splitlines()]
+    assert rows[0] == {"cohort_date": "2026-01-05", "period": 0, "users": 100}
+    assert len(rows) == 3
+
+
+@pytest.mark.parametrize("rows", [ROWS, []])
+def test_json_is_one_array_across_batches(rows):
+    content = b"".join(encode_rows(COLUMNS, rows, "json", batch_rows=2))
+
+    assert json.loads(content) == [
+        {"cohort_date": row[0].isoformat(), "period": row[1], "users": row[2]} for row in rows
+    ]
+
+
+def test_parquet_writes_a_row_group_per_batch():
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    content = b"".join(encode_rows(
+        COLUMNS, ROWS, "parquet", batch_rows=2,
+        types={"cohort_date": "date", "period": "int64", "users": "int64"},
+    ))
+
+    parquet = pq.ParquetFile(io.BytesIO(content))
+    assert parquet.metadata.num_row_groups == 2
+    table = parquet.read()
+    assert table.column_names == COLUMNS
+    assert table.column("cohort_date").to_pylist() == [row[0] for row in ROWS]
+    assert table.column("users").to_pylist() == [100, 40, 80]
+
+
+def test_parquet_keeps_declared_types_when_the_first_batch_is_null():
+    pq = pytest.importorskip("pyarrow.parquet")
+    rows = [("a", None), ("b", 2.5)]
+
+    content = b"".join(encode_rows(
+        ["visitor_id", "revenue"], rows, "parquet", batch_rows=1, types={"revenue": "float64"}
+    ))
+
+    table = pq.read_table(io.BytesIO(content))
+    assert str(table.schema.field("revenue").type) == "double"
+    assert table.column("revenue").to_pylist() == [None, 2.5]
+
+
+def test_unknown_formats_are_rejected():
+    with pytest.raises(ValueError):
+        encode_rows(COLUMNS, ROWS, "xlsx")
@@ -0,0 +1,170 @@
+"""Cohort retention SQL and results, checked against a recording ClickHouse client."""
+
+import logging
+from datetime import date, datetime
+
+import pytest
+
+from app.cohorts.models import Cohort, CohortGranularity, CohortMetric
+from app.cohorts.service import CohortService
+
+
+class RecordingClient:
+    """Records every query and answers it with ``respond(sql, params)``."""
+
+    def __init__(self, respond=None):
+        self.calls = []
+        self.respond = respond or (lambda sql, params: [])
+
+    def execute(self, query, params=None):
+        sql = " ".join(query.split())
+        self.calls.append((sql, params))
+        return self.respond(sql, params)
+
+
+def make_cohort(**overrides) -> Cohort:
+    fields = {
+        "id": "cohort-1",
+        "team_id": "team-1",
+        "name": "January",
+        "granularity": CohortGranularity.WEEKLY,
+        "periods_to_track": 4,
+    }
+    fields.update(overrides)
+    return Cohort(**fields)
+
+
+@pytest.fixture
+def service():
+    service = CohortService()
+    service.client = RecordingClient()
+    return service
+
+
+def test_matrix_counts_team_clicks_and_conversions_in_one_query(service):
+    week = date(2026, 1, 5)
+    service.client = RecordingClient(lambda sql, params: [
+        (week, 0, 100, 250, 3),
+        (week, 1, 40, 90, 2),
+    ])
+
+    cells = service._query_cohort_matrix(
+        make_cohort(), datetime(2026, 1, 5), datetime(2026, 2, 1)
+    )
+
+    [(sql, params)] = service.client.calls
+    assert "FROM clicks" in sql and "FROM conversions" in sql and "UNION ALL" in sql
+    assert sql.count("team_id = %(team_id)s") >= 3
+    assert "toMonday(first_click) AS cohort_bucket" in sql
+    assert params["team_id"] == "team-1"
+    assert params["periods"] == 4
+    assert cells == {(week, 0): (100, 250, 3), (week, 1): (40, 90, 2)}
+
+
+def test_rows_start_at_the_cohort_size_and_track_later_periods(service):
+    week = date(2026, 1, 5)
+    cells = {(week, 0): (100, 250, 3), (week, 1): (40, 90, 2)}
+
+    [row] = service._rows_from_cells(
+        make_cohort(), cells, datetime(2026, 1, 5), datetime(2026, 1, 19)
+    )
+
+    assert row.initial_size == 100
+    assert [period.users for period in row.periods] == [100, 40]
+    assert [period.retention_rate for period in row.periods] == [100.0, 40.0]
+    assert row.periods[1].total_conversions == 2
+
+
+def test_unavailable_clickhouse_is_logged_before_mock_retention(service, caplog):
+    def unavailable(sql, params):
+        raise ConnectionError("ClickHouse unavailable")
+
+    service.client = RecordingClient(unavailable)
+
+    with caplog.at_level(logging.WARNING, logger="app.cohorts.service"):
+        rows = service._calculate_cohort_rows(
+            make_cohort(), datetime(2026, 1, 5), datetime(2026, 2, 1), CohortMetric.RETENTION
+        )
+
+    assert rows
+    assert "serving mock retention" in caplog.text
+    assert "ClickHouse unavailable" in caplog.text
+
+
+def test_first_clicks_come_from_visitor_first_seen(service):
+    service._query_cohort_matrix(make_cohort(), datetime(2026, 1, 5), datetime(2026, 2, 1))
+
+    [(sql, _)] = service.client.calls
+    assert "FROM visitor_first_seen" in sql
+    assert "origin = 'clicks'" in sql
+    # Looked up only for visitors active in the range
+    assert "visitor_id IN ( SELECT visitor_id FROM clicks" in sql
+
+
+def test_filtered_cohorts_scan_the_click_history(service):
+    cohort = make_cohort(filters={"country": "US"})
+
+    service._query_cohort_matrix(cohort, datetime(2026, 1, 5), datetime(2026, 2, 1))
+
+    [(sql, params)] = service.client.calls
+    assert "visitor_first_seen" not in sql
+    assert "SELECT visitor_id, min(timestamp) AS first_click FROM clicks" in sql
+    assert "AND country = %(filter_country)s" in sql
+    assert params["filter_country"] == "US"
+
+
+def test_filter_fields_must_be_identifiers(service):
+    cohort = make_cohort(filters={"country = '' OR 1": "US"})
+
+    with pytest.raises(ValueError):
+        service._query_cohort_matrix(cohort, datetime(2026, 1, 5), datetime(2026, 2, 1))
+
+
+def test_segment_matrix_reads_bitmaps_in_one_query(service):
+    week = date(2026, 1, 5)
+    service.client = RecordingClient(lambda sql, params: [
+        ("", "", week, 0, 100),
+        ("", "", week, 1, 40),
+        ("country", "US", week, 0, 60),
+        ("country", "US", week, 1, 30),
+    ])
+
+    matrix = service._query_segment_matrix(
+        make_cohort(), "country", ["US"], datetime(2026, 1, 5), datetime(2026, 2, 1)
+    )
+
+    [(sql, params)] = service.client.calls
+    assert "FROM visitor_first_seen" in sql and "FROM visitor_daily_bitmaps" in sql
+    assert "bitmapAndCardinality" in sql
+    assert "AND value IN %(values)s" in sql
+    assert params["values"] == ("US",)
+    assert matrix[("", "")] == {(week, 0): (100, 0, 0), (week, 1): (40, 0, 0)}
+    assert matrix[("country", "US")][(week, 1)] == (30, 0, 0)
+
+
+def test_segment_filters_must_be_segment_dimensions(service):
+    cohort = make_cohort(filters={"link_id": "l1"})
+
+    with pytest.raises(ValueError):
+        service._query_segment_matrix(
+            cohort, "country", None, datetime(2026, 1, 5), datetime(2026, 2, 1)
+        )
+
+
+def test_comparison_measures_a_segment_against_the_whole_cohort(service):
+    week = date(2026, 1, 5)
+    cohort = make_cohort()
+    service.cohorts[cohort.id] = cohort
+    service.client = RecordingClient(lambda sql, params: [
+        ("", "", week, 0, 100),
+        ("", "", week, 1, 40),
+        ("country", "US", week, 0, 50),
+        ("country", "US", week, 1, 30),
+    ])
+
+    comparison = service.compare_cohorts(
+        cohort.id, "team-1", "country", ["US"], datetime(2026, 1, 5), datetime(2026, 1, 19)
+    )
+
+    assert comparison.retention_difference == [0.0, 20.0]
+    assert len(service.client.calls) == 1
@@ -0,0 +1,63 @@
+"""EventScope predicates: tenant first, in link_events sort-key order."""
+
+from datetime import datetime
+
+import pytest
+
+from app.core.scope import EventScope
+
+START = datetime(2026, 1, 5)
+END = datetime(2026, 1, 18)
+
+
+def test_a_team_is_required():
+    with pytest.raises(ValueError):
+        EventScope("", START, END)
+
+
+def test_predicates_follow_the_sort_key():
+    scope = EventScope("team-1", START, END, link_id="link-1")
+
+    assert scope.in_range() == (
+        "team_id = %(team_id)s AND link_id = %(link_id)s"
+        " AND timestamp >= %(start_date)s AND timestamp <= %(end_date)s"
+    )
+
+
+def test_conditions_are_prefixed_with_the_alias():
+    scope = EventScope("team-1", START, END)
+
+    assert scope.events("{p}country = %(country)s", alias="e") == (
+        "e.team_id = %(team_id)s AND e.country = %(country)s"
+    )
+
+
+def test_unscoped_reads_every_tenant():
+    scope = EventScope.unscoped(START, END)
+
+    assert "team_id" not in scope.in_range()
+    assert scope.events() == "1"
+    assert "team_id" not in scope.params()
+
+
+def test_visitors_are_scoped_to_link_events_origin():
+    assert EventScope("team-1").visitors("visitor_id != ''") == (
+        "team_id = %(team_id)s AND origin = 'link_events' AND visitor_id != ''"
+    )
+    assert EventScope.unscoped().visitors() == "origin = 'link_events'"
+
+
+def test_params_carry_the_scope_and_extras():
+    scope = EventScope("team-1", START, END, link_id="link-1")
+
+    assert scope.params(limit=10) == {
+        "start_date": START,
+        "end_date": END,
+        "limit": 10,
+        "team_id": "team-1",
+        "link_id": "link-1",
+    }
+
+
+def test_scopes_differ_by_tenant():
+    assert EventScope("team-1", START, END).key != EventScope("team-2", START, END).key
@@ -0,0 +1,241 @@
+"""Generated funnel SQL and parameters, checked against a recording ClickHouse client."""
+
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app.core.config import settings
+from app.funnels.models import (
+    Funnel,
+    FunnelAlert,
+    FunnelStep,
+    FunnelStepCondition,
+    FunnelStepType,
+)
+from app.funnels.service import FunnelService
+
+
+class RecordingClient:
+    """Records every query; SELECTs are answered by ``respond(sql, params)``."""
+
+    def __init__(self, respond=None):
+        self.calls = []
+        self.respond = respond or (lambda sql, params: [])
+
+    def execute(self, query, params=None):
+        sql = " ".join(query.split())
+        self.calls.append((sql, params))
+        if sql.startswith("SELECT"):
+            return self.respond(sql, params)
+        return []
+
+    def queries(self, prefix):
+        return [(sql, params) for sql, params in self.calls if sql.startswith(prefix)]
+
+
+def make_funnel(**overrides) -> Funnel:
+    fields = {
+        "id": "funnel-1",
+        "team_id": "team-1",
+        "name": "Signup",
+        "steps": [
+            FunnelStep(
+                id="click",
+                name="Click",
+                type=FunnelStepType.LINK_CLICK,
+                conditions=[FunnelStepCondition(field="link_id", operator="equals", value="l1")],
+                order=0,
+            ),
+            FunnelStep(id="convert", name="Convert", type=FunnelStepType.CONVERSION, order=1),
+        ],
+        "window_days": 7,
+    }
+    fields.update(overrides)
+    return Funnel(**fields)
+
+
+@pytest.fixture
+def service():
+    service = FunnelService()
+    service.client = RecordingClient()
+    return service
+
+
+def test_query_funnel_uses_window_funnel(service):
+    funnel = make_funnel(filters={"country": "US"})
+    service.client = RecordingClient(lambda sql, params: [("", "", 10, 4, 12.0, 10.0)])
+
+    groups = service._query_funnel(
+        funnel, datetime(2026, 1, 1), datetime(2026, 1, 31), dimensions=[]
+    )
+
+    [(sql, params)] = service.client.calls
+    assert "windowFunnel(604800)(timestamp, step_0, step_1)" in sql
+    assert "FROM clicks" in sql and "FROM conversions" in sql and "UNION ALL" in sql
+    assert "link_id = %(cond_5)s" in sql
+    assert "country = %(filter_country)s" in sql
+    assert params["team_id"] == "team-1"
+    assert params["cond_5"] == "l1"
+    assert params["filter_country"] == "US"
+    assert groups[("", "")]["reached"] == [10, 4]
+    assert groups[("", "")]["avg_seconds"] == [None, 12.0]
+
+
+def test_click_steps_read_device_and_source_from_click_columns(service):
+    funnel = make_funnel()
+
+    service._query_funnel(funnel, datetime(2026, 1, 1), datetime(2026, 1, 31), dimensions=[])
+
+    [(sql, _)] = service.client.calls
+    clicks, conversions = sql.split(" UNION ALL ")
+    assert "device AS device_type" in clicks
+    assert "if(referer = '', 'Direct', domain(referer)) AS source" in clicks
+    assert "FROM clicks" in clicks
+    assert "country, device_type, source, toUInt8" in conversions
+    assert "FROM conversions" in conversions
+
+
+def test_analysis_fails_instead_of_returning_mock_data(service, monkeypatch):
+    funnel = make_funnel()
+    service.funnels[funnel.id] = funnel
+    monkeypatch.setattr(settings, "FUNNEL_STATE_ENABLED", False)
+
+    def unavailable(sql, params):
+        raise ConnectionError("ClickHouse unavailable")
+
+    service.client = RecordingClient(unavailable)
+
+    with pytest.raises(ConnectionError):
+        service.analyze_funnel(
+            funnel.id, "team-1", datetime(2026, 1, 1), datetime(2026, 1, 31)
+        )
+
+
+def test_unordered_funnel_counts_leading_steps(service):
+    funnel = make_funnel(strict_order=False)
+
+    service._query_funnel(funnel, datetime(2026, 1, 1), datetime(2026, 1, 31), dimensions=[])
+
+    [(sql, _)] = service.client.calls
+    assert "windowFunnel" not in sql
+    assert "indexOf([max(step_0), max(step_1), 0], 0) - 1" in sql
+
+
+def test_filter_fields_must_be_identifiers(service):
+    funnel = make_funnel(filters={"country = '' OR 1": "US"})
+
+    with pytest.raises(ValueError):
+        service._query_funnel(funnel, datetime(2026, 1, 1), datetime(2026, 1, 31), dimensions=[])
+
+
+def test_ensure_state_materializes_then_extends_back(service):
+    funnel = make_funnel()
+    first_day = date(2026, 1, 10)
+
+    state = service._ensure_state(funnel, first_day)
+
+    [(sql, params)] = service.client.queries("INSERT INTO funnel_daily_state")
+    first_step = "step_0 AND toDate(timestamp) = start_day"
+    assert f"windowFunnel(604800)(timestamp, {first_step}, step_1)" in sql
+    assert "INTERVAL 8 DAY" in sql
+    assert "active_since" not in sql
+    assert params["start_date"] == datetime(2026, 1, 10)
+    assert params["signature"] == state.signature
+    assert state.first_day == first_day
+
+    service.client.calls.clear()
+    service._ensure_state(funnel, first_day - timedelta(days=3))
+
+    [(_, params)] = service.client.queries("INSERT INTO funnel_daily_state")
+    assert params["start_date"] == datetime(2026, 1, 7)
+    # Only the days before the existing state are written
+    assert params["starts_until"] == datetime(2026, 1, 10)
+    assert state.first_day == date(2026, 1, 7)
+
+
+def test_stale_state_rewrites_only_active_visitors(service):
+    funnel = make_funnel()
+    state = service._ensure_state(funnel, date(2026, 1, 10))
+    state.refreshed_at -= timedelta(hours=1)
+    refreshed_at = state.refreshed_at
+    service.client.calls.clear()
+
+    service._ensure_state(funnel, date(2026, 1, 10))
+
+    [(sql, params)] = service.client.queries("INSERT INTO funnel_daily_state")
+    assert "AND visitor_id IN (SELECT visitor_id FROM" in sql
+    assert "WHERE timestamp >= %(active_since)s" in sql
+    assert params["active_since"] < refreshed_at
+    assert state.refreshed_at > refreshed_at
+
+
+def test_changed_definition_replaces_state(service):
+    funnel = make_funnel()
+    old = service._ensure_state(funnel, date(2026, 1, 10))
+    funnel.window_days = 14
+    service.client.calls.clear()
+
+    new = service._ensure_state(funnel, date(2026, 1, 10))
+
+    [(sql, params)] = service.client.queries("ALTER TABLE funnel_daily_state DELETE")
+    assert "signature != %(signature)s" in sql
+    assert params == {"funnel_id": "funnel-1", "signature": new.signature}
+    assert new.signature != old.signature
+    assert len(service.client.queries("INSERT INTO funnel_daily_state")) == 1
+
+
+def test_alerts_share_one_reach_query_per_team_window(service):
+    funnels = [make_funnel(id="f1"), make_funnel(id="f2")]
+    reach = {"f1": [100, 30], "f2": [100, 80]}
+    service.client = RecordingClient(
+        lambda sql, params: [(funnel_id, reach[funnel_id]) for funnel_id, _ in params["keys"]]
+    )
+    for funnel in funnels:
+        service.funnels[funnel.id] = funnel
+        service.create_alert(funnel.id, "team-1", FunnelAlert(
+            id="",
+            funnel_id="",
+            metric="conversion_rate",
+            operator="below",
+            threshold=50,
+            notification_channels=["email"],
+            recipients=["ops@example.com"],
+        ))
+
+    now = datetime(2026, 1, 20, 12)
+    triggered = service.check_alerts(now)
+
+    [(sql, params)] = service.client.queries("SELECT funnel_id")
+    assert "countIf(reached >= 1), countIf(reached >= 2)" in sql
+    assert "(funnel_id, signature) IN %(keys)s" in sql
+    assert params["team_id"] == "team-1"
+    assert [funnel_id for funnel_id, _ in params["keys"]] == ["f1", "f2"]
+    # The last complete day, not the partial one alerts are checked on
+    assert (params["start_day"], params["end_day"]) == (date(2026, 1, 19), date(2026, 1, 19))
+    assert [alert["funnel_id"] for alert in triggered] == ["f1"]
+    assert triggered[0]["current_value"] == 30.0
+
+
+def test_alerts_skip_funnels_whose_counts_cannot_be_read(service, monkeypatch):
+    funnel = make_funnel()
+    service.funnels[funnel.id] = funnel
+    service.create_alert(funnel.id, "team-1", FunnelAlert(
+        id="",
+        funnel_id="",
+        metric="conversion_rate",
+        operator="below",
+        threshold=50,
+        notification_channels=["email"],
+        recipients=["ops@example.com"],
+    ))
+    monkeypatch.setattr(settings, "FUNNEL_STATE_ENABLED", False)
+
+    def unavailable(sql, params):
+        raise ConnectionError("ClickHouse unavailable")
+
+    # Alerts run on a client of their own, not the service's
+    own_client = RecordingClient(unavailable)
+
+    assert service.check_alerts(datetime(2026, 1, 20, 12), client=own_client) == []
+    assert own_client.calls and not service.client.calls
+    assert service._alert_cache == {}
@@ -0,0 +1,119 @@
+"""Retention snapshot SQL and the analyses derived from it."""
+
+from datetime import date, datetime
+
+import pytest
+
+from app.services import retention_service as module
+from app.services.retention_service import RetentionService
+
+START = datetime(2026, 1, 5)
+END = datetime(2026, 1, 18, 23, 59)
+
+# (first_day, active_days, is_returning, frequency, return_days, visitors, visits)
+SNAPSHOT = [
+    (date(2026, 1, 5), [date(2026, 1, 5), date(2026, 1, 12)], False, "2-3 visits", 3, 10, 25),
+    (date(2026, 1, 5), [date(2026, 1, 5)], True, "1 visit", 0, 30, 30),
+    (date(2026, 1, 13), [date(2026, 1, 13)], False, "1 visit", 40, 20, 20),
+]
+
+
+class RecordingClient:
+    """Records every query and answers it with ``rows``."""
+
+    def __init__(self, rows=()):
+        self.calls = []
+        self.rows = list(rows)
+
+    def execute(self, query, params=None):
+        self.calls.append((" ".join(query.split()), params))
+        return self.rows
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = RecordingClient(SNAPSHOT)
+    monkeypatch.setattr(module, "get_clickhouse_client", lambda: client)
+    return client
+
+
+@pytest.fixture
+def service():
+    return RetentionService()
+
+
+def test_snapshot_reads_range_and_returns_in_one_scan(service, client):
+    service.get_snapshot("team-1", START, END)
+
+    [(sql, params)] = client.calls
+    # The main scan, plus the visitor filter of the first-seen lookup
+    assert sql.count("FROM link_events") == 2
+    assert "timestamp <= %(end_date)s + INTERVAL 90 DAY" in sql
+    assert "minIf(timestamp, timestamp > %(end_date)s)" in sql
+    assert params["team_id"] == "team-1"
+
+
+def test_visitors_missing_from_first_seen_are_new(service, client):
+    service.get_snapshot("team-1", START, END)
+
+    [(sql, _)] = client.calls
+    assert "fv.visitor_id != '' AND fv.first_visit < %(start_date)s as is_returning" in sql
+
+
+def test_snapshots_are_cached_per_scope(service, client):
+    service.get_snapshot("team-1", START, END)
+    service.get_snapshot("team-1", START, END.replace(second=30))
+    service.get_snapshot("team-2", START, END)
+
+    assert len(client.calls) == 2
+
+
+def test_weekly_cohorts_count_each_visitor_once_per_week(service, client):
+    result = service.get_cohort_analysis("team-1", START, END, "week", retention_periods=3)
+
+    # Weeks start on Sunday
+    [first, second] = result["cohorts"]
+    assert first["cohort_date"] == "2026-01-04"
+    assert first["initial_users"] == 40
+    assert [period["users"] for period in first["retention"]] == [40, 10, 0]
+    assert first["retention"][1]["rate"] == 25.0
+    assert second["cohort_date"] == "2026-01-11"
+    assert second["initial_users"] == 20
+
+
+def test_returning_and_new_visitors(service, client):
+    summary = service.get_returning_vs_new_visitors("team-1", START, END)["summary"]
+
+    assert summary["new_visitors"] == 30
+    assert summary["returning_visitors"] == 30
+    assert summary["returning_percentage"] == 50.0
+
+
+def test_visit_frequency(service, client):
+    result = service.get_visitor_frequency("team-1", START, END)
+
+    assert result["frequency_distribution"] == [
+        {"bucket": "1 visit", "users": 50, "percentage": 83.33},
+        {"bucket": "2-3 visits", "users": 10, "percentage": 16.67},
+    ]
+    assert result["average_visits_per_user"] == 1.25
+
+
+def test_churn_counts_returns_within_the_window(service, client):
+    result = service.get_churn_analysis("team-1", START, END, churn_days=30)
+
+    assert result["active_users"] == 60
+    # Returned after 3 days; the 40-day return is outside the window
+    assert result["retained_users"] == 10
+    assert result["churn_rate"] == 83.33
+
+
+def test_historical_population_reads_later_and_recent_visits_in_one_scan(service, client):
+    client.rows = [("Active", "Last 7 days", 5, 12)]
+
+    service.get_population("team-1", datetime(2025, 6, 30))
+
+    [(sql, _)] = client.calls
+    assert sql.count("FROM link_events") == 1
+    assert "countIf(timestamp > %(end_date)s) as later_visits" in sql
+    assert "maxIf(timestamp, timestamp <= %(end_date)s)" in sql
@@ -1,12 +1,13 @@
 import logging
 from datetime import datetime, timedelta
 from typing import List, Optional
-from enum import Enum
 
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, Field
 
-from app.exporters import BigQueryExporter, SnowflakeExporter, S3Exporter, ExportFormat
+from app.exporters import BigQueryExporter, ExportFormat, S3Exporter, SnowflakeExporter
+from app.models.export_job import ExportDestination, ExportJob, ExportSchedule
+from app.services.export_service import DEFAULT_EXPORT_LIMIT, export_service
 
 logger = logging.getLogger(__name__)
 
@@ -18,12 +19,6 @@ snowflake_exporter = SnowflakeExporter()
 s3_exporter = S3Exporter()
 
 
-class ExportDestination(str, Enum):
-    BIGQUERY = "bigquery"
-    SNOWFLAKE = "snowflake"
-    S3 = "s3"
-
-
 class ExportRequest(BaseModel):
     destination: ExportDestination
     table_name: str = Field(..., description="Target table name")
@@ -34,15 +29,6 @@ class ExportRequest(BaseModel):
     filters: Optional[dict] = None
 
 
-class ExportResponse(BaseModel):
-    success: bool
-    destination: str
-    records_exported: int
-    bytes_written: int
-    duration_seconds: float
-    error: Optional[str] = None
-
-
 class ScheduledExportRequest(BaseModel):
     destination: ExportDestination
     table_name: str
@@ -54,53 +40,93 @@ class ScheduledExportRequest(BaseModel):
     )
 
 
-# In-memory job storage (use Redis/DB in production)
-export_jobs = {}
-
-
-@router.post("/export", response_model=ExportResponse)
-async def create_export(request: ExportRequest, background_tasks: BackgroundTasks):
-    """Create an export job to BigQuery, Snowflake, or S3"""
+@router.post("/export", response_model=ExportJob, status_code=202)
+async def create_export(request: ExportRequest):
+    """Queue an export job to BigQuery, Snowflake, or S3"""
     try:
-        # Build query if not provided
-        query = request.query
-        if not query:
-            query = _build_default_query(
-                request.table_name,
-                request.date_from,
-                request.date_to,
-                request.filters,
-            )
-
-        # Select exporter
-        if request.destination == ExportDestination.BIGQUERY:
-            exporter = bigquery_exporter
-        elif request.destination == ExportDestination.SNOWFLAKE:
-            exporter = snowflake_exporter
-        else:
-            exporter = s3_exporter
-
-        # Execute export
-        result = await exporter.export_query(
-            query=query,
-            table_name=request.table_name,
-            format=request.format,
+        chunks = export_service.build_chunks(
+            request.table_name,
+            query=request.query,
+            date_from=request.date_from,
+            date_to=request.date_to,
+            filters=request.filters,
         )
-
-        return ExportResponse(
-            success=result.success,
-            destination=result.destination,
-            records_exported=result.records_exported,
-            bytes_written=result.bytes_written,
-            duration_seconds=result.duration_seconds,
-            error=result.error,
+        return await export_service.create_job(
+            request.destination,
+            request.table_name,
+            chunks,
+            request.format,
+            # Range and filter exports keep the historical row cap
+            max_records=None if request.query else DEFAULT_EXPORT_LIMIT,
         )
 
     except Exception as e:
-        logger.error(f"Export failed: {e}")
+        logger.error(f"Failed to queue export: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/export/jobs", response_model=List[ExportJob])
+async def list_export_jobs(limit: int = 50):
+    """List recent export jobs"""
+    return await export_service.list_jobs(limit)
+
+
+@router.get("/export/jobs/{job_id}", response_model=ExportJob)
+async def get_export_job(job_id: str):
+    """Get export job status, progress and ETA"""
+    job = await export_service.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return job
+
+
+@router.post("/export/jobs/{job_id}/cancel", response_model=ExportJob)
+async def cancel_export_job(job_id: str):
+    """Cancel an export job; a running job stops after its current chunk"""
+    job = await export_service.cancel_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return job
+
+
+@router.post("/export/jobs/{job_id}/retry", response_model=ExportJob)
+async def retry_export_job(job_id: str):
+    """Resume a failed or cancelled export job from its last checkpoint"""
+    job = await export_service.retry_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return job
+
+
+@router.post("/export/schedules", response_model=ExportSchedule, status_code=201)
+async def create_export_schedule(request: ScheduledExportRequest):
+    """Schedule a recurring export; each run is queued as an export job"""
+    try:
+        return await export_service.create_schedule(
+            request.destination,
+            request.table_name,
+            request.query,
+            request.schedule,
+            request.format,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/export/schedules", response_model=List[ExportSchedule])
+async def list_export_schedules():
+    """List scheduled exports"""
+    return await export_service.list_schedules()
+
+
+@router.delete("/export/schedules/{schedule_id}")
+async def delete_export_schedule(schedule_id: str):
+    """Delete a scheduled export"""
+    if not await export_service.delete_schedule(schedule_id):
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    return {"success": True, "deleted": schedule_id}
+
+
 @router.post("/export/clicks")
 async def export_clicks(
     destination: ExportDestination,
@@ -149,7 +175,7 @@ async def export_clicks(
         format=format,
     )
 
-    return await create_export(request, BackgroundTasks())
+    return await create_export(request)
 
 
 @router.post("/export/analytics")
@@ -193,7 +219,7 @@ async def export_analytics(
         format=format,
     )
 
-    return await create_export(request, BackgroundTasks())
+    return await create_export(request)
 
 
 @router.get("/export/s3/list")
@@ -230,31 +256,3 @@ async def check_export_health():
         "s3": await s3_exporter.health_check(),
     }
 
-
-def _build_default_query(
-    table_name: str,
-    date_from: Optional[datetime],
-    date_to: Optional[datetime],
-    filters: Optional[dict],
-) -> str:
-    """Build a default query based on table name and filters"""
-    conditions = []
-
-    if date_from:
-        conditions.append(f"timestamp >= '{date_from.isoformat()}'")
-    if date_to:
-        conditions.append(f"timestamp <= '{date_to.isoformat()}'")
-
-    if filters:
-        for key, value in filters.items():
-            if isinstance(value, str):
-                conditions.append(f"{key} = '{value}'")
-            elif isinstance(value, list):
-                values = ", ".join(f"'{v}'" for v in value)
-                conditions.append(f"{key} IN ({values})")
-            else:
-                conditions.append(f"{key} = {value}")
-
-    where_clause = " AND ".join(conditions) if conditions else "1=1"
-
-    return f"SELECT * FROM {table_name} WHERE {where_clause} LIMIT 100000"
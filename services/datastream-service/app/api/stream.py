@@ -7,6 +7,8 @@ from datetime import datetime
 
 from user_agents import parse as parse_user_agent
 
+from app.services.geoip_service import geoip_service
+
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
@@ -62,6 +64,9 @@ async def record_click(event: ClickEvent, request: Request):
             **device_info,
         }
 
+        # Fill geo fields the caller did not supply
+        geoip_service.enrich(click_data)
+
         # Send to Kafka
         await producer.send_click(click_data)
         logger.debug(f"Click event sent to Kafka: {click_data['id']}")
@@ -86,4 +91,5 @@ async def get_stream_status(request: Request):
         "clickhouse_connected": True,
         "messages_processed": 0,
         "messages_failed": 0,
+        "geoip": geoip_service.get_stats(),
     }
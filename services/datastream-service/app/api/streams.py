@@ -1,7 +1,7 @@
 """Data Streams API router."""
 
 from typing import List, Optional
-from fastapi import APIRouter, HTTPException, Header, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Header, Query
 
 from app.models.data_stream import (
     DataStream,
@@ -11,6 +11,10 @@ from app.models.data_stream import (
     BackfillRequest,
     BackfillJob,
     TestConnectionResult,
+    DeadLetterEntry,
+    DeadLetterReason,
+    ReplayRequest,
+    ReplayStatus,
 )
 from app.services.stream_service import stream_service
 
@@ -73,11 +77,11 @@ async def get_global_stats(x_team_id: str = Header(...)):
     total_failures = 0
 
     for stream in streams:
-        stats = await stream_service.get_stats(stream.id)
+        stats = await stream_service.get_stats(stream.id, window_seconds=86400)
         if stats:
-            total_events += stats.events_delivered
-            total_bytes += stats.bytes_delivered
-            total_failures += stats.failed_deliveries
+            total_events += stats.period_events_sent
+            total_bytes += stats.period_bytes_sent
+            total_failures += stats.period_events_failed
 
     return {
         "totalStreams": total_streams,
@@ -217,11 +221,16 @@ async def test_connection(stream_id: str, x_team_id: str = Header(...)):
 
 
 @router.get("/{stream_id}/stats", response_model=StreamStats)
-async def get_stream_stats(stream_id: str, x_team_id: str = Header(...)):
+async def get_stream_stats(
+    stream_id: str,
+    x_team_id: str = Header(...),
+    window_seconds: int = Query(3600, ge=60, le=86400),
+):
     """
     获取传输统计
 
-    获取数据流的传输统计信息，包括发送事件数、失败数等。
+    获取数据流的传输统计信息，包括发送事件数、失败数，以及时间窗口内的
+    吞吐量和批次延迟分位数（p50/p95/p99）。
     """
     stream = await stream_service.get_stream(stream_id)
     if not stream:
@@ -230,14 +239,15 @@ async def get_stream_stats(stream_id: str, x_team_id: str = Header(...)):
     if stream.team_id != x_team_id:
         raise HTTPException(status_code=403, detail="Access denied")
 
-    stats = await stream_service.get_stats(stream_id)
+    stats = await stream_service.get_stats(stream_id, window_seconds)
     if not stats:
         # Return empty stats
-        from datetime import datetime
+        from datetime import datetime, timedelta
+        now = datetime.utcnow()
         stats = StreamStats(
             stream_id=stream_id,
-            period_start=datetime.utcnow(),
-            period_end=datetime.utcnow(),
+            period_start=now - timedelta(seconds=window_seconds),
+            period_end=now,
         )
 
     return stats
@@ -321,6 +331,95 @@ async def get_backfill_status(
     return job
 
 
+# ========== Dead-Letter Queue ==========
+
+
+@router.get("/{stream_id}/dlq", response_model=List[DeadLetterEntry])
+async def list_dead_letters(
+    stream_id: str,
+    x_team_id: str = Header(...),
+    limit: int = 100,
+    reason: Optional[DeadLetterReason] = None,
+):
+    """
+    获取死信队列
+
+    列出投递失败的批次（最早的在前），包含失败原因和错误信息。
+    """
+    stream = await stream_service.get_stream(stream_id)
+    if not stream:
+        raise HTTPException(status_code=404, detail="Stream not found")
+
+    if stream.team_id != x_team_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    return await stream_service.dlq.list(stream_id, limit, reason)
+
+
+@router.post("/{stream_id}/dlq/replay", response_model=ReplayStatus, status_code=202)
+async def replay_dead_letters(
+    stream_id: str,
+    request: ReplayRequest,
+    x_team_id: str = Header(...),
+):
+    """
+    重放死信队列
+
+    按失败顺序以限定速率重新投递死信批次，成功后从队列中移除。
+    """
+    stream = await stream_service.get_stream(stream_id)
+    if not stream:
+        raise HTTPException(status_code=404, detail="Stream not found")
+
+    if stream.team_id != x_team_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    status = await stream_service.start_replay(stream, request)
+    if not status:
+        raise HTTPException(status_code=409, detail="Replay already running")
+
+    return status
+
+
+@router.get("/{stream_id}/dlq/replay", response_model=ReplayStatus)
+async def get_replay_status(stream_id: str, x_team_id: str = Header(...)):
+    """
+    获取重放状态
+
+    获取最近一次死信重放的进度和状态。
+    """
+    stream = await stream_service.get_stream(stream_id)
+    if not stream:
+        raise HTTPException(status_code=404, detail="Stream not found")
+
+    if stream.team_id != x_team_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    status = await stream_service.get_replay(stream_id)
+    if not status:
+        raise HTTPException(status_code=404, detail="No replay found")
+
+    return status
+
+
+@router.delete("/{stream_id}/dlq")
+async def purge_dead_letters(stream_id: str, x_team_id: str = Header(...)):
+    """
+    清空死信队列
+
+    丢弃数据流的所有死信批次。
+    """
+    stream = await stream_service.get_stream(stream_id)
+    if not stream:
+        raise HTTPException(status_code=404, detail="Stream not found")
+
+    if stream.team_id != x_team_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    purged = await stream_service.dlq.purge(stream_id)
+    return {"message": "Dead-letter queue purged", "entries": purged}
+
+
 # ========== Configuration Validation ==========
 
 
@@ -1,5 +1,5 @@
 # Data stream connectors
-from .base import BaseConnector
+from .base import BaseConnector, SendResult
 from .bigquery_connector import BigQueryConnector
 from .s3_connector import S3Connector
 from .kafka_connector import KafkaConnector
@@ -10,6 +10,7 @@ from .gcs_connector import GCSConnector
 
 __all__ = [
     "BaseConnector",
+    "SendResult",
     "BigQueryConnector",
     "S3Connector",
     "KafkaConnector",
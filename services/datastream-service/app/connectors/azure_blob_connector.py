@@ -1,21 +1,22 @@
 """Azure Blob Storage connector for data streams."""
 
-import io
-import json
+import asyncio
+import base64
 import logging
 import time
-from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import Any, Dict, List, Optional
 
+from app.core.config import settings
 from app.models.data_stream import (
     DestinationConfig,
-    TestConnectionResult,
-    SchemaConfig,
-    FileFormat,
-    CompressionType,
     PartitioningConfig,
+    SchemaConfig,
+    TestConnectionResult,
 )
+
 from .base import BaseConnector
+from .multipart import MB, part_size_bytes, upload_parts
+from .rolling_sink import RollingFileSink
 
 logger = logging.getLogger(__name__)
 
@@ -23,16 +24,21 @@ logger = logging.getLogger(__name__)
 class AzureBlobConnector(BaseConnector):
     """Connector for Azure Blob Storage."""
 
+    buffers_events = True
+
     def __init__(
         self,
         config: DestinationConfig,
         schema: Optional[SchemaConfig] = None,
         partitioning: Optional[PartitioningConfig] = None,
+        stream_id: Optional[str] = None,
     ):
         super().__init__(config, schema)
+        self.stream_id = stream_id
         self.blob_service_client = None
         self.container_client = None
         self.partitioning = partitioning or PartitioningConfig()
+        self.sink: Optional[RollingFileSink] = None
 
     async def connect(self) -> None:
         """Establish connection to Azure Blob Storage."""
@@ -69,8 +75,15 @@ class AzureBlobConnector(BaseConnector):
             logger.error(f"Failed to connect to Azure Blob: {e}")
             raise
 
+        # Upload files a previous process accepted events into but never finished
+        await self._get_sink().recover()
+
     async def disconnect(self) -> None:
         """Close the Azure Blob connection."""
+        if self.sink:
+            # Upload whatever is still buffered before dropping the client
+            await self.sink.close()
+            self.sink = None
         self.container_client = None
         self.blob_service_client = None
         self._is_connected = False
@@ -85,120 +98,66 @@ class AzureBlobConnector(BaseConnector):
         if not azure_config or not events:
             return 0
 
-        try:
-            # Transform events
-            transformed_events = [self._transform_event(event) for event in events]
-
-            # Generate file content
-            content, content_type = self._generate_file_content(
-                transformed_events,
-                azure_config.file_format,
-                azure_config.compression,
-            )
-
-            # Generate blob name with partitioning
-            blob_name = self._generate_blob_name(
-                azure_config.prefix,
-                azure_config.file_format,
-            )
+        # Append to the open partition file; the schema is applied per row group
+        accepted = await self._get_sink().write(events)
+        logger.debug(f"Buffered {accepted} events for azure://{azure_config.container_name}")
+        return accepted
 
-            # Upload to Azure Blob
-            blob_client = self.container_client.get_blob_client(blob_name)
-            blob_client.upload_blob(
-                content,
-                overwrite=True,
-                content_settings={
-                    "content_type": content_type,
-                },
-            )
+    async def flush(self, force: bool = False) -> None:
+        """Roll partition files that reached their max age."""
+        if self.sink:
+            await self.sink.flush(force)
 
-            logger.info(
-                f"Uploaded {len(events)} events to azure://{azure_config.container_name}/{blob_name}"
+    def _get_sink(self) -> RollingFileSink:
+        if not self.sink:
+            azure_config = self.config.azure_blob
+            self.sink = RollingFileSink(
+                name="azure",
+                prefix=azure_config.prefix,
+                file_format=azure_config.file_format,
+                compression=azure_config.compression,
+                uploader=self._upload,
+                schema=self.schema,
+                partitioning=self.partitioning,
+                target_size_bytes=azure_config.target_file_size_mb * MB,
+                max_age_seconds=azure_config.max_file_age_seconds,
+                stream_id=self.stream_id,
+                on_uploaded=self.on_delivered,
+                on_undeliverable=self.on_undeliverable,
+                upload_attempts=settings.OBJECT_STORE_UPLOAD_ATTEMPTS,
             )
-            return len(events)
-
-        except Exception as e:
-            logger.error(f"Failed to send events to Azure Blob: {e}")
-            raise
+        return self.sink
 
-    def _generate_blob_name(self, prefix: str, file_format: FileFormat) -> str:
-        """Generate blob name with partitioning."""
-        now = datetime.utcnow()
-        timestamp = now.strftime("%Y%m%d%H%M%S%f")
+    async def _upload(self, blob_name: str, content: bytes, content_type: str) -> None:
+        """Upload a blob, staging blocks in parallel for large files."""
+        from azure.storage.blob import BlobBlock, ContentSettings
 
-        if self.partitioning.enabled:
-            partition_path = self.partitioning.pattern
-            partition_path = partition_path.replace("{YYYY}", now.strftime("%Y"))
-            partition_path = partition_path.replace("{MM}", now.strftime("%m"))
-            partition_path = partition_path.replace("{DD}", now.strftime("%d"))
-            partition_path = partition_path.replace("{HH}", now.strftime("%H"))
+        blob_client = self.container_client.get_blob_client(blob_name)
+        content_settings = ContentSettings(content_type=content_type)
+        part_size = part_size_bytes()
 
-            blob_name = f"{prefix}/{partition_path}/events_{timestamp}.{file_format.value}"
-        else:
-            blob_name = f"{prefix}/events_{timestamp}.{file_format.value}"
-
-        return blob_name.lstrip("/")
-
-    def _generate_file_content(
-        self,
-        events: List[Dict[str, Any]],
-        file_format: FileFormat,
-        compression: CompressionType,
-    ) -> tuple[bytes, str]:
-        """Generate file content based on format and compression."""
-        content_type = "application/octet-stream"
-
-        if file_format == FileFormat.JSON:
-            content = json.dumps(events, default=str).encode("utf-8")
-            content_type = "application/json"
-
-        elif file_format == FileFormat.NDJSON:
-            lines = [json.dumps(e, default=str) for e in events]
-            content = "\n".join(lines).encode("utf-8")
-            content_type = "application/x-ndjson"
-
-        elif file_format == FileFormat.CSV:
-            import csv
-            output = io.StringIO()
-            if events:
-                writer = csv.DictWriter(output, fieldnames=events[0].keys())
-                writer.writeheader()
-                writer.writerows(events)
-            content = output.getvalue().encode("utf-8")
-            content_type = "text/csv"
-
-        elif file_format == FileFormat.PARQUET:
-            try:
-                import pyarrow as pa
-                import pyarrow.parquet as pq
-
-                table = pa.Table.from_pylist(events)
-                buffer = io.BytesIO()
-                pq.write_table(table, buffer, compression="snappy")
-                content = buffer.getvalue()
-                content_type = "application/x-parquet"
-            except ImportError:
-                logger.warning("pyarrow not installed, falling back to JSON")
-                content = json.dumps(events, default=str).encode("utf-8")
-                content_type = "application/json"
-
-        else:
-            content = json.dumps(events, default=str).encode("utf-8")
-            content_type = "application/json"
-
-        # Apply compression
-        if compression == CompressionType.GZIP:
-            import gzip
-            content = gzip.compress(content)
-            content_type = "application/gzip"
-        elif compression == CompressionType.LZ4:
-            try:
-                import lz4.frame
-                content = lz4.frame.compress(content)
-            except ImportError:
-                logger.warning("lz4 not installed, skipping compression")
-
-        return content, content_type
+        if len(content) <= part_size:
+            await asyncio.to_thread(
+                blob_client.upload_blob,
+                content,
+                overwrite=True,
+                content_settings=content_settings,
+            )
+            return
+
+        async def upload_part(part_number: int, chunk: bytes) -> str:
+            # Block IDs must be base64 strings of equal length within a blob
+            block_id = base64.b64encode(f"block-{part_number:06d}".encode()).decode()
+            await asyncio.to_thread(blob_client.stage_block, block_id, chunk)
+            return block_id
+
+        # Uncommitted blocks are discarded by Azure if the commit never happens
+        block_ids = await upload_parts(content, part_size, upload_part)
+        await asyncio.to_thread(
+            blob_client.commit_block_list,
+            [BlobBlock(block_id=block_id) for block_id in block_ids],
+            content_settings=content_settings,
+        )
 
     async def test_connection(self) -> TestConnectionResult:
         """Test Azure Blob connection."""
@@ -210,7 +169,7 @@ class AzureBlobConnector(BaseConnector):
             azure_config = self.config.azure_blob
 
             # Check if container exists
-            exists = self.container_client.exists()
+            exists = await asyncio.to_thread(self.container_client.exists)
 
             latency = (time.time() - start_time) * 1000
 
@@ -1,26 +1,51 @@
 """Base connector interface for data streams."""
 
-from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
-from datetime import datetime
+import asyncio
 import logging
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
 
 from app.models.data_stream import (
+    DeliveryConfig,
     DestinationConfig,
-    TestConnectionResult,
     SchemaConfig,
+    TestConnectionResult,
 )
 
+from .delivery import backoff_delay
+from .transform import BatchTransformer
+
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class SendResult:
+    """Outcome of a partly accepted send: ``rejected`` indexes the events passed in."""
+
+    accepted: int
+    rejected: List[int] = field(default_factory=list)
+
+
 class BaseConnector(ABC):
     """Base class for all data stream connectors."""
 
+    # True for connectors whose ``send`` only buffers events locally. Their
+    # events count as delivered when ``on_delivered`` is called, not on send
+    buffers_events = False
+
     def __init__(self, config: DestinationConfig, schema: Optional[SchemaConfig] = None):
         self.config = config
         self.schema = schema
+        self.transformer = BatchTransformer(schema)
         self._is_connected = False
+        # Set by the stream service for buffering connectors: (events, bytes)
+        # once buffered events reach the destination, and (events, error) for
+        # buffered events that never will
+        self.on_delivered: Optional[Callable[[int, int], Awaitable[None]]] = None
+        self.on_undeliverable: Optional[
+            Callable[[List[Dict[str, Any]], str], Awaitable[None]]
+        ] = None
 
     @abstractmethod
     async def connect(self) -> None:
@@ -33,10 +58,11 @@ class BaseConnector(ABC):
         pass
 
     @abstractmethod
-    async def send(self, events: List[Dict[str, Any]]) -> int:
+    async def send(self, events: List[Dict[str, Any]]) -> Union[int, SendResult]:
         """
         Send events to the destination.
-        Returns the number of successfully sent events.
+        Returns the number of successfully sent events, which are taken to be
+        the leading ones, or a SendResult naming the events that were rejected.
         """
         pass
 
@@ -45,65 +71,115 @@ class BaseConnector(ABC):
         """Test the connection to the destination."""
         pass
 
+    async def flush(self, force: bool = False) -> None:
+        """
+        Flush data buffered by the connector.
+        Connectors that deliver immediately have nothing to flush.
+        """
+        pass
+
     async def send_batch(
         self,
         events: List[Dict[str, Any]],
         batch_size: int = 1000,
-    ) -> Dict[str, int]:
+        delivery: Optional[DeliveryConfig] = None,
+    ) -> Dict[str, Any]:
         """
-        Send events in batches.
-        Returns a dict with 'sent' and 'failed' counts.
+        Send events in sub-batches, up to ``delivery.max_in_flight`` at once.
+
+        Each sub-batch is retried on exceptions with jittered exponential
+        backoff. A short count from ``send`` is final (the destination
+        rejected those events) and is not retried.
+
+        Returns a dict with:
+        - 'sent' / 'failed': event counts
+        - 'retryable': events of sub-batches that exhausted their retries,
+          in their original order, for the caller to redeliver
+        - 'rejected': (rejected events, accepted count) for each sub-batch
+          the destination only partly accepted
+        - 'error': the last delivery error, if any
         """
+        delivery = delivery or DeliveryConfig()
+        batches = [events[i:i + batch_size] for i in range(0, len(events), batch_size)]
+        semaphore = asyncio.Semaphore(self.max_in_flight(delivery))
+
+        async def _deliver(batch: List[Dict[str, Any]]):
+            async with semaphore:
+                return await self._send_with_retry(batch, delivery)
+
+        # gather keeps results in sub-batch order whatever order they finish in
+        results = await asyncio.gather(*(_deliver(batch) for batch in batches))
+
         sent = 0
         failed = 0
+        retryable: List[Dict[str, Any]] = []
+        rejected: List[tuple] = []
+        last_error = None
+        for batch, (outcome, error) in zip(batches, results):
+            if error is not None:
+                retryable.extend(batch)
+                last_error = error
+                continue
+            if not isinstance(outcome, SendResult):
+                outcome = SendResult(outcome, list(range(outcome, len(batch))))
+            sent += outcome.accepted
+            failed += len(batch) - outcome.accepted
+            if outcome.rejected:
+                rejected.append(([batch[i] for i in outcome.rejected], outcome.accepted))
+
+        return {
+            "sent": sent,
+            "failed": failed,
+            "retryable": retryable,
+            "rejected": rejected,
+            "error": last_error,
+        }
 
-        for i in range(0, len(events), batch_size):
-            batch = events[i:i + batch_size]
+    async def _send_with_retry(
+        self,
+        batch: List[Dict[str, Any]],
+        delivery: DeliveryConfig,
+    ) -> tuple:
+        """Send one sub-batch. Returns (send result, None) or (0, error) after retries."""
+        max_retries = self.max_retries(delivery)
+        attempt = 0
+        while True:
             try:
-                count = await self.send(batch)
-                sent += count
-                failed += len(batch) - count
+                return await self.send(batch), None
             except Exception as e:
-                logger.error(f"Failed to send batch: {e}")
-                failed += len(batch)
+                if attempt >= max_retries:
+                    logger.error(f"Failed to send batch after {attempt} retries: {e}")
+                    return 0, str(e)
+                delay = backoff_delay(
+                    attempt,
+                    delivery.retry_backoff_seconds,
+                    delivery.max_backoff_seconds,
+                )
+                attempt += 1
+                logger.warning(
+                    f"Send failed ({e}), retry {attempt}/{max_retries} in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+
+    def max_in_flight(self, delivery: DeliveryConfig) -> int:
+        """Concurrent sub-batches allowed for this destination."""
+        return max(delivery.max_in_flight, 1)
+
+    def flush_size(self, delivery: DeliveryConfig) -> int:
+        """Events the stream buffers before flushing them to ``send_batch``."""
+        return delivery.batch_size
 
-        return {"sent": sent, "failed": failed}
+    def max_retries(self, delivery: DeliveryConfig) -> int:
+        """Retries per sub-batch for this destination."""
+        return delivery.max_retries
 
     def _transform_event(self, event: Dict[str, Any]) -> Dict[str, Any]:
         """Transform event based on schema configuration."""
-        if not self.schema or self.schema.mode == "auto":
-            return event
-
-        # Apply custom schema transformations
-        transformed = {}
-        for field in self.schema.fields:
-            if field.name in event:
-                transformed[field.name] = self._cast_value(
-                    event[field.name],
-                    field.type
-                )
-        return transformed
-
-    def _cast_value(self, value: Any, target_type: str) -> Any:
-        """Cast value to target type."""
-        if value is None:
-            return None
-
-        type_mapping = {
-            "STRING": str,
-            "INT64": int,
-            "FLOAT64": float,
-            "BOOLEAN": bool,
-            "TIMESTAMP": lambda v: datetime.fromisoformat(v) if isinstance(v, str) else v,
-        }
+        return self.transformer.transform(event)
 
-        cast_func = type_mapping.get(target_type.upper())
-        if cast_func:
-            try:
-                return cast_func(value)
-            except (ValueError, TypeError):
-                return value
-        return value
+    def _transform_events(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Transform a batch of events column-wise based on schema configuration."""
+        return self.transformer.to_rows(events)
 
     @property
     def is_connected(self) -> bool:
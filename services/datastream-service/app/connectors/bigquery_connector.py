@@ -1,17 +1,25 @@
 """BigQuery connector for data streams."""
 
+import asyncio
 import json
 import logging
 import time
-from typing import List, Dict, Any, Optional
 from datetime import datetime
+from typing import Any, Dict, List, Optional, Union
 
 from app.models.data_stream import (
     DestinationConfig,
-    TestConnectionResult,
     SchemaConfig,
+    TestConnectionResult,
+)
+
+from .base import BaseConnector, SendResult
+from .bigquery_sink import (
+    WRITE_MODE_AUTO,
+    WRITE_MODE_LOAD_JOB,
+    WRITE_MODE_STORAGE_WRITE,
+    BigQuerySink,
 )
-from .base import BaseConnector
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +31,7 @@ class BigQueryConnector(BaseConnector):
         super().__init__(config, schema)
         self.client = None
         self.table_ref = None
+        self.sink: Optional[BigQuerySink] = None
 
     async def connect(self) -> None:
         """Establish connection to BigQuery."""
@@ -35,6 +44,7 @@ class BigQueryConnector(BaseConnector):
                 raise ValueError("BigQuery configuration is required")
 
             # Create credentials
+            credentials = None
             if bq_config.credentials_json:
                 credentials_info = json.loads(bq_config.credentials_json)
                 credentials = service_account.Credentials.from_service_account_info(
@@ -60,6 +70,12 @@ class BigQueryConnector(BaseConnector):
             self.table_ref = self.client.dataset(bq_config.dataset_id).table(
                 bq_config.table_id
             )
+            self.sink = BigQuerySink(
+                self.client,
+                f"{bq_config.project_id}.{bq_config.dataset_id}.{bq_config.table_id}",
+                self.schema,
+                credentials=credentials,
+            )
 
             self._is_connected = True
             logger.info(f"Connected to BigQuery: {bq_config.project_id}")
@@ -77,31 +93,31 @@ class BigQueryConnector(BaseConnector):
             self.client.close()
             self.client = None
             self.table_ref = None
+            self.sink = None
             self._is_connected = False
             logger.info("Disconnected from BigQuery")
 
-    async def send(self, events: List[Dict[str, Any]]) -> int:
+    async def send(self, events: List[Dict[str, Any]]) -> Union[int, SendResult]:
         """Send events to BigQuery."""
         if not self._is_connected or not self.client:
             await self.connect()
 
         try:
-            # Transform events
-            rows = [self._transform_event(event) for event in events]
-
-            # Insert rows
-            errors = self.client.insert_rows_json(self.table_ref, rows)
-
-            if errors:
-                logger.error(f"BigQuery insert errors: {errors}")
-                return len(events) - len(errors)
-
-            return len(events)
+            return await asyncio.to_thread(self.sink.write, events, self._write_mode(len(events)))
 
         except Exception as e:
             logger.error(f"Failed to send events to BigQuery: {e}")
             raise
 
+    def _write_mode(self, batch_size: int) -> str:
+        """Storage Write for live batches, load jobs for large (backfill) batches."""
+        bq_config = self.config.bigquery
+        if bq_config.write_mode != WRITE_MODE_AUTO:
+            return bq_config.write_mode
+        if batch_size >= bq_config.load_job_threshold:
+            return WRITE_MODE_LOAD_JOB
+        return WRITE_MODE_STORAGE_WRITE
+
     async def test_connection(self) -> TestConnectionResult:
         """Test BigQuery connection."""
         start_time = time.time()
@@ -0,0 +1,303 @@
+"""BigQuery write paths: Parquet load jobs and the Storage Write API."""
+
+import calendar
+import io
+import logging
+from datetime import date, datetime
+from typing import Any, BinaryIO, Dict, List, Optional, Union
+from uuid import uuid4
+
+from app.models.data_stream import (
+    CompressionType,
+    FileFormat,
+    SchemaConfig,
+    SchemaField,
+)
+
+from .base import SendResult
+from .file_writer import ColumnarFileWriter
+from .transform import BatchTransformer
+
+logger = logging.getLogger(__name__)
+
+WRITE_MODE_AUTO = "auto"
+WRITE_MODE_STORAGE_WRITE = "storage_write"
+WRITE_MODE_LOAD_JOB = "load_job"
+WRITE_MODE_STREAMING_INSERT = "streaming_insert"
+
+# Storage Write API rejects requests above 10MB
+MAX_APPEND_REQUEST_BYTES = 8 * 1024 * 1024
+
+EPOCH = date(1970, 1, 1)
+
+
+def _timestamp_micros(value: datetime) -> int:
+    return calendar.timegm(value.utctimetuple()) * 1_000_000 + value.microsecond
+
+
+def _date_days(value: Any) -> int:
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    elif isinstance(value, datetime):
+        value = value.date()
+    return (value - EPOCH).days
+
+
+class BigQuerySink:
+    """
+    Write batches to one BigQuery table without the legacy streaming API.
+
+    - ``load_job``: the batch is written as a Parquet file and loaded with a
+      load job; free of streaming quotas, suited to backfills and exports.
+    - ``storage_write``: rows are serialized as protobuf, typed per column
+      from the table schema, and appended to the table's default stream.
+    - ``streaming_insert``: legacy ``insert_rows_json``, used only when the
+      Storage Write client library is unavailable.
+
+    All methods are blocking; callers run them in a worker thread.
+    """
+
+    def __init__(
+        self,
+        client,
+        table_id: str,
+        schema: Optional[SchemaConfig] = None,
+        credentials=None,
+    ):
+        self.client = client
+        self.table_id = table_id
+        self.schema = schema
+        self.credentials = credentials
+        self._table_schema: Optional[SchemaConfig] = None
+        self._write_client = None
+        self._proto_descriptor = None
+        self._row_class = None
+        self.bytes_loaded = 0
+
+    def write(self, events: List[Dict[str, Any]], mode: str) -> Union[int, SendResult]:
+        """Write events with the given mode. Returns the rows written, or a SendResult."""
+        if not events:
+            return 0
+
+        if mode == WRITE_MODE_LOAD_JOB:
+            return self.load(events)
+
+        if mode == WRITE_MODE_STORAGE_WRITE:
+            try:
+                return self.append(events)
+            except ImportError:
+                logger.warning(
+                    "google-cloud-bigquery-storage not installed, falling back to insert_rows_json"
+                )
+
+        return self.insert(events)
+
+    # ========== Load jobs ==========
+
+    def load(self, events: List[Dict[str, Any]]) -> int:
+        """Load events as a Parquet file with a load job."""
+        buffer = io.BytesIO()
+        writer = ColumnarFileWriter(
+            buffer,
+            FileFormat.PARQUET,
+            CompressionType.SNAPPY,
+            self.get_table_schema(),
+        )
+        if writer.file_format != FileFormat.PARQUET:
+            raise RuntimeError("pyarrow is required for BigQuery load jobs")
+        writer.write_rows(events)
+        writer.close()
+        self.bytes_loaded = buffer.tell()
+        buffer.seek(0)
+        return self.load_file(buffer)
+
+    def load_file(self, source: BinaryIO) -> int:
+        """Load an open Parquet file with a load job. Returns rows loaded."""
+        from google.cloud import bigquery
+
+        job_config = bigquery.LoadJobConfig(
+            source_format=bigquery.SourceFormat.PARQUET,
+            write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+        )
+        job = self.client.load_table_from_file(
+            source,
+            self.table_id,
+            job_id_prefix="lnk_load_",
+            job_config=job_config,
+        )
+        job.result()
+
+        logger.info(f"Loaded {job.output_rows} rows into {self.table_id}")
+        return job.output_rows or 0
+
+    # ========== Storage Write API ==========
+
+    def append(self, events: List[Dict[str, Any]]) -> int:
+        """Append events to the table's default write stream."""
+        from google.cloud import bigquery_storage_v1
+        from google.cloud.bigquery_storage_v1 import types
+
+        if self._write_client is None:
+            self._write_client = bigquery_storage_v1.BigQueryWriteClient(
+                credentials=self.credentials,
+            )
+        if self._row_class is None:
+            self._build_row_class()
+
+        project, dataset, table = self.table_id.split(".")
+        stream_name = f"projects/{project}/datasets/{dataset}/tables/{table}/streams/_default"
+
+        serialized = self._serialize_rows(events)
+
+        def requests():
+            batch: List[bytes] = []
+            size = 0
+            first = True
+            for row in serialized:
+                if batch and size + len(row) > MAX_APPEND_REQUEST_BYTES:
+                    yield self._append_request(types, stream_name, batch, first)
+                    batch, size, first = [], 0, False
+                batch.append(row)
+                size += len(row)
+            if batch:
+                yield self._append_request(types, stream_name, batch, first)
+
+        responses = self._write_client.append_rows(
+            requests(),
+            metadata=(("x-goog-request-params", f"write_stream={stream_name}"),),
+        )
+        for response in responses:
+            if response.error.code:
+                raise RuntimeError(f"Storage Write append failed: {response.error.message}")
+            if response.row_errors:
+                raise RuntimeError(f"Storage Write row errors: {list(response.row_errors)[:3]}")
+
+        return len(events)
+
+    def _append_request(self, types, stream_name: str, rows: List[bytes], first: bool):
+        proto_data = types.AppendRowsRequest.ProtoData(
+            rows=types.ProtoRows(serialized_rows=rows),
+        )
+        if first:
+            # The writer schema is only required on the first request of a connection
+            proto_data.writer_schema = types.ProtoSchema(proto_descriptor=self._proto_descriptor)
+        return types.AppendRowsRequest(write_stream=stream_name, proto_rows=proto_data)
+
+    def _build_row_class(self) -> None:
+        """Build a protobuf message type matching the table schema."""
+        from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
+
+        field_types = descriptor_pb2.FieldDescriptorProto
+        proto_types = {
+            "STRING": field_types.TYPE_STRING,
+            "INT64": field_types.TYPE_INT64,
+            "INTEGER": field_types.TYPE_INT64,
+            "FLOAT64": field_types.TYPE_DOUBLE,
+            "FLOAT": field_types.TYPE_DOUBLE,
+            "BOOLEAN": field_types.TYPE_BOOL,
+            "BOOL": field_types.TYPE_BOOL,
+            "TIMESTAMP": field_types.TYPE_INT64,  # Microseconds since epoch
+            "DATE": field_types.TYPE_INT32,  # Days since epoch
+        }
+
+        schema = self.get_table_schema()
+        if not schema:
+            raise RuntimeError(f"Table {self.table_id} has no schema for Storage Write")
+
+        descriptor = descriptor_pb2.DescriptorProto(name="Row")
+        for number, field in enumerate(schema.fields, start=1):
+            descriptor.field.add(
+                name=field.name,
+                number=number,
+                type=proto_types.get(field.type.upper(), field_types.TYPE_STRING),
+                label=field_types.LABEL_OPTIONAL,
+            )
+
+        package = f"lnk_{uuid4().hex}"
+        file_proto = descriptor_pb2.FileDescriptorProto(
+            name=f"{package}.proto",
+            package=package,
+            syntax="proto2",
+        )
+        file_proto.message_type.add().CopyFrom(descriptor)
+
+        pool = descriptor_pool.DescriptorPool()
+        pool.Add(file_proto)
+        row_descriptor = pool.FindMessageTypeByName(f"{package}.Row")
+        if hasattr(message_factory, "GetMessageClass"):
+            self._row_class = message_factory.GetMessageClass(row_descriptor)
+        else:  # protobuf < 4.22
+            self._row_class = message_factory.MessageFactory(pool).GetPrototype(row_descriptor)
+        self._proto_descriptor = descriptor
+
+    def _serialize_rows(self, events: List[Dict[str, Any]]) -> List[bytes]:
+        """Serialize events column-wise into protobuf rows."""
+        schema = self.get_table_schema()
+        transformer = BatchTransformer(schema)
+        columns = transformer.to_columns(events, strict=True)
+
+        converters = {}
+        for field in schema.fields:
+            type_name = field.type.upper()
+            if type_name == "TIMESTAMP":
+                converters[field.name] = _timestamp_micros
+            elif type_name == "DATE":
+                converters[field.name] = _date_days
+            elif type_name not in ("INT64", "INTEGER", "FLOAT64", "FLOAT", "BOOLEAN", "BOOL"):
+                converters[field.name] = str
+
+        for name, convert in converters.items():
+            columns[name] = [
+                None if value is None else convert(value)
+                for value in columns[name]
+            ]
+
+        names = list(columns.keys())
+        rows = []
+        for values in zip(*(columns[name] for name in names)):
+            message = self._row_class(**{
+                name: value for name, value in zip(names, values) if value is not None
+            })
+            rows.append(message.SerializeToString())
+        return rows
+
+    # ========== Legacy streaming inserts ==========
+
+    def insert(self, events: List[Dict[str, Any]]) -> Union[int, SendResult]:
+        """Insert events with the legacy streaming API.
+
+        Rows are rejected individually, anywhere in the request, so a partial
+        insert returns a SendResult naming them.
+        """
+        transformer = BatchTransformer(self.schema)
+        rows = transformer.to_rows(events)
+        errors = self.client.insert_rows_json(self.table_id, rows)
+
+        if errors:
+            logger.error(f"BigQuery insert errors: {errors[:3]}")
+            rejected = sorted({error["index"] for error in errors})
+            return SendResult(len(events) - len(rejected), rejected)
+        return len(events)
+
+    # ========== Schema ==========
+
+    def get_table_schema(self) -> Optional[SchemaConfig]:
+        """Column types from the custom SchemaConfig, else from the table itself."""
+        if self.schema and self.schema.mode != "auto" and self.schema.fields:
+            return self.schema
+
+        if self._table_schema is None:
+            try:
+                table = self.client.get_table(self.table_id)
+            except Exception as e:
+                logger.debug(f"Could not read schema of {self.table_id}: {e}")
+                return None
+
+            self._table_schema = SchemaConfig(
+                mode="custom",
+                fields=[
+                    SchemaField(name=field.name, type=field.field_type, mode=field.mode)
+                    for field in table.schema
+                ],
+            )
+        return self._table_schema
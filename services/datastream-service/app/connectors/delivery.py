@@ -0,0 +1,79 @@
+"""Retry backoff and circuit breaking for stream delivery."""
+
+import random
+import time
+from typing import Optional
+
+
+def backoff_delay(attempt: int, base_seconds: float, max_seconds: float) -> float:
+    """Exponential backoff with full jitter for the given 0-based attempt."""
+    return random.uniform(0, min(max_seconds, base_seconds * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Stop delivering to a destination after repeated failures.
+
+    After ``failure_threshold`` consecutive failed deliveries the circuit
+    opens for ``cooldown_seconds``; the cooldown doubles (up to
+    ``max_cooldown_seconds``) each time a half-open probe fails again. One
+    successful delivery closes it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        cooldown_seconds: float = 60,
+        max_cooldown_seconds: float = 900,
+    ):
+        self.failure_threshold = max(failure_threshold, 1)
+        self.cooldown_seconds = cooldown_seconds
+        self.max_cooldown_seconds = max_cooldown_seconds
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self._opened_at: Optional[float] = None
+        self._current_cooldown = cooldown_seconds
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self._opened_at >= self._current_cooldown:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    @property
+    def retry_after(self) -> float:
+        """Seconds until the next probe is allowed."""
+        if self._opened_at is None:
+            return 0
+        return max(0.0, self._current_cooldown - (time.monotonic() - self._opened_at))
+
+    def allow(self) -> bool:
+        return self.state != self.OPEN
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.last_error = None
+        self._opened_at = None
+        self._current_cooldown = self.cooldown_seconds
+
+    def record_failure(self, error: Optional[str] = None) -> bool:
+        """Record a failed delivery. Returns True if this opened the circuit."""
+        self.failures += 1
+        self.last_error = error
+
+        if self.state == self.HALF_OPEN:
+            # Probe failed: back off harder
+            self._current_cooldown = min(self._current_cooldown * 2, self.max_cooldown_seconds)
+            self._opened_at = time.monotonic()
+            return False
+
+        if self._opened_at is None and self.failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+            return True
+        return False
@@ -0,0 +1,429 @@
+"""Streaming file writer shared by the object-store connectors."""
+
+import csv
+import gzip
+import io
+import json
+import logging
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional
+
+from app.models.data_stream import (
+    CompressionType,
+    FileFormat,
+    SchemaConfig,
+)
+
+from .transform import BatchTransformer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROW_GROUP_SIZE = 10000
+
+# Parquet and Avro compress pages/blocks themselves, so no outer codec is applied
+PARQUET_CODECS = {
+    CompressionType.NONE: "none",
+    CompressionType.GZIP: "gzip",
+    CompressionType.SNAPPY: "snappy",
+    CompressionType.LZ4: "lz4",
+    CompressionType.ZSTD: "zstd",
+}
+
+AVRO_CODECS = {
+    CompressionType.NONE: "null",
+    CompressionType.GZIP: "deflate",
+    CompressionType.SNAPPY: "snappy",
+    CompressionType.LZ4: "lz4",
+    CompressionType.ZSTD: "zstandard",
+}
+
+# Codec -> whether fastavro can write it here (snappy/zstandard/lz4 need extra libraries)
+_AVRO_CODEC_AVAILABLE: Dict[str, bool] = {}
+
+CONTENT_TYPES = {
+    FileFormat.JSON: "application/json",
+    FileFormat.NDJSON: "application/x-ndjson",
+    FileFormat.CSV: "text/csv",
+    FileFormat.PARQUET: "application/x-parquet",
+    FileFormat.AVRO: "application/avro",
+}
+
+COMPRESSION_EXTENSIONS = {
+    CompressionType.GZIP: "gz",
+    CompressionType.LZ4: "lz4",
+    CompressionType.ZSTD: "zst",
+}
+
+
+def build_avro_schema(
+    schema: Optional[SchemaConfig],
+    sample: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Build an Avro record schema from SchemaConfig, or infer it from a sample row."""
+    timestamp_type = {"type": "long", "logicalType": "timestamp-micros"}
+    type_mapping = {
+        "STRING": "string",
+        "INT64": "long",
+        "INTEGER": "long",
+        "FLOAT64": "double",
+        "FLOAT": "double",
+        "BOOLEAN": "boolean",
+        "BOOL": "boolean",
+        "TIMESTAMP": timestamp_type,
+    }
+
+    fields = []
+    if schema and schema.mode != "auto" and schema.fields:
+        for field in schema.fields:
+            avro_type = type_mapping.get(field.type.upper(), "string")
+            if field.mode == "REQUIRED":
+                fields.append({"name": field.name, "type": avro_type})
+            else:
+                fields.append({"name": field.name, "type": ["null", avro_type], "default": None})
+    else:
+        python_mapping = {
+            str: "string",
+            int: "long",
+            float: "double",
+            bool: "boolean",
+            datetime: timestamp_type,
+        }
+        for key, value in (sample or {}).items():
+            avro_type = python_mapping.get(type(value), "string")
+            fields.append({"name": key, "type": ["null", avro_type], "default": None})
+
+    return {
+        "type": "record",
+        "name": "ClickEvent",
+        "fields": fields,
+    }
+
+
+class ColumnarFileWriter:
+    """
+    Write raw events into a single file incrementally.
+
+    Rows are consumed in chunks of ``row_group_size``; Parquet files get one
+    row group and Avro files one block per chunk, so memory stays bounded by
+    a chunk rather than the whole file. Parquet and Avro use their native
+    codecs; row formats (JSON, NDJSON, CSV) are wrapped in a stream compressor.
+    The SchemaConfig is applied per chunk by a BatchTransformer, so Parquet
+    output never materializes per-event dicts.
+    """
+
+    def __init__(
+        self,
+        sink: BinaryIO,
+        file_format: FileFormat,
+        compression: CompressionType = CompressionType.NONE,
+        schema: Optional[SchemaConfig] = None,
+        row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+    ):
+        self.sink = sink
+        self.file_format = self._resolve_format(file_format)
+        self.compression = compression
+        self.avro_codec: Optional[str] = None
+        if self.file_format == FileFormat.AVRO:
+            self.avro_codec = self._resolve_avro_codec()
+        self.schema = schema
+        self.transformer = BatchTransformer(schema)
+        self.row_group_size = row_group_size
+        self.rows_written = 0
+
+        self._stream: Optional[BinaryIO] = None
+        self._parquet_writer = None
+        self._arrow_schema = None
+        self._avro_writer = None
+        self._avro_schema: Optional[Dict[str, Any]] = None
+        self._avro_string_fields: set = set()
+        self._csv_text = None
+        self._csv_writer = None
+        self._closed = False
+
+    @property
+    def is_columnar(self) -> bool:
+        return self.file_format in (FileFormat.PARQUET, FileFormat.AVRO)
+
+    @property
+    def content_type(self) -> str:
+        if not self.is_columnar and self.compression == CompressionType.GZIP:
+            return "application/gzip"
+        return CONTENT_TYPES.get(self.file_format, "application/octet-stream")
+
+    @property
+    def extension(self) -> str:
+        """File extension including the outer compression suffix, if any."""
+        extension = self.file_format.value
+        suffix = COMPRESSION_EXTENSIONS.get(self.compression)
+        if suffix and not self.is_columnar:
+            extension = f"{extension}.{suffix}"
+        return extension
+
+    def write_rows(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """Append rows to the file. Returns the number of rows written."""
+        if self._closed:
+            raise ValueError("Writer is closed")
+
+        written = 0
+        chunk: List[Dict[str, Any]] = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.row_group_size:
+                written += self._flush_chunk(chunk)
+                chunk = []
+        if chunk:
+            written += self._flush_chunk(chunk)
+
+        return written
+
+    def write_batch(self, batch: Any) -> int:
+        """
+        Append an Arrow record batch (or a list of row dicts).
+
+        Parquet writes record batches directly as a row group; other formats
+        go through row dicts.
+        """
+        if isinstance(batch, list):
+            return self.write_rows(batch)
+        if self._closed:
+            raise ValueError("Writer is closed")
+        if not batch.num_rows:
+            return 0
+
+        if self.file_format != FileFormat.PARQUET:
+            return self.write_rows(batch.to_pylist())
+
+        import pyarrow as pa
+
+        table = pa.Table.from_batches([batch])
+        if not self._parquet_writer:
+            if self.transformer.passthrough:
+                # Widen all-null columns so later blocks with values still fit
+                self._arrow_schema = pa.schema([
+                    pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f
+                    for f in table.schema
+                ])
+                self._open_parquet_writer()
+            else:
+                self._open_parquet([])
+
+        if table.schema != self._arrow_schema:
+            table = table.select(self._arrow_schema.names).cast(self._arrow_schema)
+        self._parquet_writer.write_table(table, row_group_size=table.num_rows)
+        self.rows_written += table.num_rows
+        return table.num_rows
+
+    def close(self) -> None:
+        """Finalize the file footer and flush compressors. The sink stays open."""
+        if self._closed:
+            return
+        self._closed = True
+
+        if self.file_format == FileFormat.PARQUET:
+            if not self._parquet_writer:
+                # Empty file still needs a valid footer
+                self._open_parquet([])
+            self._parquet_writer.close()
+
+        elif self.file_format == FileFormat.AVRO:
+            if not self._avro_writer:
+                self._open_avro({})
+            self._avro_writer.flush()
+
+        else:
+            stream = self._get_row_stream()
+            if self.file_format == FileFormat.JSON:
+                stream.write(b"]" if self.rows_written else b"[]")
+            if self._csv_text:
+                self._csv_text.flush()
+                self._csv_text.detach()
+            if stream is not self.sink:
+                stream.close()
+
+        if not self.sink.closed:
+            self.sink.flush()
+
+    def __enter__(self) -> "ColumnarFileWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    # ========== Format writers ==========
+
+    def _flush_chunk(self, rows: List[Dict[str, Any]]) -> int:
+        # Parquet casts column-wise into Arrow; other formats need row dicts
+        if self.file_format == FileFormat.PARQUET:
+            count = self._write_parquet(rows)
+        elif self.file_format == FileFormat.AVRO:
+            count = self._write_avro(self.transformer.to_rows(rows))
+        elif self.file_format == FileFormat.CSV:
+            count = self._write_csv(self.transformer.to_rows(rows))
+        else:
+            count = self._write_json(self.transformer.to_rows(rows))
+
+        self.rows_written += count
+        return count
+
+    def _open_parquet(self, rows: List[Dict[str, Any]]) -> None:
+        import pyarrow as pa
+
+        self._arrow_schema = self.transformer.arrow_schema
+        if self._arrow_schema is None:
+            # Auto mode: infer from the first chunk, widening all-null columns to string
+            inferred = pa.Table.from_pylist(rows).schema
+            self._arrow_schema = pa.schema([
+                pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f
+                for f in inferred
+            ])
+
+        self._open_parquet_writer()
+
+    def _open_parquet_writer(self) -> None:
+        import pyarrow.parquet as pq
+
+        self._parquet_writer = pq.ParquetWriter(
+            self.sink,
+            self._arrow_schema,
+            compression=PARQUET_CODECS.get(self.compression, "snappy"),
+        )
+
+    def _write_parquet(self, rows: List[Dict[str, Any]]) -> int:
+        import pyarrow as pa
+
+        if not self._parquet_writer:
+            self._open_parquet(rows)
+
+        if self.transformer.passthrough:
+            table = pa.Table.from_pylist(rows, schema=self._arrow_schema)
+        else:
+            table = self.transformer.to_arrow(rows)
+        self._parquet_writer.write_table(table, row_group_size=len(rows))
+        return len(rows)
+
+    def _open_avro(self, sample: Dict[str, Any]) -> None:
+        from fastavro import parse_schema
+        from fastavro.write import Writer
+
+        self._avro_schema = build_avro_schema(self.schema, sample)
+        self._avro_string_fields = {
+            f["name"] for f in self._avro_schema["fields"]
+            if "string" in (f["type"] if isinstance(f["type"], list) else [f["type"]])
+        }
+        self._avro_writer = Writer(
+            self.sink,
+            parse_schema(self._avro_schema),
+            codec=self.avro_codec,
+        )
+
+    def _write_avro(self, rows: List[Dict[str, Any]]) -> int:
+        if not self._avro_writer:
+            self._open_avro(rows[0])
+
+        string_fields = self._avro_string_fields
+        for row in rows:
+            record = {
+                key: str(value) if key in string_fields and value is not None
+                and not isinstance(value, str) else value
+                for key, value in row.items()
+            }
+            self._avro_writer.write(record)
+
+        # One Avro block per chunk
+        self._avro_writer.flush()
+        return len(rows)
+
+    def _write_json(self, rows: List[Dict[str, Any]]) -> int:
+        stream = self._get_row_stream()
+
+        if self.file_format == FileFormat.JSON:
+            prefix = b"," if self.rows_written else b"["
+            body = b",".join(json.dumps(row, default=str).encode("utf-8") for row in rows)
+            stream.write(prefix + body)
+        else:
+            separator = b"\n" if self.rows_written else b""
+            body = b"\n".join(json.dumps(row, default=str).encode("utf-8") for row in rows)
+            stream.write(separator + body)
+
+        return len(rows)
+
+    def _write_csv(self, rows: List[Dict[str, Any]]) -> int:
+        if not self._csv_writer:
+            stream = self._get_row_stream()
+            self._csv_text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+            if self.schema and self.schema.mode != "auto" and self.schema.fields:
+                fieldnames = [field.name for field in self.schema.fields]
+            else:
+                fieldnames = list(rows[0].keys())
+            self._csv_writer = csv.DictWriter(
+                self._csv_text,
+                fieldnames=fieldnames,
+                extrasaction="ignore",
+            )
+            self._csv_writer.writeheader()
+
+        self._csv_writer.writerows(rows)
+        return len(rows)
+
+    def _get_row_stream(self) -> BinaryIO:
+        """Get the (possibly compressing) stream row formats write into."""
+        if self._stream is not None:
+            return self._stream
+
+        self._stream = self.sink
+        if self.compression == CompressionType.GZIP:
+            self._stream = gzip.GzipFile(fileobj=self.sink, mode="wb")
+        elif self.compression == CompressionType.LZ4:
+            try:
+                import lz4.frame
+                self._stream = lz4.frame.LZ4FrameFile(self.sink, mode="wb")
+            except ImportError:
+                logger.warning("lz4 not installed, skipping compression")
+                self.compression = CompressionType.NONE
+        elif self.compression == CompressionType.ZSTD:
+            try:
+                import zstandard
+                self._stream = zstandard.ZstdCompressor().stream_writer(
+                    self.sink,
+                    closefd=False,
+                )
+            except ImportError:
+                logger.warning("zstandard not installed, skipping compression")
+                self.compression = CompressionType.NONE
+
+        return self._stream
+
+    def _resolve_avro_codec(self) -> str:
+        """Fall back to deflate when the Avro codec's library is unavailable."""
+        codec = AVRO_CODECS.get(self.compression, "deflate")
+        if codec not in _AVRO_CODEC_AVAILABLE:
+            from fastavro import writer
+
+            # fastavro only reports a missing codec library when it writes a block
+            try:
+                probe_schema = {"type": "record", "name": "probe", "fields": []}
+                writer(io.BytesIO(), probe_schema, [{}], codec=codec)
+                _AVRO_CODEC_AVAILABLE[codec] = True
+            except ValueError:
+                _AVRO_CODEC_AVAILABLE[codec] = False
+
+        if not _AVRO_CODEC_AVAILABLE[codec]:
+            logger.warning(f"Avro {codec} codec library not installed, using deflate")
+            return "deflate"
+        return codec
+
+    def _resolve_format(self, file_format: FileFormat) -> FileFormat:
+        """Fall back to JSON when the columnar library is unavailable."""
+        file_format = FileFormat(file_format)
+        try:
+            if file_format == FileFormat.PARQUET:
+                import pyarrow  # noqa: F401
+                import pyarrow.parquet  # noqa: F401
+            elif file_format == FileFormat.AVRO:
+                import fastavro  # noqa: F401
+        except ImportError:
+            logger.warning(
+                f"{file_format.value} writer dependencies not installed, falling back to JSON"
+            )
+            return FileFormat.JSON
+        return file_format
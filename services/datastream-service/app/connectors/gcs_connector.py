@@ -1,38 +1,47 @@
 """Google Cloud Storage connector for data streams."""
 
-import io
+import asyncio
 import json
 import logging
+import math
 import time
-from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import Any, Dict, List, Optional
 
+from app.core.config import settings
 from app.models.data_stream import (
     DestinationConfig,
-    TestConnectionResult,
-    SchemaConfig,
-    FileFormat,
-    CompressionType,
     PartitioningConfig,
+    SchemaConfig,
+    TestConnectionResult,
 )
+
 from .base import BaseConnector
+from .multipart import MB, part_size_bytes, upload_parts
+from .rolling_sink import RollingFileSink
 
 logger = logging.getLogger(__name__)
 
+MAX_COMPOSE_SOURCES = 32
+
 
 class GCSConnector(BaseConnector):
     """Connector for Google Cloud Storage."""
 
+    buffers_events = True
+
     def __init__(
         self,
         config: DestinationConfig,
         schema: Optional[SchemaConfig] = None,
         partitioning: Optional[PartitioningConfig] = None,
+        stream_id: Optional[str] = None,
     ):
         super().__init__(config, schema)
+        self.stream_id = stream_id
         self.client = None
         self.bucket = None
         self.partitioning = partitioning or PartitioningConfig()
+        self.sink: Optional[RollingFileSink] = None
 
     async def connect(self) -> None:
         """Establish connection to Google Cloud Storage."""
@@ -77,8 +86,15 @@ class GCSConnector(BaseConnector):
             logger.error(f"Failed to connect to GCS: {e}")
             raise
 
+        # Upload files a previous process accepted events into but never finished
+        await self._get_sink().recover()
+
     async def disconnect(self) -> None:
         """Close the GCS connection."""
+        if self.sink:
+            # Upload whatever is still buffered before dropping the client
+            await self.sink.close()
+            self.sink = None
         self.client = None
         self.bucket = None
         self._is_connected = False
@@ -93,139 +109,74 @@ class GCSConnector(BaseConnector):
         if not gcs_config or not events:
             return 0
 
-        try:
-            # Transform events
-            transformed_events = [self._transform_event(event) for event in events]
-
-            # Generate file content
-            content, content_type = self._generate_file_content(
-                transformed_events,
-                gcs_config.file_format,
-                gcs_config.compression,
-            )
-
-            # Generate object name with partitioning
-            object_name = self._generate_object_name(
-                gcs_config.prefix,
-                gcs_config.file_format,
-            )
+        # Append to the open partition file; the schema is applied per row group
+        accepted = await self._get_sink().write(events)
+        logger.debug(f"Buffered {accepted} events for gs://{gcs_config.bucket_name}")
+        return accepted
 
-            # Upload to GCS
-            blob = self.bucket.blob(object_name)
-            blob.upload_from_string(content, content_type=content_type)
+    async def flush(self, force: bool = False) -> None:
+        """Roll partition files that reached their max age."""
+        if self.sink:
+            await self.sink.flush(force)
 
-            logger.info(
-                f"Uploaded {len(events)} events to gs://{gcs_config.bucket_name}/{object_name}"
+    def _get_sink(self) -> RollingFileSink:
+        if not self.sink:
+            gcs_config = self.config.gcs
+            self.sink = RollingFileSink(
+                name="gcs",
+                prefix=gcs_config.prefix,
+                file_format=gcs_config.file_format,
+                compression=gcs_config.compression,
+                uploader=self._upload,
+                schema=self.schema,
+                partitioning=self.partitioning,
+                target_size_bytes=gcs_config.target_file_size_mb * MB,
+                max_age_seconds=gcs_config.max_file_age_seconds,
+                stream_id=self.stream_id,
+                on_uploaded=self.on_delivered,
+                on_undeliverable=self.on_undeliverable,
+                upload_attempts=settings.OBJECT_STORE_UPLOAD_ATTEMPTS,
             )
-            return len(events)
+        return self.sink
 
-        except Exception as e:
-            logger.error(f"Failed to send events to GCS: {e}")
-            raise
+    async def _upload(self, object_name: str, content: bytes, content_type: str) -> None:
+        """
+        Upload an object, using a parallel composite upload for large files.
 
-    def _generate_object_name(self, prefix: str, file_format: FileFormat) -> str:
-        """Generate object name with partitioning."""
-        now = datetime.utcnow()
-        timestamp = now.strftime("%Y%m%d%H%M%S%f")
+        Parts are written as temporary objects concurrently and then composed
+        into the final object in a single request.
+        """
+        # GCS composes at most 32 source objects per request
+        part_size = max(part_size_bytes(), math.ceil(len(content) / MAX_COMPOSE_SOURCES))
 
-        if self.partitioning.enabled:
-            partition_path = self.partitioning.pattern
-            partition_path = partition_path.replace("{YYYY}", now.strftime("%Y"))
-            partition_path = partition_path.replace("{MM}", now.strftime("%m"))
-            partition_path = partition_path.replace("{DD}", now.strftime("%d"))
-            partition_path = partition_path.replace("{HH}", now.strftime("%H"))
+        if len(content) <= part_size:
+            blob = self.bucket.blob(object_name)
+            await asyncio.to_thread(
+                blob.upload_from_string,
+                content,
+                content_type=content_type,
+            )
+            return
 
-            object_name = f"{prefix}/{partition_path}/events_{timestamp}.{file_format.value}"
-        else:
-            object_name = f"{prefix}/events_{timestamp}.{file_format.value}"
+        uploaded = []
 
-        return object_name.lstrip("/")
+        async def upload_part(part_number: int, chunk: bytes):
+            part = self.bucket.blob(f"{object_name}.part{part_number:05d}")
+            await asyncio.to_thread(part.upload_from_string, chunk)
+            uploaded.append(part)
+            return part
 
-    def _generate_file_content(
-        self,
-        events: List[Dict[str, Any]],
-        file_format: FileFormat,
-        compression: CompressionType,
-    ) -> tuple[bytes, str]:
-        """Generate file content based on format and compression."""
-        content_type = "application/octet-stream"
-
-        if file_format == FileFormat.JSON:
-            content = json.dumps(events, default=str).encode("utf-8")
-            content_type = "application/json"
-
-        elif file_format == FileFormat.NDJSON:
-            lines = [json.dumps(e, default=str) for e in events]
-            content = "\n".join(lines).encode("utf-8")
-            content_type = "application/x-ndjson"
-
-        elif file_format == FileFormat.CSV:
-            import csv
-            output = io.StringIO()
-            if events:
-                writer = csv.DictWriter(output, fieldnames=events[0].keys())
-                writer.writeheader()
-                writer.writerows(events)
-            content = output.getvalue().encode("utf-8")
-            content_type = "text/csv"
-
-        elif file_format == FileFormat.PARQUET:
-            try:
-                import pyarrow as pa
-                import pyarrow.parquet as pq
-
-                table = pa.Table.from_pylist(events)
-                buffer = io.BytesIO()
-                pq.write_table(table, buffer, compression="snappy")
-                content = buffer.getvalue()
-                content_type = "application/x-parquet"
-            except ImportError:
-                logger.warning("pyarrow not installed, falling back to JSON")
-                content = json.dumps(events, default=str).encode("utf-8")
-                content_type = "application/json"
-
-        elif file_format == FileFormat.AVRO:
-            try:
-                import fastavro
-                from fastavro.schema import parse_schema
-
-                # Simple Avro schema for click events
-                schema = {
-                    "type": "record",
-                    "name": "ClickEvent",
-                    "fields": [
-                        {"name": field, "type": ["null", "string"], "default": None}
-                        for field in events[0].keys()
-                    ] if events else []
-                }
-                parsed_schema = parse_schema(schema)
-
-                buffer = io.BytesIO()
-                fastavro.writer(buffer, parsed_schema, events)
-                content = buffer.getvalue()
-                content_type = "application/avro"
-            except ImportError:
-                logger.warning("fastavro not installed, falling back to JSON")
-                content = json.dumps(events, default=str).encode("utf-8")
-                content_type = "application/json"
-
-        else:
-            content = json.dumps(events, default=str).encode("utf-8")
-            content_type = "application/json"
-
-        # Apply compression
-        if compression == CompressionType.GZIP:
-            import gzip
-            content = gzip.compress(content)
-            content_type = "application/gzip"
-        elif compression == CompressionType.LZ4:
-            try:
-                import lz4.frame
-                content = lz4.frame.compress(content)
-            except ImportError:
-                logger.warning("lz4 not installed, skipping compression")
-
-        return content, content_type
+        try:
+            parts = await upload_parts(content, part_size, upload_part)
+            blob = self.bucket.blob(object_name)
+            blob.content_type = content_type
+            await asyncio.to_thread(blob.compose, parts)
+        finally:
+            for part in uploaded:
+                try:
+                    await asyncio.to_thread(part.delete)
+                except Exception as e:
+                    logger.warning(f"Failed to delete temporary part {part.name}: {e}")
 
     async def test_connection(self) -> TestConnectionResult:
         """Test GCS connection."""
@@ -237,7 +188,7 @@ class GCSConnector(BaseConnector):
             gcs_config = self.config.gcs
 
             # Check if bucket exists and is accessible
-            exists = self.bucket.exists()
+            exists = await asyncio.to_thread(self.bucket.exists)
 
             latency = (time.time() - start_time) * 1000
 
@@ -1,20 +1,30 @@
 """HTTP/Webhook connector for data streams."""
 
+import base64
+import gzip
 import json
 import logging
 import time
-import base64
-from typing import List, Dict, Any, Optional
+from typing import Any, Dict, List, Optional
 
 from app.models.data_stream import (
+    DeliveryConfig,
     DestinationConfig,
-    TestConnectionResult,
     SchemaConfig,
+    TestConnectionResult,
 )
+
 from .base import BaseConnector
 
 logger = logging.getLogger(__name__)
 
+# Bodies smaller than this are not worth compressing
+GZIP_MIN_BYTES = 1024
+
+
+class RetryableHTTPError(Exception):
+    """Server-side or throttling response; the batch is retried with backoff."""
+
 
 class HTTPConnector(BaseConnector):
     """Connector for HTTP/Webhook endpoints."""
@@ -22,6 +32,7 @@ class HTTPConnector(BaseConnector):
     def __init__(self, config: DestinationConfig, schema: Optional[SchemaConfig] = None):
         super().__init__(config, schema)
         self.session = None
+        self._headers: Dict[str, str] = {}
 
     async def connect(self) -> None:
         """Establish HTTP session."""
@@ -32,8 +43,15 @@ class HTTPConnector(BaseConnector):
             if not http_config:
                 raise ValueError("HTTP configuration is required")
 
+            # One pooled session per connector so keep-alive connections are reused
             timeout = aiohttp.ClientTimeout(total=http_config.timeout_seconds)
-            self.session = aiohttp.ClientSession(timeout=timeout)
+            connector = aiohttp.TCPConnector(
+                limit_per_host=32,
+                keepalive_timeout=60,
+                ttl_dns_cache=300,
+            )
+            self.session = aiohttp.ClientSession(timeout=timeout, connector=connector)
+            self._headers = self._build_headers()
 
             self._is_connected = True
             logger.info(f"HTTP connector ready for: {http_config.url}")
@@ -62,70 +80,63 @@ class HTTPConnector(BaseConnector):
         if not http_config:
             raise ValueError("HTTP configuration is required")
 
-        try:
-            # Transform events
-            transformed_events = [self._transform_event(event) for event in events]
-
-            # Build headers
-            headers = dict(http_config.headers)
-            headers["Content-Type"] = "application/json"
-
-            # Add authentication
-            if http_config.auth_type == "basic" and http_config.auth_value:
-                encoded = base64.b64encode(http_config.auth_value.encode()).decode()
-                headers["Authorization"] = f"Basic {encoded}"
-            elif http_config.auth_type == "bearer" and http_config.auth_value:
-                headers["Authorization"] = f"Bearer {http_config.auth_value}"
-            elif http_config.auth_type == "api_key" and http_config.auth_value:
-                headers["X-API-Key"] = http_config.auth_value
-
-            # Send request
-            payload = {
-                "events": transformed_events,
-                "count": len(transformed_events),
-                "timestamp": time.time(),
-            }
-
-            retry_count = 0
-            last_error = None
-
-            while retry_count <= http_config.retry_count:
-                try:
-                    async with self.session.request(
-                        method=http_config.method,
-                        url=http_config.url,
-                        json=payload,
-                        headers=headers,
-                    ) as response:
-                        if response.status >= 200 and response.status < 300:
-                            logger.info(
-                                f"Sent {len(events)} events to {http_config.url}, "
-                                f"status: {response.status}"
-                            )
-                            return len(events)
-                        elif response.status >= 500:
-                            # Server error, retry
-                            last_error = f"Server error: {response.status}"
-                            retry_count += 1
-                            continue
-                        else:
-                            # Client error, don't retry
-                            body = await response.text()
-                            logger.error(
-                                f"HTTP request failed: {response.status}, body: {body}"
-                            )
-                            return 0
-
-                except Exception as e:
-                    last_error = str(e)
-                    retry_count += 1
-
-            logger.error(f"Failed to send after {http_config.retry_count} retries: {last_error}")
+        # Transform events
+        transformed_events = self._transform_events(events)
+
+        payload = {
+            "events": transformed_events,
+            "count": len(transformed_events),
+            "timestamp": time.time(),
+        }
+        body = json.dumps(payload, default=str).encode("utf-8")
+
+        headers = self._headers
+        if http_config.gzip and len(body) >= GZIP_MIN_BYTES:
+            body = gzip.compress(body, compresslevel=5)
+            headers = {**headers, "Content-Encoding": "gzip"}
+
+        # Retries (with jittered backoff) are handled by send_batch
+        async with self.session.request(
+            method=http_config.method,
+            url=http_config.url,
+            data=body,
+            headers=headers,
+        ) as response:
+            if 200 <= response.status < 300:
+                logger.info(
+                    f"Sent {len(events)} events to {http_config.url}, "
+                    f"status: {response.status}"
+                )
+                return len(events)
+
+            response_body = await response.text()
+            if response.status >= 500 or response.status == 429:
+                raise RetryableHTTPError(f"Server error: {response.status}")
+
+            # Client error, don't retry
+            logger.error(
+                f"HTTP request failed: {response.status}, body: {response_body}"
+            )
             return 0
 
-        except Exception as e:
-            logger.error(f"Failed to send events to HTTP endpoint: {e}")
-            raise
+    def max_retries(self, delivery: DeliveryConfig) -> int:
+        return self.config.http.retry_count if self.config.http else delivery.max_retries
+
+    def _build_headers(self) -> Dict[str, str]:
+        http_config = self.config.http
+        headers = dict(http_config.headers)
+        headers["Content-Type"] = "application/json"
+
+        # Add authentication
+        if http_config.auth_type == "basic" and http_config.auth_value:
+            encoded = base64.b64encode(http_config.auth_value.encode()).decode()
+            headers["Authorization"] = f"Basic {encoded}"
+        elif http_config.auth_type == "bearer" and http_config.auth_value:
+            headers["Authorization"] = f"Bearer {http_config.auth_value}"
+        elif http_config.auth_type == "api_key" and http_config.auth_value:
+            headers["X-API-Key"] = http_config.auth_value
+
+        return headers
 
     async def test_connection(self) -> TestConnectionResult:
         """Test HTTP connection."""
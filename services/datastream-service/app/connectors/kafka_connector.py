@@ -77,8 +77,7 @@ class KafkaConnector(BaseConnector):
 
         sent = 0
         try:
-            for event in events:
-                transformed = self._transform_event(event)
+            for transformed in self._transform_events(events):
                 await self.producer.send_and_wait(
                     kafka_config.topic,
                     transformed,
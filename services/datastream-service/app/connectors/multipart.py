@@ -0,0 +1,73 @@
+"""Chunked, parallel uploads shared by the object-store connectors."""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+def part_size_bytes() -> int:
+    """Configured part size; S3 rejects non-final parts smaller than 5MB."""
+    return max(settings.OBJECT_STORE_PART_SIZE_MB, 5) * MB
+
+
+async def upload_parts(
+    content: bytes,
+    part_size: int,
+    upload_part: Callable[[int, bytes], Awaitable[Any]],
+    concurrency: Optional[int] = None,
+    max_retries: Optional[int] = None,
+    retry_backoff_seconds: float = 0.5,
+) -> List[Any]:
+    """
+    Upload ``content`` in fixed-size parts with bounded parallelism.
+
+    ``upload_part(part_number, chunk)`` is called for each 1-based part and
+    retried on its own with exponential backoff, so a transient failure does
+    not restart the whole object. Results are returned in part order. If a
+    part exhausts its retries the remaining parts are cancelled and the error
+    is raised for the caller to abort the upload.
+    """
+    concurrency = concurrency or settings.OBJECT_STORE_UPLOAD_CONCURRENCY
+    if max_retries is None:
+        max_retries = settings.OBJECT_STORE_PART_RETRIES
+
+    semaphore = asyncio.Semaphore(concurrency)
+    offsets = range(0, max(len(content), 1), part_size)
+
+    async def _upload(part_number: int, offset: int) -> Any:
+        async with semaphore:
+            # Slice lazily so at most `concurrency` part copies are alive
+            chunk = content[offset:offset + part_size]
+            attempt = 0
+            while True:
+                try:
+                    return await upload_part(part_number, chunk)
+                except Exception as e:
+                    if attempt >= max_retries:
+                        raise
+                    delay = retry_backoff_seconds * (2 ** attempt)
+                    attempt += 1
+                    logger.warning(
+                        f"Part {part_number} upload failed ({e}), "
+                        f"retry {attempt}/{max_retries} in {delay:.1f}s"
+                    )
+                    await asyncio.sleep(delay)
+
+    tasks = [
+        asyncio.create_task(_upload(number, offset))
+        for number, offset in enumerate(offsets, start=1)
+    ]
+
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
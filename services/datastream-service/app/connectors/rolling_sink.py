@@ -0,0 +1,429 @@
+"""Size- and time-based file rolling for object-store connectors."""
+
+import asyncio
+import json
+import logging
+import mmap
+import os
+import tempfile
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Awaitable, BinaryIO, Callable, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from app.core.config import settings
+from app.models.data_stream import (
+    CompressionType,
+    FileFormat,
+    PartitioningConfig,
+    SchemaConfig,
+)
+
+from .file_writer import DEFAULT_ROW_GROUP_SIZE, ColumnarFileWriter
+from .multipart import part_size_bytes
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# (object_name, content, content_type) -> None
+Uploader = Callable[[str, Any, str], Awaitable[None]]
+# (events, bytes) of a file that reached the object store
+Delivered = Callable[[int, int], Awaitable[None]]
+# (events, error) of a file that could not be uploaded
+Undeliverable = Callable[[List[Dict[str, Any]], str], Awaitable[None]]
+
+
+def render_partition(pattern: str, when: datetime) -> str:
+    """Render a PartitioningConfig pattern for a point in time."""
+    return (
+        pattern
+        .replace("{YYYY}", when.strftime("%Y"))
+        .replace("{MM}", when.strftime("%m"))
+        .replace("{DD}", when.strftime("%d"))
+        .replace("{HH}", when.strftime("%H"))
+    )
+
+
+@dataclass
+class CompletedFile:
+    object_name: str
+    partition: str
+    rows: int
+    bytes: int
+    opened_at: str
+    completed_at: str
+
+
+@dataclass
+class _OpenFile:
+    partition: str
+    path: str
+    handle: BinaryIO
+    writer: ColumnarFileWriter
+    journal_path: str
+    journal: BinaryIO
+    opened_at: float = field(default_factory=time.time)
+    pending: List[Dict[str, Any]] = field(default_factory=list)
+    pending_bytes: int = 0
+    upload_attempts: int = 0
+
+    @property
+    def size(self) -> int:
+        return self.handle.tell()
+
+
+class RollingFileSink:
+    """
+    Buffer events into one local file per partition and upload on roll.
+
+    Each partition path (rendered from the event timestamp) keeps a single
+    open temp file. Rows are appended in row groups of ``row_group_size``
+    rows or 1/16 of the target size, whichever comes first; the file is
+    finalized and uploaded once it reaches ``target_size_bytes`` or is older
+    than ``max_age_seconds``. Every uploaded file is recorded in a JSONL
+    manifest next to the temp files and in ``completed_files``.
+
+    ``write`` only returns once the events are fsynced to an NDJSON journal
+    beside their file, so accepted events survive a crash: with a
+    ``stream_id`` the temp directory is stable across restarts and
+    ``recover`` rebuilds and uploads whatever a previous process left there.
+
+    Events are only delivered once their file is uploaded: ``on_uploaded``
+    is called then. A file whose upload fails is retried on the next flush;
+    after ``upload_attempts`` failures its events are read back from the
+    journal and handed to ``on_undeliverable`` (the stream's dead-letter
+    queue). Without that handler, or if it fails, the file is kept and
+    retried.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        prefix: str,
+        file_format: FileFormat,
+        compression: CompressionType,
+        uploader: Uploader,
+        schema: Optional[SchemaConfig] = None,
+        partitioning: Optional[PartitioningConfig] = None,
+        target_size_bytes: int = 128 * MB,
+        max_age_seconds: int = 300,
+        row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+        stream_id: Optional[str] = None,
+        on_uploaded: Optional[Delivered] = None,
+        on_undeliverable: Optional[Undeliverable] = None,
+        upload_attempts: int = 3,
+    ):
+        self.prefix = prefix
+        self.file_format = file_format
+        self.compression = compression
+        self.uploader = uploader
+        self.schema = schema
+        self.partitioning = partitioning or PartitioningConfig()
+        self.target_size_bytes = target_size_bytes
+        self.max_age_seconds = max_age_seconds
+        self.row_group_size = row_group_size
+        self.on_uploaded = on_uploaded
+        self.on_undeliverable = on_undeliverable
+        self.upload_attempts = upload_attempts
+
+        base_dir = settings.OBJECT_STORE_TEMP_DIR or os.path.join(
+            tempfile.gettempdir(), "datastream"
+        )
+        os.makedirs(base_dir, exist_ok=True)
+        if stream_id:
+            self.directory = os.path.join(base_dir, f"{name}-{stream_id}")
+            os.makedirs(self.directory, exist_ok=True)
+        else:
+            self.directory = tempfile.mkdtemp(prefix=f"{name}-", dir=base_dir)
+        self.manifest_path = os.path.join(self.directory, "manifest.jsonl")
+
+        self.completed_files: deque = deque(maxlen=1000)
+        self._open_files: Dict[str, _OpenFile] = {}
+        self._unsent: List[_OpenFile] = []
+        self._lock = asyncio.Lock()
+
+    @property
+    def open_partitions(self) -> List[str]:
+        return list(self._open_files.keys())
+
+    @property
+    def pending_uploads(self) -> int:
+        return len(self._unsent)
+
+    async def write(self, events: List[Dict[str, Any]]) -> int:
+        """
+        Append events to their partition files. Returns the number accepted.
+
+        Accepted events are journaled, not yet delivered: see ``on_uploaded``.
+        """
+        if not events:
+            return 0
+
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        for event in events:
+            grouped.setdefault(self._partition_for(event), []).append(event)
+
+        async with self._lock:
+            for partition, rows in grouped.items():
+                await self._append(partition, rows)
+
+        return len(events)
+
+    async def recover(self) -> List[CompletedFile]:
+        """Upload the events journaled by a previous process that never got uploaded."""
+        journals = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(".part") and not os.path.exists(self._journal_path(name)):
+                # Uploaded, but the process stopped before removing it
+                os.remove(os.path.join(self.directory, name))
+            elif name.endswith(".events.jsonl"):
+                journals.append(os.path.join(self.directory, name))
+        if not journals:
+            return []
+
+        completed = []
+        async with self._lock:
+            recovered = set()
+            for journal_path in journals:
+                partition, rows = await asyncio.to_thread(self._read_journal, journal_path)
+                if rows:
+                    await self._append(partition, rows)
+                    recovered.add(partition)
+                # Only dropped once the rows are journaled again in the new file
+                os.remove(journal_path)
+                part_path = journal_path[:-len(".events.jsonl")] + ".part"
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+                logger.warning(f"Recovered {len(rows)} unuploaded events from {journal_path}")
+
+            for partition in recovered:
+                result = await self._roll(partition)
+                if result:
+                    completed.append(result)
+        return completed
+
+    async def flush(self, force: bool = False) -> List[CompletedFile]:
+        """Roll files past their max age, or every open file when ``force`` is set."""
+        completed = []
+        async with self._lock:
+            # Retry files whose upload failed earlier
+            unsent, self._unsent = self._unsent, []
+            for open_file in unsent:
+                result = await self._upload(open_file)
+                if result:
+                    completed.append(result)
+
+            now = time.time()
+            for partition, open_file in list(self._open_files.items()):
+                if force or now - open_file.opened_at >= self.max_age_seconds:
+                    result = await self._roll(partition)
+                    if result:
+                        completed.append(result)
+        return completed
+
+    async def close(self) -> None:
+        """Upload everything still open and remove the temp directory if empty."""
+        await self.flush(force=True)
+        if self._unsent:
+            logger.error(
+                f"{len(self._unsent)} rolled files could not be uploaded, kept in {self.directory}"
+            )
+            return
+
+        try:
+            for name in os.listdir(self.directory):
+                if name != "manifest.jsonl":
+                    return
+            if os.path.exists(self.manifest_path):
+                os.remove(self.manifest_path)
+            os.rmdir(self.directory)
+        except OSError as e:
+            logger.warning(f"Failed to clean up {self.directory}: {e}")
+
+    # ========== Internals ==========
+
+    def _partition_for(self, event: Dict[str, Any]) -> str:
+        if not self.partitioning.enabled:
+            return ""
+
+        when = event.get("timestamp")
+        if isinstance(when, str):
+            try:
+                when = datetime.fromisoformat(when)
+            except ValueError:
+                when = None
+        if not isinstance(when, datetime):
+            when = datetime.utcnow()
+
+        return render_partition(self.partitioning.pattern, when)
+
+    async def _append(self, partition: str, rows: List[Dict[str, Any]]) -> None:
+        open_file = self._open_files.get(partition) or self._open(partition)
+        open_file.pending_bytes += await asyncio.to_thread(self._journal, open_file, rows)
+        open_file.pending.extend(rows)
+
+        # Bound the unwritten bytes too, so the size check below stays close to the truth
+        if (
+            len(open_file.pending) >= self.row_group_size
+            or open_file.pending_bytes >= self.target_size_bytes // 16
+        ):
+            await self._write_pending(open_file)
+
+        if open_file.size >= self.target_size_bytes:
+            await self._roll(partition)
+
+    @staticmethod
+    def _journal(open_file: _OpenFile, rows: List[Dict[str, Any]]) -> int:
+        data = "".join(json.dumps(row, default=str) + "\n" for row in rows).encode("utf-8")
+        open_file.journal.write(data)
+        open_file.journal.flush()
+        os.fsync(open_file.journal.fileno())
+        return len(data)
+
+    @staticmethod
+    def _read_journal(path: str) -> Tuple[str, List[Dict[str, Any]]]:
+        partition = ""
+        rows = []
+        with open(path, "rb") as journal:
+            for number, line in enumerate(journal):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # The last line is cut short if the process died mid-write
+                    continue
+                if number == 0:
+                    partition = record.get("partition", "")
+                else:
+                    rows.append(record)
+        return partition, rows
+
+    def _journal_path(self, part_name: str) -> str:
+        return os.path.join(self.directory, part_name[:-len(".part")] + ".events.jsonl")
+
+    def _open(self, partition: str) -> _OpenFile:
+        name = f"{uuid4().hex}.part"
+        path = os.path.join(self.directory, name)
+        handle = open(path, "w+b")
+        journal_path = self._journal_path(name)
+        journal = open(journal_path, "ab")
+        journal.write(json.dumps({"partition": partition}).encode("utf-8") + b"\n")
+        writer = ColumnarFileWriter(
+            handle,
+            self.file_format,
+            self.compression,
+            self.schema,
+            row_group_size=self.row_group_size,
+        )
+        open_file = _OpenFile(
+            partition=partition,
+            path=path,
+            handle=handle,
+            writer=writer,
+            journal_path=journal_path,
+            journal=journal,
+        )
+        self._open_files[partition] = open_file
+        return open_file
+
+    async def _write_pending(self, open_file: _OpenFile) -> None:
+        rows, open_file.pending = open_file.pending, []
+        open_file.pending_bytes = 0
+        await asyncio.to_thread(open_file.writer.write_rows, rows)
+
+    async def _roll(self, partition: str) -> Optional[CompletedFile]:
+        """Finalize a partition file, upload it and record it in the manifest."""
+        open_file = self._open_files.pop(partition)
+
+        if open_file.pending:
+            await self._write_pending(open_file)
+        await asyncio.to_thread(open_file.writer.close)
+
+        if not open_file.writer.rows_written:
+            self._discard(open_file)
+            return None
+
+        return await self._upload(open_file)
+
+    async def _upload(self, open_file: _OpenFile) -> Optional[CompletedFile]:
+        """Upload a finalized file; on failure retry it or dead-letter its events."""
+        rows = open_file.writer.rows_written
+        size = open_file.size
+        object_name = self._object_name(open_file.partition, open_file.writer.extension)
+
+        try:
+            await self._upload_file(open_file, object_name, size)
+        except Exception as e:
+            open_file.upload_attempts += 1
+            if open_file.upload_attempts < self.upload_attempts or not self.on_undeliverable:
+                logger.error(f"Failed to upload {open_file.path}, will retry: {e}")
+                self._unsent.append(open_file)
+            else:
+                await self._give_up(open_file, str(e))
+            return None
+
+        self._discard(open_file)
+        if self.on_uploaded:
+            try:
+                await self.on_uploaded(rows, size)
+            except Exception as e:
+                logger.warning(f"Failed to report upload of {object_name}: {e}")
+
+        completed = CompletedFile(
+            object_name=object_name,
+            partition=open_file.partition,
+            rows=rows,
+            bytes=size,
+            opened_at=datetime.utcfromtimestamp(open_file.opened_at).isoformat(),
+            completed_at=datetime.utcnow().isoformat(),
+        )
+        self.completed_files.append(completed)
+        with open(self.manifest_path, "a") as manifest:
+            manifest.write(json.dumps(asdict(completed)) + "\n")
+
+        logger.info(f"Rolled {rows} events ({size} bytes) to {object_name}")
+        return completed
+
+    async def _give_up(self, open_file: _OpenFile, error: str) -> None:
+        """Hand a file's events to ``on_undeliverable`` and drop the file once it took them."""
+        _, events = await asyncio.to_thread(self._read_journal, open_file.journal_path)
+        try:
+            await self.on_undeliverable(events, error)
+        except Exception as e:
+            logger.error(f"Failed to dead-letter {open_file.path}, will retry the upload: {e}")
+            self._unsent.append(open_file)
+            return
+
+        logger.error(
+            f"Gave up uploading {open_file.path} after {open_file.upload_attempts} attempts, "
+            f"dead-lettered {len(events)} events: {error}"
+        )
+        self._discard(open_file)
+
+    @staticmethod
+    def _discard(open_file: _OpenFile) -> None:
+        # The journal goes first: a .part file without one is known to be uploaded
+        open_file.journal.close()
+        os.remove(open_file.journal_path)
+        open_file.handle.close()
+        os.remove(open_file.path)
+
+    async def _upload_file(self, open_file: _OpenFile, object_name: str, size: int) -> None:
+        open_file.handle.flush()
+        if size <= part_size_bytes():
+            open_file.handle.seek(0)
+            content = open_file.handle.read()
+            await self.uploader(object_name, content, open_file.writer.content_type)
+            return
+
+        # Memory-map large files so parts are sliced from the page cache
+        with mmap.mmap(open_file.handle.fileno(), 0, access=mmap.ACCESS_READ) as content:
+            await self.uploader(object_name, content, open_file.writer.content_type)
+
+    def _object_name(self, partition: str, extension: str) -> str:
+        timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S%f")
+        file_name = f"events_{timestamp}_{uuid4().hex[:8]}.{extension}"
+        parts = [p.strip("/") for p in (self.prefix, partition) if p and p.strip("/")]
+        return "/".join(parts + [file_name])
@@ -1,21 +1,21 @@
 """S3 connector for data streams."""
 
-import io
-import json
+import asyncio
 import logging
 import time
-from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import Any, Dict, List, Optional
 
+from app.core.config import settings
 from app.models.data_stream import (
     DestinationConfig,
-    TestConnectionResult,
-    SchemaConfig,
-    FileFormat,
-    CompressionType,
     PartitioningConfig,
+    SchemaConfig,
+    TestConnectionResult,
 )
+
 from .base import BaseConnector
+from .multipart import MB, part_size_bytes, upload_parts
+from .rolling_sink import RollingFileSink
 
 logger = logging.getLogger(__name__)
 
@@ -23,15 +23,20 @@ logger = logging.getLogger(__name__)
 class S3Connector(BaseConnector):
     """Connector for Amazon S3 and S3-compatible storage."""
 
+    buffers_events = True
+
     def __init__(
         self,
         config: DestinationConfig,
         schema: Optional[SchemaConfig] = None,
         partitioning: Optional[PartitioningConfig] = None,
+        stream_id: Optional[str] = None,
     ):
         super().__init__(config, schema)
+        self.stream_id = stream_id
         self.client = None
         self.partitioning = partitioning or PartitioningConfig()
+        self.sink: Optional[RollingFileSink] = None
 
     async def connect(self) -> None:
         """Establish connection to S3."""
@@ -55,6 +60,12 @@ class S3Connector(BaseConnector):
                 client_kwargs["aws_access_key_id"] = s3_config.access_key_id
                 client_kwargs["aws_secret_access_key"] = s3_config.secret_access_key
 
+            # Size the connection pool for parallel part uploads
+            client_kwargs["config"] = Config(
+                max_pool_connections=max(settings.OBJECT_STORE_UPLOAD_CONCURRENCY, 10),
+                retries={"max_attempts": 3, "mode": "standard"},
+            )
+
             self.client = boto3.client("s3", **client_kwargs)
             self._is_connected = True
             logger.info(f"Connected to S3: {s3_config.bucket}")
@@ -66,8 +77,15 @@ class S3Connector(BaseConnector):
             logger.error(f"Failed to connect to S3: {e}")
             raise
 
+        # Upload files a previous process accepted events into but never finished
+        await self._get_sink().recover()
+
     async def disconnect(self) -> None:
         """Close the S3 connection."""
+        if self.sink:
+            # Upload whatever is still buffered before dropping the client
+            await self.sink.close()
+            self.sink = None
         self.client = None
         self._is_connected = False
         logger.info("Disconnected from S3")
@@ -81,110 +99,88 @@ class S3Connector(BaseConnector):
         if not s3_config:
             raise ValueError("S3 configuration is required")
 
-        try:
-            # Transform events
-            transformed_events = [self._transform_event(event) for event in events]
-
-            # Generate file content
-            content, content_type = self._generate_file_content(
-                transformed_events,
-                s3_config.file_format,
-                s3_config.compression,
+        # Append to the open partition file; the schema is applied per row group
+        accepted = await self._get_sink().write(events)
+        logger.debug(f"Buffered {accepted} events for s3://{s3_config.bucket}")
+        return accepted
+
+    async def flush(self, force: bool = False) -> None:
+        """Roll partition files that reached their max age."""
+        if self.sink:
+            await self.sink.flush(force)
+
+    def _get_sink(self) -> RollingFileSink:
+        if not self.sink:
+            s3_config = self.config.s3
+            self.sink = RollingFileSink(
+                name="s3",
+                prefix=s3_config.prefix,
+                file_format=s3_config.file_format,
+                compression=s3_config.compression,
+                uploader=self._upload,
+                schema=self.schema,
+                partitioning=self.partitioning,
+                target_size_bytes=s3_config.target_file_size_mb * MB,
+                max_age_seconds=s3_config.max_file_age_seconds,
+                stream_id=self.stream_id,
+                on_uploaded=self.on_delivered,
+                on_undeliverable=self.on_undeliverable,
+                upload_attempts=settings.OBJECT_STORE_UPLOAD_ATTEMPTS,
             )
+        return self.sink
 
-            # Generate S3 key with partitioning
-            key = self._generate_key(s3_config.prefix, s3_config.file_format)
+    async def _upload(self, key: str, content: bytes, content_type: str) -> None:
+        """Upload an object, switching to a parallel multipart upload for large files."""
+        bucket = self.config.s3.bucket
+        part_size = part_size_bytes()
 
-            # Upload to S3
-            self.client.put_object(
-                Bucket=s3_config.bucket,
+        if len(content) <= part_size:
+            await asyncio.to_thread(
+                self.client.put_object,
+                Bucket=bucket,
                 Key=key,
                 Body=content,
                 ContentType=content_type,
             )
+            return
+
+        upload = await asyncio.to_thread(
+            self.client.create_multipart_upload,
+            Bucket=bucket,
+            Key=key,
+            ContentType=content_type,
+        )
+        upload_id = upload["UploadId"]
+
+        async def upload_part(part_number: int, chunk: bytes) -> Dict[str, Any]:
+            response = await asyncio.to_thread(
+                self.client.upload_part,
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                Body=chunk,
+            )
+            return {"ETag": response["ETag"], "PartNumber": part_number}
 
-            logger.info(f"Uploaded {len(events)} events to s3://{s3_config.bucket}/{key}")
-            return len(events)
-
-        except Exception as e:
-            logger.error(f"Failed to send events to S3: {e}")
+        try:
+            parts = await upload_parts(content, part_size, upload_part)
+            await asyncio.to_thread(
+                self.client.complete_multipart_upload,
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+        except BaseException:
+            await asyncio.to_thread(
+                self.client.abort_multipart_upload,
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+            )
             raise
 
-    def _generate_key(self, prefix: str, file_format: FileFormat) -> str:
-        """Generate S3 key with partitioning."""
-        now = datetime.utcnow()
-        timestamp = now.strftime("%Y%m%d%H%M%S%f")
-
-        if self.partitioning.enabled:
-            partition_path = self.partitioning.pattern
-            partition_path = partition_path.replace("{YYYY}", now.strftime("%Y"))
-            partition_path = partition_path.replace("{MM}", now.strftime("%m"))
-            partition_path = partition_path.replace("{DD}", now.strftime("%d"))
-            partition_path = partition_path.replace("{HH}", now.strftime("%H"))
-
-            key = f"{prefix}/{partition_path}/events_{timestamp}.{file_format.value}"
-        else:
-            key = f"{prefix}/events_{timestamp}.{file_format.value}"
-
-        return key.lstrip("/")
-
-    def _generate_file_content(
-        self,
-        events: List[Dict[str, Any]],
-        file_format: FileFormat,
-        compression: CompressionType,
-    ) -> tuple[bytes, str]:
-        """Generate file content based on format and compression."""
-        content_type = "application/octet-stream"
-
-        if file_format == FileFormat.JSON:
-            content = json.dumps(events, default=str).encode("utf-8")
-            content_type = "application/json"
-
-        elif file_format == FileFormat.CSV:
-            import csv
-            output = io.StringIO()
-            if events:
-                writer = csv.DictWriter(output, fieldnames=events[0].keys())
-                writer.writeheader()
-                writer.writerows(events)
-            content = output.getvalue().encode("utf-8")
-            content_type = "text/csv"
-
-        elif file_format == FileFormat.PARQUET:
-            try:
-                import pyarrow as pa
-                import pyarrow.parquet as pq
-
-                table = pa.Table.from_pylist(events)
-                buffer = io.BytesIO()
-                pq.write_table(table, buffer, compression="snappy")
-                content = buffer.getvalue()
-                content_type = "application/x-parquet"
-            except ImportError:
-                # Fallback to JSON
-                logger.warning("pyarrow not installed, falling back to JSON")
-                content = json.dumps(events, default=str).encode("utf-8")
-                content_type = "application/json"
-
-        else:
-            content = json.dumps(events, default=str).encode("utf-8")
-            content_type = "application/json"
-
-        # Apply compression
-        if compression == CompressionType.GZIP:
-            import gzip
-            content = gzip.compress(content)
-            content_type = "application/gzip"
-        elif compression == CompressionType.LZ4:
-            try:
-                import lz4.frame
-                content = lz4.frame.compress(content)
-            except ImportError:
-                logger.warning("lz4 not installed, skipping compression")
-
-        return content, content_type
-
     async def test_connection(self) -> TestConnectionResult:
         """Test S3 connection."""
         start_time = time.time()
@@ -195,7 +191,7 @@ class S3Connector(BaseConnector):
             s3_config = self.config.s3
 
             # Try to list bucket (head bucket)
-            self.client.head_bucket(Bucket=s3_config.bucket)
+            await asyncio.to_thread(self.client.head_bucket, Bucket=s3_config.bucket)
 
             latency = (time.time() - start_time) * 1000
 
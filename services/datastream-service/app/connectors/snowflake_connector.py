@@ -1,17 +1,21 @@
 """Snowflake connector for data streams."""
 
+import asyncio
 import json
 import logging
 import time
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import Any, Dict, List, Optional
 
 from app.models.data_stream import (
+    DeliveryConfig,
     DestinationConfig,
-    TestConnectionResult,
     SchemaConfig,
+    TestConnectionResult,
 )
+
 from .base import BaseConnector
+from .snowflake_stage import SnowflakeStage
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +27,7 @@ class SnowflakeConnector(BaseConnector):
         super().__init__(config, schema)
         self.connection = None
         self.cursor = None
+        self.stage: Optional[SnowflakeStage] = None
 
     async def connect(self) -> None:
         """Establish connection to Snowflake."""
@@ -43,6 +48,7 @@ class SnowflakeConnector(BaseConnector):
                 role=sf_config.role if sf_config.role else None,
             )
             self.cursor = self.connection.cursor()
+            self.stage = SnowflakeStage(self.cursor, sf_config.stage_name)
             self._is_connected = True
             logger.info(f"Connected to Snowflake: {sf_config.account}")
 
@@ -61,6 +67,7 @@ class SnowflakeConnector(BaseConnector):
         if self.connection:
             self.connection.close()
             self.connection = None
+        self.stage = None
         self._is_connected = False
         logger.info("Disconnected from Snowflake")
 
@@ -73,39 +80,84 @@ class SnowflakeConnector(BaseConnector):
         if not sf_config or not events:
             return 0
 
-        try:
-            # Transform events
-            transformed = [self._transform_event(event) for event in events]
-
-            # Get column names from first event
-            columns = list(transformed[0].keys())
-
-            # Prepare insert statement
-            placeholders = ", ".join(["%s"] * len(columns))
-            insert_sql = f"""
-                INSERT INTO {sf_config.table_name} ({', '.join(columns)})
-                VALUES ({placeholders})
-            """
-
-            # Convert to list of tuples
-            rows = [
-                tuple(self._serialize_value(row.get(col)) for col in columns)
-                for row in transformed
-            ]
-
-            # Execute batch insert
-            self.cursor.executemany(insert_sql, rows)
-            self.connection.commit()
+        # Large batches: one Parquet file, one PUT, one COPY INTO
+        if len(events) >= sf_config.bulk_load_threshold:
+            return await self._bulk_load(sf_config.table_name, events)
 
+        try:
+            # The connector's blocking calls run off the event loop
+            await asyncio.to_thread(self._insert, sf_config.table_name, events)
             logger.info(f"Inserted {len(events)} rows to Snowflake table {sf_config.table_name}")
             return len(events)
 
         except Exception as e:
             logger.error(f"Failed to send events to Snowflake: {e}")
             if self.connection:
-                self.connection.rollback()
+                await asyncio.to_thread(self.connection.rollback)
+            raise
+
+    async def send_batch(
+        self,
+        events: List[Dict[str, Any]],
+        batch_size: int = 1000,
+        delivery: Optional[DeliveryConfig] = None,
+    ) -> Dict[str, Any]:
+        """Bulk-load a flush as one sub-batch when it reaches the threshold, else insert."""
+        sf_config = self.config.snowflake
+        # Decided before slicing: sub-batches of batch_size never reach the threshold
+        if sf_config and len(events) >= sf_config.bulk_load_threshold:
+            batch_size = len(events)
+        return await super().send_batch(events, batch_size, delivery)
+
+    def _insert(self, table_name: str, events: List[Dict[str, Any]]) -> None:
+        # Transform column-wise; no per-event dicts are built
+        column_data = self.transformer.to_columns(events)
+        columns = list(column_data.keys())
+
+        # Prepare insert statement
+        placeholders = ", ".join(["%s"] * len(columns))
+        insert_sql = f"""
+            INSERT INTO {table_name} ({', '.join(columns)})
+            VALUES ({placeholders})
+        """
+
+        # Convert columns to list of tuples
+        rows = list(zip(*(
+            [self._serialize_value(value) for value in column_data[col]]
+            for col in columns
+        )))
+
+        # Execute batch insert
+        self.cursor.executemany(insert_sql, rows)
+        self.connection.commit()
+
+    async def _bulk_load(self, table_name: str, events: List[Dict[str, Any]]) -> int:
+        """Load a batch through the stage off the event loop."""
+        try:
+            loaded = await asyncio.to_thread(
+                self.stage.load,
+                table_name,
+                events,
+                self.schema,
+            )
+            logger.info(f"Bulk loaded {loaded} rows to Snowflake table {table_name}")
+            return loaded
+
+        except Exception as e:
+            logger.error(f"Failed to bulk load events to Snowflake: {e}")
             raise
 
+    def max_in_flight(self, delivery: DeliveryConfig) -> int:
+        # One cursor per connector; statements on it must not interleave
+        return 1
+
+    def flush_size(self, delivery: DeliveryConfig) -> int:
+        # Let busy streams buffer up to a bulk load; quiet ones still flush on the interval
+        sf_config = self.config.snowflake
+        if not sf_config:
+            return delivery.batch_size
+        return max(delivery.batch_size, sf_config.bulk_load_threshold)
+
     async def test_connection(self) -> TestConnectionResult:
         """Test Snowflake connection."""
         start_time = time.time()
@@ -218,29 +270,22 @@ class SnowflakeConnector(BaseConnector):
         events: List[Dict[str, Any]],
         stage_name: str,
     ) -> int:
-        """Stream events to a Snowflake internal stage for bulk loading."""
+        """Stream events to a Snowflake stage and bulk load them into the table."""
         if not self._is_connected:
             await self.connect()
 
-        try:
-            import io
-            import gzip
-
-            # Convert events to NDJSON
-            content = "\n".join(json.dumps(e, default=str) for e in events)
-            compressed = gzip.compress(content.encode("utf-8"))
-
-            # Create a file-like object
-            file_stream = io.BytesIO(compressed)
-
-            # Upload to stage
-            timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S%f")
-            file_name = f"events_{timestamp}.json.gz"
-
-            self.cursor.execute(f"PUT file://{file_name} @{stage_name}")
+        sf_config = self.config.snowflake
+        stage = SnowflakeStage(self.cursor, stage_name)
 
-            logger.info(f"Uploaded {len(events)} events to stage {stage_name}")
-            return len(events)
+        try:
+            loaded = await asyncio.to_thread(
+                stage.load,
+                sf_config.table_name,
+                events,
+                self.schema,
+            )
+            logger.info(f"Loaded {loaded} events through stage {stage_name}")
+            return loaded
 
         except Exception as e:
             logger.error(f"Failed to stream to stage: {e}")
@@ -0,0 +1,180 @@
+"""Schema transformation compiled once per SchemaConfig and applied per batch."""
+
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from app.models.data_stream import SchemaConfig, SchemaField
+
+logger = logging.getLogger(__name__)
+
+
+def _to_timestamp(value: Any) -> Any:
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+CASTS: Dict[str, Callable[[Any], Any]] = {
+    "STRING": str,
+    "INT64": int,
+    "INTEGER": int,
+    "FLOAT64": float,
+    "FLOAT": float,
+    "BOOLEAN": bool,
+    "BOOL": bool,
+    "TIMESTAMP": _to_timestamp,
+}
+
+PYTHON_TYPES: Dict[str, type] = {
+    "STRING": str,
+    "INT64": int,
+    "INTEGER": int,
+    "FLOAT64": float,
+    "FLOAT": float,
+    "BOOLEAN": bool,
+    "BOOL": bool,
+    "TIMESTAMP": datetime,
+}
+
+
+def arrow_type(type_name: str):
+    """Map a SchemaField type to an Arrow data type."""
+    import pyarrow as pa
+
+    return {
+        "STRING": pa.string(),
+        "INT64": pa.int64(),
+        "INTEGER": pa.int64(),
+        "FLOAT64": pa.float64(),
+        "FLOAT": pa.float64(),
+        "BOOLEAN": pa.bool_(),
+        "BOOL": pa.bool_(),
+        "TIMESTAMP": pa.timestamp("us"),
+        "DATE": pa.date32(),
+    }.get(type_name.upper(), pa.string())
+
+
+def _compile_cast(field: SchemaField, strict: bool) -> Callable[[List[Any]], List[Any]]:
+    """
+    Build a column cast for one field.
+
+    Values that already have the target type are passed through untouched.
+    Values that fail to cast are kept as-is, or set to None when ``strict``
+    (typed columnar output cannot hold them).
+    """
+    type_name = field.type.upper()
+    cast = CASTS.get(type_name)
+    if cast is None:
+        return lambda column: column
+
+    target = PYTHON_TYPES[type_name]
+
+    def cast_column(column: List[Any]) -> List[Any]:
+        result = []
+        append = result.append
+        for value in column:
+            if value is None or type(value) is target:
+                append(value)
+                continue
+            try:
+                append(cast(value))
+            except (ValueError, TypeError):
+                append(None if strict else value)
+        return result
+
+    return cast_column
+
+
+class BatchTransformer:
+    """
+    Apply a SchemaConfig to whole batches column by column.
+
+    The field list and cast functions are resolved once, so transforming a
+    batch is one pass per column instead of a dict rebuild per event. In auto
+    mode events pass through unchanged.
+    """
+
+    def __init__(self, schema: Optional[SchemaConfig] = None):
+        self.schema = schema
+        self.passthrough = not schema or schema.mode == "auto" or not schema.fields
+        self.fields: List[SchemaField] = [] if self.passthrough else list(schema.fields)
+        self.names = [field.name for field in self.fields]
+        self._casts = [_compile_cast(field, strict=False) for field in self.fields]
+        self._strict_casts = [_compile_cast(field, strict=True) for field in self.fields]
+        self._arrow_schema = None
+
+    @property
+    def arrow_schema(self):
+        """Explicit Arrow schema for custom schemas; None in auto mode."""
+        if self.passthrough:
+            return None
+        if self._arrow_schema is None:
+            import pyarrow as pa
+
+            self._arrow_schema = pa.schema([
+                pa.field(
+                    field.name,
+                    arrow_type(field.type),
+                    nullable=field.mode != "REQUIRED",
+                )
+                for field in self.fields
+            ])
+        return self._arrow_schema
+
+    def transform(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """Transform a single event, keeping only schema fields present in it."""
+        if self.passthrough:
+            return event
+        return {
+            name: cast([event[name]])[0]
+            for name, cast in zip(self.names, self._casts)
+            if name in event
+        }
+
+    def to_columns(
+        self,
+        events: List[Dict[str, Any]],
+        strict: bool = False,
+    ) -> Dict[str, List[Any]]:
+        """Transform a batch into cast columns. Missing fields become None."""
+        if self.passthrough:
+            names = list(events[0].keys()) if events else []
+            return {name: [event.get(name) for event in events] for name in names}
+
+        casts = self._strict_casts if strict else self._casts
+        return {
+            name: cast([event.get(name) for event in events])
+            for name, cast in zip(self.names, casts)
+        }
+
+    def to_rows(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Transform a batch into row dicts carrying every schema field."""
+        if self.passthrough:
+            return events
+        columns = self.to_columns(events)
+        return [
+            dict(zip(self.names, values))
+            for values in zip(*(columns[name] for name in self.names))
+        ]
+
+    def to_arrow(self, events: List[Dict[str, Any]]):
+        """
+        Transform a batch straight into an Arrow table.
+
+        Casts run through Arrow compute kernels (e.g. ISO-8601 string to
+        timestamp); a column falls back to Python casting only when the
+        kernel rejects its values.
+        """
+        import pyarrow as pa
+
+        if self.passthrough:
+            return pa.Table.from_pylist(events)
+
+        arrays = []
+        for field, name, strict_cast in zip(self.arrow_schema, self.names, self._strict_casts):
+            column = [event.get(name) for event in events]
+            try:
+                arrays.append(pa.array(column).cast(field.type))
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                arrays.append(pa.array(strict_cast(column), type=field.type))
+
+        return pa.Table.from_arrays(arrays, schema=self.arrow_schema)
@@ -1,18 +1,47 @@
-import json
 import logging
 from typing import Optional
 
-from aiokafka import AIOKafkaConsumer
 from clickhouse_driver import Client
 
+from lnk_pipeline import (
+    CLICK_COLUMNS,
+    ClickHouseSink,
+    KafkaSource,
+    Pipeline,
+    RabbitMQSource,
+    RedisStreamSource,
+    Source,
+    normalize_click,
+    to_click_row,
+)
+
 from app.core.config import settings
+from app.services.geoip_service import geoip_service
 
 logger = logging.getLogger(__name__)
 
+def build_click_source() -> Source:
+    """Source for click events, chosen by ``CLICK_SOURCE``."""
+    if settings.CLICK_SOURCE == "redis_stream":
+        return RedisStreamSource(
+            settings.REDIS_URL,
+            settings.CLICK_REDIS_STREAM,
+            group=settings.KAFKA_CONSUMER_GROUP,
+            consumer=settings.REPLICA_ID or "datastream",
+        )
+    if settings.CLICK_SOURCE == "rabbitmq":
+        return RabbitMQSource(settings.RABBITMQ_URL, settings.CLICK_RABBITMQ_QUEUE)
+    return KafkaSource(
+        settings.KAFKA_CLICK_TOPIC,
+        settings.KAFKA_BOOTSTRAP_SERVERS,
+        settings.KAFKA_CONSUMER_GROUP,
+    )
+
 
 class ClickConsumer:
-    def __init__(self):
-        self.consumer: Optional[AIOKafkaConsumer] = None
+    """Ingest click events into the ClickHouse ``clicks`` table in batches."""
+
+    def __init__(self, source: Optional[Source] = None):
         self.running = False
         self.clickhouse = Client(
             host=settings.CLICKHOUSE_HOST,
@@ -21,59 +50,31 @@ class ClickConsumer:
             user=settings.CLICKHOUSE_USER,
             password=settings.CLICKHOUSE_PASSWORD,
         )
-
-    async def start(self):
-        self.consumer = AIOKafkaConsumer(
-            settings.KAFKA_CLICK_TOPIC,
-            bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
-            group_id=settings.KAFKA_CONSUMER_GROUP,
-            value_deserializer=lambda m: json.loads(m.decode("utf-8")),
+        self.pipeline = Pipeline(
+            "datastream-clicks",
+            source or build_click_source(),
+            ClickHouseSink(self.clickhouse, "clicks", CLICK_COLUMNS, to_click_row),
+            enrich=[
+                normalize_click,
+                # Enrich events that arrived without geo data
+                geoip_service.enrich,
+            ],
+            batch_size=settings.PIPELINE_BATCH_SIZE,
+            flush_interval=settings.PIPELINE_FLUSH_INTERVAL_SECONDS,
+            queue_size=settings.PIPELINE_QUEUE_SIZE,
+            sink_retries=settings.PIPELINE_SINK_RETRIES,
         )
 
-        await self.consumer.start()
+    async def start(self):
         self.running = True
         logger.info("Click consumer started")
-
         try:
-            async for msg in self.consumer:
-                await self.process_click(msg.value)
+            await self.pipeline.run()
         except Exception as e:
             logger.error(f"Consumer error: {e}")
         finally:
-            await self.stop()
+            self.running = False
 
     async def stop(self):
-        self.running = False
-        if self.consumer:
-            await self.consumer.stop()
-            logger.info("Click consumer stopped")
-
-    async def process_click(self, click_data: dict):
-        try:
-            # Insert into ClickHouse
-            self.clickhouse.execute(
-                """
-                INSERT INTO clicks (
-                    id, link_id, short_code, timestamp, ip, user_agent,
-                    referer, country, region, city, device, browser, os
-                ) VALUES
-                """,
-                [(
-                    click_data.get("id"),
-                    click_data.get("link_id"),
-                    click_data.get("short_code"),
-                    click_data.get("timestamp"),
-                    click_data.get("ip"),
-                    click_data.get("user_agent"),
-                    click_data.get("referer", ""),
-                    click_data.get("country", ""),
-                    click_data.get("region", ""),
-                    click_data.get("city", ""),
-                    click_data.get("device", ""),
-                    click_data.get("browser", ""),
-                    click_data.get("os", ""),
-                )]
-            )
-            logger.debug(f"Processed click: {click_data.get('id')}")
-        except Exception as e:
-            logger.error(f"Failed to process click: {e}")
+        await self.pipeline.stop()
+        logger.info("Click consumer stopped")
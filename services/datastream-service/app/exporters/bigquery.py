@@ -1,12 +1,15 @@
-import json
+import asyncio
+import logging
+import os
 from datetime import datetime
 from typing import Any, Dict, List, Optional
-import logging
 
 from clickhouse_driver import Client
 
 from app.core.config import settings
+
 from .base import BaseExporter, ExportFormat, ExportResult
+from .clickhouse_stream import ClickHouseArrowStream, iter_parquet_files
 
 logger = logging.getLogger(__name__)
 
@@ -93,27 +96,17 @@ class BigQueryExporter(BaseExporter):
             except Exception:
                 pass  # Table already exists
 
-            # Insert data
-            errors = self.client.insert_rows_json(table_ref, data)
-
-            if errors:
-                return ExportResult(
-                    success=False,
-                    destination=table_ref,
-                    records_exported=0,
-                    bytes_written=0,
-                    started_at=started_at,
-                    completed_at=datetime.utcnow(),
-                    error=str(errors[:3]),  # First 3 errors
-                )
+            # Load as Parquet with a load job; avoids streaming insert quotas and cost
+            from app.connectors.bigquery_sink import BigQuerySink
 
-            bytes_written = sum(len(json.dumps(row)) for row in data)
+            sink = BigQuerySink(self.client, table_ref)
+            records_exported = await asyncio.to_thread(sink.load, data)
 
             result = ExportResult(
                 success=True,
                 destination=table_ref,
-                records_exported=len(data),
-                bytes_written=bytes_written,
+                records_exported=records_exported,
+                bytes_written=sink.bytes_loaded,
                 started_at=started_at,
                 completed_at=datetime.utcnow(),
             )
@@ -138,15 +131,66 @@ class BigQueryExporter(BaseExporter):
         table_name: str,
         format: ExportFormat = ExportFormat.JSON,
     ) -> ExportResult:
-        # Execute ClickHouse query and get data
-        data = self.clickhouse.execute(query, with_column_types=True)
-        rows, columns = data
-        column_names = [col[0] for col in columns]
+        started_at = datetime.utcnow()
+
+        if not self.client:
+            await self.connect()
+
+        table_ref = f"{settings.BIGQUERY_PROJECT_ID}.{settings.BIGQUERY_DATASET}.{table_name}"
+        if not self.client:
+            return ExportResult(
+                success=False,
+                destination=f"bigquery://{settings.BIGQUERY_PROJECT_ID}/{settings.BIGQUERY_DATASET}/{table_name}",
+                records_exported=0,
+                bytes_written=0,
+                started_at=started_at,
+                completed_at=datetime.utcnow(),
+                error="BigQuery client not connected",
+            )
+
+        try:
+            records, bytes_written = await asyncio.to_thread(
+                self._stream_query, query, table_ref
+            )
+
+            result = ExportResult(
+                success=True,
+                destination=table_ref,
+                records_exported=records,
+                bytes_written=bytes_written,
+                started_at=started_at,
+                completed_at=datetime.utcnow(),
+            )
+            self._log_export_complete(result)
+            return result
 
-        # Convert to list of dicts
-        records = [dict(zip(column_names, row)) for row in rows]
+        except Exception as e:
+            self.logger.error(f"BigQuery export failed: {e}")
+            return ExportResult(
+                success=False,
+                destination=table_ref,
+                records_exported=0,
+                bytes_written=0,
+                started_at=started_at,
+                completed_at=datetime.utcnow(),
+                error=str(e),
+            )
 
-        return await self.export(records, table_name, format)
+    def _stream_query(self, query: str, table_ref: str) -> tuple:
+        """Pipe ClickHouse blocks into Parquet chunks, one load job per chunk."""
+        from app.connectors.bigquery_sink import BigQuerySink
+
+        sink = BigQuerySink(self.client, table_ref)
+        batches = ClickHouseArrowStream(self.clickhouse).iter_batches(query)
+
+        # The first load job creates the table from the Parquet schema if needed
+        records = 0
+        bytes_written = 0
+        for path, _ in iter_parquet_files(batches):
+            bytes_written += os.path.getsize(path)
+            with open(path, "rb") as source:
+                records += sink.load_file(source)
+        return records, bytes_written
 
     def _infer_schema(self, sample: Dict[str, Any]):
         from google.cloud import bigquery
@@ -1,18 +1,101 @@
-import json
-import io
+import asyncio
 import gzip
+import io
+import json
+import logging
 from datetime import datetime
 from typing import Any, Dict, List, Optional
-import logging
+from uuid import uuid4
 
 from clickhouse_driver import Client
 
+from app.connectors.file_writer import ColumnarFileWriter
+from app.connectors.multipart import part_size_bytes
 from app.core.config import settings
+from app.models.data_stream import CompressionType, FileFormat
+
 from .base import BaseExporter, ExportFormat, ExportResult
+from .clickhouse_stream import ClickHouseArrowStream
 
 logger = logging.getLogger(__name__)
 
 
+class _MultipartUploadSink(io.RawIOBase):
+    """
+    Writable file object that ships every ``part_size`` bytes as an S3 part.
+
+    Lets a file writer stream straight into a multipart upload, so an export
+    never holds more than one part in memory. ``key`` and ``content_type``
+    may be set after construction; the upload is created on the first part.
+    """
+
+    def __init__(self, client, bucket: str, part_size: int, metadata: Dict[str, str]):
+        self.client = client
+        self.bucket = bucket
+        self.part_size = part_size
+        self.metadata = metadata
+        self.key: Optional[str] = None
+        self.content_type = "application/octet-stream"
+        self.upload_id: Optional[str] = None
+        self._parts: List[Dict[str, Any]] = []
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self._position += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def complete(self) -> None:
+        # The last part may be smaller than the minimum (or empty for an empty export)
+        if self._buffer or not self._parts:
+            self._upload_part(bytes(self._buffer))
+            self._buffer.clear()
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            MultipartUpload={"Parts": self._parts},
+        )
+
+    def abort(self) -> None:
+        if self.upload_id:
+            self.client.abort_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self.upload_id,
+            )
+            self.upload_id = None
+
+    def _upload_part(self, chunk: bytes) -> None:
+        if self.upload_id is None:
+            self.upload_id = self.client.create_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                ContentType=self.content_type,
+                Metadata=self.metadata,
+            )["UploadId"]
+
+        part_number = len(self._parts) + 1
+        response = self.client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=chunk,
+        )
+        self._parts.append({"PartNumber": part_number, "ETag": response["ETag"]})
+
+
 class S3Exporter(BaseExporter):
     def __init__(self):
         super().__init__("s3")
@@ -96,8 +179,11 @@ class S3Exporter(BaseExporter):
             # Serialize data based on format
             content, content_type = self._serialize_data(data, format)
 
-            # Compress if large
-            compress = len(content) > 1024 * 1024  # > 1MB
+            # Compress if large (Parquet/Avro are already compressed internally)
+            compress = (
+                len(content) > 1024 * 1024  # > 1MB
+                and format not in (ExportFormat.PARQUET, ExportFormat.AVRO)
+            )
             if compress:
                 content = gzip.compress(content)
                 key += ".gz"
@@ -145,15 +231,92 @@ class S3Exporter(BaseExporter):
         table_name: str,
         format: ExportFormat = ExportFormat.JSON,
     ) -> ExportResult:
-        # Execute ClickHouse query and get data
-        data = self.clickhouse.execute(query, with_column_types=True)
-        rows, columns = data
-        column_names = [col[0] for col in columns]
+        started_at = datetime.utcnow()
 
-        # Convert to list of dicts
-        records = [dict(zip(column_names, row)) for row in rows]
+        if not self.client:
+            await self.connect()
 
-        return await self.export(records, table_name, format)
+        if not self.client:
+            return ExportResult(
+                success=False,
+                destination=f"s3://{settings.S3_BUCKET}/{table_name}",
+                records_exported=0,
+                bytes_written=0,
+                started_at=started_at,
+                completed_at=datetime.utcnow(),
+                error="S3 client not connected",
+            )
+
+        try:
+            key, records, bytes_written = await asyncio.to_thread(
+                self._stream_query, query, table_name, format, started_at
+            )
+
+            result = ExportResult(
+                success=True,
+                destination=f"s3://{settings.S3_BUCKET}/{key}",
+                records_exported=records,
+                bytes_written=bytes_written,
+                started_at=started_at,
+                completed_at=datetime.utcnow(),
+            )
+            self._log_export_complete(result)
+            return result
+
+        except Exception as e:
+            self.logger.error(f"S3 export failed: {e}")
+            return ExportResult(
+                success=False,
+                destination=f"s3://{settings.S3_BUCKET}/{table_name}",
+                records_exported=0,
+                bytes_written=0,
+                started_at=started_at,
+                completed_at=datetime.utcnow(),
+                error=str(e),
+            )
+
+    def _stream_query(
+        self,
+        query: str,
+        table_name: str,
+        format: ExportFormat,
+        started_at: datetime,
+    ) -> tuple:
+        """Pipe ClickHouse blocks through the file writer into a multipart upload."""
+        file_format = FileFormat(format.value)
+        # Size is unknown up front, so row formats are always gzipped
+        compression = (
+            CompressionType.SNAPPY
+            if format in (ExportFormat.PARQUET, ExportFormat.AVRO)
+            else CompressionType.GZIP
+        )
+
+        sink = _MultipartUploadSink(
+            self.client,
+            settings.S3_BUCKET,
+            part_size_bytes(),
+            metadata={"format": format.value, "exported_at": started_at.isoformat()},
+        )
+        writer = ColumnarFileWriter(sink, file_format, compression)
+        if writer.file_format != file_format:
+            library = "pyarrow" if format == ExportFormat.PARQUET else "fastavro"
+            raise ValueError(f"{format.value} export requires {library}")
+
+        timestamp = started_at.strftime("%Y/%m/%d/%H%M%S")
+        # Chunks of one export job can start within the same second
+        sink.key = f"exports/{table_name}/{timestamp}/data_{uuid4().hex[:8]}.{writer.extension}"
+        sink.content_type = writer.content_type
+
+        try:
+            for batch in ClickHouseArrowStream(self.clickhouse).iter_batches(query):
+                writer.write_batch(batch)
+            writer.close()
+            sink.complete()
+        except BaseException:
+            sink.abort()
+            raise
+
+        return sink.key, writer.rows_written, sink.tell()
 
     def _serialize_data(self, data: List[Dict[str, Any]], format: ExportFormat) -> tuple:
         if format == ExportFormat.JSON:
@@ -172,34 +335,16 @@ class S3Exporter(BaseExporter):
             writer.writerows(data)
             return output.getvalue().encode("utf-8"), "text/csv"
 
-        elif format == ExportFormat.PARQUET:
-            try:
-                import pandas as pd
-                import pyarrow as pa
-                import pyarrow.parquet as pq
-
-                df = pd.DataFrame(data)
-                buffer = io.BytesIO()
-                table = pa.Table.from_pandas(df)
-                pq.write_table(table, buffer)
-                return buffer.getvalue(), "application/octet-stream"
-            except ImportError:
-                raise ValueError("Parquet export requires pandas and pyarrow")
-
-        elif format == ExportFormat.AVRO:
-            try:
-                import fastavro
-
-                if not data:
-                    return b"", "application/octet-stream"
-
-                # Infer schema from data
-                schema = self._infer_avro_schema(data[0])
-                buffer = io.BytesIO()
-                fastavro.writer(buffer, schema, data)
-                return buffer.getvalue(), "application/octet-stream"
-            except ImportError:
-                raise ValueError("Avro export requires fastavro")
+        elif format in (ExportFormat.PARQUET, ExportFormat.AVRO):
+            # Columnar formats carry their own codec, written one row group at a time
+            file_format = FileFormat(format.value)
+            writer = ColumnarFileWriter(io.BytesIO(), file_format, CompressionType.SNAPPY)
+            if writer.file_format != file_format:
+                library = "pyarrow" if format == ExportFormat.PARQUET else "fastavro"
+                raise ValueError(f"{format.value} export requires {library}")
+            writer.write_rows(data)
+            writer.close()
+            return writer.sink.getvalue(), writer.content_type
 
         raise ValueError(f"Unsupported format: {format}")
 
@@ -211,29 +356,6 @@ class S3Exporter(BaseExporter):
             ExportFormat.AVRO: "avro",
         }.get(format, "json")
 
-    def _infer_avro_schema(self, sample: Dict[str, Any]) -> Dict:
-        type_mapping = {
-            str: "string",
-            int: "long",
-            float: "double",
-            bool: "boolean",
-            type(None): ["null", "string"],
-        }
-
-        fields = []
-        for key, value in sample.items():
-            avro_type = type_mapping.get(type(value), "string")
-            # Make all fields nullable
-            if isinstance(avro_type, str):
-                avro_type = ["null", avro_type]
-            fields.append({"name": key, "type": avro_type})
-
-        return {
-            "type": "record",
-            "name": "ExportRecord",
-            "fields": fields,
-        }
-
     async def list_exports(self, table_name: str, limit: int = 100) -> List[Dict[str, Any]]:
         """List existing exports for a table"""
         if not self.client:
@@ -1,12 +1,18 @@
+import asyncio
+import itertools
 import json
+import logging
+import os
 from datetime import datetime
 from typing import Any, Dict, List, Optional
-import logging
 
 from clickhouse_driver import Client
 
+from app.connectors.snowflake_stage import SnowflakeStage
 from app.core.config import settings
+
 from .base import BaseExporter, ExportFormat, ExportResult
+from .clickhouse_stream import ClickHouseArrowStream, first_row, iter_parquet_files
 
 logger = logging.getLogger(__name__)
 
@@ -84,8 +90,15 @@ class SnowflakeExporter(BaseExporter):
                 create_sql = self._generate_create_table(table_name, data[0])
                 self.cursor.execute(create_sql)
 
-            # Prepare insert statement
-            if data:
+            records_exported = len(data)
+            if len(data) >= settings.SNOWFLAKE_BULK_LOAD_THRESHOLD:
+                # Stage as Parquet and load with a single COPY INTO
+                stage = SnowflakeStage(self.cursor, settings.SNOWFLAKE_STAGE)
+                records_exported = await asyncio.to_thread(stage.load, table_name, data)
+                self.logger.info(f"Bulk loaded {records_exported} rows into {table_name}")
+
+            # Small batches: prepare insert statement
+            elif data:
                 columns = list(data[0].keys())
                 placeholders = ", ".join(["%s"] * len(columns))
                 insert_sql = f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})"
@@ -102,7 +115,7 @@ class SnowflakeExporter(BaseExporter):
             result = ExportResult(
                 success=True,
                 destination=f"snowflake://{settings.SNOWFLAKE_ACCOUNT}/{settings.SNOWFLAKE_DATABASE}/{table_name}",
-                records_exported=len(data),
+                records_exported=records_exported,
                 bytes_written=bytes_written,
                 started_at=started_at,
                 completed_at=datetime.utcnow(),
@@ -130,15 +143,67 @@ class SnowflakeExporter(BaseExporter):
         table_name: str,
         format: ExportFormat = ExportFormat.JSON,
     ) -> ExportResult:
-        # Execute ClickHouse query and get data
-        data = self.clickhouse.execute(query, with_column_types=True)
-        rows, columns = data
-        column_names = [col[0] for col in columns]
+        started_at = datetime.utcnow()
+        destination = f"snowflake://{settings.SNOWFLAKE_ACCOUNT}/{settings.SNOWFLAKE_DATABASE}/{table_name}"
 
-        # Convert to list of dicts
-        records = [dict(zip(column_names, row)) for row in rows]
+        if not self.connection:
+            await self.connect()
+
+        if not self.connection:
+            return ExportResult(
+                success=False,
+                destination=destination,
+                records_exported=0,
+                bytes_written=0,
+                started_at=started_at,
+                completed_at=datetime.utcnow(),
+                error="Snowflake connection not established",
+            )
+
+        try:
+            records, bytes_written = await asyncio.to_thread(
+                self._stream_query, query, table_name
+            )
+
+            result = ExportResult(
+                success=True,
+                destination=destination,
+                records_exported=records,
+                bytes_written=bytes_written,
+                started_at=started_at,
+                completed_at=datetime.utcnow(),
+            )
+            self._log_export_complete(result)
+            return result
+
+        except Exception as e:
+            self.logger.error(f"Snowflake export failed: {e}")
+            return ExportResult(
+                success=False,
+                destination=destination,
+                records_exported=0,
+                bytes_written=0,
+                started_at=started_at,
+                completed_at=datetime.utcnow(),
+                error=str(e),
+            )
 
-        return await self.export(records, table_name, format)
+    def _stream_query(self, query: str, table_name: str) -> tuple:
+        """Pipe ClickHouse blocks into Parquet chunks, one PUT + COPY INTO per chunk."""
+        batches = iter(ClickHouseArrowStream(self.clickhouse).iter_batches(query))
+        first = next(batches, None)
+        if first is None:
+            return 0, 0
+
+        self.cursor.execute(self._generate_create_table(table_name, first_row(first)))
+
+        stage = SnowflakeStage(self.cursor, settings.SNOWFLAKE_STAGE)
+        records = 0
+        bytes_written = 0
+        for path, _ in iter_parquet_files(itertools.chain([first], batches)):
+            bytes_written += os.path.getsize(path)
+            records += stage.load_file(table_name, path)
+        return records, bytes_written
 
     def _generate_create_table(self, table_name: str, sample: Dict[str, Any]) -> str:
         type_mapping = {
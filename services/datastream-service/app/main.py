@@ -3,12 +3,15 @@ import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from lnk_pipeline import pipeline_metrics
 
 from app.core.config import settings
 from app.consumers.click_consumer import ClickConsumer
 from app.producers.click_producer import ClickProducer
 from app.api import stream, export, streams
 from app.services.stream_service import stream_service
+from app.services.export_service import export_service
+from app.services.geoip_service import geoip_service
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -21,10 +24,16 @@ click_producer = None
 async def lifespan(app: FastAPI):
     global click_consumer, click_producer
 
+    # Load GeoIP database (memory-mapped)
+    geoip_service.initialize()
+
     # Initialize stream service
     await stream_service.initialize()
     logger.info("Stream service initialized")
 
+    # Start export job workers
+    await export_service.initialize()
+
     # Start Kafka producer
     click_producer = ClickProducer()
     await click_producer.start()
@@ -37,6 +46,9 @@ async def lifespan(app: FastAPI):
 
     yield
 
+    # Stop export workers (running jobs are re-queued)
+    await export_service.shutdown()
+
     # Shutdown stream service
     await stream_service.shutdown()
     logger.info("Stream service shutdown")
@@ -47,6 +59,8 @@ async def lifespan(app: FastAPI):
     if click_producer:
         await click_producer.stop()
 
+    geoip_service.close()
+
 
 app = FastAPI(
     title="Datastream Service",
@@ -68,6 +82,12 @@ app.include_router(export.router, prefix="/api/v1/export", tags=["export"])
 app.include_router(streams.router, prefix="/api/v1", tags=["data-streams"])
 
 
+@app.get("/metrics/pipelines")
+async def get_pipeline_metrics():
+    """Per-stage throughput and latency of the ingestion pipelines."""
+    return pipeline_metrics()
+
+
 @app.get("/health")
 async def health_check():
     return {
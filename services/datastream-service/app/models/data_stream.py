@@ -35,6 +35,7 @@ class CompressionType(str, Enum):
     GZIP = "gzip"
     SNAPPY = "snappy"
     LZ4 = "lz4"
+    ZSTD = "zstd"
 
 
 class StreamStatus(str, Enum):
@@ -64,6 +65,8 @@ class BigQueryConfig(BaseModel):
     table_id: str
     credentials_json: Optional[str] = None  # Base64 encoded or path
     credentials_path: Optional[str] = None
+    write_mode: str = "auto"  # auto, storage_write, load_job, streaming_insert
+    load_job_threshold: int = 10000  # Rows; auto mode loads larger batches as Parquet
 
 
 class RedshiftConfig(BaseModel):
@@ -87,6 +90,8 @@ class SnowflakeConfig(BaseModel):
     password: Optional[str] = None
     private_key: Optional[str] = None
     role: Optional[str] = None
+    stage_name: Optional[str] = None  # Defaults to the table stage (@%TABLE)
+    bulk_load_threshold: int = 5000  # Batches at or above this size use PUT + COPY INTO
 
 
 class S3Config(BaseModel):
@@ -99,6 +104,8 @@ class S3Config(BaseModel):
     endpoint_url: Optional[str] = None  # For MinIO or S3-compatible
     file_format: FileFormat = FileFormat.PARQUET
     compression: CompressionType = CompressionType.GZIP
+    target_file_size_mb: int = 128  # Roll the open partition file at this size
+    max_file_age_seconds: int = 300  # ...or once it has been open this long
 
 
 class GCSConfig(BaseModel):
@@ -109,6 +116,8 @@ class GCSConfig(BaseModel):
     credentials_path: Optional[str] = None
     file_format: FileFormat = FileFormat.PARQUET
     compression: CompressionType = CompressionType.GZIP
+    target_file_size_mb: int = 128  # Roll the open partition file at this size
+    max_file_age_seconds: int = 300  # ...or once it has been open this long
 
 
 class AzureBlobConfig(BaseModel):
@@ -120,6 +129,8 @@ class AzureBlobConfig(BaseModel):
     connection_string: Optional[str] = None
     file_format: FileFormat = FileFormat.PARQUET
     compression: CompressionType = CompressionType.GZIP
+    target_file_size_mb: int = 128  # Roll the open partition file at this size
+    max_file_age_seconds: int = 300  # ...or once it has been open this long
 
 
 class KafkaConfig(BaseModel):
@@ -139,6 +150,7 @@ class HTTPConfig(BaseModel):
     auth_value: Optional[str] = None
     timeout_seconds: int = 30
     retry_count: int = 3
+    gzip: bool = True  # Send request bodies with Content-Encoding: gzip
 
 
 class DestinationConfig(BaseModel):
@@ -173,7 +185,11 @@ class DeliveryConfig(BaseModel):
     batch_size: int = 1000
     batch_interval_seconds: int = 60
     max_retries: int = 3
-    retry_backoff_seconds: int = 30
+    retry_backoff_seconds: int = 30  # Base of the jittered exponential backoff
+    max_backoff_seconds: int = 300
+    max_in_flight: int = 4  # Concurrent sub-batches per destination
+    circuit_breaker_threshold: int = 5  # Consecutive failed flushes before pausing
+    circuit_breaker_cooldown_seconds: int = 60
 
 
 class DataStreamCreate(BaseModel):
@@ -217,17 +233,67 @@ class DataStream(BaseModel):
 
 class StreamStats(BaseModel):
     stream_id: str
+    # Lifetime totals
     events_sent: int = 0
     events_failed: int = 0
     bytes_sent: int = 0
     last_event_at: Optional[datetime] = None
     last_error_at: Optional[datetime] = None
     last_error_message: Optional[str] = None
+    circuit_state: str = "closed"
+
+    # Between period_start and period_end
+    period_events_sent: int = 0
+    period_events_failed: int = 0
+    period_bytes_sent: int = 0
+    batches: int = 0
+    events_per_second: float = 0
+    bytes_per_second: float = 0
     avg_latency_ms: float = 0
+    p50_latency_ms: float = 0
+    p95_latency_ms: float = 0
+    p99_latency_ms: float = 0
     period_start: datetime
     period_end: datetime
 
 
+class DeadLetterReason(str, Enum):
+    RETRIES_EXHAUSTED = "retries_exhausted"  # Send kept failing after all retries
+    REJECTED = "rejected"  # Destination rejected these events of a batch
+    SHUTDOWN = "shutdown"  # Final flush failed while the stream was stopping
+    UPLOAD_FAILED = "upload_failed"  # A buffered file could not be uploaded
+
+
+class DeadLetterEntry(BaseModel):
+    id: str
+    reason: DeadLetterReason
+    error: Optional[str] = None
+    count: int
+    accepted: int = 0
+    attempts: int = 1
+    bytes: int = 0
+    failed_at: datetime
+
+
+class ReplayRequest(BaseModel):
+    max_events: Optional[int] = Field(None, gt=0)
+    rate_per_second: Optional[int] = Field(None, gt=0)
+    reason: Optional[DeadLetterReason] = None
+
+
+class ReplayStatus(BaseModel):
+    stream_id: str
+    status: str  # running, completed, failed
+    replayed_events: int = 0
+    replayed_entries: int = 0
+    max_events: Optional[int] = None
+    rate_per_second: int
+    reason: Optional[DeadLetterReason] = None
+    started_at: datetime
+    completed_at: Optional[datetime] = None
+    error_message: Optional[str] = None
+
+
 class BackfillRequest(BaseModel):
     start_date: datetime
     end_date: datetime
@@ -0,0 +1,65 @@
+"""Export job models for the queued export engine."""
+
+from datetime import datetime
+from enum import Enum
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from app.exporters.base import ExportFormat
+
+
+class ExportDestination(str, Enum):
+    BIGQUERY = "bigquery"
+    SNOWFLAKE = "snowflake"
+    S3 = "s3"
+
+
+class ExportJobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class ExportJob(BaseModel):
+    id: str
+    destination: ExportDestination
+    table_name: str
+    format: ExportFormat = ExportFormat.JSON
+    status: ExportJobStatus = ExportJobStatus.QUEUED
+
+    # Each chunk is an independent query; chunks_done is the checkpoint
+    chunks: List[str]
+    chunks_done: int = 0
+    attempts: int = 0
+    max_records: Optional[int] = None  # Row cap across all chunks
+
+    # Progress
+    records_exported: int = 0
+    bytes_written: int = 0
+    progress: int = 0
+    elapsed_seconds: float = 0
+    eta_seconds: Optional[float] = None
+    results: List[str] = []  # Destination of each exported chunk
+
+    schedule_id: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    error_message: Optional[str] = None
+
+
+class ExportSchedule(BaseModel):
+    id: str
+    destination: ExportDestination
+    table_name: str
+    query: str
+    format: ExportFormat = ExportFormat.JSON
+    schedule: str  # Cron expression
+    enabled: bool = True
+    created_at: datetime
+    next_run_at: datetime
+    last_run_at: Optional[datetime] = None
+    last_job_id: Optional[str] = None
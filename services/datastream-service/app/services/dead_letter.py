@@ -0,0 +1,139 @@
+"""Per-stream dead-letter queue for failed deliveries, backed by Redis Streams."""
+
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+from app.models.data_stream import DeadLetterEntry, DeadLetterReason
+
+logger = logging.getLogger(__name__)
+
+
+def dlq_key(stream_id: str) -> str:
+    return f"stream:{stream_id}:dlq"
+
+
+class DeadLetterQueue:
+    """
+    Store batches a stream failed to deliver so they can be replayed.
+
+    Each entry in ``stream:{id}:dlq`` is one failed sub-batch with its
+    reason code, error, and the events as JSON. Entry IDs are Redis Stream
+    IDs, so entries replay in the order they failed. The stream is capped
+    (approximately) at ``DLQ_MAX_ENTRIES`` entries.
+    """
+
+    def __init__(self, redis_client: redis.Redis):
+        self.redis = redis_client
+
+    async def add(
+        self,
+        stream_id: str,
+        events: List[Dict[str, Any]],
+        reason: DeadLetterReason,
+        error: Optional[str] = None,
+        accepted: int = 0,
+        attempts: int = 1,
+    ) -> Optional[str]:
+        """Dead-letter a batch. Returns the entry ID."""
+        if not events:
+            return None
+
+        entry_id = await self.redis.xadd(
+            dlq_key(stream_id),
+            {
+                "reason": reason.value,
+                "error": error or "",
+                "count": len(events),
+                "accepted": accepted,
+                "attempts": attempts,
+                "failed_at": datetime.utcnow().isoformat(),
+                "events": json.dumps(events, default=str),
+            },
+            maxlen=settings.DLQ_MAX_ENTRIES,
+            approximate=True,
+        )
+        logger.warning(
+            f"Dead-lettered {len(events)} events for stream {stream_id} ({reason.value}): {error}"
+        )
+        return entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+
+    async def list(
+        self,
+        stream_id: str,
+        limit: int = 100,
+        reason: Optional[DeadLetterReason] = None,
+        start: str = "-",
+    ) -> List[DeadLetterEntry]:
+        """List entries oldest first, without their event payloads."""
+        entries = []
+        async for entry_id, fields in self._scan(stream_id, start):
+            entry = self._to_entry(entry_id, fields)
+            if reason and entry.reason != reason:
+                continue
+            entries.append(entry)
+            if len(entries) >= limit:
+                break
+        return entries
+
+    async def read(
+        self,
+        stream_id: str,
+        count: int,
+        start: str = "-",
+        end: str = "+",
+    ) -> List[Tuple[str, DeadLetterEntry, List[Dict[str, Any]]]]:
+        """Read up to ``count`` entries with their events, oldest first."""
+        raw = await self.redis.xrange(dlq_key(stream_id), min=start, max=end, count=count)
+        return [
+            (
+                entry_id.decode(),
+                self._to_entry(entry_id, fields),
+                json.loads(fields[b"events"]),
+            )
+            for entry_id, fields in raw
+        ]
+
+    async def last_id(self, stream_id: str) -> Optional[str]:
+        raw = await self.redis.xrevrange(dlq_key(stream_id), count=1)
+        return raw[0][0].decode() if raw else None
+
+    async def remove(self, stream_id: str, entry_ids: List[str]) -> int:
+        if not entry_ids:
+            return 0
+        return await self.redis.xdel(dlq_key(stream_id), *entry_ids)
+
+    async def size(self, stream_id: str) -> int:
+        return await self.redis.xlen(dlq_key(stream_id))
+
+    async def purge(self, stream_id: str) -> int:
+        size = await self.size(stream_id)
+        await self.redis.delete(dlq_key(stream_id))
+        return size
+
+    async def _scan(self, stream_id: str, start: str, page_size: int = 500):
+        while True:
+            raw = await self.redis.xrange(dlq_key(stream_id), min=start, count=page_size)
+            for entry_id, fields in raw:
+                yield entry_id, fields
+            if len(raw) < page_size:
+                return
+            # Exclusive range: continue after the last entry
+            start = f"({raw[-1][0].decode()}"
+
+    @staticmethod
+    def _to_entry(entry_id, fields: Dict[bytes, bytes]) -> DeadLetterEntry:
+        return DeadLetterEntry(
+            id=entry_id.decode() if isinstance(entry_id, bytes) else entry_id,
+            reason=DeadLetterReason(fields[b"reason"].decode()),
+            error=fields.get(b"error", b"").decode() or None,
+            count=int(fields[b"count"]),
+            accepted=int(fields.get(b"accepted", 0)),
+            attempts=int(fields.get(b"attempts", 1)),
+            bytes=len(fields.get(b"events", b"")),
+            failed_at=datetime.fromisoformat(fields[b"failed_at"].decode()),
+        )
@@ -0,0 +1,584 @@
+"""Export Service: queued, resumable exports to warehouses and object storage."""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+from uuid import uuid4
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+from app.exporters import (
+    BaseExporter,
+    BigQueryExporter,
+    ExportFormat,
+    S3Exporter,
+    SnowflakeExporter,
+)
+from app.models.export_job import (
+    ExportDestination,
+    ExportJob,
+    ExportJobStatus,
+    ExportSchedule,
+)
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = "export:queue"
+PROCESSING_KEY = "export:processing"
+JOBS_KEY = "export:jobs"
+SCHEDULES_KEY = "export:schedules"
+
+DEFAULT_EXPORT_LIMIT = 100000
+IDLE_POLL_SECONDS = 1.0
+
+# Pop a job and take its lease in one step, so stale-job recovery never sees
+# a claimed job without a lease. The processing entry is "{job_id}:{token}"
+# and the lease holds the same value, so each worker only touches its own.
+# A job whose lease is still held goes back on the queue until it is free.
+_CLAIM_SCRIPT = """
+local job_id = redis.call('RPOP', KEYS[1])
+if not job_id then
+    return false
+end
+local entry = job_id .. ':' .. ARGV[1]
+if redis.call('SET', 'export:job:' .. job_id .. ':lease', entry, 'NX', 'EX', ARGV[2]) then
+    redis.call('LPUSH', KEYS[2], entry)
+    return entry
+end
+redis.call('LPUSH', KEYS[1], job_id)
+return false
+"""
+
+_RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('DEL', KEYS[1])
+end
+return redis.call('LREM', KEYS[2], 1, ARGV[1])
+"""
+
+
+def build_default_query(
+    table_name: str,
+    date_from: Optional[datetime],
+    date_to: Optional[datetime],
+    filters: Optional[dict],
+    limit: Optional[int] = DEFAULT_EXPORT_LIMIT,
+    end_inclusive: bool = True,
+) -> str:
+    """Build a default query based on table name and filters"""
+    conditions = []
+
+    if date_from:
+        conditions.append(f"timestamp >= '{date_from.isoformat()}'")
+    if date_to:
+        operator = "<=" if end_inclusive else "<"
+        conditions.append(f"timestamp {operator} '{date_to.isoformat()}'")
+
+    if filters:
+        for key, value in filters.items():
+            if isinstance(value, str):
+                conditions.append(f"{key} = '{value}'")
+            elif isinstance(value, list):
+                values = ", ".join(f"'{v}'" for v in value)
+                conditions.append(f"{key} IN ({values})")
+            else:
+                conditions.append(f"{key} = {value}")
+
+    where_clause = " AND ".join(conditions) if conditions else "1=1"
+
+    query = f"SELECT * FROM {table_name} WHERE {where_clause}"
+    if limit:
+        query += f" LIMIT {limit}"
+    return query
+
+
+def _parse_cron_field(field: str, low: int, high: int) -> Set[int]:
+    values: Set[int] = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start_text, end_text = part.split("-", 1)
+            start, end = int(start_text), int(end_text)
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if start < low or end > high:
+            raise ValueError(f"Cron field '{field}' out of range {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+def next_cron_run(expression: str, after: datetime) -> datetime:
+    """Next time a five-field cron expression fires strictly after ``after``."""
+    fields = expression.split()
+    if len(fields) != 5:
+        raise ValueError(f"Invalid cron expression: {expression}")
+
+    minutes = _parse_cron_field(fields[0], 0, 59)
+    hours = _parse_cron_field(fields[1], 0, 23)
+    days = _parse_cron_field(fields[2], 1, 31)
+    months = _parse_cron_field(fields[3], 1, 12)
+    weekdays = {day % 7 for day in _parse_cron_field(fields[4], 0, 7)}
+    any_day = fields[2] == "*"
+    any_weekday = fields[4] == "*"
+
+    def day_matches(when: datetime) -> bool:
+        weekday = (when.weekday() + 1) % 7  # cron: 0 = Sunday
+        if any_day or any_weekday:
+            return when.day in days and weekday in weekdays
+        # Both restricted: cron fires when either matches
+        return when.day in days or weekday in weekdays
+
+    when = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    limit = when + timedelta(days=366 * 4)
+    while when < limit:
+        if when.month not in months:
+            month = when.month % 12 + 1
+            year = when.year + (1 if month == 1 else 0)
+            when = when.replace(year=year, month=month, day=1, hour=0, minute=0)
+        elif not day_matches(when):
+            when = (when + timedelta(days=1)).replace(hour=0, minute=0)
+        elif when.hour not in hours:
+            when = (when + timedelta(hours=1)).replace(minute=0)
+        elif when.minute not in minutes:
+            when += timedelta(minutes=1)
+        else:
+            return when
+
+    raise ValueError(f"Cron expression never fires: {expression}")
+
+
+class ExportService:
+    """
+    Run exports as queued jobs instead of inside the HTTP request.
+
+    Jobs live in Redis (``export:job:{id}``) and move through
+    queued -> running -> completed / failed / cancelled. A job is split into
+    chunks (date windows for range exports); ``chunks_done`` is persisted
+    after every chunk so a failed, cancelled or interrupted job resumes from
+    its last checkpoint. A chunk interrupted mid-way is exported again, so
+    delivery is at-least-once per chunk.
+
+    ``EXPORT_WORKER_CONCURRENCY`` workers claim jobs into a processing list
+    and take a lease in the same script, then keep the lease alive while
+    running; jobs whose lease expired (crashed replica) are put back on the
+    queue. Scheduled exports enqueue jobs into the same queue.
+
+    Jobs built from date ranges or filters keep the historical cap of
+    ``DEFAULT_EXPORT_LIMIT`` rows through ``max_records``: each chunk is
+    limited to the rows the job has left.
+    """
+
+    def __init__(self):
+        self.redis: Optional[redis.Redis] = None
+        self._workers: List[asyncio.Task] = []
+        self._scheduler_task: Optional[asyncio.Task] = None
+
+    async def initialize(self):
+        """Connect to Redis and start workers and the scheduler."""
+        self.redis = redis.from_url(settings.REDIS_URL)
+        self._claim = self.redis.register_script(_CLAIM_SCRIPT)
+        self._renew = self.redis.register_script(_RENEW_SCRIPT)
+        self._release = self.redis.register_script(_RELEASE_SCRIPT)
+
+        await self._recover_stale_jobs()
+
+        for index in range(settings.EXPORT_WORKER_CONCURRENCY):
+            self._workers.append(asyncio.create_task(self._worker(index)))
+        self._scheduler_task = asyncio.create_task(self._scheduler())
+
+        logger.info(f"ExportService initialized with {len(self._workers)} workers")
+
+    async def shutdown(self):
+        """Stop workers; running jobs are put back on the queue."""
+        tasks = self._workers + ([self._scheduler_task] if self._scheduler_task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._scheduler_task = None
+
+        if self.redis:
+            await self.redis.close()
+
+        logger.info("ExportService shutdown complete")
+
+    # ========== Jobs ==========
+
+    async def create_job(
+        self,
+        destination: ExportDestination,
+        table_name: str,
+        chunks: List[str],
+        format: ExportFormat = ExportFormat.JSON,
+        schedule_id: Optional[str] = None,
+        max_records: Optional[int] = None,
+    ) -> ExportJob:
+        """Store a job and put it on the queue."""
+        job = ExportJob(
+            id=str(uuid4()),
+            destination=destination,
+            table_name=table_name,
+            format=format,
+            chunks=chunks,
+            max_records=max_records,
+            schedule_id=schedule_id,
+            created_at=datetime.utcnow(),
+        )
+        await self._save_job(job)
+        await self.redis.zadd(JOBS_KEY, {job.id: job.created_at.timestamp()})
+        await self.redis.lpush(QUEUE_KEY, job.id)
+
+        logger.info(f"Queued export job {job.id} ({len(chunks)} chunks) to {destination.value}")
+        return job
+
+    def build_chunks(
+        self,
+        table_name: str,
+        query: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        filters: Optional[dict] = None,
+    ) -> List[str]:
+        """
+        Split an export into chunk queries; date ranges become fixed windows.
+
+        Window queries carry no LIMIT of their own; pass
+        ``DEFAULT_EXPORT_LIMIT`` as the job's ``max_records`` to cap the
+        export as a whole.
+        """
+        if query:
+            return [query]
+
+        if not (date_from and date_to):
+            return [build_default_query(table_name, date_from, date_to, filters)]
+
+        window = timedelta(hours=settings.EXPORT_CHUNK_HOURS)
+        chunks = []
+        start = date_from
+        while start < date_to:
+            end = min(start + window, date_to)
+            chunks.append(build_default_query(
+                table_name, start, end, filters,
+                limit=None,
+                end_inclusive=end == date_to,
+            ))
+            start = end
+        return chunks
+
+    async def get_job(self, job_id: str) -> Optional[ExportJob]:
+        """Get a job by ID."""
+        data = await self.redis.hget(f"export:job:{job_id}", "data")
+        if data:
+            return ExportJob.model_validate_json(data)
+        return None
+
+    async def list_jobs(self, limit: int = 50) -> List[ExportJob]:
+        """List the most recent jobs."""
+        job_ids = await self.redis.zrevrange(JOBS_KEY, 0, limit - 1)
+        if not job_ids:
+            return []
+
+        pipe = self.redis.pipeline()
+        for job_id in job_ids:
+            pipe.hget(f"export:job:{job_id.decode()}", "data")
+        return [ExportJob.model_validate_json(data) for data in await pipe.execute() if data]
+
+    async def cancel_job(self, job_id: str) -> Optional[ExportJob]:
+        """Cancel a job; a running job stops after its current chunk."""
+        job = await self.get_job(job_id)
+        if not job:
+            return None
+
+        if job.status == ExportJobStatus.QUEUED:
+            await self.redis.lrem(QUEUE_KEY, 0, job.id)
+            job.status = ExportJobStatus.CANCELLED
+            job.eta_seconds = None
+            await self._save_job(job)
+
+        if job.status in (ExportJobStatus.CANCELLED, ExportJobStatus.RUNNING):
+            # The worker owns a running job's state; it stops at the next chunk boundary
+            await self.redis.set(f"export:job:{job.id}:cancel", "1", ex=86400)
+        return job
+
+    async def retry_job(self, job_id: str) -> Optional[ExportJob]:
+        """Re-queue a failed or cancelled job from its last checkpoint."""
+        job = await self.get_job(job_id)
+        if not job:
+            return None
+
+        if job.status in (ExportJobStatus.FAILED, ExportJobStatus.CANCELLED):
+            job.status = ExportJobStatus.QUEUED
+            job.error_message = None
+            await self._save_job(job)
+            await self.redis.delete(f"export:job:{job.id}:cancel")
+            await self.redis.lpush(QUEUE_KEY, job.id)
+        return job
+
+    async def _save_job(self, job: ExportJob) -> None:
+        await self.redis.hset(
+            f"export:job:{job.id}",
+            mapping={"data": job.model_dump_json()},
+        )
+
+    # ========== Schedules ==========
+
+    async def create_schedule(
+        self,
+        destination: ExportDestination,
+        table_name: str,
+        query: str,
+        schedule: str,
+        format: ExportFormat = ExportFormat.JSON,
+    ) -> ExportSchedule:
+        """Create a cron-scheduled export. Raises ValueError for invalid cron."""
+        now = datetime.utcnow()
+        export_schedule = ExportSchedule(
+            id=str(uuid4()),
+            destination=destination,
+            table_name=table_name,
+            query=query,
+            format=format,
+            schedule=schedule,
+            created_at=now,
+            next_run_at=next_cron_run(schedule, now),
+        )
+        await self.redis.hset(SCHEDULES_KEY, export_schedule.id, export_schedule.model_dump_json())
+        return export_schedule
+
+    async def list_schedules(self) -> List[ExportSchedule]:
+        data = await self.redis.hvals(SCHEDULES_KEY)
+        return [ExportSchedule.model_validate_json(item) for item in data]
+
+    async def delete_schedule(self, schedule_id: str) -> bool:
+        return bool(await self.redis.hdel(SCHEDULES_KEY, schedule_id))
+
+    async def _run_due_schedules(self) -> None:
+        now = datetime.utcnow()
+        for export_schedule in await self.list_schedules():
+            if not export_schedule.enabled or export_schedule.next_run_at > now:
+                continue
+
+            # Only one replica enqueues a given run
+            run_at = export_schedule.next_run_at.isoformat()
+            lock_key = f"export:schedule:{export_schedule.id}:{run_at}"
+            if not await self.redis.set(lock_key, "1", nx=True, ex=3600):
+                continue
+
+            job = await self.create_job(
+                export_schedule.destination,
+                export_schedule.table_name,
+                [export_schedule.query],
+                export_schedule.format,
+                schedule_id=export_schedule.id,
+            )
+            export_schedule.last_run_at = now
+            export_schedule.last_job_id = job.id
+            export_schedule.next_run_at = next_cron_run(export_schedule.schedule, now)
+            await self.redis.hset(
+                SCHEDULES_KEY, export_schedule.id, export_schedule.model_dump_json()
+            )
+
+    async def _scheduler(self) -> None:
+        while True:
+            try:
+                await self._run_due_schedules()
+                await self._recover_stale_jobs()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Export scheduler error: {e}")
+            await asyncio.sleep(settings.EXPORT_SCHEDULER_INTERVAL_SECONDS)
+
+    # ========== Workers ==========
+
+    async def _worker(self, index: int) -> None:
+        # Exporters hold non-thread-safe ClickHouse clients, so each worker owns its own
+        exporters: Dict[ExportDestination, BaseExporter] = {}
+
+        try:
+            while True:
+                try:
+                    entry = await self._claim(
+                        keys=[QUEUE_KEY, PROCESSING_KEY],
+                        args=[uuid4().hex, settings.EXPORT_JOB_LEASE_SECONDS],
+                    )
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Export worker {index} queue error: {e}")
+                    await asyncio.sleep(1)
+                    continue
+
+                if not entry:
+                    await asyncio.sleep(IDLE_POLL_SECONDS)
+                    continue
+                entry = entry.decode()
+                job_id = entry.partition(":")[0]
+
+                lease = asyncio.create_task(self._keep_lease(job_id, entry))
+                try:
+                    await self._run_job(job_id, exporters)
+                except asyncio.CancelledError:
+                    await self._requeue(job_id)
+                    raise
+                except Exception as e:
+                    logger.error(f"Export job {job_id} crashed: {e}")
+                finally:
+                    lease.cancel()
+                    await asyncio.gather(lease, return_exceptions=True)
+                    await self._release(
+                        keys=[f"export:job:{job_id}:lease", PROCESSING_KEY], args=[entry]
+                    )
+
+        finally:
+            for exporter in exporters.values():
+                try:
+                    await exporter.disconnect()
+                except Exception as e:
+                    logger.error(f"Error disconnecting exporter: {e}")
+
+    async def _run_job(self, job_id: str, exporters: Dict[ExportDestination, BaseExporter]) -> None:
+        job = await self.get_job(job_id)
+        if not job or job.status != ExportJobStatus.QUEUED:
+            return
+
+        exporter = exporters.get(job.destination)
+        if exporter is None:
+            exporter = exporters[job.destination] = self._create_exporter(job.destination)
+
+        job.status = ExportJobStatus.RUNNING
+        job.attempts += 1
+        job.started_at = job.started_at or datetime.utcnow()
+        await self._save_job(job)
+
+        while job.chunks_done < len(job.chunks):
+            if job.max_records is not None and job.records_exported >= job.max_records:
+                logger.info(f"Export job {job.id} reached its {job.max_records} record limit")
+                break
+
+            # Pick up cancellations made through the API
+            if await self.redis.exists(f"export:job:{job.id}:cancel"):
+                job.status = ExportJobStatus.CANCELLED
+                job.eta_seconds = None
+                await self._save_job(job)
+                logger.info(f"Export job {job.id} cancelled at chunk {job.chunks_done}")
+                return
+
+            chunk_started = time.monotonic()
+            result = await self._export_chunk(exporter, job)
+            if not result.success:
+                job.status = ExportJobStatus.FAILED
+                job.error_message = result.error
+                job.eta_seconds = None
+                await self._save_job(job)
+                logger.error(
+                    f"Export job {job.id} failed at chunk {job.chunks_done}: {result.error}"
+                )
+                return
+
+            # Checkpoint
+            job.chunks_done += 1
+            job.records_exported += result.records_exported
+            job.bytes_written += result.bytes_written
+            job.results.append(result.destination)
+            job.elapsed_seconds += time.monotonic() - chunk_started
+            job.progress = int(job.chunks_done * 100 / len(job.chunks))
+            remaining = len(job.chunks) - job.chunks_done
+            job.eta_seconds = round(job.elapsed_seconds / job.chunks_done * remaining, 1)
+            await self._save_job(job)
+
+        job.status = ExportJobStatus.COMPLETED
+        job.progress = 100
+        job.eta_seconds = 0
+        job.completed_at = datetime.utcnow()
+        await self._save_job(job)
+        logger.info(
+            f"Export job {job.id} completed: {job.records_exported} records "
+            f"in {job.elapsed_seconds:.1f}s"
+        )
+
+    async def _export_chunk(self, exporter: BaseExporter, job: ExportJob):
+        """Export the next chunk, retrying with backoff."""
+        query = job.chunks[job.chunks_done]
+        if job.max_records is not None:
+            query = f"{query} LIMIT {job.max_records - job.records_exported}"
+        attempt = 0
+        while True:
+            result = await exporter.export_query(
+                query=query,
+                table_name=job.table_name,
+                format=job.format,
+            )
+            if result.success or attempt >= settings.EXPORT_CHUNK_RETRIES:
+                return result
+            delay = 2 ** attempt
+            attempt += 1
+            logger.warning(
+                f"Export job {job.id} chunk {job.chunks_done} failed ({result.error}), "
+                f"retry {attempt}/{settings.EXPORT_CHUNK_RETRIES} in {delay}s"
+            )
+            await asyncio.sleep(delay)
+
+    async def _keep_lease(self, job_id: str, entry: str) -> None:
+        lease_key = f"export:job:{job_id}:lease"
+        while True:
+            await asyncio.sleep(settings.EXPORT_JOB_LEASE_SECONDS / 3)
+            renewed = await self._renew(
+                keys=[lease_key], args=[entry, settings.EXPORT_JOB_LEASE_SECONDS]
+            )
+            if not renewed:
+                logger.warning(f"Export job {job_id} lost its lease")
+                return
+
+    async def _requeue(self, job_id: str) -> None:
+        """Put an interrupted job back on the queue, keeping its checkpoint."""
+        job = await self.get_job(job_id)
+        if job and job.status == ExportJobStatus.RUNNING:
+            job.status = ExportJobStatus.QUEUED
+            await self._save_job(job)
+        if job and job.status == ExportJobStatus.QUEUED:
+            await self.redis.rpush(QUEUE_KEY, job_id)
+            logger.info(f"Re-queued export job {job_id}")
+
+    async def _recover_stale_jobs(self) -> None:
+        """Re-queue jobs left in the processing list by a worker that died."""
+        entries = await self.redis.lrange(PROCESSING_KEY, 0, -1)
+        for raw_entry in entries:
+            entry = raw_entry.decode()
+            job_id = entry.partition(":")[0]
+            owner = await self.redis.get(f"export:job:{job_id}:lease")
+            if owner and owner.decode() == entry:
+                continue
+            # A lost lease is never renewed, so the entry is stale; whoever
+            # removes it recovers the job
+            if not await self.redis.lrem(PROCESSING_KEY, 1, entry):
+                continue
+            logger.warning(f"Recovering stale export job {job_id}")
+            await self._requeue(job_id)
+
+    def _create_exporter(self, destination: ExportDestination) -> BaseExporter:
+        if destination == ExportDestination.BIGQUERY:
+            return BigQueryExporter()
+        elif destination == ExportDestination.SNOWFLAKE:
+            return SnowflakeExporter()
+        return S3Exporter()
+
+
+# Singleton instance
+export_service = ExportService()
@@ -0,0 +1,205 @@
+"""GeoIP enrichment for click events backed by a local MaxMind database."""
+
+import ipaddress
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+GEO_FIELDS = ("country", "region", "city")
+
+_EMPTY_GEO: Dict[str, str] = {"country": "", "region": "", "city": ""}
+
+
+class GeoIPService:
+    """
+    Resolve IPs to country/region/city using the configured mmdb file.
+
+    The database is memory-mapped once, so lookups read straight from the
+    page cache without loading the file into the Python heap. Results are
+    cached per network prefix (/24 for IPv4, /48 for IPv6) in a bounded LRU,
+    since clicks from the same prefix almost always resolve to the same city.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        cache_size: Optional[int] = None,
+    ):
+        self.db_path = db_path or settings.GEOIP_PATH
+        self.cache_size = cache_size or settings.GEOIP_CACHE_SIZE
+        self.reader = None
+        self._cache: "OrderedDict[str, Dict[str, str]]" = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def initialize(self) -> None:
+        """Open the MaxMind database in mmap mode."""
+        if self.reader:
+            return
+
+        if not os.path.exists(self.db_path):
+            logger.warning(f"GeoIP database not found at {self.db_path}, enrichment disabled")
+            return
+
+        try:
+            import geoip2.database
+            from maxminddb import MODE_MMAP
+
+            self.reader = geoip2.database.Reader(self.db_path, mode=MODE_MMAP)
+            logger.info(f"GeoIP database loaded: {self.db_path}")
+
+        except ImportError:
+            logger.error("geoip2 not installed, enrichment disabled")
+        except Exception as e:
+            logger.error(f"Failed to open GeoIP database: {e}")
+
+    def close(self) -> None:
+        """Close the database and drop the prefix cache."""
+        if self.reader:
+            self.reader.close()
+            self.reader = None
+        self._cache.clear()
+
+    @property
+    def is_enabled(self) -> bool:
+        return self.reader is not None
+
+    # ========== Lookups ==========
+
+    def lookup(self, ip: str) -> Dict[str, str]:
+        """Resolve a single IP address."""
+        return self.lookup_batch([ip]).get(ip, dict(_EMPTY_GEO))
+
+    def lookup_batch(self, ips: Iterable[str]) -> Dict[str, Dict[str, str]]:
+        """
+        Resolve a batch of IPs.
+
+        Each distinct prefix in the batch hits the database at most once;
+        returns a mapping of ip -> geo fields.
+        """
+        results: Dict[str, Dict[str, str]] = {}
+        if not self.reader:
+            return results
+
+        pending: Dict[str, List[str]] = {}
+        for ip in ips:
+            if not ip or ip in results:
+                continue
+
+            prefix = self._prefix_key(ip)
+            if prefix is None:
+                results[ip] = dict(_EMPTY_GEO)
+                continue
+
+            cached = self._cache_get(prefix)
+            if cached is not None:
+                self.cache_hits += 1
+                results[ip] = cached
+            else:
+                pending.setdefault(prefix, []).append(ip)
+
+        for prefix, prefix_ips in pending.items():
+            self.cache_misses += 1
+            geo = self._resolve(prefix_ips[0])
+            self._cache_put(prefix, geo)
+            for ip in prefix_ips:
+                results[ip] = geo
+
+        return results
+
+    # ========== Enrichment ==========
+
+    def enrich(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """Fill missing geo fields on a single event in place."""
+        self.enrich_batch([event])
+        return event
+
+    def enrich_batch(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Fill missing geo fields on events in place.
+
+        Values already supplied by the caller are kept; only events with an
+        empty country are looked up.
+        """
+        if not self.reader or not events:
+            return events
+
+        targets = [e for e in events if e.get("ip") and not e.get("country")]
+        if not targets:
+            return events
+
+        resolved = self.lookup_batch(e["ip"] for e in targets)
+
+        for event in targets:
+            geo = resolved.get(event["ip"])
+            if not geo:
+                continue
+            for field in GEO_FIELDS:
+                if not event.get(field):
+                    event[field] = geo[field]
+
+        return events
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get cache statistics."""
+        total = self.cache_hits + self.cache_misses
+        return {
+            "enabled": self.is_enabled,
+            "cache_entries": len(self._cache),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "hit_rate": round(self.cache_hits / total, 4) if total else 0,
+        }
+
+    # ========== Internals ==========
+
+    def _resolve(self, ip: str) -> Dict[str, str]:
+        """Look up one IP in the database."""
+        from geoip2.errors import AddressNotFoundError
+
+        try:
+            response = self.reader.city(ip)
+        except (AddressNotFoundError, ValueError):
+            return dict(_EMPTY_GEO)
+        except Exception as e:
+            logger.debug(f"GeoIP lookup failed for {ip}: {e}")
+            return dict(_EMPTY_GEO)
+
+        return {
+            "country": response.country.iso_code or "",
+            "region": response.subdivisions.most_specific.name or "",
+            "city": response.city.name or "",
+        }
+
+    @staticmethod
+    def _prefix_key(ip: str) -> Optional[str]:
+        """Map an IP to its /24 (IPv4) or /48 (IPv6) prefix."""
+        try:
+            addr = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+
+        if addr.version == 4:
+            return f"4:{int(addr) >> 8}"
+        return f"6:{int(addr) >> 80}"
+
+    def _cache_get(self, prefix: str) -> Optional[Dict[str, str]]:
+        geo = self._cache.get(prefix)
+        if geo is not None:
+            self._cache.move_to_end(prefix)
+        return geo
+
+    def _cache_put(self, prefix: str, geo: Dict[str, str]) -> None:
+        self._cache[prefix] = geo
+        self._cache.move_to_end(prefix)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+# Singleton instance
+geoip_service = GeoIPService()
@@ -0,0 +1,75 @@
+"""In-process cache of stream configs, invalidated by version over Redis pub/sub."""
+
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.models.data_stream import DataStream
+
+STREAM_INVALIDATION_CHANNEL = "streams:invalidate"
+
+
+class StreamConfigCache:
+    """
+    Parsed ``DataStream`` configs and team stream lists.
+
+    Every write to a stream bumps its ``version`` in Redis and publishes
+    ``{id, team_id, version}`` on ``STREAM_INVALIDATION_CHANNEL``; each
+    replica drops its copy when it sees a newer version. A load that read
+    an older version than one already invalidated is not cached, so a slow
+    read cannot put a stale config back. Entries also expire after
+    ``ttl_seconds`` in case invalidations were missed.
+
+    Cached configs are shared: callers must not mutate them.
+    """
+
+    def __init__(self, ttl_seconds: float = 60):
+        self.ttl_seconds = ttl_seconds
+        self._streams: Dict[str, Tuple[int, float, DataStream]] = {}
+        self._teams: Dict[str, Tuple[float, List[str]]] = {}
+        self._min_versions: Dict[str, int] = {}
+
+    def get(self, stream_id: str) -> Optional[DataStream]:
+        entry = self._streams.get(stream_id)
+        if not entry:
+            return None
+        _, cached_at, stream = entry
+        if time.monotonic() - cached_at > self.ttl_seconds:
+            del self._streams[stream_id]
+            return None
+        return stream
+
+    def put(self, stream_id: str, version: int, stream: DataStream) -> None:
+        if version < self._min_versions.get(stream_id, 0):
+            return
+        self._streams[stream_id] = (version, time.monotonic(), stream)
+
+    def get_team(self, team_id: str) -> Optional[List[str]]:
+        entry = self._teams.get(team_id)
+        if not entry:
+            return None
+        cached_at, stream_ids = entry
+        if time.monotonic() - cached_at > self.ttl_seconds:
+            del self._teams[team_id]
+            return None
+        return stream_ids
+
+    def put_team(self, team_id: str, stream_ids: List[str]) -> None:
+        self._teams[team_id] = (time.monotonic(), stream_ids)
+
+    def invalidate(
+        self,
+        stream_id: str,
+        version: int,
+        team_id: Optional[str] = None,
+    ) -> None:
+        """Drop a stream cached at an older version than ``version``."""
+        self._min_versions[stream_id] = max(version, self._min_versions.get(stream_id, 0))
+        entry = self._streams.get(stream_id)
+        if entry and entry[0] < version:
+            del self._streams[stream_id]
+        if team_id:
+            self._teams.pop(team_id, None)
+
+    def clear(self) -> None:
+        self._streams.clear()
+        self._teams.clear()
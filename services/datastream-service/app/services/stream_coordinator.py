@@ -0,0 +1,129 @@
+"""Stream ownership across datastream-service replicas."""
+
+import bisect
+import hashlib
+import logging
+import socket
+import time
+from typing import Dict, Iterable, List, Optional, Set
+from uuid import uuid4
+
+import redis.asyncio as redis
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+REPLICAS_KEY = "datastream:replicas"
+ACTIVE_STREAMS_KEY = "streams:active"
+
+# Extend only the leases this replica still holds; returns 1/0 per key
+RENEW_LEASES = """
+local renewed = {}
+for i, key in ipairs(KEYS) do
+    if redis.call('GET', key) == ARGV[1] then
+        redis.call('EXPIRE', key, ARGV[2])
+        renewed[i] = 1
+    else
+        renewed[i] = 0
+    end
+end
+return renewed
+"""
+
+RELEASE_LEASE = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def lease_key(stream_id: str) -> str:
+    return f"stream:{stream_id}:owner"
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hash ring; each replica gets ``vnodes`` points to even out the load."""
+
+    def __init__(self, replicas: Iterable[str], vnodes: int = 160):
+        points = sorted(
+            (_hash(f"{replica}#{i}"), replica)
+            for replica in replicas
+            for i in range(vnodes)
+        )
+        self._keys = [point for point, _ in points]
+        self._owners = [replica for _, replica in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._keys:
+            return None
+        index = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._owners[index]
+
+
+class StreamCoordinator:
+    """
+    Decide which streams this replica runs.
+
+    Replicas heartbeat into a sorted set; those silent for longer than the
+    lease are dropped from the ring. A stream runs on the replica the ring
+    assigns it to, and only while that replica holds the stream's lease
+    (``stream:{id}:owner``). Leases expire when a replica dies, so the new
+    owner takes over within ``STREAM_LEASE_SECONDS``. On scale-up the old
+    owner releases the streams that moved before the new one starts them.
+    """
+
+    def __init__(self, redis_client: redis.Redis):
+        self.redis = redis_client
+        self.replica_id = settings.REPLICA_ID or f"{socket.gethostname()}-{uuid4().hex[:8]}"
+        self._renew = self.redis.register_script(RENEW_LEASES)
+        self._release = self.redis.register_script(RELEASE_LEASE)
+
+    async def heartbeat(self) -> List[str]:
+        """Record this replica as alive and return the live replicas."""
+        now = time.time()
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.zadd(REPLICAS_KEY, {self.replica_id: now})
+        pipe.zremrangebyscore(REPLICAS_KEY, "-inf", now - settings.STREAM_LEASE_SECONDS)
+        pipe.zrange(REPLICAS_KEY, 0, -1)
+        _, _, replicas = await pipe.execute()
+        return [replica.decode() for replica in replicas]
+
+    async def leave(self) -> None:
+        await self.redis.zrem(REPLICAS_KEY, self.replica_id)
+
+    async def assigned_streams(self, replicas: List[str]) -> Set[str]:
+        """Active streams the ring assigns to this replica."""
+        ring = HashRing(replicas, settings.STREAM_RING_VNODES)
+        stream_ids = await self.redis.smembers(ACTIVE_STREAMS_KEY)
+        return {
+            stream_id
+            for stream_id in (s.decode() for s in stream_ids)
+            if ring.owner(stream_id) == self.replica_id
+        }
+
+    async def acquire(self, stream_id: str) -> bool:
+        return bool(await self.redis.set(
+            lease_key(stream_id),
+            self.replica_id,
+            nx=True,
+            ex=settings.STREAM_LEASE_SECONDS,
+        ))
+
+    async def renew(self, stream_ids: List[str]) -> Dict[str, bool]:
+        """Extend leases in one round trip. Returns which ones are still ours."""
+        if not stream_ids:
+            return {}
+        renewed = await self._renew(
+            keys=[lease_key(stream_id) for stream_id in stream_ids],
+            args=[self.replica_id, settings.STREAM_LEASE_SECONDS],
+        )
+        return {stream_id: bool(ok) for stream_id, ok in zip(stream_ids, renewed)}
+
+    async def release(self, stream_id: str) -> None:
+        await self._release(keys=[lease_key(stream_id)], args=[self.replica_id])
@@ -0,0 +1,72 @@
+"""Per-stream delivery metrics: latency histograms and throughput in Redis."""
+
+import bisect
+import time
+from typing import Dict, List, Optional
+
+# Upper bounds (ms) of the batch latency buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = [
+    1, 2, 5, 10, 20, 50, 100, 200, 500,
+    1000, 2000, 5000, 10000, 30000, 60000,
+]
+
+METRICS_RESOLUTION_SECONDS = 60
+METRICS_RETENTION_SECONDS = 25 * 3600  # Covers a 24h window
+
+
+def metrics_key(stream_id: str, slot: int) -> str:
+    return f"stream:{stream_id}:metrics:{slot}"
+
+
+def current_slot(now: Optional[float] = None) -> int:
+    return int((now or time.time()) // METRICS_RESOLUTION_SECONDS)
+
+
+def latency_bucket(latency_ms: float) -> int:
+    """Index of the histogram bucket for a latency."""
+    return bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)
+
+
+def window_slots(window_seconds: int, now: Optional[float] = None) -> List[int]:
+    """Slots covering the last ``window_seconds``, oldest first."""
+    end = current_slot(now)
+    count = max(1, -(-window_seconds // METRICS_RESOLUTION_SECONDS))
+    return list(range(end - count + 1, end + 1))
+
+
+def merge_slots(slots: List[Dict[bytes, bytes]]) -> Dict[str, int]:
+    """Sum the counters of several per-minute hashes."""
+    merged: Dict[str, int] = {}
+    for slot in slots:
+        for field, value in slot.items():
+            name = field.decode() if isinstance(field, bytes) else field
+            merged[name] = merged.get(name, 0) + int(value)
+    return merged
+
+
+def percentile(histogram: List[int], q: float) -> float:
+    """
+    Estimate the ``q`` quantile (0-1) of a bucketed latency histogram.
+
+    Interpolates linearly inside the bucket holding the quantile; the
+    open-ended last bucket reports its lower bound.
+    """
+    total = sum(histogram)
+    if not total:
+        return 0.0
+
+    rank = q * total
+    seen = 0
+    for index, count in enumerate(histogram):
+        if count and seen + count >= rank:
+            lower = LATENCY_BUCKETS_MS[index - 1] if index > 0 else 0
+            if index >= len(LATENCY_BUCKETS_MS):
+                return float(lower)
+            upper = LATENCY_BUCKETS_MS[index]
+            return lower + (upper - lower) * (rank - seen) / count
+        seen += count
+    return float(LATENCY_BUCKETS_MS[-1])
+
+
+def histogram_from(merged: Dict[str, int]) -> List[int]:
+    return [merged.get(f"lat:{i}", 0) for i in range(len(LATENCY_BUCKETS_MS) + 1)]
@@ -3,8 +3,9 @@
 import asyncio
 import json
 import logging
+import time
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import Any, Dict, List, Optional, Set
 from uuid import uuid4
 
 import redis.asyncio as redis
@@ -21,6 +22,9 @@ from app.models.data_stream import (
     BackfillJob,
     TestConnectionResult,
     DestinationType,
+    DeadLetterReason,
+    ReplayRequest,
+    ReplayStatus,
 )
 from app.connectors import (
     BaseConnector,
@@ -32,6 +36,20 @@ from app.connectors import (
     AzureBlobConnector,
     GCSConnector,
 )
+from app.connectors.delivery import CircuitBreaker, backoff_delay
+from app.services.dead_letter import DeadLetterQueue
+from app.services.stream_coordinator import ACTIVE_STREAMS_KEY, StreamCoordinator
+from app.services.stream_cache import STREAM_INVALIDATION_CHANNEL, StreamConfigCache
+from app.services.stream_metrics import (
+    METRICS_RETENTION_SECONDS,
+    current_slot,
+    histogram_from,
+    latency_bucket,
+    merge_slots,
+    metrics_key,
+    percentile,
+    window_slots,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -44,10 +62,25 @@ class StreamService:
         self.clickhouse: Optional[ClickHouseClient] = None
         self._stream_tasks: Dict[str, asyncio.Task] = {}
         self._connectors: Dict[str, BaseConnector] = {}
+        self._replay_tasks: Dict[str, asyncio.Task] = {}
+        self.dlq: Optional[DeadLetterQueue] = None
+
+        # Ownership of streams across replicas
+        self.coordinator: Optional[StreamCoordinator] = None
+        self._coordinator_task: Optional[asyncio.Task] = None
+        self._keepalive_task: Optional[asyncio.Task] = None
+        self._rebalance_requested = asyncio.Event()
+        self._stopping: Set[str] = set()  # Streams flushing on stop; their leases are still held
+        # Config version each running stream started with
+        self._stream_versions: Dict[str, int] = {}
+
+        self.cache = StreamConfigCache(settings.STREAM_CACHE_TTL_SECONDS)
+        self._invalidation_task: Optional[asyncio.Task] = None
 
     async def initialize(self):
-        """Initialize service connections."""
+        """Initialize service connections and start running the streams this replica owns."""
         self.redis = redis.from_url(settings.REDIS_URL)
+        self.dlq = DeadLetterQueue(self.redis)
         self.clickhouse = ClickHouseClient(
             host=settings.CLICKHOUSE_HOST,
             port=settings.CLICKHOUSE_PORT,
@@ -55,24 +88,55 @@ class StreamService:
             user=settings.CLICKHOUSE_USER,
             password=settings.CLICKHOUSE_PASSWORD,
         )
-        logger.info("StreamService initialized")
+
+        self._invalidation_task = asyncio.create_task(self._listen_invalidations())
+
+        self.coordinator = StreamCoordinator(self.redis)
+        await self._index_active_streams()
+        self._keepalive_task = asyncio.create_task(self._keep_leases())
+        self._coordinator_task = asyncio.create_task(self._coordinate())
+        logger.info(f"StreamService initialized as replica {self.coordinator.replica_id}")
 
     async def shutdown(self):
         """Shutdown service and stop all streams."""
-        # Stop all stream tasks
-        for stream_id, task in self._stream_tasks.items():
+        if self._coordinator_task:
+            self._coordinator_task.cancel()
+            try:
+                await self._coordinator_task
+            except asyncio.CancelledError:
+                pass
+
+        # Stop all streams, releasing their leases so other replicas take over
+        for stream_id in list(self._stream_tasks):
+            try:
+                await self._stop_stream(stream_id)
+            except Exception as e:
+                logger.error(f"Error stopping stream {stream_id}: {e}")
+
+        if self._keepalive_task:
+            self._keepalive_task.cancel()
+            try:
+                await self._keepalive_task
+            except asyncio.CancelledError:
+                pass
+
+        # Stop replays; unreplayed entries stay in the dead-letter queue
+        for task in list(self._replay_tasks.values()):
             task.cancel()
             try:
                 await task
             except asyncio.CancelledError:
                 pass
 
-        # Disconnect all connectors
-        for connector in self._connectors.values():
+        if self.coordinator:
+            await self.coordinator.leave()
+
+        if self._invalidation_task:
+            self._invalidation_task.cancel()
             try:
-                await connector.disconnect()
-            except Exception as e:
-                logger.error(f"Error disconnecting connector: {e}")
+                await self._invalidation_task
+            except asyncio.CancelledError:
+                pass
 
         if self.redis:
             await self.redis.close()
@@ -101,39 +165,47 @@ class StreamService:
             updated_at=now,
         )
 
-        # Store in Redis
-        await self.redis.hset(
-            f"stream:{stream_id}",
-            mapping={"data": stream.model_dump_json()},
-        )
-
-        # Add to team's stream list
+        # Add to team's stream list before announcing it, so the team cache reloads it
         await self.redis.sadd(f"team:{create_data.team_id}:streams", stream_id)
 
-        # Start the stream processor
-        await self._start_stream(stream)
+        # Store in Redis
+        await self._save_stream(stream)
+
+        # The replica that owns the stream starts its processor
+        await self.redis.sadd(ACTIVE_STREAMS_KEY, stream_id)
+        self._rebalance_requested.set()
 
         logger.info(f"Created stream: {stream_id}")
         return stream
 
     async def get_stream(self, stream_id: str) -> Optional[DataStream]:
-        """Get a stream by ID."""
-        data = await self.redis.hget(f"stream:{stream_id}", "data")
-        if data:
-            return DataStream.model_validate_json(data)
-        return None
+        """Get a stream by ID. The result may be shared with the cache; do not mutate it."""
+        stream = self.cache.get(stream_id)
+        if stream:
+            return stream
+        loaded = await self._load_streams([stream_id])
+        return loaded.get(stream_id)
+
+    async def get_streams(self, stream_ids: List[str]) -> Dict[str, DataStream]:
+        """Get several streams, loading cache misses in one round trip."""
+        streams = {}
+        misses = []
+        for stream_id in stream_ids:
+            stream = self.cache.get(stream_id)
+            if stream:
+                streams[stream_id] = stream
+            else:
+                misses.append(stream_id)
+        streams.update(await self._load_streams(misses))
+        return streams
 
     async def list_streams(self, team_id: str) -> List[DataStream]:
         """List all streams for a team."""
-        stream_ids = await self.redis.smembers(f"team:{team_id}:streams")
-        streams = []
-
-        for stream_id in stream_ids:
-            stream = await self.get_stream(stream_id)
-            if stream and stream.status != StreamStatus.DELETED:
-                streams.append(stream)
-
-        return streams
+        streams = await self.get_streams(await self._team_stream_ids(team_id))
+        return [
+            stream for stream in streams.values()
+            if stream.status != StreamStatus.DELETED
+        ]
 
     async def update_stream(
         self,
@@ -141,7 +213,7 @@ class StreamService:
         update_data: DataStreamUpdate,
     ) -> Optional[DataStream]:
         """Update a data stream."""
-        stream = await self.get_stream(stream_id)
+        stream = await self._get_stream_for_update(stream_id)
         if not stream:
             return None
 
@@ -154,49 +226,227 @@ class StreamService:
         stream.updated_at = datetime.utcnow()
 
         # Save to Redis
-        await self.redis.hset(
-            f"stream:{stream_id}",
-            mapping={"data": stream.model_dump_json()},
-        )
+        await self._save_stream(stream)
 
-        # Restart stream if needed
+        # The owning replica restarts (or stops) the stream when its config changes
         if stream.status == StreamStatus.ACTIVE:
-            await self._stop_stream(stream_id)
-            await self._start_stream(stream)
+            await self.redis.sadd(ACTIVE_STREAMS_KEY, stream_id)
+        else:
+            await self.redis.srem(ACTIVE_STREAMS_KEY, stream_id)
+        self._rebalance_requested.set()
 
         logger.info(f"Updated stream: {stream_id}")
         return stream
 
     async def delete_stream(self, stream_id: str) -> bool:
         """Delete a data stream."""
-        stream = await self.get_stream(stream_id)
+        stream = await self._get_stream_for_update(stream_id)
         if not stream:
             return False
 
         # Stop the stream
-        await self._stop_stream(stream_id)
+        await self.redis.srem(ACTIVE_STREAMS_KEY, stream_id)
+        self._rebalance_requested.set()
 
         # Mark as deleted
         stream.status = StreamStatus.DELETED
         stream.updated_at = datetime.utcnow()
 
-        await self.redis.hset(
-            f"stream:{stream_id}",
-            mapping={"data": stream.model_dump_json()},
-        )
+        await self._save_stream(stream)
 
         logger.info(f"Deleted stream: {stream_id}")
         return True
 
+    # ========== Config Cache ==========
+
+    async def _get_stream_for_update(self, stream_id: str) -> Optional[DataStream]:
+        """Read a stream from Redis into a private copy the caller may modify."""
+        data = await self.redis.hget(f"stream:{stream_id}", "data")
+        if data:
+            return DataStream.model_validate_json(data)
+        return None
+
+    async def _save_stream(self, stream: DataStream) -> int:
+        """Store a stream, bump its version and tell every replica to drop older copies."""
+        key = f"stream:{stream.id}"
+        pipe = self.redis.pipeline()
+        pipe.hset(key, mapping={"data": stream.model_dump_json()})
+        pipe.hincrby(key, "version", 1)
+        _, version = await pipe.execute()
+
+        self.cache.invalidate(stream.id, version, stream.team_id)
+        await self.redis.publish(
+            STREAM_INVALIDATION_CHANNEL,
+            json.dumps({"id": stream.id, "team_id": stream.team_id, "version": version}),
+        )
+        return version
+
+    async def _load_streams(self, stream_ids: List[str]) -> Dict[str, DataStream]:
+        """Load streams from Redis in one round trip and cache them."""
+        if not stream_ids:
+            return {}
+        pipe = self.redis.pipeline(transaction=False)
+        for stream_id in stream_ids:
+            pipe.hmget(f"stream:{stream_id}", "data", "version")
+        results = await pipe.execute()
+
+        streams = {}
+        for stream_id, (data, version) in zip(stream_ids, results):
+            if not data:
+                continue
+            stream = DataStream.model_validate_json(data)
+            self.cache.put(stream_id, int(version or 0), stream)
+            streams[stream_id] = stream
+        return streams
+
+    async def _get_versions(self, stream_ids: List[str]) -> Dict[str, int]:
+        if not stream_ids:
+            return {}
+        pipe = self.redis.pipeline(transaction=False)
+        for stream_id in stream_ids:
+            pipe.hget(f"stream:{stream_id}", "version")
+        results = await pipe.execute()
+        return {
+            stream_id: int(version or 0)
+            for stream_id, version in zip(stream_ids, results)
+        }
+
+    async def _team_stream_ids(self, team_id: str) -> List[str]:
+        stream_ids = self.cache.get_team(team_id)
+        if stream_ids is None:
+            stream_ids = [s.decode() for s in await self.redis.smembers(f"team:{team_id}:streams")]
+            self.cache.put_team(team_id, stream_ids)
+        return stream_ids
+
+    async def _listen_invalidations(self) -> None:
+        """Apply config invalidations published by any replica."""
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(STREAM_INVALIDATION_CHANNEL)
+                # Invalidations may have been missed while unsubscribed
+                self.cache.clear()
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    payload = json.loads(message["data"])
+                    self.cache.invalidate(
+                        payload["id"],
+                        payload["version"],
+                        payload.get("team_id"),
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Stream invalidation listener failed: {e}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.close()
+
     # ========== Stream Processing ==========
 
-    async def _start_stream(self, stream: DataStream) -> None:
-        """Start processing a stream."""
+    async def _index_active_streams(self) -> None:
+        """Build the active-stream index from team stream sets if it does not exist yet."""
+        if await self.redis.exists(ACTIVE_STREAMS_KEY):
+            return
+
+        stream_ids = set()
+        async for key in self.redis.scan_iter(match="team:*:streams"):
+            stream_ids.update(s.decode() for s in await self.redis.smembers(key))
+
+        active = [
+            stream.id
+            for stream in (await self.get_streams(list(stream_ids))).values()
+            if stream.status == StreamStatus.ACTIVE
+        ]
+        if active:
+            await self.redis.sadd(ACTIVE_STREAMS_KEY, *active)
+            logger.info(f"Indexed {len(active)} active streams")
+
+    async def _coordinate(self) -> None:
+        """Rebalance every heartbeat, or sooner when a stream is created or changed."""
+        while True:
+            try:
+                await self._rebalance()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Stream rebalance failed: {e}")
+
+            try:
+                await asyncio.wait_for(
+                    self._rebalance_requested.wait(),
+                    timeout=settings.STREAM_HEARTBEAT_SECONDS,
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._rebalance_requested.clear()
+
+    async def _keep_leases(self) -> None:
+        """
+        Heartbeat and renew this replica's stream leases on their own schedule.
+
+        Rebalancing stops streams inline, and a stop flushes and uploads
+        buffered data, which can outlast the lease. Renewing here keeps the
+        leases of running and stopping streams alive meanwhile.
+        """
+        while True:
+            try:
+                await self.coordinator.heartbeat()
+                held = list(self._stream_tasks.keys() | self._stopping)
+                leased = await self.coordinator.renew(held)
+                lost = [stream_id for stream_id, ok in leased.items() if not ok]
+                if lost:
+                    logger.warning(f"Lost stream leases: {', '.join(lost)}")
+                    self._rebalance_requested.set()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Stream lease renewal failed: {e}")
+            await asyncio.sleep(settings.STREAM_HEARTBEAT_SECONDS)
+
+    async def _rebalance(self) -> None:
+        """
+        Run exactly the streams the hash ring assigns to this replica.
+
+        Streams that moved to another replica, lost their lease, stopped on
+        their own, or whose config changed are stopped (and their lease
+        released). Newly assigned streams start once their lease is free,
+        i.e. after the previous owner has stopped them or its lease expired.
+        """
+        replicas = await self.coordinator.heartbeat()
+        assigned = await self.coordinator.assigned_streams(replicas)
+
+        running = list(self._stream_tasks)
+        leased = await self.coordinator.renew(running)
+        versions = await self._get_versions(list(assigned | set(running)))
+
+        for stream_id in running:
+            if (
+                stream_id in assigned
+                and leased[stream_id]
+                and not self._stream_tasks[stream_id].done()
+                and versions.get(stream_id) == self._stream_versions.get(stream_id)
+            ):
+                continue
+            await self._stop_stream(stream_id)
+
+        # Start from a fresh read: the cache may not have seen the latest version yet
+        to_start = await self._load_streams(list(assigned - set(self._stream_tasks)))
+        for stream_id, stream in to_start.items():
+            if stream.status != StreamStatus.ACTIVE:
+                await self.redis.srem(ACTIVE_STREAMS_KEY, stream_id)
+                continue
+            if await self.coordinator.acquire(stream_id):
+                await self._start_stream(stream, versions.get(stream_id, 0))
+
+    async def _start_stream(self, stream: DataStream, version: int) -> None:
+        """Start processing a stream this replica holds the lease for."""
         if stream.id in self._stream_tasks:
             return
 
         # Create connector
-        connector = self._create_connector(stream)
+        connector = self._create_connector(stream, durable=True)
         self._connectors[stream.id] = connector
 
         # Start processing task
@@ -204,11 +454,22 @@ class StreamService:
             self._process_stream(stream, connector)
         )
         self._stream_tasks[stream.id] = task
+        self._stream_versions[stream.id] = version
 
         logger.info(f"Started stream: {stream.id}")
 
     async def _stop_stream(self, stream_id: str) -> None:
         """Stop processing a stream."""
+        self._stopping.add(stream_id)
+        try:
+            await self._shutdown_stream(stream_id)
+        finally:
+            self._stopping.discard(stream_id)
+        await self.coordinator.release(stream_id)
+
+        logger.info(f"Stopped stream: {stream_id}")
+
+    async def _shutdown_stream(self, stream_id: str) -> None:
         # Cancel task
         if stream_id in self._stream_tasks:
             self._stream_tasks[stream_id].cancel()
@@ -220,32 +481,72 @@ class StreamService:
 
         # Disconnect connector
         if stream_id in self._connectors:
-            await self._connectors[stream_id].disconnect()
-            del self._connectors[stream_id]
+            try:
+                await self._connectors[stream_id].disconnect()
+            finally:
+                del self._connectors[stream_id]
 
-        logger.info(f"Stopped stream: {stream_id}")
+        self._stream_versions.pop(stream_id, None)
+
+    def _create_connector(self, stream: DataStream, durable: bool = False) -> BaseConnector:
+        """
+        Create a connector for the stream destination.
 
-    def _create_connector(self, stream: DataStream) -> BaseConnector:
-        """Create a connector for the stream destination."""
+        Only the stream's own processor passes ``durable``: object-store
+        connectors then spool to a directory keyed by the stream ID, so the
+        next owner of the stream recovers files left behind by a crash.
+        Replays and backfills spool to private directories.
+        """
         dest_type = stream.destination.type
+        stream_id = stream.id if durable else None
 
         if dest_type == DestinationType.BIGQUERY:
-            return BigQueryConnector(stream.destination, stream.schema)
+            connector = BigQueryConnector(stream.destination, stream.schema)
         elif dest_type == DestinationType.S3:
-            return S3Connector(stream.destination, stream.schema, stream.partitioning)
+            connector = S3Connector(
+                stream.destination, stream.schema, stream.partitioning, stream_id
+            )
         elif dest_type == DestinationType.KAFKA:
-            return KafkaConnector(stream.destination, stream.schema)
+            connector = KafkaConnector(stream.destination, stream.schema)
         elif dest_type == DestinationType.HTTP:
-            return HTTPConnector(stream.destination, stream.schema)
+            connector = HTTPConnector(stream.destination, stream.schema)
         elif dest_type == DestinationType.SNOWFLAKE:
-            return SnowflakeConnector(stream.destination, stream.schema)
+            connector = SnowflakeConnector(stream.destination, stream.schema)
         elif dest_type == DestinationType.AZURE_BLOB:
-            return AzureBlobConnector(stream.destination, stream.schema, stream.partitioning)
+            connector = AzureBlobConnector(
+                stream.destination, stream.schema, stream.partitioning, stream_id
+            )
         elif dest_type == DestinationType.GCS:
-            return GCSConnector(stream.destination, stream.schema, stream.partitioning)
+            connector = GCSConnector(
+                stream.destination, stream.schema, stream.partitioning, stream_id
+            )
         else:
             raise ValueError(f"Unsupported destination type: {dest_type}")
 
+        if connector.buffers_events:
+            self._report_buffered_delivery(stream, connector)
+        return connector
+
+    def _report_buffered_delivery(self, stream: DataStream, connector: BaseConnector) -> None:
+        """Count buffered events when their file is uploaded, and dead-letter failed files."""
+
+        async def delivered(count: int, nbytes: int) -> None:
+            await self._update_stats(stream.id, count, 0, nbytes=nbytes)
+
+        async def undeliverable(events: List[Dict[str, Any]], error: str) -> None:
+            await self.dlq.add(
+                stream.id,
+                events,
+                DeadLetterReason.UPLOAD_FAILED,
+                error=error,
+                attempts=settings.OBJECT_STORE_UPLOAD_ATTEMPTS,
+            )
+            await self._update_stats(stream.id, 0, len(events))
+            await self._record_error(stream.id, error)
+
+        connector.on_delivered = delivered
+        connector.on_undeliverable = undeliverable
+
     async def _process_stream(
         self,
         stream: DataStream,
@@ -253,12 +554,25 @@ class StreamService:
     ) -> None:
         """Process events for a stream."""
         batch_buffer: List[Dict[str, Any]] = []
+        buffer_bytes = 0
         last_flush = datetime.utcnow()
+        delivery = stream.delivery
+        flush_size = connector.flush_size(delivery)
+        breaker = CircuitBreaker(
+            failure_threshold=delivery.circuit_breaker_threshold,
+            cooldown_seconds=delivery.circuit_breaker_cooldown_seconds,
+        )
 
         try:
-            await connector.connect()
+            await self._connect_with_retry(stream, connector, breaker)
 
             while True:
+                # Circuit open: stop pulling events and let them queue up in Redis.
+                # Once half-open, the next flush is the probe.
+                if not breaker.allow():
+                    await asyncio.sleep(min(breaker.retry_after, 1.0))
+                    continue
+
                 # Get events from queue
                 event_data = await self.redis.lpop(f"stream:{stream.id}:events")
 
@@ -266,48 +580,174 @@ class StreamService:
                     event = json.loads(event_data)
                     if self._matches_filters(event, stream.filters):
                         batch_buffer.append(event)
+                        buffer_bytes += len(event_data)
 
                 # Check if we should flush
                 should_flush = (
-                    len(batch_buffer) >= stream.delivery.batch_size or
+                    len(batch_buffer) >= flush_size or
                     (datetime.utcnow() - last_flush).total_seconds() >=
-                    stream.delivery.batch_interval_seconds
+                    delivery.batch_interval_seconds
                 )
 
                 if should_flush and batch_buffer:
-                    try:
-                        result = await connector.send_batch(
-                            batch_buffer,
-                            stream.delivery.batch_size,
-                        )
-                        await self._update_stats(
-                            stream.id,
-                            result["sent"],
-                            result["failed"],
-                        )
-                        batch_buffer = []
-                        last_flush = datetime.utcnow()
+                    await self._deliver(stream, connector, breaker, batch_buffer, buffer_bytes)
+                    batch_buffer = []
+                    buffer_bytes = 0
+                    last_flush = datetime.utcnow()
 
-                    except Exception as e:
-                        logger.error(f"Error sending batch: {e}")
-                        await self._update_stream_error(stream.id, str(e))
+                # Roll buffered files that reached their max age
+                await connector.flush()
 
                 # Small delay to prevent busy loop
                 await asyncio.sleep(0.1)
 
         except asyncio.CancelledError:
-            # Flush remaining events
+            # Flush remaining events; dead-letter whatever does not make it
             if batch_buffer:
                 try:
-                    await connector.send_batch(batch_buffer, len(batch_buffer))
+                    result = await connector.send_batch(batch_buffer, len(batch_buffer), delivery)
                 except Exception as e:
                     logger.error(f"Error flushing final batch: {e}")
+                    result = {"sent": 0, "failed": 0, "retryable": batch_buffer, "error": str(e)}
+                try:
+                    await self._dead_letter(stream, connector, result, DeadLetterReason.SHUTDOWN)
+                except Exception as e:
+                    logger.error(f"Error dead-lettering final batch: {e}")
+            try:
+                await connector.flush(force=True)
+            except Exception as e:
+                logger.error(f"Error flushing connector: {e}")
             raise
 
         except Exception as e:
             logger.error(f"Stream processing error: {e}")
             await self._update_stream_error(stream.id, str(e))
 
+    async def _connect_with_retry(
+        self,
+        stream: DataStream,
+        connector: BaseConnector,
+        breaker: CircuitBreaker,
+    ) -> None:
+        """Connect, backing off (and pausing via the breaker) while the destination is down."""
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                await asyncio.sleep(breaker.retry_after)
+            try:
+                await connector.connect()
+                was_closed = breaker.state == CircuitBreaker.CLOSED
+                breaker.record_success()
+                if not was_closed:
+                    await self._set_circuit_state(stream.id, breaker)
+                return
+            except Exception as e:
+                logger.error(f"Stream {stream.id} failed to connect: {e}")
+                if breaker.record_failure(str(e)):
+                    await self._set_circuit_state(stream.id, breaker)
+                await asyncio.sleep(backoff_delay(
+                    attempt,
+                    stream.delivery.retry_backoff_seconds,
+                    stream.delivery.max_backoff_seconds,
+                ))
+                attempt += 1
+
+    async def _deliver(
+        self,
+        stream: DataStream,
+        connector: BaseConnector,
+        breaker: CircuitBreaker,
+        events: List[Dict[str, Any]],
+        nbytes: int = 0,
+    ) -> None:
+        """Send a buffered batch, dead-lettering the sub-batches that fail."""
+        was_closed = breaker.state == CircuitBreaker.CLOSED
+        started = asyncio.get_running_loop().time()
+        try:
+            result = await connector.send_batch(
+                events,
+                stream.delivery.batch_size,
+                stream.delivery,
+            )
+        except Exception as e:
+            logger.error(f"Error sending batch: {e}")
+            result = {"sent": 0, "failed": 0, "retryable": events, "error": str(e)}
+
+        # Buffering connectors count their events once the file holding them is uploaded
+        sent = 0 if connector.buffers_events else result["sent"]
+        await self._update_stats(
+            stream.id,
+            sent,
+            result["failed"],
+            latency_ms=(asyncio.get_running_loop().time() - started) * 1000,
+            # Sizes are of the queued JSON events, pro rata to what was sent
+            nbytes=nbytes * sent // len(events),
+        )
+        await self._dead_letter(stream, connector, result, DeadLetterReason.RETRIES_EXHAUSTED)
+
+        if not result["retryable"]:
+            breaker.record_success()
+            if not was_closed:
+                await self._set_circuit_state(stream.id, breaker)
+            return
+
+        # Pause pulling events once the breaker opens
+        opened = breaker.record_failure(result["error"])
+        await self._record_error(stream.id, result["error"])
+        if opened or not was_closed:
+            await self._set_circuit_state(stream.id, breaker)
+
+    async def _dead_letter(
+        self,
+        stream: DataStream,
+        connector: BaseConnector,
+        result: Dict[str, Any],
+        reason: DeadLetterReason,
+    ) -> None:
+        """Dead-letter the failed and rejected sub-batches of a send_batch result."""
+        if result["retryable"]:
+            await self.dlq.add(
+                stream.id,
+                result["retryable"],
+                reason,
+                error=result["error"],
+                attempts=connector.max_retries(stream.delivery) + 1,
+            )
+        # Only the rejected events are kept, so replaying an entry sends all of it
+        for events, accepted in result.get("rejected", []):
+            await self.dlq.add(
+                stream.id,
+                events,
+                DeadLetterReason.REJECTED,
+                error=f"Destination accepted {accepted} of {accepted + len(events)} events",
+                accepted=accepted,
+            )
+
+    async def _record_error(self, stream_id: str, error: Optional[str]) -> None:
+        await self.redis.hset(
+            f"stream:{stream_id}:stats",
+            mapping={
+                "last_error_at": datetime.utcnow().isoformat(),
+                "last_error_message": error or "",
+            },
+        )
+
+    async def _set_circuit_state(self, stream_id: str, breaker: CircuitBreaker) -> None:
+        """Record the breaker state; the stream stays ACTIVE so events keep queueing."""
+        state = breaker.state
+        await self.redis.hset(f"stream:{stream_id}:stats", "circuit_state", state)
+
+        if state == CircuitBreaker.CLOSED:
+            await self.add_log(stream_id, "info", "Delivery resumed")
+        else:
+            await self.add_log(
+                stream_id,
+                "warning",
+                f"Delivery paused for {breaker.retry_after:.0f}s after "
+                f"{breaker.failures} consecutive failures",
+                {"error": breaker.last_error},
+            )
+
     def _matches_filters(self, event: Dict[str, Any], filters) -> bool:
         """Check if event matches stream filters."""
         # Team filter
@@ -341,28 +781,44 @@ class StreamService:
         stream_id: str,
         sent: int,
         failed: int,
+        latency_ms: Optional[float] = None,
+        nbytes: int = 0,
     ) -> None:
-        """Update stream statistics."""
-        await self.redis.hincrby(f"stream:{stream_id}:stats", "events_sent", sent)
-        await self.redis.hincrby(f"stream:{stream_id}:stats", "events_failed", failed)
-        await self.redis.hset(
-            f"stream:{stream_id}:stats",
-            "last_event_at",
-            datetime.utcnow().isoformat(),
-        )
+        """
+        Update stream statistics for one delivered batch.
+
+        Lifetime totals go to ``stream:{id}:stats``; counters and the latency
+        histogram for windowed stats go to a per-minute hash. One round trip.
+        """
+        stats_key = f"stream:{stream_id}:stats"
+        slot_key = metrics_key(stream_id, current_slot())
+
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hincrby(stats_key, "events_sent", sent)
+        pipe.hincrby(stats_key, "events_failed", failed)
+        pipe.hincrby(stats_key, "bytes_sent", nbytes)
+        pipe.hset(stats_key, "last_event_at", datetime.utcnow().isoformat())
+
+        pipe.hincrby(slot_key, "events_sent", sent)
+        pipe.hincrby(slot_key, "events_failed", failed)
+        pipe.hincrby(slot_key, "bytes_sent", nbytes)
+        if latency_ms is not None:
+            pipe.hincrby(slot_key, "batches", 1)
+            pipe.hincrby(slot_key, "latency_ms", int(latency_ms))
+            pipe.hincrby(slot_key, f"lat:{latency_bucket(latency_ms)}", 1)
+        pipe.expire(slot_key, METRICS_RETENTION_SECONDS)
+        await pipe.execute()
 
     async def _update_stream_error(self, stream_id: str, error: str) -> None:
         """Update stream with error status."""
-        stream = await self.get_stream(stream_id)
+        stream = await self._get_stream_for_update(stream_id)
         if stream:
             stream.status = StreamStatus.ERROR
             stream.error_message = error
             stream.updated_at = datetime.utcnow()
 
-            await self.redis.hset(
-                f"stream:{stream_id}",
-                mapping={"data": stream.model_dump_json()},
-            )
+            await self.redis.srem(ACTIVE_STREAMS_KEY, stream_id)
+            await self._save_stream(stream)
 
     # ========== Event Publishing ==========
 
@@ -372,17 +828,21 @@ class StreamService:
         if not team_id:
             return
 
-        # Get all active streams for the team
-        stream_ids = await self.redis.smembers(f"team:{team_id}:streams")
+        # Get all active streams for the team (cached)
+        streams = await self.get_streams(await self._team_stream_ids(team_id))
+        active = [
+            stream_id for stream_id, stream in streams.items()
+            if stream.status == StreamStatus.ACTIVE
+        ]
+        if not active:
+            return
 
-        for stream_id in stream_ids:
-            stream = await self.get_stream(stream_id)
-            if stream and stream.status == StreamStatus.ACTIVE:
-                # Add to stream's event queue
-                await self.redis.rpush(
-                    f"stream:{stream_id}:events",
-                    json.dumps(event, default=str),
-                )
+        # Add to each stream's event queue in one round trip
+        payload = json.dumps(event, default=str)
+        pipe = self.redis.pipeline(transaction=False)
+        for stream_id in active:
+            pipe.rpush(f"stream:{stream_id}:events", payload)
+        await pipe.execute()
 
     # ========== Connection Testing ==========
 
@@ -401,12 +861,34 @@ class StreamService:
 
     # ========== Statistics ==========
 
-    async def get_stats(self, stream_id: str) -> Optional[StreamStats]:
-        """Get statistics for a stream."""
-        stats_data = await self.redis.hgetall(f"stream:{stream_id}:stats")
+    async def get_stats(
+        self,
+        stream_id: str,
+        window_seconds: int = 3600,
+    ) -> Optional[StreamStats]:
+        """Get lifetime totals and stats over the last ``window_seconds`` for a stream."""
+        now = time.time()
+        slots = window_slots(window_seconds, now)
+
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hgetall(f"stream:{stream_id}:stats")
+        for slot in slots:
+            pipe.hgetall(metrics_key(stream_id, slot))
+        results = await pipe.execute()
+
+        stats_data = {
+            key.decode(): value.decode()
+            for key, value in results[0].items()
+        }
         if not stats_data:
             return None
 
+        window = merge_slots(results[1:])
+        histogram = histogram_from(window)
+        batches = window.get("batches", 0)
+        period_start = datetime.utcfromtimestamp(now - window_seconds)
+        period_end = datetime.utcfromtimestamp(now)
+
         return StreamStats(
             stream_id=stream_id,
             events_sent=int(stats_data.get("events_sent", 0)),
@@ -418,10 +900,20 @@ class StreamService:
             last_error_at=datetime.fromisoformat(stats_data["last_error_at"])
             if stats_data.get("last_error_at")
             else None,
-            last_error_message=stats_data.get("last_error_message"),
-            avg_latency_ms=float(stats_data.get("avg_latency_ms", 0)),
-            period_start=datetime.utcnow(),
-            period_end=datetime.utcnow(),
+            last_error_message=stats_data.get("last_error_message") or None,
+            circuit_state=stats_data.get("circuit_state", CircuitBreaker.CLOSED),
+            period_events_sent=window.get("events_sent", 0),
+            period_events_failed=window.get("events_failed", 0),
+            period_bytes_sent=window.get("bytes_sent", 0),
+            batches=batches,
+            events_per_second=window.get("events_sent", 0) / window_seconds,
+            bytes_per_second=window.get("bytes_sent", 0) / window_seconds,
+            avg_latency_ms=window.get("latency_ms", 0) / batches if batches else 0,
+            p50_latency_ms=percentile(histogram, 0.50),
+            p95_latency_ms=percentile(histogram, 0.95),
+            p99_latency_ms=percentile(histogram, 0.99),
+            period_start=period_start,
+            period_end=period_end,
         )
 
     # ========== Logs ==========
@@ -465,6 +957,142 @@ class StreamService:
         # Keep only the last 1000 logs
         await self.redis.ltrim(logs_key, 0, 999)
 
+    # ========== Dead-Letter Queue ==========
+
+    async def start_replay(
+        self,
+        stream: DataStream,
+        request: ReplayRequest,
+    ) -> Optional[ReplayStatus]:
+        """Start re-driving a stream's dead-lettered batches. Returns None if one is running."""
+        lock_key = f"stream:{stream.id}:dlq:replay:lock"
+        if not await self.redis.set(lock_key, "1", nx=True, ex=60):
+            return None
+
+        status = ReplayStatus(
+            stream_id=stream.id,
+            status="running",
+            max_events=request.max_events,
+            rate_per_second=request.rate_per_second or settings.DLQ_REPLAY_RATE,
+            reason=request.reason,
+            started_at=datetime.utcnow(),
+        )
+        await self._save_replay(status)
+
+        task = asyncio.create_task(self._process_replay(stream, status, lock_key))
+        self._replay_tasks[stream.id] = task
+        task.add_done_callback(lambda _: self._replay_tasks.pop(stream.id, None))
+        return status
+
+    async def get_replay(self, stream_id: str) -> Optional[ReplayStatus]:
+        """Get the status of a stream's latest replay."""
+        data = await self.redis.hget(f"stream:{stream_id}:dlq:replay", "data")
+        if data:
+            return ReplayStatus.model_validate_json(data)
+        return None
+
+    async def _save_replay(self, status: ReplayStatus) -> None:
+        await self.redis.hset(
+            f"stream:{status.stream_id}:dlq:replay",
+            mapping={"data": status.model_dump_json()},
+        )
+
+    async def _process_replay(
+        self,
+        stream: DataStream,
+        status: ReplayStatus,
+        lock_key: str,
+    ) -> None:
+        """
+        Re-send dead-lettered entries oldest first at ``rate_per_second``.
+
+        Each entry is removed once delivered. Replay stops at the first entry
+        that fails again, leaving it (and everything after it) in the queue.
+        Entries dead-lettered while the replay runs are left for the next one.
+        Rejected entries only re-send the events the destination did not accept.
+        """
+        loop = asyncio.get_running_loop()
+        connector = self._create_connector(stream)
+        try:
+            await connector.connect()
+
+            end = await self.dlq.last_id(stream.id)
+            cursor = "-"
+            while end and (status.max_events is None or status.replayed_events < status.max_events):
+                entries = await self.dlq.read(stream.id, count=10, start=cursor, end=end)
+                if not entries:
+                    break
+
+                for entry_id, entry, events in entries:
+                    cursor = f"({entry_id}"
+                    if status.reason and entry.reason != status.reason:
+                        continue
+                    if (
+                        status.max_events is not None
+                        and status.replayed_events + len(events) > status.max_events
+                        and status.replayed_events > 0
+                    ):
+                        end = None
+                        break
+
+                    started = loop.time()
+                    result = await connector.send_batch(
+                        events,
+                        min(stream.delivery.batch_size, status.rate_per_second),
+                        stream.delivery,
+                    )
+                    sent = 0 if connector.buffers_events else result["sent"]
+                    await self._update_stats(
+                        stream.id,
+                        sent,
+                        result["failed"],
+                        latency_ms=(loop.time() - started) * 1000,
+                        nbytes=entry.bytes * sent // entry.count,
+                    )
+                    if result["retryable"]:
+                        raise RuntimeError(
+                            f"Replay of entry {entry_id} failed: {result['error']}"
+                        )
+
+                    await self.dlq.remove(stream.id, [entry_id])
+                    await self._dead_letter(stream, connector, result, DeadLetterReason.REJECTED)
+
+                    status.replayed_entries += 1
+                    status.replayed_events += len(events)
+                    await self._save_replay(status)
+                    await self.redis.expire(lock_key, 60)
+
+                    # Pace entries so the destination sees at most rate_per_second events
+                    pace = len(events) / status.rate_per_second
+                    await asyncio.sleep(max(0.0, pace - (loop.time() - started)))
+
+            await connector.flush(force=True)
+            status.status = "completed"
+            await self.add_log(
+                stream.id,
+                "info",
+                f"Replayed {status.replayed_events} dead-lettered events",
+            )
+
+        except asyncio.CancelledError:
+            status.status = "failed"
+            status.error_message = "Replay cancelled"
+            raise
+
+        except Exception as e:
+            status.status = "failed"
+            status.error_message = str(e)
+            logger.error(f"DLQ replay for stream {stream.id} failed: {e}")
+
+        finally:
+            status.completed_at = datetime.utcnow()
+            await self._save_replay(status)
+            await self.redis.delete(lock_key)
+            try:
+                await connector.disconnect()
+            except Exception as e:
+                logger.error(f"Error disconnecting replay connector: {e}")
+
     # ========== Backfill ==========
 
     async def create_backfill(
@@ -0,0 +1,253 @@
+"""Dead-letter replay against an in-memory queue and a fake connector."""
+
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Union
+
+import pytest
+
+from app.connectors.base import BaseConnector, SendResult
+from app.connectors.bigquery_sink import BigQuerySink
+from app.models.data_stream import (
+    DataStream,
+    DeadLetterEntry,
+    DeadLetterReason,
+    DeliveryConfig,
+    DestinationConfig,
+    DestinationType,
+    PartitioningConfig,
+    ReplayStatus,
+    SchemaConfig,
+    StreamFilters,
+)
+from app.models.data_stream import TestConnectionResult as ConnectionResult
+from app.services.stream_service import StreamService
+
+
+class FakeConnector(BaseConnector):
+    """
+    Accepts up to ``accept`` events per send, or all but the ``reject`` ids;
+    raises for batches containing ``fail_on``.
+    """
+
+    def __init__(
+        self,
+        accept: Optional[int] = None,
+        fail_on: Optional[str] = None,
+        reject: Optional[Set[str]] = None,
+    ):
+        super().__init__(DestinationConfig(type=DestinationType.HTTP))
+        self.accept = accept
+        self.fail_on = fail_on
+        self.reject = reject or set()
+        self.batches: List[List[str]] = []
+
+    async def connect(self) -> None:
+        self._is_connected = True
+
+    async def disconnect(self) -> None:
+        self._is_connected = False
+
+    async def send(self, events: List[Dict[str, Any]]) -> Union[int, SendResult]:
+        ids = [event["id"] for event in events]
+        if self.fail_on in ids:
+            raise ConnectionError("destination down")
+        self.batches.append(ids)
+        rejected = [i for i, event_id in enumerate(ids) if event_id in self.reject]
+        if rejected:
+            return SendResult(len(events) - len(rejected), rejected)
+        return len(events) if self.accept is None else min(self.accept, len(events))
+
+    async def test_connection(self) -> ConnectionResult:
+        return ConnectionResult(success=True, message="ok")
+
+
+class MemoryDeadLetterQueue:
+    """The parts of DeadLetterQueue replay uses, over a list."""
+
+    def __init__(self):
+        self.entries: List[tuple] = []
+        self._next_id = 1
+
+    async def add(self, stream_id, events, reason, error=None, accepted=0, attempts=1):
+        entry_id = f"{self._next_id}-0"
+        self._next_id += 1
+        entry = DeadLetterEntry(
+            id=entry_id,
+            reason=reason,
+            error=error,
+            count=len(events),
+            accepted=accepted,
+            attempts=attempts,
+            bytes=100 * len(events),
+            failed_at=datetime.utcnow(),
+        )
+        self.entries.append((entry_id, entry, list(events)))
+        return entry_id
+
+    async def read(self, stream_id, count, start="-", end="+"):
+        def after_start(entry_id):
+            if start == "-":
+                return True
+            if start.startswith("("):
+                return _seq(entry_id) > _seq(start[1:])
+            return _seq(entry_id) >= _seq(start)
+
+        selected = [
+            entry for entry in self.entries
+            if after_start(entry[0]) and (end == "+" or _seq(entry[0]) <= _seq(end))
+        ]
+        return selected[:count]
+
+    async def last_id(self, stream_id):
+        return self.entries[-1][0] if self.entries else None
+
+    async def remove(self, stream_id, entry_ids):
+        before = len(self.entries)
+        self.entries = [entry for entry in self.entries if entry[0] not in entry_ids]
+        return before - len(self.entries)
+
+
+class FakeRedis:
+    async def expire(self, key, seconds):
+        return True
+
+    async def delete(self, *keys):
+        return len(keys)
+
+
+def _seq(entry_id: str) -> int:
+    return int(entry_id.split("-")[0])
+
+
+def events(*ids: str) -> List[Dict[str, Any]]:
+    return [{"id": event_id} for event_id in ids]
+
+
+@pytest.fixture
+def stream():
+    now = datetime.utcnow()
+    return DataStream(
+        id="stream-1",
+        name="replay",
+        team_id="team-1",
+        destination=DestinationConfig(type=DestinationType.HTTP),
+        schema=SchemaConfig(),
+        filters=StreamFilters(),
+        partitioning=PartitioningConfig(),
+        delivery=DeliveryConfig(max_retries=0, retry_backoff_seconds=0),
+        created_at=now,
+        updated_at=now,
+    )
+
+
+def make_service(dlq: MemoryDeadLetterQueue) -> StreamService:
+    service = StreamService()
+    service.redis = FakeRedis()
+    service.dlq = dlq
+
+    async def noop(*args, **kwargs):
+        return None
+
+    service._update_stats = noop
+    service._save_replay = noop
+    service._record_error = noop
+    service.add_log = noop
+    return service
+
+
+def replay(stream: DataStream, dlq: MemoryDeadLetterQueue, connector: FakeConnector):
+    service = make_service(dlq)
+    service._create_connector = lambda stream, durable=False: connector
+
+    status = ReplayStatus(
+        stream_id=stream.id,
+        status="running",
+        rate_per_second=100000,
+        started_at=datetime.utcnow(),
+    )
+    asyncio.run(service._process_replay(stream, status, "lock"))
+    return status
+
+
+def test_rejected_entries_are_replayed_in_full(stream):
+    dlq = MemoryDeadLetterQueue()
+    asyncio.run(dlq.add(stream.id, events("c", "d"), DeadLetterReason.REJECTED, accepted=2))
+    asyncio.run(dlq.add(stream.id, events("e", "f"), DeadLetterReason.RETRIES_EXHAUSTED))
+    connector = FakeConnector()
+
+    status = replay(stream, dlq, connector)
+
+    assert status.status == "completed"
+    assert connector.batches == [["c", "d"], ["e", "f"]]
+    assert status.replayed_entries == 2
+    assert status.replayed_events == 4
+    assert dlq.entries == []
+
+
+def test_replay_stops_at_first_entry_that_fails_again(stream):
+    dlq = MemoryDeadLetterQueue()
+    asyncio.run(dlq.add(stream.id, events("a"), DeadLetterReason.RETRIES_EXHAUSTED))
+    asyncio.run(dlq.add(stream.id, events("b"), DeadLetterReason.RETRIES_EXHAUSTED))
+    asyncio.run(dlq.add(stream.id, events("c"), DeadLetterReason.RETRIES_EXHAUSTED))
+    connector = FakeConnector(fail_on="b")
+
+    status = replay(stream, dlq, connector)
+
+    assert status.status == "failed"
+    assert "destination down" in status.error_message
+    assert connector.batches == [["a"]]
+    assert [entry_id for entry_id, _, _ in dlq.entries] == ["2-0", "3-0"]
+
+
+def test_partly_accepted_replay_is_dead_lettered_again(stream):
+    dlq = MemoryDeadLetterQueue()
+    asyncio.run(dlq.add(stream.id, events("a", "b", "c"), DeadLetterReason.SHUTDOWN))
+    connector = FakeConnector(accept=1)
+
+    status = replay(stream, dlq, connector)
+
+    assert status.status == "completed"
+    [(_, entry, remaining)] = dlq.entries
+    assert entry.reason == DeadLetterReason.REJECTED
+    assert entry.accepted == 1
+    assert remaining == events("b", "c")
+
+
+def test_rejected_rows_anywhere_in_a_batch_are_dead_lettered_and_replayed(stream):
+    dlq = MemoryDeadLetterQueue()
+    service = make_service(dlq)
+    rejecting = FakeConnector(reject={"b", "d"})
+
+    async def send():
+        result = await rejecting.send_batch(events("a", "b", "c", "d"), 10, stream.delivery)
+        await service._dead_letter(stream, rejecting, result, DeadLetterReason.RETRIES_EXHAUSTED)
+        return result
+
+    result = asyncio.run(send())
+
+    assert (result["sent"], result["failed"]) == (2, 2)
+    [(_, entry, rejected)] = dlq.entries
+    assert entry.reason == DeadLetterReason.REJECTED
+    assert rejected == events("b", "d")
+
+    connector = FakeConnector()
+    status = replay(stream, dlq, connector)
+
+    assert status.status == "completed"
+    assert connector.batches == [["b", "d"]]
+    assert dlq.entries == []
+
+
+def test_bigquery_streaming_insert_names_the_rejected_rows():
+    class Client:
+        def insert_rows_json(self, table_id, rows):
+            return [
+                {"index": 1, "errors": [{"reason": "invalid"}]},
+                {"index": 1, "errors": [{"reason": "stopped"}]},
+                {"index": 3, "errors": [{"reason": "invalid"}]},
+            ]
+
+    result = BigQuerySink(Client(), "project.dataset.table").insert(events("a", "b", "c", "d"))
+
+    assert result == SendResult(accepted=2, rejected=[1, 3])
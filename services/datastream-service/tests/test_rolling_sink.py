@@ -0,0 +1,157 @@
+"""Rolling file sink: delivery reported on upload, journal recovery and dead-lettering."""
+
+import asyncio
+import json
+import os
+
+import pytest
+
+from app.connectors import rolling_sink
+from app.connectors.rolling_sink import RollingFileSink
+from app.models.data_stream import CompressionType, FileFormat, PartitioningConfig
+
+
+class FakeStore:
+    """Collects uploaded objects; fails the first ``failures`` uploads."""
+
+    def __init__(self, failures: int = 0):
+        self.objects = {}
+        self.failures = failures
+
+    async def upload(self, name, content, content_type):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("store unavailable")
+        self.objects[name] = bytes(content)
+
+    def rows(self):
+        return [
+            json.loads(line)
+            for content in self.objects.values()
+            for line in content.decode().splitlines()
+        ]
+
+
+@pytest.fixture(autouse=True)
+def temp_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(rolling_sink.settings, "OBJECT_STORE_TEMP_DIR", str(tmp_path))
+    return tmp_path
+
+
+def make_sink(store: FakeStore, **kwargs) -> RollingFileSink:
+    return RollingFileSink(
+        name="test",
+        prefix="events",
+        file_format=FileFormat.NDJSON,
+        compression=CompressionType.NONE,
+        uploader=store.upload,
+        partitioning=PartitioningConfig(enabled=False),
+        **kwargs,
+    )
+
+
+def events(*ids):
+    return [{"id": event_id} for event_id in ids]
+
+
+def test_events_are_delivered_when_the_file_is_uploaded():
+    store = FakeStore()
+    delivered = []
+
+    async def on_uploaded(count, nbytes):
+        delivered.append(count)
+
+    async def scenario():
+        sink = make_sink(store, on_uploaded=on_uploaded)
+        assert await sink.write(events("a", "b")) == 2
+        buffered = list(delivered)
+        await sink.flush(force=True)
+        return buffered
+
+    buffered = asyncio.run(scenario())
+
+    assert buffered == []
+    assert delivered == [2]
+    assert [row["id"] for row in store.rows()] == ["a", "b"]
+
+
+def test_journaled_events_are_recovered_after_a_crash(temp_dir):
+    store = FakeStore()
+
+    async def crash():
+        sink = make_sink(store, stream_id="stream-1")
+        await sink.write(events("a", "b"))
+        # The process dies: the file is never rolled or closed
+
+    async def restart():
+        sink = make_sink(store, stream_id="stream-1")
+        return await sink.recover()
+
+    asyncio.run(crash())
+    completed = asyncio.run(restart())
+
+    assert [file.rows for file in completed] == [2]
+    assert [row["id"] for row in store.rows()] == ["a", "b"]
+    assert sorted(os.listdir(temp_dir / "test-stream-1")) == ["manifest.jsonl"]
+
+
+def test_recovery_skips_a_truncated_last_line(temp_dir):
+    store = FakeStore()
+
+    async def crash():
+        sink = make_sink(store, stream_id="stream-1")
+        await sink.write(events("a"))
+        [journal] = [
+            os.path.join(sink.directory, name)
+            for name in os.listdir(sink.directory)
+            if name.endswith(".events.jsonl")
+        ]
+        with open(journal, "ab") as handle:
+            handle.write(b'{"id": "b"')
+
+    asyncio.run(crash())
+    asyncio.run(make_sink(store, stream_id="stream-1").recover())
+
+    assert [row["id"] for row in store.rows()] == ["a"]
+
+
+def test_upload_is_retried_then_dead_lettered():
+    store = FakeStore(failures=3)
+    dead = []
+
+    async def on_undeliverable(rows, error):
+        dead.append((rows, error))
+
+    async def scenario():
+        sink = make_sink(store, on_undeliverable=on_undeliverable, upload_attempts=2)
+        await sink.write(events("a", "b"))
+        await sink.flush(force=True)
+        retrying = sink.pending_uploads
+        await sink.flush()
+        return sink, retrying
+
+    sink, retrying = asyncio.run(scenario())
+
+    assert retrying == 1
+    assert dead == [(events("a", "b"), "store unavailable")]
+    assert sink.pending_uploads == 0
+    assert os.listdir(sink.directory) == []
+    assert store.objects == {}
+
+
+def test_file_is_kept_when_dead_lettering_fails():
+    store = FakeStore(failures=1)
+
+    async def on_undeliverable(rows, error):
+        raise ConnectionError("dead-letter queue unavailable")
+
+    async def scenario():
+        sink = make_sink(store, on_undeliverable=on_undeliverable, upload_attempts=1)
+        await sink.write(events("a"))
+        await sink.flush(force=True)
+        kept = sink.pending_uploads
+        await sink.flush()
+        return kept
+
+    assert asyncio.run(scenario()) == 1
+    assert [row["id"] for row in store.rows()] == ["a"]